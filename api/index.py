@@ -9,11 +9,41 @@ import os
 import random
 import re
 import sys
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass
 from datetime import datetime, timedelta, date
 from flask import Flask, jsonify, request
 import requests
 from sqlalchemy import create_engine, text
 
+from common.chat_memory import (
+    CHAT_MEMORY_DDL,
+    CHAT_MEMORY_INDEX_DDL,
+    ChatMemory,
+    SqlChatMemoryStore,
+)
+from common.conversion_rates import (
+    CONVERSION_RATES_QUERY,
+    conversion_rate_cache,
+    invalidate_conversion_rates,
+)
+from common.reading_pool import (
+    READING_SEEN_DDL,
+    READING_SETS_DDL,
+    READING_SETS_INDEX_DDL,
+    ReadingSetPool,
+    SqlReadingSetStore,
+)
+from common.trivia_pool import (
+    TRIVIA_QUESTIONS_DDL,
+    TRIVIA_QUESTIONS_INDEX_DDL,
+    SqlTriviaQuestionPool,
+    SqlTriviaQuestionStore,
+)
+
 app = Flask(__name__)
 
 # Webhook secret
@@ -24,6 +54,12 @@ BOT_TOKEN = os.getenv("BOT_TOKEN", "")
 DEFAULT_RESPONSE_MODE = "short"
 CHAT_RESPONSE_MODES: dict[int, str] = {}
 DB_ENGINE = None
+# Schema bootstrap: bump SCHEMA_VERSION whenever an _ensure_* function changes
+SCHEMA_VERSION = 4
+SCHEMA_COMPONENT = "vercel_webhook"
+_SCHEMA_READY = False
+_SCHEMA_LOCK = threading.Lock()
+_DDL_STATS: dict[str, int] = {"total": 0, "request": 0}  # DDL statements: process total / current request
 
 # Bot identity for reply/mention detection
 BOT_ID: int | None = None
@@ -51,11 +87,15 @@ DEFAULT_CHARACTER = "нейтральный"
 _user_character_cache: dict[int, str] = {}
 _global_character: str = DEFAULT_CHARACTER
 ADMIN_TELEGRAM_ID = 2091908459
-# Conversation memory for AI context
-_CHAT_MEMORY: dict[int, list[dict]] = {}  # per-user: last 10 personal messages
-_CHAT_MEMORY_LIMIT = 10
-_CHAT_GLOBAL: list[dict] = []  # global chat: last 50 messages across all users
-_CHAT_GLOBAL_LIMIT = 50
+# Conversation memory for AI context: ring buffers (10 personal / 50 global messages),
+# persisted to ai_chat_memory unless CHAT_MEMORY_PERSIST=false
+_CHAT_MEMORY = ChatMemory(
+    store=(
+        SqlChatMemoryStore(lambda: get_db_engine())
+        if os.getenv("CHAT_MEMORY_PERSIST", "true").lower() == "true"
+        else None
+    )
+)
 _GD_SUBMIT_STATE: dict[int, dict] = {}
 _GD_MODERATE_STATE: dict[int, int] = {}
 _GD_APPROVE_STATE: dict[int, dict] = {}  # user_id -> {sub_id, level_name, username}
@@ -90,26 +130,106 @@ def get_db_engine():
             normalize_database_url(database_url), pool_pre_ping=True,
             connect_args={"connect_timeout": 10},
         )
-    _ensure_gd_tables(DB_ENGINE)
-    _ensure_budget_tables(DB_ENGINE)
-    _ensure_universe_tables(DB_ENGINE)
+    if not _SCHEMA_READY:
+        ensure_schema(DB_ENGINE)
     return DB_ENGINE
 
 
+def _execute_ddl(conn, statement: str) -> None:
+    """Execute one DDL statement and count it for the current request."""
+    conn.execute(text(statement))
+    _DDL_STATS["total"] += 1
+    _DDL_STATS["request"] += 1
+
+
+def _get_schema_version(engine) -> int:
+    """Read the recorded webhook schema version (0 if never bootstrapped)."""
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(
+                text("SELECT version FROM schema_version WHERE component = :component"),
+                {"component": SCHEMA_COMPONENT},
+            ).mappings().first()
+            return int(row["version"]) if row else 0
+    except Exception:
+        return 0
+
+
+def _record_schema_version(engine) -> bool:
+    """Persist SCHEMA_VERSION so other instances skip the DDL burst."""
+    try:
+        with engine.connect() as conn:
+            _execute_ddl(conn, """
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    component TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute(
+                text("""
+                    INSERT INTO schema_version (component, version, applied_at)
+                    VALUES (:component, :version, CURRENT_TIMESTAMP)
+                    ON CONFLICT (component) DO UPDATE
+                    SET version = EXCLUDED.version, applied_at = EXCLUDED.applied_at
+                """),
+                {"component": SCHEMA_COMPONENT, "version": SCHEMA_VERSION},
+            )
+            conn.commit()
+        return True
+    except Exception as exc:
+        print(f"[SCHEMA] Version record error: {exc}")
+        return False
+
+
+def ensure_schema(engine, force: bool = False) -> bool:
+    """Bootstrap webhook tables once per process and once per SCHEMA_VERSION.
+
+    Warm requests return immediately. A cold start issues a single SELECT
+    against ``schema_version``; the full DDL burst only runs when the stored
+    version is older than SCHEMA_VERSION (bump it after changing any
+    ``_ensure_*`` function). Returns True if DDL was executed.
+    """
+    global _SCHEMA_READY
+    if _SCHEMA_READY and not force:
+        return False
+    with _SCHEMA_LOCK:
+        if _SCHEMA_READY and not force:
+            return False
+        if not force and _get_schema_version(engine) >= SCHEMA_VERSION:
+            _SCHEMA_READY = True
+            print(f"[SCHEMA] Version {SCHEMA_VERSION} already applied, skipping DDL")
+            return False
+        ok = all([
+            _ensure_gd_tables(engine),
+            _ensure_user_preferences_table(engine),
+            _ensure_chess_games_table(engine),
+            _ensure_budget_tables(engine),
+            _ensure_universe_tables(engine),
+            _ensure_chat_memory_table(engine),
+            _ensure_reading_pool_tables(engine),
+            _ensure_trivia_pool_table(engine),
+        ])
+        if ok and _record_schema_version(engine):
+            _SCHEMA_READY = True
+            print(f"[SCHEMA] Bootstrapped version {SCHEMA_VERSION} ({_DDL_STATS['total']} DDL statements)")
+        return True
+
+
 def _ensure_gd_tables(engine):
     """Create GD module tables if they don't exist (preserves existing data)."""
     try:
         with engine.connect() as conn:
-            conn.execute(text("""
+            _execute_ddl(conn, """
                 CREATE TABLE IF NOT EXISTS levels (
                     id SERIAL PRIMARY KEY,
                     name TEXT NOT NULL,
                     position INTEGER NOT NULL DEFAULT 0,
                     difficulty TEXT DEFAULT 'Unknown'
                 )
-            """))
-            conn.execute(text("ALTER TABLE levels ADD COLUMN IF NOT EXISTS difficulty TEXT DEFAULT 'Unknown'"))
-            conn.execute(text("""
+            """)
+            _execute_ddl(conn, "ALTER TABLE levels ADD COLUMN IF NOT EXISTS difficulty TEXT DEFAULT 'Unknown'")
+            _execute_ddl(conn, """
                 CREATE TABLE IF NOT EXISTS submissions (
                     id SERIAL PRIMARY KEY,
                     user_id BIGINT NOT NULL,
@@ -122,8 +242,8 @@ def _ensure_gd_tables(engine):
                     reviewed_at TIMESTAMP,
                     reviewed_by BIGINT
                 )
-            """))
-            conn.execute(text("""
+            """)
+            _execute_ddl(conn, """
                 CREATE TABLE IF NOT EXISTS player_stats (
                     user_id BIGINT PRIMARY KEY,
                     total_approved INTEGER DEFAULT 0,
@@ -131,8 +251,8 @@ def _ensure_gd_tables(engine):
                     hardest_level_id INTEGER,
                     last_submission TIMESTAMP
                 )
-            """))
-            conn.execute(text("""
+            """)
+            _execute_ddl(conn, """
                 CREATE TABLE IF NOT EXISTS level_completions (
                     id SERIAL PRIMARY KEY,
                     user_id BIGINT NOT NULL,
@@ -140,8 +260,8 @@ def _ensure_gd_tables(engine):
                     completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     UNIQUE(user_id, level_id)
                 )
-            """))
-            conn.execute(text("""
+            """)
+            _execute_ddl(conn, """
                 CREATE TABLE IF NOT EXISTS game_states (
                     user_id BIGINT NOT NULL,
                     game_name TEXT NOT NULL,
@@ -150,12 +270,13 @@ def _ensure_gd_tables(engine):
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     PRIMARY KEY (user_id, game_name, metric)
                 )
-            """))
+            """)
             conn.commit()
         print("[GD] Tables ensured successfully")
+        return True
     except Exception as exc:
         print(f"[GD] Table init error: {exc}")
-    _ensure_user_preferences_table(engine)
+        return False
 
 
 def get_user_balance(user_id: int) -> tuple[int, bool]:
@@ -242,25 +363,70 @@ def _ensure_user_preferences_table(engine):
     """Create user_preferences table if it doesn't exist."""
     try:
         with engine.connect() as conn:
-            conn.execute(text("""
+            _execute_ddl(conn, """
                 CREATE TABLE IF NOT EXISTS user_preferences (
                     user_id BIGINT PRIMARY KEY,
                     preferred_character VARCHAR(20) DEFAULT 'чай',
                     preferred_ai_model VARCHAR(50),
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
-            """))
+            """)
             conn.commit()
         print("[INIT] user_preferences table ensured")
+        return True
     except Exception as exc:
         print(f"[INIT] user_preferences table error: {exc}")
+        return False
+
+
+def _ensure_chat_memory_table(engine):
+    """Create ai_chat_memory table for persistent AI conversation memory."""
+    try:
+        with engine.connect() as conn:
+            _execute_ddl(conn, CHAT_MEMORY_DDL)
+            _execute_ddl(conn, CHAT_MEMORY_INDEX_DDL)
+            conn.commit()
+        print("[INIT] ai_chat_memory table ensured")
+        return True
+    except Exception as exc:
+        print(f"[INIT] ai_chat_memory table error: {exc}")
+        return False
+
+
+def _ensure_reading_pool_tables(engine):
+    """Create reading_sets/reading_seen tables for the pre-generated reading pool."""
+    try:
+        with engine.connect() as conn:
+            _execute_ddl(conn, READING_SETS_DDL)
+            _execute_ddl(conn, READING_SETS_INDEX_DDL)
+            _execute_ddl(conn, READING_SEEN_DDL)
+            conn.commit()
+        print("[INIT] reading pool tables ensured")
+        return True
+    except Exception as exc:
+        print(f"[INIT] reading pool tables error: {exc}")
+        return False
+
+
+def _ensure_trivia_pool_table(engine):
+    """Create the trivia_questions table for the pre-generated trivia pool."""
+    try:
+        with engine.connect() as conn:
+            _execute_ddl(conn, TRIVIA_QUESTIONS_DDL)
+            _execute_ddl(conn, TRIVIA_QUESTIONS_INDEX_DDL)
+            conn.commit()
+        print("[INIT] trivia pool table ensured")
+        return True
+    except Exception as exc:
+        print(f"[INIT] trivia pool table error: {exc}")
+        return False
 
 
 def _ensure_chess_games_table(engine):
     """Create chess_games table if it doesn't exist."""
     try:
         with engine.connect() as conn:
-            conn.execute(text("""
+            _execute_ddl(conn, """
                 CREATE TABLE IF NOT EXISTS chess_games (
                     id SERIAL PRIMARY KEY,
                     user_id BIGINT NOT NULL,
@@ -272,19 +438,21 @@ def _ensure_chess_games_table(engine):
                     solved_at TIMESTAMPTZ,
                     created_at TIMESTAMPTZ DEFAULT NOW()
                 )
-            """))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_chess_games_user_id ON chess_games(user_id)"))
+            """)
+            _execute_ddl(conn, "CREATE INDEX IF NOT EXISTS ix_chess_games_user_id ON chess_games(user_id)")
             conn.commit()
         print("[INIT] chess_games table ensured")
+        return True
     except Exception as exc:
         print(f"[INIT] chess_games table error: {exc}")
+        return False
 
 
 def _ensure_budget_tables(engine):
     """Create Family Budget tables if they don't exist."""
     try:
         with engine.connect() as conn:
-            conn.execute(text("""
+            _execute_ddl(conn, """
                 CREATE TABLE IF NOT EXISTS families (
                     id SERIAL PRIMARY KEY,
                     name TEXT NOT NULL,
@@ -292,10 +460,10 @@ def _ensure_budget_tables(engine):
                     invite_code TEXT NOT NULL,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
-            """))
-            conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS idx_families_invite_code ON families(invite_code)"))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_families_admin_id ON families(admin_id)"))
-            conn.execute(text("""
+            """)
+            _execute_ddl(conn, "CREATE UNIQUE INDEX IF NOT EXISTS idx_families_invite_code ON families(invite_code)")
+            _execute_ddl(conn, "CREATE INDEX IF NOT EXISTS idx_families_admin_id ON families(admin_id)")
+            _execute_ddl(conn, """
                 CREATE TABLE IF NOT EXISTS family_members (
                     id SERIAL PRIMARY KEY,
                     family_id INTEGER NOT NULL REFERENCES families(id) ON DELETE CASCADE,
@@ -303,10 +471,10 @@ def _ensure_budget_tables(engine):
                     display_name TEXT NOT NULL,
                     joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
-            """))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_family_members_family_id ON family_members(family_id)"))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_family_members_user_id ON family_members(user_id)"))
-            conn.execute(text("""
+            """)
+            _execute_ddl(conn, "CREATE INDEX IF NOT EXISTS idx_family_members_family_id ON family_members(family_id)")
+            _execute_ddl(conn, "CREATE INDEX IF NOT EXISTS idx_family_members_user_id ON family_members(user_id)")
+            _execute_ddl(conn, """
                 CREATE TABLE IF NOT EXISTS budget_transactions (
                     id SERIAL PRIMARY KEY,
                     family_id INTEGER NOT NULL REFERENCES families(id) ON DELETE CASCADE,
@@ -316,18 +484,18 @@ def _ensure_budget_tables(engine):
                     description TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
-            """))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_budget_transactions_family_id ON budget_transactions(family_id)"))
-            conn.execute(text("""
+            """)
+            _execute_ddl(conn, "CREATE INDEX IF NOT EXISTS idx_budget_transactions_family_id ON budget_transactions(family_id)")
+            _execute_ddl(conn, """
                 CREATE TABLE IF NOT EXISTS transaction_details (
                     id SERIAL PRIMARY KEY,
                     transaction_id INTEGER NOT NULL REFERENCES budget_transactions(id) ON DELETE CASCADE,
                     for_whom_id TEXT NOT NULL,
                     share INTEGER NOT NULL
                 )
-            """))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_transaction_details_txn_id ON transaction_details(transaction_id)"))
-            conn.execute(text("""
+            """)
+            _execute_ddl(conn, "CREATE INDEX IF NOT EXISTS idx_transaction_details_txn_id ON transaction_details(transaction_id)")
+            _execute_ddl(conn, """
                 CREATE TABLE IF NOT EXISTS debts (
                     id SERIAL PRIMARY KEY,
                     family_id INTEGER NOT NULL REFERENCES families(id) ON DELETE CASCADE,
@@ -337,11 +505,11 @@ def _ensure_budget_tables(engine):
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
-            """))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_debts_family_id ON debts(family_id)"))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_debts_debtor_id ON debts(debtor_id)"))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_debts_creditor_id ON debts(creditor_id)"))
-            conn.execute(text("""
+            """)
+            _execute_ddl(conn, "CREATE INDEX IF NOT EXISTS idx_debts_family_id ON debts(family_id)")
+            _execute_ddl(conn, "CREATE INDEX IF NOT EXISTS idx_debts_debtor_id ON debts(debtor_id)")
+            _execute_ddl(conn, "CREATE INDEX IF NOT EXISTS idx_debts_creditor_id ON debts(creditor_id)")
+            _execute_ddl(conn, """
                 CREATE TABLE IF NOT EXISTS payments (
                     id SERIAL PRIMARY KEY,
                     family_id INTEGER NOT NULL REFERENCES families(id) ON DELETE CASCADE,
@@ -350,38 +518,42 @@ def _ensure_budget_tables(engine):
                     amount INTEGER NOT NULL,
                     paid_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
-            """))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_payments_family_id ON payments(family_id)"))
+            """)
+            _execute_ddl(conn, "CREATE INDEX IF NOT EXISTS idx_payments_family_id ON payments(family_id)")
             conn.commit()
         print("[BUDGET] Tables ensured successfully")
+        return True
     except Exception as exc:
         print(f"[BUDGET] Table init error: {exc}")
+        return False
 
 
 def _ensure_universe_tables(engine):
     """Create Universe Module tables if they don't exist."""
     try:
         with engine.connect() as conn:
-            conn.execute(text("""
+            _execute_ddl(conn, """
                 CREATE TABLE IF NOT EXISTS infection_status (
                     user_id BIGINT PRIMARY KEY,
                     virus_type VARCHAR(50),
                     infected_at TIMESTAMPTZ,
                     tea_cooldown_until TIMESTAMPTZ
                 )
-            """))
-            conn.execute(text("""
+            """)
+            _execute_ddl(conn, """
                 CREATE TABLE IF NOT EXISTS daily_prayer_log (
                     user_id BIGINT NOT NULL,
                     prayer_date DATE NOT NULL,
                     PRIMARY KEY (user_id, prayer_date)
                 )
-            """))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_daily_prayer_log_date ON daily_prayer_log(prayer_date)"))
+            """)
+            _execute_ddl(conn, "CREATE INDEX IF NOT EXISTS ix_daily_prayer_log_date ON daily_prayer_log(prayer_date)")
             conn.commit()
         print("[UNIVERSE] Tables ensured successfully")
+        return True
     except Exception as exc:
         print(f"[UNIVERSE] Table init error: {exc}")
+        return False
 
 
 def _load_bot_id() -> int | None:
@@ -469,47 +641,31 @@ def build_character_prompt(character: str, user_text: str) -> str:
 
 def add_chat_memory(user_id: int, role: str, text: str) -> None:
     """Add a message to user's conversation memory and global chat history."""
-    global _CHAT_GLOBAL
-    # Per-user memory
-    if user_id not in _CHAT_MEMORY:
-        _CHAT_MEMORY[user_id] = []
-    _CHAT_MEMORY[user_id].append({"role": role, "content": text})
-    if len(_CHAT_MEMORY[user_id]) > _CHAT_MEMORY_LIMIT:
-        _CHAT_MEMORY[user_id] = _CHAT_MEMORY[user_id][-_CHAT_MEMORY_LIMIT:]
-    # Global chat memory
-    _CHAT_GLOBAL.append({"role": role, "content": text, "user_id": user_id})
-    if len(_CHAT_GLOBAL) > _CHAT_GLOBAL_LIMIT:
-        _CHAT_GLOBAL = _CHAT_GLOBAL[-_CHAT_GLOBAL_LIMIT:]
+    _CHAT_MEMORY.add(user_id, (role, text))
 
 
 def get_chat_memory(user_id: int) -> list[dict]:
     """Get user's personal conversation memory (last 10 messages)."""
-    return _CHAT_MEMORY.get(user_id, [])
+    return _CHAT_MEMORY.personal(user_id)
 
 
 def get_global_chat_memory() -> list[dict]:
     """Get global chat history (last 50 messages, without user_id field)."""
-    return [{"role": m["role"], "content": m["content"]} for m in _CHAT_GLOBAL]
+    return _CHAT_MEMORY.global_history()
 
 
 def call_ai_with_memory(user_id: int, prompt: str, max_tokens: int = 150) -> str:
-    """Call AI with conversation context (personal + global chat)."""
+    """Call AI with conversation context (personal + global chat).
+
+    Only the newest history that fits the token budget is sent: personal
+    messages first, then a smaller share of other users' global messages.
+    """
     groq_key = os.getenv("GROQ_API_KEY")
     if not groq_key:
         return "❌ AI недоступен (нет GROQ_API_KEY)"
 
     # Build messages with memory
-    messages = []
-    
-    # Add global chat context (last 50 messages from all users)
-    global_memory = get_global_chat_memory()
-    if global_memory:
-        messages.extend(global_memory)
-    
-    # Add personal conversation memory (last 10 messages)
-    personal_memory = get_chat_memory(user_id)
-    if personal_memory:
-        messages.extend(personal_memory)
+    messages = _CHAT_MEMORY.context(user_id)
     
     # Add current message
     messages.append({"role": "user", "content": prompt})
@@ -532,9 +688,8 @@ def call_ai_with_memory(user_id: int, prompt: str, max_tokens: int = 150) -> str
         if response.status_code == 200:
             result = response.json()
             answer = result["choices"][0]["message"]["content"]
-            # Save to memory
-            add_chat_memory(user_id, "user", prompt)
-            add_chat_memory(user_id, "assistant", answer)
+            # Save to memory (one DB write for the exchange)
+            _CHAT_MEMORY.add(user_id, ("user", prompt), ("assistant", answer))
             return answer
         else:
             error_detail = response.text[:200] if response.text else "No details"
@@ -843,60 +998,222 @@ def add_user_balance(user_id: int, amount: int, description: str = "") -> bool:
         return False
 
 
+def _score_user_name(name: str, uname: str, fname: str, lname: str, full: str) -> int:
+    """Score how well lowercase ``name`` matches a user's lowercase names."""
+    # Exact username match (highest)
+    if uname and (uname == name or uname == name.lstrip("@")):
+        return 100
+    # Exact first_name match
+    if fname == name:
+        return 80
+    # Exact last_name match
+    if lname == name:
+        return 70
+    # Full name match
+    if full == name:
+        return 90
+    # First name + underscore/space match (e.g. "ivan" matches "ivan_petrov" username)
+    if uname and (uname.startswith(name) or uname.endswith(name)):
+        return 60
+    # Starts with match
+    if fname and fname.startswith(name):
+        return 50
+    if lname and lname.startswith(name):
+        return 40
+    # Contains
+    if fname and name in fname:
+        return 30
+    if lname and name in lname:
+        return 20
+    return 0
+
+
+class _NameTrie:
+    """Character trie where every node keeps the ids of all keys passing through it."""
+
+    __slots__ = ("_root",)
+
+    def __init__(self):
+        self._root: tuple[dict, set] = ({}, set())
+
+    def add(self, key: str, uid: int) -> None:
+        node = self._root
+        for ch in key:
+            node = node[0].setdefault(ch, ({}, set()))
+            node[1].add(uid)
+
+    def discard(self, key: str, uid: int) -> None:
+        node = self._root
+        for ch in key:
+            node = node[0].get(ch)
+            if node is None:
+                return
+            node[1].discard(uid)
+
+    def find(self, prefix: str) -> set[int]:
+        node = self._root
+        for ch in prefix:
+            node = node[0].get(ch)
+            if node is None:
+                return set()
+        return node[1]
+
+
+class UserDirectory:
+    """In-process name index over ``users`` backing find_user_by_name().
+
+    Exact maps serve the username / first / last / full-name tiers; tries over
+    usernames (forward and reversed) and over every suffix of first and last
+    names serve the startswith / endswith / contains tiers. Only the matching
+    candidates are scored, with the same rules as the former full-table scan.
+
+    The first lookup loads the table; afterwards only rows with a higher
+    ``users.id`` are fetched when a name is not found, and the whole index is
+    reloaded every ``ttl`` seconds to pick up renames made by the polling bot.
+    """
+
+    def __init__(self, ttl: float = 600.0):
+        self.ttl = ttl
+        self.loaded_at = 0.0
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._users: dict[int, tuple[str, str, str, str]] = {}
+        self._order: dict[int, tuple[float, int]] = {}
+        self._by_username: dict[str, set[int]] = {}
+        self._by_first: dict[str, set[int]] = {}
+        self._by_last: dict[str, set[int]] = {}
+        self._by_full: dict[str, set[int]] = {}
+        self._username_prefix = _NameTrie()
+        self._username_suffix = _NameTrie()  # reversed usernames
+        self._first_substr = _NameTrie()  # all suffixes of first names
+        self._last_substr = _NameTrie()  # all suffixes of last names
+        self._max_row_id = 0
+        self._inserted = 0
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def _index(self, uid: int, names: tuple[str, str, str, str], add: bool) -> None:
+        uname, fname, lname, full = names
+        for mapping, key in (
+            (self._by_username, uname),
+            (self._by_first, fname),
+            (self._by_last, lname),
+            (self._by_full, full),
+        ):
+            if not key:
+                continue
+            if add:
+                mapping.setdefault(key, set()).add(uid)
+            elif key in mapping:
+                mapping[key].discard(uid)
+                if not mapping[key]:
+                    del mapping[key]
+        update = "add" if add else "discard"
+        if uname:
+            getattr(self._username_prefix, update)(uname, uid)
+            getattr(self._username_suffix, update)(uname[::-1], uid)
+        for trie, value in ((self._first_substr, fname), (self._last_substr, lname)):
+            for i in range(len(value)):
+                getattr(trie, update)(value[i:], uid)
+
+    def upsert(
+        self,
+        telegram_id: int,
+        username: str | None,
+        first_name: str | None,
+        last_name: str | None,
+        row_id: int | None = None,
+    ) -> None:
+        """Add a user or re-index them after a rename."""
+        fname = (first_name or "").lower()
+        lname = (last_name or "").lower()
+        names = ((username or "").lower(), fname, lname, f"{fname} {lname}".strip())
+        with self._lock:
+            if row_id is not None:
+                self._max_row_id = max(self._max_row_id, row_id)
+            self._inserted += 1
+            # Ties go to the oldest row, matching the old table-scan order
+            order = (row_id if row_id is not None else float("inf"), self._inserted)
+            if telegram_id in self._order:
+                order = min(order, self._order[telegram_id])
+            self._order[telegram_id] = order
+            old = self._users.get(telegram_id)
+            if old == names:
+                return
+            if old is not None:
+                self._index(telegram_id, old, add=False)
+            self._users[telegram_id] = names
+            self._index(telegram_id, names, add=True)
+
+    def refresh(self, full: bool = False) -> int:
+        """Load users from the DB (all, or only rows newer than the last seen id)."""
+        query = "SELECT id, telegram_id, username, first_name, last_name FROM users"
+        params = {}
+        if not full:
+            query += " WHERE id > :after_id"
+            params["after_id"] = self._max_row_id
+        with get_db_engine().connect() as conn:
+            rows = conn.execute(text(query + " ORDER BY id"), params).mappings().all()
+        with self._lock:
+            if full:
+                self._reset()
+                self.loaded_at = time.monotonic()
+            for row in rows:
+                self.upsert(
+                    row["telegram_id"], row["username"], row["first_name"], row["last_name"], row["id"]
+                )
+        return len(rows)
+
+    def ensure_loaded(self) -> None:
+        if not self.loaded_at or time.monotonic() - self.loaded_at > self.ttl:
+            self.refresh(full=True)
+
+    def find(self, name: str) -> int | None:
+        """Return the best-matching Telegram ID for ``name`` or None."""
+        name = name.strip().lower()
+        if not name:
+            return None
+        with self._lock:
+            candidates = set(self._by_username.get(name, ()))
+            candidates |= self._by_username.get(name.lstrip("@"), set())
+            for mapping in (self._by_first, self._by_last, self._by_full):
+                candidates |= mapping.get(name, set())
+            candidates |= self._username_prefix.find(name)
+            candidates |= self._username_suffix.find(name[::-1])
+            candidates |= self._first_substr.find(name)
+            candidates |= self._last_substr.find(name)
+
+            best = None
+            best_key = None
+            for uid in candidates:
+                score = _score_user_name(name, *self._users[uid])
+                key = (-score, self._order[uid])
+                if score > 0 and (best_key is None or key < best_key):
+                    best, best_key = uid, key
+            return best
+
+
+_USER_DIRECTORY = UserDirectory()
+
+
 def find_user_by_name(name: str) -> int | None:
     """Find Telegram user ID by fuzzy name/username matching."""
     if not name or not name.strip():
         return None
-    name = name.strip().lower()
     try:
-        with get_db_engine().connect() as conn:
-            rows = conn.execute(
-                text("SELECT telegram_id, username, first_name, last_name FROM users"),
-            ).mappings().all()
-            candidates = [dict(r) for r in rows]
+        _USER_DIRECTORY.ensure_loaded()
+        best = _USER_DIRECTORY.find(name)
+        # Unknown name: pick up users registered since the last load
+        if best is None and _USER_DIRECTORY.refresh():
+            best = _USER_DIRECTORY.find(name)
+        return best
     except Exception as exc:
         print(f"Error finding user: {exc}")
         return None
 
-    best = None
-    best_score = 0
-    for u in candidates:
-        score = 0
-        uid = u["telegram_id"]
-        uname = (u.get("username") or "").lower()
-        fname = (u.get("first_name") or "").lower()
-        lname = (u.get("last_name") or "").lower()
-        full = f"{fname} {lname}".strip()
-        # Exact username match (highest)
-        if uname and (uname == name or uname == name.lstrip("@")):
-            score = 100
-        # Exact first_name match
-        elif fname == name:
-            score = 80
-        # Exact last_name match
-        elif lname == name:
-            score = 70
-        # Full name match
-        elif full == name:
-            score = 90
-        # First name + underscore/space match (e.g. "ivan" matches "ivan_petrov" username)
-        elif uname and (uname.startswith(name) or uname.endswith(name)):
-            score = 60
-        # Starts with match
-        elif fname and fname.startswith(name):
-            score = 50
-        elif lname and lname.startswith(name):
-            score = 40
-        # Contains
-        elif fname and name in fname:
-            score = 30
-        elif lname and name in lname:
-            score = 20
-        if score > best_score:
-            best_score = score
-            best = uid
-    return best
-
 
 def get_game_state(user_id: int, game_name: str, metric: str = "") -> float:
     """Get stored previous value for a game metric."""
@@ -1868,18 +2185,19 @@ BOT_CONVERSION_RATES = {
 }
 
 
+def _load_conversion_rates() -> list:
+    with get_db_engine().connect() as conn:
+        return conn.execute(text(CONVERSION_RATES_QUERY)).all()
+
+
 def get_conversion_rate(bot_name: str) -> float:
+    """Get k for a bot from the shared rate cache (one DB read per TTL)."""
     try:
-        db = get_db_engine()
-        with db.connect() as conn:
-            row = conn.execute(
-                text("SELECT k FROM conversion_rates WHERE bot_name = :bn LIMIT 1"),
-                {"bn": bot_name},
-            ).mappings().first()
-            if row:
-                return float(row["k"])
-    except Exception:
-        pass
+        k = conversion_rate_cache.get(bot_name, loader=_load_conversion_rates)
+        if k is not None:
+            return float(k)
+    except Exception as exc:
+        print(f"[RATES] load error: {exc}")
     return BOT_CONVERSION_RATES.get(bot_name, 1.0)
 
 
@@ -2340,6 +2658,50 @@ def health():
     return jsonify({"status": "healthy", "platform": "vercel"})
 
 
+@app.before_request
+def _reset_request_ddl_counter():
+    _DDL_STATS["request"] = 0
+
+
+@app.after_request
+def _report_request_ddl_counter(response):
+    response.headers["X-DDL-Statements"] = str(_DDL_STATS["request"])
+    if _DDL_STATS["request"]:
+        print(f"[SCHEMA] {request.path} issued {_DDL_STATS['request']} DDL statements")
+    return response
+
+
+def _has_admin_secret() -> bool:
+    """Check ``Authorization: Bearer <secret>`` for write/maintenance endpoints.
+
+    Accepts CRON_SECRET (sent by Vercel cron jobs) or the webhook secret.
+    """
+    header = request.headers.get("Authorization", "")
+    if not header.startswith("Bearer "):
+        return False
+    token = header[len("Bearer "):]
+    secrets = [value for value in (os.getenv("CRON_SECRET"), WEBHOOK_SECRET) if value]
+    return any(hmac.compare_digest(token, value) for value in secrets)
+
+
+@app.route("/api/debug_schema", methods=["GET"])
+def debug_schema():
+    """Show schema bootstrap state; ?force=1 re-runs the DDL (admin secret required)."""
+    ran = False
+    if request.args.get("force") == "1":
+        if not _has_admin_secret():
+            return jsonify({"error": "unauthorized"}), 403
+        ran = ensure_schema(get_db_engine(), force=True)
+    return jsonify({
+        "schema_version": SCHEMA_VERSION,
+        "recorded_version": _get_schema_version(get_db_engine()),
+        "ready": _SCHEMA_READY,
+        "ddl_total": _DDL_STATS["total"],
+        "ddl_this_request": _DDL_STATS["request"],
+        "forced": ran,
+    })
+
+
 @app.route("/debug_puzzle")
 def debug_puzzle():
     """Debug endpoint to test puzzle system."""
@@ -2788,21 +3150,43 @@ def _call_ai_api_fast(prompt: str, max_tokens: int = 200, timeout: float = 4.0)
     return "❌"
 
 
-def _vercel_trivia_question() -> dict | None:
-    # Try AI first with short timeout
+def _generate_ai_trivia_question() -> dict | None:
     canon = _load_canon_trivia()
-    if canon:
-        prompt = _AI_QUESTIONS_PROMPT.format(canon=canon[:1500])
-        ai_text = _call_ai_api_fast(prompt, max_tokens=400, timeout=5.0)
-        if ai_text and not ai_text.startswith("❌"):
-            parsed = _parse_ai_question(ai_text)
-            if parsed:
-                return parsed
-
-    # Fallback to hardcoded questions
+    if not canon:
+        return None
+    prompt = _AI_QUESTIONS_PROMPT.format(canon=canon[:1500])
+    ai_text = _call_ai_api_fast(prompt, max_tokens=400, timeout=5.0)
+    if ai_text and not ai_text.startswith("❌"):
+        return _parse_ai_question(ai_text)
+    return None
+
+
+# AI questions are generated ahead of time into trivia_questions (cron and
+# background refills); /trivia only takes ready ones
+_TRIVIA_POOL = SqlTriviaQuestionPool(SqlTriviaQuestionStore(lambda: get_db_engine()), _generate_ai_trivia_question)
+
+
+@app.route("/api/trivia_pool", methods=["GET", "POST"])
+def trivia_pool():
+    """Report the trivia pool state; ``?refill=1`` (cron or admin) tops it up first."""
+    if not _has_admin_secret():
+        return jsonify({"error": "unauthorized"}), 403
+    added = _TRIVIA_POOL.refill() if request.args.get("refill") == "1" else 0
+    return jsonify({"refilled": added, "pool_size": _TRIVIA_POOL.size(), "stats": _TRIVIA_POOL.stats})
+
+
+def _vercel_trivia_question() -> dict | None:
+    # Prefetched AI question, never waits for the provider
+    ai_question = _TRIVIA_POOL.take()
+    if ai_question:
+        return ai_question
+
+    # Fallback to hardcoded questions not asked recently
     if not _TRIVIA_QUESTIONS:
         return None
-    question = random.choice(_TRIVIA_QUESTIONS)
+    candidates = [q for q in _TRIVIA_QUESTIONS if not _TRIVIA_POOL.is_recent(q["text"])] or _TRIVIA_QUESTIONS
+    question = random.choice(candidates)
+    _TRIVIA_POOL.mark_asked(question)
     correct_text = question["correct_text"]
     q_group = question.get("group", "")
 
@@ -2827,1754 +3211,2087 @@ def _vercel_trivia_question() -> dict | None:
     }
 
 
-@app.route("/telegram/webhook/<secret>", methods=["POST"])
-def telegram_webhook(secret: str):
-    """Receive Telegram webhook and forward to processing."""
+# ============================================================================
+# Webhook router
+# ============================================================================
 
-    # Verify secret
-    if not hmac.compare_digest(secret, WEBHOOK_SECRET):
-        return jsonify({"error": "invalid_secret"}), 404
+@dataclass
+class WebhookContext:
+    """Values extracted once per update and shared by all webhook handlers."""
 
-    # Get update
-    update = request.get_json()
-    if not update:
-        return jsonify({"ok": True})
-    
-    # Handle callback_query
-    callback_query = update.get("callback_query", {})
-    callback_data = callback_query.get("data", "")
-    if callback_data:
-        if callback_data.startswith("trivia_"):
-            trivia_answer_callback(callback_query, callback_data)
-            return jsonify({"ok": True})
-        if callback_data.startswith("gd_moderate_"):
-            gd_moderate_callback(callback_query, callback_data)
-            return jsonify({"ok": True})
+    update: dict
+    message: dict
+    msg_text: str
+    chat_id: int | None
+    user: dict
+    user_id: int | None
+    name: str
+    command: str
+    reply_to: dict | None
 
-    # Process Telegram commands supported by the Vercel webhook runtime.
+
+# command -> (handler, requires_chat); callback_data prefix -> handler
+_COMMAND_ROUTES: dict[str, tuple[Callable[[WebhookContext], None], bool]] = {}
+_CALLBACK_ROUTES: dict[str, Callable[[dict, str], None]] = {}
+# route -> {"calls", "errors", "total_ms", "max_ms", "last_ms"}
+_ROUTE_STATS: dict[str, dict] = {}
+
+
+def webhook_command(*commands: str, requires_chat: bool = True):
+    """Register a handler for exact ``/command`` matches (O(1) dict lookup)."""
+
+    def register(func):
+        for command in commands:
+            if command in _COMMAND_ROUTES:
+                raise ValueError(f"Duplicate webhook command: {command}")
+            _COMMAND_ROUTES[command] = (func, requires_chat)
+        return func
+
+    return register
+
+
+def webhook_callback(prefix: str):
+    """Register a handler for callback_data starting with ``prefix``."""
+
+    def register(func):
+        _CALLBACK_ROUTES[prefix] = func
+        return func
+
+    return register
+
+
+def _record_route_latency(route: str, started: float, failed: bool = False) -> None:
+    """Add one handler run (started at ``time.perf_counter()``) to route stats."""
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    stats = _ROUTE_STATS.setdefault(
+        route, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0}
+    )
+    stats["calls"] += 1
+    stats["errors"] += int(failed)
+    stats["total_ms"] += elapsed_ms
+    stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+    stats["last_ms"] = elapsed_ms
+    print(f"[ROUTER] {route} handled in {elapsed_ms:.1f} ms{' (error)' if failed else ''}")
+
+
+def _timed_call(route: str, handler: Callable, *args) -> None:
+    """Run a route handler and record its latency, re-raising any error."""
+    started = time.perf_counter()
     try:
-        message = update.get("message", {})
-        msg_text = message.get("text", "")
-        chat_id = message.get("chat", {}).get("id")
-        user = message.get("from", {})
-        user_id = user.get("id", chat_id)
-        name = user.get("first_name") or user.get("username") or "LucasTeam"
-        command = normalize_command(msg_text)
+        handler(*args)
+    except Exception:
+        _record_route_latency(route, started, failed=True)
+        raise
+    _record_route_latency(route, started)
 
-        print(f"[WEBHOOK] command='{command}' text='{msg_text[:50]}' user_id={user_id} chat_id={chat_id}")
 
-        # Universe Module: infected user message modification
-        if (
-            msg_text
-            and not command
-            and chat_id
-            and chat_id != user_id
-            and not message.get("reply_to_message")
-        ):
-            try:
-                with get_db_engine().connect() as conn:
-                    inf_row = conn.execute(
-                        text("SELECT virus_type FROM infection_status WHERE user_id = :uid"),
-                        {"uid": user_id},
-                    ).mappings().first()
-                if inf_row and inf_row["virus_type"]:
-                    virus = inf_row["virus_type"]
-                    msg_id = message.get("message_id")
-                    if virus == "олеговирус":
-                        modified = msg_text.replace(" ", " кхм-кхм ")[:200]
-                        suffix = "🦠 _заражён олеговирусом_"
-                    else:
-                        modified = msg_text + " ☕"
-                        suffix = "🧬 _заражён LTL-паразитом_"
-                    if msg_id:
-                        requests.delete(
-                            f"https://api.telegram.org/bot{BOT_TOKEN}/deleteMessage",
-                            json={"chat_id": chat_id, "message_id": msg_id},
-                            timeout=3,
-                        )
-                    send_telegram_message(
-                        chat_id,
-                        f"{modified}\n\n{suffix}",
-                        parse_mode="Markdown",
-                    )
-                    return jsonify({"ok": True})
-            except Exception as exc:
-                print(f"[UNIVERSE] infection message modify error: {exc}")
-
-        # Check for parsing trigger (reply to game bot with "Парсинг" or /parse or /parsing)
-        reply_to = message.get("reply_to_message")
-        is_parsing_trigger = (
-            msg_text and msg_text.lower().strip() in ["парсинг", "parsing"]
-        ) or command in ["/parse", "/parsing"]
-
-        # Debug logging
-        if is_parsing_trigger and reply_to:
-            print(f"Parsing trigger detected. Reply_to keys: {list(reply_to.keys())}")
-            replied_text = reply_to.get("text") or reply_to.get("caption", "")
-            print(f"Replied text length: {len(replied_text)}")
-
-        if reply_to and is_parsing_trigger:
-            replied_text = reply_to.get("text") or reply_to.get("caption", "")
-            parsed = parse_bot_message(replied_text)
-
-            if parsed and chat_id:
-                game = parsed["game"]
-                amount = parsed["amount"]
-                metric = parsed.get("type", "balance")
-                total = parsed.get("total", amount)
-                is_balance = parsed.get("is_balance", False)
-                player_name = parsed.get("player", "")
-
-                # Determine target user (player from message, not command sender)
-                target_id = find_user_by_name(player_name) if player_name else None
-                target_user_id = target_id or user_id
-                target_name = player_name or name
-
-                if is_balance:
-                    prev_value = get_game_state(target_user_id, game, metric)
-                    if "total" in parsed:
-                        track_value = total
-                        if prev_value == 0:
-                            diff = amount
-                        else:
-                            diff = track_value - prev_value
+def _run_stages(stages: tuple, ctx: WebhookContext) -> bool:
+    """Run stage handlers in order until one of them consumes the update."""
+    for stage in stages:
+        started = time.perf_counter()
+        if stage(ctx):
+            _record_route_latency(stage.__name__.lstrip("_"), started)
+            return True
+    return False
+
+
+
+# ============================================================================
+# Webhook command handlers
+# ============================================================================
+
+def _handle_parsing_trigger(ctx: WebhookContext) -> bool:
+    """Credit parsed game-bot rewards on a "Парсинг" / /parse reply."""
+    msg_text, chat_id, user_id, name, command, reply_to = ctx.msg_text, ctx.chat_id, ctx.user_id, ctx.name, ctx.command, ctx.reply_to
+    is_parsing_trigger = (
+        msg_text and msg_text.lower().strip() in ["парсинг", "parsing"]
+    ) or command in ["/parse", "/parsing"]
+
+    # Debug logging
+    if is_parsing_trigger and reply_to:
+        print(f"Parsing trigger detected. Reply_to keys: {list(reply_to.keys())}")
+        replied_text = reply_to.get("text") or reply_to.get("caption", "")
+        print(f"Replied text length: {len(replied_text)}")
+
+    if reply_to and is_parsing_trigger:
+        replied_text = reply_to.get("text") or reply_to.get("caption", "")
+        parsed = parse_bot_message(replied_text)
+
+        if parsed and chat_id:
+            game = parsed["game"]
+            amount = parsed["amount"]
+            metric = parsed.get("type", "balance")
+            total = parsed.get("total", amount)
+            is_balance = parsed.get("is_balance", False)
+            player_name = parsed.get("player", "")
+
+            # Determine target user (player from message, not command sender)
+            target_id = find_user_by_name(player_name) if player_name else None
+            target_user_id = target_id or user_id
+            target_name = player_name or name
+
+            if is_balance:
+                prev_value = get_game_state(target_user_id, game, metric)
+                if "total" in parsed:
+                    track_value = total
+                    if prev_value == 0:
+                        diff = amount
                     else:
-                        track_value = amount
                         diff = track_value - prev_value
-                    if diff < 0:
-                        diff = track_value
-                    if diff == 0:
-                        send_telegram_message(chat_id, f"ℹ️ {game}: значение не изменилось с прошлого раза ({prev_value:.1f}).")
-                        return jsonify({"ok": True})
-                    rate = parsed.get("rate", 1.0)
-                    coins = int(diff * rate)
-                    if coins <= 0:
-                        send_telegram_message(chat_id, f"ℹ️ {game}: прирост {diff:.1f} слишком мал для начисления.")
-                        return jsonify({"ok": True})
-                    set_game_state(target_user_id, game, metric, track_value)
-                    description = f"Парсинг {game}: +{coins} (прирост {diff:.1f})"
-                    if game == "Чайометр":
-                        detail = f"{game}: +{diff:.1f} л. × {rate}"
-                    else:
-                        detail = f"{game}: +{diff:.1f} × {rate}"
                 else:
-                    # Delta (earned amount) — use directly
-                    coins = parsed["coins"]
-                    if coins <= 0:
-                        send_telegram_message(chat_id, "❌ Сумма начисления должна быть положительной")
-                        return jsonify({"ok": True})
-                    if game == "GDcards":
-                        detail = f"{game}: {parsed['orbs']} orbs × {parsed['rate']}"
-                    elif game == "Гуся Cards":
-                        detail = f"{game}: {parsed['amount']} монет × {parsed['rate']}"
-                    elif game == "Shmalala":
-                        detail = f"{game} ({parsed['type']}): {parsed['amount']} × {parsed['rate']}"
-                    else:
-                        detail = f"{game}: ×{parsed['rate']}"
-                    description = f"Парсинг {game}: +{coins}"
-
-                if add_user_balance(target_user_id, coins, description):
-                    mention = f"**{target_name}**" if target_id else f"**{target_name}**"
-                    send_telegram_message(
-                        chat_id,
-                        f"✅ Начислено {coins} очков {mention}\n({detail})",
-                    )
+                    track_value = amount
+                    diff = track_value - prev_value
+                if diff < 0:
+                    diff = track_value
+                if diff == 0:
+                    send_telegram_message(chat_id, f"ℹ️ {game}: значение не изменилось с прошлого раза ({prev_value:.1f}).")
+                    return True
+                rate = parsed.get("rate", 1.0)
+                coins = int(diff * rate)
+                if coins <= 0:
+                    send_telegram_message(chat_id, f"ℹ️ {game}: прирост {diff:.1f} слишком мал для начисления.")
+                    return True
+                set_game_state(target_user_id, game, metric, track_value)
+                description = f"Парсинг {game}: +{coins} (прирост {diff:.1f})"
+                if game == "Чайометр":
+                    detail = f"{game}: +{diff:.1f} л. × {rate}"
                 else:
-                    send_telegram_message(chat_id, "❌ Ошибка начисления")
-                return jsonify({"ok": True})
-            elif chat_id:
+                    detail = f"{game}: +{diff:.1f} × {rate}"
+            else:
+                # Delta (earned amount) — use directly
+                coins = parsed["coins"]
+                if coins <= 0:
+                    send_telegram_message(chat_id, "❌ Сумма начисления должна быть положительной")
+                    return True
+                if game == "GDcards":
+                    detail = f"{game}: {parsed['orbs']} orbs × {parsed['rate']}"
+                elif game == "Гуся Cards":
+                    detail = f"{game}: {parsed['amount']} монет × {parsed['rate']}"
+                elif game == "Shmalala":
+                    detail = f"{game} ({parsed['type']}): {parsed['amount']} × {parsed['rate']}"
+                else:
+                    detail = f"{game}: ×{parsed['rate']}"
+                description = f"Парсинг {game}: +{coins}"
+
+            if add_user_balance(target_user_id, coins, description):
+                mention = f"**{target_name}**" if target_id else f"**{target_name}**"
                 send_telegram_message(
                     chat_id,
-                    "❌ Не удалось распарсить сообщение. Поддерживаются: GDcards, Гуся Cards, Shmalala, Чайометр, BunkerRP",
+                    f"✅ Начислено {coins} очков {mention}\n({detail})",
                 )
-                return jsonify({"ok": True})
-
-        # GD approve — position input (must be before AI block to avoid interception)
-        approve_state = _GD_APPROVE_STATE.get(user_id)
-        if approve_state and msg_text:
-            text_stripped = msg_text.strip()
-            try:
-                position = int(text_stripped)
-                if position < 1:
-                    send_telegram_message(chat_id, "❌ Позиция должна быть положительным числом.")
-                else:
-                    sub_id = approve_state["sub_id"]
-                    level_name = approve_state["level_name"]
-                    difficulty = get_gd_difficulty_name(level_name)
-                    level_id = add_gd_level(level_name, position, difficulty)
-                    if not level_id:
-                        send_telegram_message(chat_id, f"❌ Ошибка при добавлении уровня **{level_name}** в топ.", parse_mode="Markdown")
-                    else:
-                        if approve_gd_submission_db(sub_id, user_id):
-                            send_telegram_message(
-                                chat_id,
-                                f"✅ Заявка #{sub_id} подтверждена!\n"
-                                f"🏆 Уровень **{level_name}** добавлен в топ на позицию **#{position}**.",
-                                parse_mode="Markdown",
-                            )
-                        else:
-                            send_telegram_message(chat_id, f"❌ Ошибка подтверждения заявки #{sub_id}.")
-                            log_error("GD", "approve_failed", f"GD approve failed sub_id={sub_id}", "approve_gd_submission_db returned False")
-                _GD_APPROVE_STATE.pop(user_id, None)
-            except ValueError:
-                send_telegram_message(chat_id, "❌ Пожалуйста, введите число — позицию в топе.")
-            return jsonify({"ok": True})
-
-        # AI response on reply to bot message or @mention
-        if BOT_ID is None:
-            _load_bot_id()
-        
-        # Check for reply to bot message
-        is_bot_reply = detect_bot_reply(message)
-        # Check for @mention of bot
-        is_mention, mention_text = detect_bot_mention(msg_text, message.get("entities"))
-        
-        if chat_id and (is_bot_reply or is_mention):
-            # Get user's character preference
-            character = get_user_character(user_id)
-            # Extract user text
-            if is_bot_reply and reply_to:
-                user_text = msg_text or ""
-            elif is_mention:
-                user_text = mention_text
             else:
-                user_text = msg_text or ""
-            
-            if user_text.strip():
-                # Build prompt and call AI with memory
-                prompt = build_character_prompt(character, user_text)
-                answer = call_ai_with_memory(user_id, prompt)
-                emoji = CHARACTER_EMOJI.get(character, "")
-                prefix = f"{emoji} " if emoji else ""
-                send_telegram_message(chat_id, f"{prefix}{answer}")
-                return jsonify({"ok": True})
-            else:
-                # User replied with empty text or just mention
-                send_telegram_message(chat_id, f"💬 Напишите сообщение для {character}")
-                return jsonify({"ok": True})
-
-        if command == "/start" and chat_id:
+                send_telegram_message(chat_id, "❌ Ошибка начисления")
+            return True
+        elif chat_id:
             send_telegram_message(
-                chat_id, build_start_text(name, user_id, get_response_mode(chat_id))
+                chat_id,
+                "❌ Не удалось распарсить сообщение. Поддерживаются: GDcards, Гуся Cards, Shmalala, Чайометр, BunkerRP",
             )
-        elif command == "/short" and chat_id:
-            set_response_mode(chat_id, "short")
-            send_telegram_message(chat_id, "Краткий режим включён. Напишите /start.")
-        elif command == "/long" and chat_id:
-            set_response_mode(chat_id, "long")
-            send_telegram_message(chat_id, "Полный режим включён. Напишите /start.")
-        elif command == "/reading_trainer" and chat_id:
-            send_reading_trainer(chat_id)
-        elif command == "/budget" and chat_id:
-            budget_url = f"https://bank-bot-ruby.vercel.app/family_budget?user_id={user_id}"
-
-            inline_kb = [[{"text": "💰 Открыть семейный бюджет", "url": budget_url}]]
-
-            yadisk_token = os.getenv("YANDEX_DISK_TOKEN", "")
-            if not yadisk_token:
-                send_telegram_message(
-                    chat_id,
-                    "⚠️ Яндекс.Диск не настроен: добавьте YANDEX_DISK_TOKEN "
-                    "в переменные окружения Vercel.",
-                )
+            return True
+    return False
+
+
+def _handle_gd_approve_input(ctx: WebhookContext) -> bool:
+    """Consume the level position typed by an admin approving a GD submission."""
+    msg_text, chat_id, user_id = ctx.msg_text, ctx.chat_id, ctx.user_id
+    approve_state = _GD_APPROVE_STATE.get(user_id)
+    if approve_state and msg_text:
+        text_stripped = msg_text.strip()
+        try:
+            position = int(text_stripped)
+            if position < 1:
+                send_telegram_message(chat_id, "❌ Позиция должна быть положительным числом.")
             else:
-                debts = _fetch_debts_for_export()
-                if debts is None:
-                    send_telegram_message(
-                        chat_id,
-                        "⚠️ Не удалось получить долги из БД (возможно, нет семьи или таблиц).",
-                    )
+                sub_id = approve_state["sub_id"]
+                level_name = approve_state["level_name"]
+                difficulty = get_gd_difficulty_name(level_name)
+                level_id = add_gd_level(level_name, position, difficulty)
+                if not level_id:
+                    send_telegram_message(chat_id, f"❌ Ошибка при добавлении уровня **{level_name}** в топ.", parse_mode="Markdown")
                 else:
-                    json_content = json.dumps(debts, ensure_ascii=False, indent=2)
-                    html_content = _build_debts_html(debts)
-                    json_url = _upload_to_yadisk(yadisk_token, "/debts.json", json_content)
-                    html_url = _upload_to_yadisk(yadisk_token, "/debts.html", html_content)
-                    if html_url:
-                        inline_kb.append([{"text": "📋 Долги (Яндекс.Диск)", "url": html_url}])
+                    if approve_gd_submission_db(sub_id, user_id):
                         send_telegram_message(
                             chat_id,
-                            f"✅ Долги загружены на Яндекс.Диск ({len(debts)} записей).",
+                            f"✅ Заявка #{sub_id} подтверждена!\n"
+                            f"🏆 Уровень **{level_name}** добавлен в топ на позицию **#{position}**.",
+                            parse_mode="Markdown",
                         )
                     else:
-                        send_telegram_message(
-                            chat_id,
-                            "⚠️ Ошибка загрузки на Яндекс.Диск. Проверьте токен.",
-                        )
+                        send_telegram_message(chat_id, f"❌ Ошибка подтверждения заявки #{sub_id}.")
+                        log_error("GD", "approve_failed", f"GD approve failed sub_id={sub_id}", "approve_gd_submission_db returned False")
+            _GD_APPROVE_STATE.pop(user_id, None)
+        except ValueError:
+            send_telegram_message(chat_id, "❌ Пожалуйста, введите число — позицию в топе.")
+        return True
+    return False
 
-            send_telegram_message(
-                chat_id,
-                "💰 Семейный бюджет\n\n"
-                "Ведите учёт семейных трат, автоматически рассчитывайте долги "
-                "и погашайте их частями.\n\n"
-                "📖 Что внутри:\n"
-                "• Создайте семью или присоединитесь по коду\n"
-                "• Добавляйте траты — долги создаются автоматически\n"
-                "• Смотрите, кто кому должен\n"
-                "• Погашайте долги с пересчётом\n\n"
-                "Нажмите кнопку ниже, чтобы открыть в браузере:",
-                reply_markup={"inline_keyboard": inline_kb},
-            )
-        elif command == "/addexpense" and chat_id:
-            _ADDE_LOG.append({"user_id": user_id, "name": name, "chat_id": chat_id, "text": msg_text[:100], "time": datetime.now().isoformat()})
-            _ADDE_LOG[:] = _ADDE_LOG[-50:]
-            now_ts = datetime.now().timestamp()
-            last_ts = _ADDE_COOLDOWN.get(user_id, 0)
-            if now_ts - last_ts < 300:
-                return jsonify({"ok": True})
-            _ADDE_COOLDOWN[user_id] = now_ts
-            args = msg_text.split(maxsplit=1)
-            if len(args) < 2:
-                send_telegram_message(
-                    chat_id,
-                    "📝 Использование:\n"
-                    "<code>/addexpense Кредитор Должник Сумма [Категория] [Комментарий]</code>\n\n"
-                    "Пример:\n"
-                    "<code>/addexpense Лука Мама 500 еда за пиццу</code>\n\n"
-                    "Категории: еда, транспорт, хозяйство, развлечения, другое",
-                    parse_mode="HTML",
-                )
-                return jsonify({"ok": True})
-
-            family = _fetch_family_info_via_api(str(user_id))
-            if not family:
-                send_telegram_message(
-                    chat_id,
-                    "❌ Вы не состоите в семье.\n"
-                    "Сначала создайте её: /family create <название>",
-                )
-                return jsonify({"ok": True})
-
-            members = family.get("members", [])
-            txn = parse_expense_line(args[1], members)
-            if not txn:
-                send_telegram_message(
-                    chat_id,
-                    "❌ Не удалось распознать трату.\n"
-                    "Формат: Кредитор Должник Сумма [Категория] [Комментарий]\n"
-                    "Проверьте имена участников и сумму.",
-                )
-                return jsonify({"ok": True})
 
-            ok = _create_transaction_via_api(family["id"], txn)
-            if ok:
-                line_text = f"✅ {txn['amount']}₽ — {txn['category']}"
-                if txn["description"]:
-                    line_text += f" ({txn['description']})"
-                send_telegram_message(chat_id, line_text)
-            else:
-                send_telegram_message(chat_id, "❌ Ошибка сервера при создании траты.")
-        elif command == "/export_debts" and chat_id:
-            token = os.getenv("YANDEX_DISK_TOKEN", "")
-            if not token:
-                send_telegram_message(
-                    chat_id, "❌ Яндекс.Диск не настроен (токен отсутствует)."
-                )
-                return
+def _handle_ai_reply(ctx: WebhookContext) -> bool:
+    """Answer replies to the bot and @mentions with the user's character."""
+    message, msg_text, chat_id, user_id, reply_to = ctx.message, ctx.msg_text, ctx.chat_id, ctx.user_id, ctx.reply_to
+    if BOT_ID is None:
+        _load_bot_id()
+
+    # Check for reply to bot message
+    is_bot_reply = detect_bot_reply(message)
+    # Check for @mention of bot
+    is_mention, mention_text = detect_bot_mention(msg_text, message.get("entities"))
+
+    if chat_id and (is_bot_reply or is_mention):
+        # Get user's character preference
+        character = get_user_character(user_id)
+        # Extract user text
+        if is_bot_reply and reply_to:
+            user_text = msg_text or ""
+        elif is_mention:
+            user_text = mention_text
+        else:
+            user_text = msg_text or ""
+
+        if user_text.strip():
+            # Build prompt and call AI with memory
+            prompt = build_character_prompt(character, user_text)
+            answer = call_ai_with_memory(user_id, prompt)
+            emoji = CHARACTER_EMOJI.get(character, "")
+            prefix = f"{emoji} " if emoji else ""
+            send_telegram_message(chat_id, f"{prefix}{answer}")
+            return True
+        else:
+            # User replied with empty text or just mention
+            send_telegram_message(chat_id, f"💬 Напишите сообщение для {character}")
+            return True
+    return False
 
-            send_telegram_message(chat_id, "⏳ Экспортирую долги на Яндекс.Диск...")
 
-            debts = _fetch_debts_for_export()
-            if debts is None:
+def _handle_infected_message(ctx: WebhookContext) -> bool:
+    """Rewrite plain group messages of infected users (Universe Module)."""
+    message, msg_text, chat_id, user_id, command = ctx.message, ctx.msg_text, ctx.chat_id, ctx.user_id, ctx.command
+    if (
+        msg_text
+        and not command
+        and chat_id
+        and chat_id != user_id
+        and not message.get("reply_to_message")
+    ):
+        try:
+            with get_db_engine().connect() as conn:
+                inf_row = conn.execute(
+                    text("SELECT virus_type FROM infection_status WHERE user_id = :uid"),
+                    {"uid": user_id},
+                ).mappings().first()
+            if inf_row and inf_row["virus_type"]:
+                virus = inf_row["virus_type"]
+                msg_id = message.get("message_id")
+                if virus == "олеговирус":
+                    modified = msg_text.replace(" ", " кхм-кхм ")[:200]
+                    suffix = "🦠 _заражён олеговирусом_"
+                else:
+                    modified = msg_text + " ☕"
+                    suffix = "🧬 _заражён LTL-паразитом_"
+                if msg_id:
+                    requests.delete(
+                        f"https://api.telegram.org/bot{BOT_TOKEN}/deleteMessage",
+                        json={"chat_id": chat_id, "message_id": msg_id},
+                        timeout=3,
+                    )
                 send_telegram_message(
-                    chat_id, "❌ Ошибка при получении долгов из БД."
+                    chat_id,
+                    f"{modified}\n\n{suffix}",
+                    parse_mode="Markdown",
                 )
-                return
-
-            json_content = json.dumps(debts, ensure_ascii=False, indent=2)
+                return True
+        except Exception as exc:
+            print(f"[UNIVERSE] infection message modify error: {exc}")
+    return False
 
-            json_url = _upload_to_yadisk(token, "/debts.json", json_content)
-            if json_url is None:
-                send_telegram_message(
-                    chat_id, "❌ Ошибка при загрузке debts.json на Яндекс.Диск."
-                )
-                return
 
-            html_content = _build_debts_html(debts)
-            html_url = _upload_to_yadisk(token, "/debts.html", html_content)
+def _handle_puzzle_answer(ctx: WebhookContext) -> bool:
+    """Check a UCI move sent in answer to a pending chess puzzle."""
+    msg_text, chat_id, user_id, command = ctx.msg_text, ctx.chat_id, ctx.user_id, ctx.command
+    if chat_id and user_id in _PENDING_PUZZLES and not command.startswith("/"):
+        pending = _PENDING_PUZZLES[user_id]
+        user_move = msg_text.strip().lower()
+        # UCI move validation: 4-5 chars, letters+digits (e.g. e2e4, g1f3, e7e8q)
+        import re
+        if not re.match(r'^[a-h][1-8][a-h][1-8][qrbn]?$', user_move):
+            return True
+        solution = pending["solution"]
+        # Handle both string and list formats
+        if isinstance(solution, list):
+            solution_moves = solution
+        else:
+            solution_moves = solution.split()
 
+        if solution_moves and user_move == solution_moves[0].lower():
+            # Correct move — award coins
+            del _PENDING_PUZZLES[user_id]
+            update_user_coins(user_id, 5, datetime.utcnow())
             send_telegram_message(
                 chat_id,
-                f"✅ Долги экспортированы ({len(debts)} записей).\n\n"
-                f"📋 Просмотр: {html_url or 'ошибка загрузки'}\n"
-                f"📦 JSON: {json_url}",
-            )
-        elif command == "/balance" and chat_id:
-            balance, is_admin = get_user_balance(user_id)
-            send_telegram_message(
-                chat_id,
-                f"Баланс: {balance} очков\nСтатус: {'админ' if is_admin else 'пользователь'}",
-            )
-        elif command == "/stats" and chat_id:
-            stats = get_user_stats(user_id)
-            send_telegram_message(
-                chat_id,
-                f"Статистика:\nЗаработано: {stats['earned']}\nПотрачено: {stats['spent']}\nБаланс: {stats['earned'] - stats['spent']}\nПокупок: {stats['purchases']}\nЗа неделю операций: {stats['total_transactions']}",
-            )
-        elif command == "/profile" and chat_id:
-            balance, is_admin = get_user_balance(user_id)
-            stats = get_user_stats(user_id)
-            send_telegram_message(
-                chat_id,
-                f"Профиль: {name}\nБаланс: {balance}\nТранзакций: {stats['total_transactions']}\nСтатус: {'админ' if is_admin else 'пользователь'}",
+                f"✅ **Правильно!**\n\nХод: `{solution_moves[0]}`\n💰 +5 монет",
+                parse_mode="Markdown",
             )
-        elif command == "/user" and chat_id:
-            # Alias for /profile
-            balance, is_admin = get_user_balance(user_id)
-            stats = get_user_stats(user_id)
+        else:
+            # Wrong move — show correct solution
+            correct = solution_moves[0] if solution_moves else "?"
+            del _PENDING_PUZZLES[user_id]
             send_telegram_message(
                 chat_id,
-                f"Профиль: {name}\nБаланс: {balance}\nТранзакций: {stats['total_transactions']}\nСтатус: {'админ' if is_admin else 'пользователь'}",
+                f"❌ **Неверно.**\n\nПравильный ход: `{correct}`\nПопробуйте следующую задачу: /puzzle",
+                parse_mode="Markdown",
             )
-        elif command == "/errors" and chat_id:
-            if user_id != ADMIN_TELEGRAM_ID:
-                send_telegram_message(chat_id, "❌ Только админ может просматривать ошибки.")
-            elif not _ERROR_LOG:
-                send_telegram_message(chat_id, "✅ Ошибок нет — всё чисто!")
-            else:
-                recent = _ERROR_LOG[-10:]
-                lines = [f"📋 **Ошибки** ({len(_ERROR_LOG)} всего, последние {len(recent)}):\n"]
-                for e in reversed(recent):
-                    lines.append(f"🕐 {e['time']} | 🔴 {e['module']}/{e['error_type']}")
-                    lines.append(f"   {e['message'][:100]}")
-                    lines.append(f"   💡 {e['recommendation']}")
-                    tb = e.get('traceback', '')
-                    if tb:
-                        lines.append(f"   📎 `{tb[-150:]}`")
-                    lines.append("")
-                send_telegram_message(chat_id, "\n".join(lines), parse_mode="Markdown")
-        elif command == "/clear_errors" and chat_id:
-            if user_id != ADMIN_TELEGRAM_ID:
-                send_telegram_message(chat_id, "❌ Только админ может очищать ошибки.")
-            else:
-                count = len(_ERROR_LOG)
-                _ERROR_LOG.clear()
-                send_telegram_message(chat_id, f"🗑 Очищено {count} ошибок.")
-        elif command == "/history" and chat_id:
-            history = get_user_history(user_id, limit=10)
-            if not history:
-                send_telegram_message(chat_id, "📭 У вас пока нет транзакций")
+        return True
+    return False
+
+
+def _handle_gd_submission_media(ctx: WebhookContext) -> bool:
+    """Attach media to a GD submission waiting for proof."""
+    message, chat_id, user_id, name, command = ctx.message, ctx.chat_id, ctx.user_id, ctx.name, ctx.command
+    if command == "" and chat_id:
+        # GD submit — check pending_media submission in DB (survives cold starts)
+        pending_sub = None
+        try:
+            with get_db_engine().connect() as conn:
+                row = conn.execute(
+                    text("SELECT id, level_name FROM submissions WHERE user_id = :uid AND status = 'pending_media' ORDER BY submitted_at DESC LIMIT 1"),
+                    {"uid": user_id},
+                ).mappings().first()
+                if row:
+                    pending_sub = dict(row)
+        except Exception as exc:
+            print(f"Error fetching pending submission: {exc}")
+
+        if pending_sub:
+            sub_id = pending_sub["id"]
+            level_name = pending_sub["level_name"]
+            media_file_id = None
+            media_type = None
+            if message.get("photo"):
+                media_file_id = message["photo"][-1].get("file_id", "")
+                media_type = "photo"
+            elif message.get("video"):
+                media_file_id = message["video"].get("file_id", "")
+                media_type = "video"
+            elif message.get("document"):
+                media_file_id = message["document"].get("file_id", "")
+                media_type = "document"
             else:
-                lines = [f"История: {len(history)} операций"]
-                for tx in history:
-                    amount_text = (
-                        f"+{tx['amount']}" if tx["amount"] > 0 else str(tx["amount"])
-                    )
-                    desc = (
-                        tx["description"][:30] if tx["description"] else "Без описания"
+                send_telegram_message(chat_id, "❌ Пожалуйста, отправьте видео или фото с прохождением.")
+                return True
+            try:
+                with get_db_engine().connect() as conn:
+                    conn.execute(
+                        text("UPDATE submissions SET media_file_id = :mfid, media_type = :mt, status = 'pending', submitted_at = CURRENT_TIMESTAMP WHERE id = :sid"),
+                        {"mfid": media_file_id, "mt": media_type, "sid": sub_id},
                     )
-                    lines.append(f"{amount_text} — {desc}")
-                send_telegram_message(chat_id, "\n".join(lines))
-        elif command == "/short_all" and chat_id:
-            set_response_mode(chat_id, "short")
-            send_telegram_message(
-                chat_id,
-                "Краткий режим включён для всех.\n/balance — баланс\n/profile — профиль\n/stats — статистика",
-            )
-        elif command == "/long_all" and chat_id:
-            set_response_mode(chat_id, "long")
-            send_telegram_message(chat_id, "Полный режим включён для всех.")
-        elif command == "/ping" and chat_id:
-            send_telegram_message(chat_id, "🏓 Понг!")
-
-        # Admin commands
-        elif command == "/admin" and chat_id:
-            if not check_admin(user_id):
-                send_telegram_message(chat_id, "🔒 Нет прав администратора")
-            else:
+                    conn.commit()
                 send_telegram_message(
                     chat_id,
-                    "👨‍💼 Админ-панель\n\n/admin_users — пользователи\n/admin_balances — топ баланс\n/admin_stats — статистика\n/add_points — начислить\n/add_admin — назначить админа",
+                    f"✅ **Заявка отправлена!**\n\nУровень: **{level_name}**\nСтатус: **Ожидает модерации**\n\nВаша заявка будет рассмотрена администратором.",
+                    parse_mode="Markdown",
                 )
-        elif command == "/add_points" and chat_id:
-            if not check_admin(user_id):
-                send_telegram_message(chat_id, "🔒 Нет прав администратора")
-            else:
-                # Parse: /add_points @user 100 описание
-                args = msg_text.split()[1:] if len(msg_text.split()) > 1 else []
-                if len(args) < 2:
-                    send_telegram_message(
-                        chat_id, "Формат: /add_points @username сумма [описание]"
-                    )
-                else:
-                    target_username = args[0].lstrip("@")
-                    try:
-                        amount = int(args[1])
-                        description = (
-                            " ".join(args[2:]) if len(args) > 2 else "Начислено админом"
-                        )
-                        # Find user by username or ID
-                        target_id = None
-                        if target_username.isdigit():
-                            target_id = int(target_username)
-                        else:
-                            # Simple lookup by username (would need proper query)
-                            send_telegram_message(
-                                chat_id,
-                                "❌ Поиск по username пока не поддерживается. Используйте telegram_id",
-                            )
-                            target_id = None
-
-                        if target_id and add_user_balance(
-                            target_id, amount, description
-                        ):
-                            send_telegram_message(
-                                chat_id,
-                                f"✅ Начислено {amount} очков пользователю {target_id}",
-                            )
-                        else:
-                            send_telegram_message(chat_id, "❌ Ошибка начисления")
-                    except ValueError:
-                        send_telegram_message(chat_id, "❌ Неверный формат суммы")
-        elif command == "/add_coins" and chat_id:
-            # Alias for add_points
-            if not check_admin(user_id):
-                send_telegram_message(chat_id, "🔒 Нет прав администратора")
-            else:
-                send_telegram_message(chat_id, "Используйте /add_points")
-        elif command == "/add_admin" and chat_id:
-            if not check_admin(user_id):
-                send_telegram_message(chat_id, "🔒 Нет прав администратора")
-            else:
-                args = msg_text.split()[1:] if len(msg_text.split()) > 1 else []
-                if len(args) < 1:
-                    send_telegram_message(chat_id, "Формат: /add_admin telegram_id")
-                else:
-                    try:
-                        target_id = int(args[0])
-                        if set_admin_status(target_id, True):
-                            send_telegram_message(
-                                chat_id, f"✅ Пользователь {target_id} назначен админом"
-                            )
-                        else:
-                            send_telegram_message(chat_id, "❌ Ошибка назначения")
-                    except ValueError:
-                        send_telegram_message(chat_id, "❌ Неверный формат ID")
-        elif command == "/admin_users" and chat_id:
-            if not check_admin(user_id):
-                send_telegram_message(chat_id, "🔒 Нет прав администратора")
-            else:
-                users = get_all_users(limit=20)
-                if not users:
-                    send_telegram_message(chat_id, "Нет пользователей")
-                else:
-                    lines = [f"👥 Пользователей: {len(users)}\n"]
-                    for u in users[:10]:
-                        admin_mark = "👑" if u["is_admin"] else ""
-                        lines.append(
-                            f"{admin_mark}{u['first_name']} (@{u['username']}) — {u['balance']}"
-                        )
-                    send_telegram_message(chat_id, "\n".join(lines))
-        elif command == "/admin_balances" and chat_id:
-            if not check_admin(user_id):
-                send_telegram_message(chat_id, "🔒 Нет прав администратора")
-            else:
-                top = get_top_balances(limit=10)
-                if not top:
-                    send_telegram_message(chat_id, "Нет данных")
-                else:
-                    lines = ["🏆 Топ баланс:\n"]
-                    for i, u in enumerate(top, 1):
-                        lines.append(f"{i}. {u['first_name']} — {u['balance']}")
-                    send_telegram_message(chat_id, "\n".join(lines))
-        elif command == "/admin_transactions" and chat_id:
-            if not check_admin(user_id):
-                send_telegram_message(chat_id, "🔒 Нет прав администратора")
-            else:
-                args = msg_text.split()[1:] if len(msg_text.split()) > 1 else []
-                if len(args) < 1:
-                    send_telegram_message(
-                        chat_id, "Формат: /admin_transactions telegram_id"
-                    )
-                else:
-                    try:
-                        target_id = int(args[0])
-                        history = get_user_history(target_id, limit=10)
-                        if not history:
-                            send_telegram_message(
-                                chat_id, f"Нет транзакций для {target_id}"
-                            )
-                        else:
-                            lines = [f"💰 Транзакции {target_id}:\n"]
-                            for tx in history:
-                                amount_text = (
-                                    f"+{tx['amount']}"
-                                    if tx["amount"] > 0
-                                    else str(tx["amount"])
-                                )
-                                lines.append(
-                                    f"{amount_text} — {tx['description'][:20]}"
-                                )
-                            send_telegram_message(chat_id, "\n".join(lines))
-                    except ValueError:
-                        send_telegram_message(chat_id, "❌ Неверный формат ID")
-        elif command == "/admin_stats" and chat_id:
-            if not check_admin(user_id):
-                send_telegram_message(chat_id, "🔒 Нет прав администратора")
+            except Exception as exc:
+                print(f"Error updating submission #{sub_id}: {exc}")
+                send_telegram_message(chat_id, "❌ Ошибка при сохранении заявки. Убедитесь, что база данных настроена правильно, и попробуйте ещё раз.")
+                log_error("GD", "submission_save", f"GD submit save failed user={user_id}", "INSERT INTO submissions failed")
+            return True
+
+        # Legacy in-memory fallback
+        submit_state = _GD_SUBMIT_STATE.get(user_id)
+        if submit_state and submit_state.get("step") == "awaiting_media":
+            level_name = submit_state.get("level_name", "")
+            media_file_id = None
+            media_type = None
+            if message.get("photo"):
+                media_file_id = message["photo"][-1].get("file_id", "")
+                media_type = "photo"
+            elif message.get("video"):
+                media_file_id = message["video"].get("file_id", "")
+                media_type = "video"
+            elif message.get("document"):
+                media_file_id = message["document"].get("file_id", "")
+                media_type = "document"
             else:
-                users = get_all_users(limit=1000)
-                total_balance = sum(u["balance"] for u in users)
-                admin_count = sum(1 for u in users if u["is_admin"])
+                send_telegram_message(chat_id, "❌ Пожалуйста, отправьте видео или фото с прохождением.")
+                return True
+            sub_id = create_gd_submission(user_id, name, level_name, media_file_id, media_type)
+            _GD_SUBMIT_STATE.pop(user_id, None)
+            if sub_id:
                 send_telegram_message(
                     chat_id,
-                    f"📊 Статистика системы:\n\nПользователей: {len(users)}\nАдминов: {admin_count}\nОбщий баланс: {total_balance}",
+                    f"✅ **Заявка отправлена!**\n\nУровень: **{level_name}**\nСтатус: **Ожидает модерации**\n\nВаша заявка будет рассмотрена администратором.",
+                    parse_mode="Markdown",
                 )
-        elif command == "/broadcast" and chat_id:
-            if not check_admin(user_id):
-                send_telegram_message(chat_id, "🔒 Нет прав администратора")
             else:
-                send_telegram_message(
-                    chat_id, "❌ Рассылка пока не реализована в Vercel runtime"
-                )
-
-        # AI commands
-        # /ai command (parent for AI module)
-        elif command == "/ai" or command == "/ask":
-            if not chat_id:
-                return jsonify({"ok": True})
-            args = msg_text.split(maxsplit=1)
-            if len(args) < 2:
                 send_telegram_message(
                     chat_id,
-                    "**🤖 AI Module**\n\n"
-                    "/ai <вопрос> — задать вопрос AI\n"
-                    "/ask <вопрос> — алиас /ai\n"
-                    "/ai_help — показать эту справку\n"
-                    "/character — выбрать характер\n"
-                    "/generate_prayer или /pray — сгенерировать молитву\n"
-                    "/ask_canon <вопрос> — вопрос по канону\n\n"
-                    "💡 Или просто ответьте на сообщение бота или упомяните @lt_lo_game_bot",
+                    "❌ Ошибка при сохранении заявки. Убедитесь, что база данных настроена правильно, и попробуйте ещё раз.",
                 )
-            else:
-                question = args[1]
-                if len(question) < 3:
-                    send_telegram_message(chat_id, "❌ Вопрос слишком короткий")
-                else:
-                    prompt = f"Ты помощник, отвечающий кратко и по делу. Вопрос пользователя: {question}\n\nОтветь в 2-3 предложениях."
-                    answer = call_ai_with_memory(user_id, prompt, max_tokens=200)
-                    send_telegram_message(chat_id, answer)
-        elif command == "/ai_help" and chat_id:
+            return True
+    return False
+
+
+@webhook_command("/start")
+def _cmd_start(ctx: WebhookContext) -> None:
+    chat_id, user_id, name = ctx.chat_id, ctx.user_id, ctx.name
+    send_telegram_message(
+        chat_id, build_start_text(name, user_id, get_response_mode(chat_id))
+    )
+
+
+@webhook_command("/short")
+def _cmd_short(ctx: WebhookContext) -> None:
+    chat_id = ctx.chat_id
+    set_response_mode(chat_id, "short")
+    send_telegram_message(chat_id, "Краткий режим включён. Напишите /start.")
+
+
+@webhook_command("/long")
+def _cmd_long(ctx: WebhookContext) -> None:
+    chat_id = ctx.chat_id
+    set_response_mode(chat_id, "long")
+    send_telegram_message(chat_id, "Полный режим включён. Напишите /start.")
+
+
+@webhook_command("/reading_trainer")
+def _cmd_reading_trainer(ctx: WebhookContext) -> None:
+    chat_id = ctx.chat_id
+    send_reading_trainer(chat_id)
+
+
+@webhook_command("/budget")
+def _cmd_budget(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    budget_url = f"https://bank-bot-ruby.vercel.app/family_budget?user_id={user_id}"
+
+    inline_kb = [[{"text": "💰 Открыть семейный бюджет", "url": budget_url}]]
+
+    yadisk_token = os.getenv("YANDEX_DISK_TOKEN", "")
+    if not yadisk_token:
+        send_telegram_message(
+            chat_id,
+            "⚠️ Яндекс.Диск не настроен: добавьте YANDEX_DISK_TOKEN "
+            "в переменные окружения Vercel.",
+        )
+    else:
+        debts = _fetch_debts_for_export()
+        if debts is None:
             send_telegram_message(
                 chat_id,
-                "🤖 **AI Module**\n\n"
-                "/ai <вопрос> — задать вопрос AI\n"
-                "/ask <вопрос> — алиас /ai\n"
-                "/ai_help — показать эту справку\n"
-                "/character — выбрать характер\n"
-                "/generate_prayer или /pray — сгенерировать молитву\n"
-                "/ask_canon <вопрос> — вопрос по канону\n\n"
-                "💡 Или просто ответьте на сообщение бота или упомяните @lt_lo_game_bot",
+                "⚠️ Не удалось получить долги из БД (возможно, нет семьи или таблиц).",
             )
-        elif command == "/character" and chat_id:
-            args = msg_text.split()
-            if len(args) < 2:
-                # Show current character and available options
-                current = get_user_character(user_id)
-                chars = "\n".join([f"• {k} {CHARACTER_EMOJI.get(k, '')}" for k in CHARACTER_PROMPTS])
+        else:
+            json_content = json.dumps(debts, ensure_ascii=False, indent=2)
+            html_content = _build_debts_html(debts)
+            _upload_to_yadisk(yadisk_token, "/debts.json", json_content)
+            html_url = _upload_to_yadisk(yadisk_token, "/debts.html", html_content)
+            if html_url:
+                inline_kb.append([{"text": "📋 Долги (Яндекс.Диск)", "url": html_url}])
                 send_telegram_message(
                     chat_id,
-                    f"🎭 Текущий характер: **{current}** {CHARACTER_EMOJI.get(current, '')}\n\n"
-                    f"Доступные характеры:\n{chars}\n\n"
-                    f"Смена: /character <имя>\n"
-                    f"Пример: /character чай",
+                    f"✅ Долги загружены на Яндекс.Диск ({len(debts)} записей).",
                 )
             else:
-                character = args[1].lower()
-                if set_user_character(user_id, character):
-                    emoji = CHARACTER_EMOJI.get(character, "")
+                send_telegram_message(
+                    chat_id,
+                    "⚠️ Ошибка загрузки на Яндекс.Диск. Проверьте токен.",
+                )
+
+    send_telegram_message(
+        chat_id,
+        "💰 Семейный бюджет\n\n"
+        "Ведите учёт семейных трат, автоматически рассчитывайте долги "
+        "и погашайте их частями.\n\n"
+        "📖 Что внутри:\n"
+        "• Создайте семью или присоединитесь по коду\n"
+        "• Добавляйте траты — долги создаются автоматически\n"
+        "• Смотрите, кто кому должен\n"
+        "• Погашайте долги с пересчётом\n\n"
+        "Нажмите кнопку ниже, чтобы открыть в браузере:",
+        reply_markup={"inline_keyboard": inline_kb},
+    )
+
+
+@webhook_command("/addexpense")
+def _cmd_addexpense(ctx: WebhookContext) -> None:
+    msg_text, chat_id, user_id, name = ctx.msg_text, ctx.chat_id, ctx.user_id, ctx.name
+    _ADDE_LOG.append({"user_id": user_id, "name": name, "chat_id": chat_id, "text": msg_text[:100], "time": datetime.now().isoformat()})
+    _ADDE_LOG[:] = _ADDE_LOG[-50:]
+    now_ts = datetime.now().timestamp()
+    last_ts = _ADDE_COOLDOWN.get(user_id, 0)
+    if now_ts - last_ts < 300:
+        return
+    _ADDE_COOLDOWN[user_id] = now_ts
+    args = msg_text.split(maxsplit=1)
+    if len(args) < 2:
+        send_telegram_message(
+            chat_id,
+            "📝 Использование:\n"
+            "<code>/addexpense Кредитор Должник Сумма [Категория] [Комментарий]</code>\n\n"
+            "Пример:\n"
+            "<code>/addexpense Лука Мама 500 еда за пиццу</code>\n\n"
+            "Категории: еда, транспорт, хозяйство, развлечения, другое",
+            parse_mode="HTML",
+        )
+        return
+
+    family = _fetch_family_info_via_api(str(user_id))
+    if not family:
+        send_telegram_message(
+            chat_id,
+            "❌ Вы не состоите в семье.\n"
+            "Сначала создайте её: /family create <название>",
+        )
+        return
+
+    members = family.get("members", [])
+    txn = parse_expense_line(args[1], members)
+    if not txn:
+        send_telegram_message(
+            chat_id,
+            "❌ Не удалось распознать трату.\n"
+            "Формат: Кредитор Должник Сумма [Категория] [Комментарий]\n"
+            "Проверьте имена участников и сумму.",
+        )
+        return
+
+    ok = _create_transaction_via_api(family["id"], txn)
+    if ok:
+        line_text = f"✅ {txn['amount']}₽ — {txn['category']}"
+        if txn["description"]:
+            line_text += f" ({txn['description']})"
+        send_telegram_message(chat_id, line_text)
+    else:
+        send_telegram_message(chat_id, "❌ Ошибка сервера при создании траты.")
+
+
+@webhook_command("/export_debts")
+def _cmd_export_debts(ctx: WebhookContext) -> None:
+    chat_id = ctx.chat_id
+    token = os.getenv("YANDEX_DISK_TOKEN", "")
+    if not token:
+        send_telegram_message(
+            chat_id, "❌ Яндекс.Диск не настроен (токен отсутствует)."
+        )
+        return
+
+    send_telegram_message(chat_id, "⏳ Экспортирую долги на Яндекс.Диск...")
+
+    debts = _fetch_debts_for_export()
+    if debts is None:
+        send_telegram_message(
+            chat_id, "❌ Ошибка при получении долгов из БД."
+        )
+        return
+
+    json_content = json.dumps(debts, ensure_ascii=False, indent=2)
+
+    json_url = _upload_to_yadisk(token, "/debts.json", json_content)
+    if json_url is None:
+        send_telegram_message(
+            chat_id, "❌ Ошибка при загрузке debts.json на Яндекс.Диск."
+        )
+        return
+
+    html_content = _build_debts_html(debts)
+    html_url = _upload_to_yadisk(token, "/debts.html", html_content)
+
+    send_telegram_message(
+        chat_id,
+        f"✅ Долги экспортированы ({len(debts)} записей).\n\n"
+        f"📋 Просмотр: {html_url or 'ошибка загрузки'}\n"
+        f"📦 JSON: {json_url}",
+    )
+
+
+@webhook_command("/balance")
+def _cmd_balance(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    balance, is_admin = get_user_balance(user_id)
+    send_telegram_message(
+        chat_id,
+        f"Баланс: {balance} очков\nСтатус: {'админ' if is_admin else 'пользователь'}",
+    )
+
+
+@webhook_command("/stats")
+def _cmd_stats(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    stats = get_user_stats(user_id)
+    send_telegram_message(
+        chat_id,
+        f"Статистика:\nЗаработано: {stats['earned']}\nПотрачено: {stats['spent']}\nБаланс: {stats['earned'] - stats['spent']}\nПокупок: {stats['purchases']}\nЗа неделю операций: {stats['total_transactions']}",
+    )
+
+
+@webhook_command("/profile")
+def _cmd_profile(ctx: WebhookContext) -> None:
+    chat_id, user_id, name = ctx.chat_id, ctx.user_id, ctx.name
+    balance, is_admin = get_user_balance(user_id)
+    stats = get_user_stats(user_id)
+    send_telegram_message(
+        chat_id,
+        f"Профиль: {name}\nБаланс: {balance}\nТранзакций: {stats['total_transactions']}\nСтатус: {'админ' if is_admin else 'пользователь'}",
+    )
+
+
+@webhook_command("/user")
+def _cmd_user(ctx: WebhookContext) -> None:
+    chat_id, user_id, name = ctx.chat_id, ctx.user_id, ctx.name
+    # Alias for /profile
+    balance, is_admin = get_user_balance(user_id)
+    stats = get_user_stats(user_id)
+    send_telegram_message(
+        chat_id,
+        f"Профиль: {name}\nБаланс: {balance}\nТранзакций: {stats['total_transactions']}\nСтатус: {'админ' if is_admin else 'пользователь'}",
+    )
+
+
+@webhook_command("/errors")
+def _cmd_errors(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    if user_id != ADMIN_TELEGRAM_ID:
+        send_telegram_message(chat_id, "❌ Только админ может просматривать ошибки.")
+    elif not _ERROR_LOG:
+        send_telegram_message(chat_id, "✅ Ошибок нет — всё чисто!")
+    else:
+        recent = _ERROR_LOG[-10:]
+        lines = [f"📋 **Ошибки** ({len(_ERROR_LOG)} всего, последние {len(recent)}):\n"]
+        for e in reversed(recent):
+            lines.append(f"🕐 {e['time']} | 🔴 {e['module']}/{e['error_type']}")
+            lines.append(f"   {e['message'][:100]}")
+            lines.append(f"   💡 {e['recommendation']}")
+            tb = e.get('traceback', '')
+            if tb:
+                lines.append(f"   📎 `{tb[-150:]}`")
+            lines.append("")
+        send_telegram_message(chat_id, "\n".join(lines), parse_mode="Markdown")
+
+
+@webhook_command("/clear_errors")
+def _cmd_clear_errors(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    if user_id != ADMIN_TELEGRAM_ID:
+        send_telegram_message(chat_id, "❌ Только админ может очищать ошибки.")
+    else:
+        count = len(_ERROR_LOG)
+        _ERROR_LOG.clear()
+        send_telegram_message(chat_id, f"🗑 Очищено {count} ошибок.")
+
+
+@webhook_command("/history")
+def _cmd_history(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    history = get_user_history(user_id, limit=10)
+    if not history:
+        send_telegram_message(chat_id, "📭 У вас пока нет транзакций")
+    else:
+        lines = [f"История: {len(history)} операций"]
+        for tx in history:
+            amount_text = (
+                f"+{tx['amount']}" if tx["amount"] > 0 else str(tx["amount"])
+            )
+            desc = (
+                tx["description"][:30] if tx["description"] else "Без описания"
+            )
+            lines.append(f"{amount_text} — {desc}")
+        send_telegram_message(chat_id, "\n".join(lines))
+
+
+@webhook_command("/short_all")
+def _cmd_short_all(ctx: WebhookContext) -> None:
+    chat_id = ctx.chat_id
+    set_response_mode(chat_id, "short")
+    send_telegram_message(
+        chat_id,
+        "Краткий режим включён для всех.\n/balance — баланс\n/profile — профиль\n/stats — статистика",
+    )
+
+
+@webhook_command("/long_all")
+def _cmd_long_all(ctx: WebhookContext) -> None:
+    chat_id = ctx.chat_id
+    set_response_mode(chat_id, "long")
+    send_telegram_message(chat_id, "Полный режим включён для всех.")
+
+
+@webhook_command("/ping")
+def _cmd_ping(ctx: WebhookContext) -> None:
+    chat_id = ctx.chat_id
+    send_telegram_message(chat_id, "🏓 Понг!")
+
+
+# Admin commands
+@webhook_command("/admin")
+def _cmd_admin(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    if not check_admin(user_id):
+        send_telegram_message(chat_id, "🔒 Нет прав администратора")
+    else:
+        send_telegram_message(
+            chat_id,
+            "👨‍💼 Админ-панель\n\n/admin_users — пользователи\n/admin_balances — топ баланс\n/admin_stats — статистика\n/add_points — начислить\n/add_admin — назначить админа",
+        )
+
+
+@webhook_command("/add_points")
+def _cmd_add_points(ctx: WebhookContext) -> None:
+    msg_text, chat_id, user_id = ctx.msg_text, ctx.chat_id, ctx.user_id
+    if not check_admin(user_id):
+        send_telegram_message(chat_id, "🔒 Нет прав администратора")
+    else:
+        # Parse: /add_points @user 100 описание
+        args = msg_text.split()[1:] if len(msg_text.split()) > 1 else []
+        if len(args) < 2:
+            send_telegram_message(
+                chat_id, "Формат: /add_points @username сумма [описание]"
+            )
+        else:
+            target_username = args[0].lstrip("@")
+            try:
+                amount = int(args[1])
+                description = (
+                    " ".join(args[2:]) if len(args) > 2 else "Начислено админом"
+                )
+                # Find user by username or ID
+                target_id = None
+                if target_username.isdigit():
+                    target_id = int(target_username)
+                else:
+                    # Simple lookup by username (would need proper query)
                     send_telegram_message(
                         chat_id,
-                        f"✅ Характер изменён на: **{character}** {emoji}\n\n"
-                        f"Теперь при ответе на сообщение бота или @упоминании бот будет отвечать в стиле {character}.",
+                        "❌ Поиск по username пока не поддерживается. Используйте telegram_id",
                     )
-                else:
-                    chars = ", ".join(CHARACTER_PROMPTS.keys())
+                    target_id = None
+
+                if target_id and add_user_balance(
+                    target_id, amount, description
+                ):
                     send_telegram_message(
                         chat_id,
-                        f"❌ Неизвестный характер: {character}\n\n"
-                        f"Доступные: {chars}",
+                        f"✅ Начислено {amount} очков пользователю {target_id}",
                     )
-        elif command == "/character_all" and chat_id:
-            if not check_admin(user_id):
-                send_telegram_message(chat_id, "🔒 Только для админов")
-            else:
-                args = msg_text.split()
-                if len(args) < 2:
-                    current = get_global_character()
+                else:
+                    send_telegram_message(chat_id, "❌ Ошибка начисления")
+            except ValueError:
+                send_telegram_message(chat_id, "❌ Неверный формат суммы")
+
+
+@webhook_command("/add_coins")
+def _cmd_add_coins(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    # Alias for add_points
+    if not check_admin(user_id):
+        send_telegram_message(chat_id, "🔒 Нет прав администратора")
+    else:
+        send_telegram_message(chat_id, "Используйте /add_points")
+
+
+@webhook_command("/add_admin")
+def _cmd_add_admin(ctx: WebhookContext) -> None:
+    msg_text, chat_id, user_id = ctx.msg_text, ctx.chat_id, ctx.user_id
+    if not check_admin(user_id):
+        send_telegram_message(chat_id, "🔒 Нет прав администратора")
+    else:
+        args = msg_text.split()[1:] if len(msg_text.split()) > 1 else []
+        if len(args) < 1:
+            send_telegram_message(chat_id, "Формат: /add_admin telegram_id")
+        else:
+            try:
+                target_id = int(args[0])
+                if set_admin_status(target_id, True):
                     send_telegram_message(
-                        chat_id,
-                        f"🌐 Глобальный характер: **{current}** {CHARACTER_EMOJI.get(current, '')}\n\n"
-                        f"Смена: /character_all <имя>",
+                        chat_id, f"✅ Пользователь {target_id} назначен админом"
                     )
                 else:
-                    character = args[1].lower()
-                    if set_global_character(character):
-                        emoji = CHARACTER_EMOJI.get(character, "")
-                        send_telegram_message(
-                            chat_id,
-                            f"✅ Глобальный характер изменён на: **{character}** {emoji}",
-                        )
-                    else:
-                        send_telegram_message(chat_id, f"❌ Неизвестный характер: {character}")
-        elif command in ["/generate_prayer", "/pray"] and chat_id:
-            send_telegram_message(chat_id, "🙏 Сочиняю молитву...")
-            prompt = (
-                "Создай короткую молитву в стиле чайной религии.\n\n"
-                "СТРУКТУРА ОБЯЗАТЕЛЬНАЯ:\n"
-                "1. Начало: 5-9 повторений слова 'чай' через запятую\n"
-                "2. Основная часть: 3-5 строк, каждая заканчивается словом 'чай' или 'настой'\n"
-                "3. Завершение: 'eight-nine' (курсивом)\n\n"
-                "Используй слова: чай, настой, заварка, кружка-алтарь, eight-nine.\n"
-                "Пример:\n"
-                "Чай, чай, чай, чай, чай, чай, чай.\n"
-                "Да будет заварка моей крепкой, чай.\n"
-                "Да не остынет кружка моя, чай.\n"
-                "Да успокоит меня тёплый пар, чай.\n"
-                "*eight-nine*\n\n"
-                "Создай новую молитву в этом стиле:"
-            )
-            prayer = call_ai_api(prompt, max_tokens=150)
-            send_telegram_message(chat_id, f"🙏 Молитва:\n\n{prayer}")
-            return jsonify({"ok": True})
-        elif command == "/ask_canon" and chat_id:
-            args = msg_text.split(maxsplit=1)
-            if len(args) < 2:
-                send_telegram_message(
-                    chat_id,
-                    "Использование: /ask_canon <вопрос>\nПример: /ask_canon Кто такой олеговирус?",
-                )
-            else:
-                question = args[1]
-                prompt = (
-                    f"Ты знаток канона олеговируса и LucasTeam Lore (LTL). "
-                    f"Ответь кратко на вопрос по канону: {question}"
+                    send_telegram_message(chat_id, "❌ Ошибка назначения")
+            except ValueError:
+                send_telegram_message(chat_id, "❌ Неверный формат ID")
+
+
+@webhook_command("/admin_users")
+def _cmd_admin_users(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    if not check_admin(user_id):
+        send_telegram_message(chat_id, "🔒 Нет прав администратора")
+    else:
+        users = get_all_users(limit=20)
+        if not users:
+            send_telegram_message(chat_id, "Нет пользователей")
+        else:
+            lines = [f"👥 Пользователей: {len(users)}\n"]
+            for u in users[:10]:
+                admin_mark = "👑" if u["is_admin"] else ""
+                lines.append(
+                    f"{admin_mark}{u['first_name']} (@{u['username']}) — {u['balance']}"
                 )
-                answer = call_ai_api(prompt)
-                send_telegram_message(chat_id, answer)
-
-        # Shop commands
-        elif command == "/shop" and chat_id:
-            items = get_shop_items(limit=10)
-            if not items:
-                send_telegram_message(chat_id, "🏪 Магазин пуст")
-            else:
-                lines = ["🏪 Магазин:\n"]
-                for item in items:
-                    lines.append(
-                        f"{item['id']}. {item['name']} — {item['price']} очков"
-                    )
-                lines.append("\nКупить: /buy <номер>")
-                send_telegram_message(chat_id, "\n".join(lines))
-        elif command == "/buy" and chat_id:
-            args = msg_text.split(maxsplit=1)
-            if len(args) < 2:
-                send_telegram_message(chat_id, "Формат: /buy <номер товара>")
-            else:
-                try:
-                    item_id = int(args[1])
-                    success, message = purchase_item(user_id, item_id)
-                    send_telegram_message(chat_id, message)
-                except ValueError:
-                    send_telegram_message(chat_id, "❌ Неверный номер товара")
-        elif command == "/buy_contact" and chat_id:
-            send_telegram_message(chat_id, "Используйте /buy <номер> для покупки")
-        elif (
-            command
-            in [
-                "/buy_1",
-                "/buy_2",
-                "/buy_3",
-                "/buy_4",
-                "/buy_5",
-                "/buy_6",
-                "/buy_7",
-                "/buy_8",
-            ]
-            and chat_id
-        ):
-            # Quick buy shortcuts
-            item_num = int(command.replace("/buy_", ""))
-            success, message = purchase_item(user_id, item_num)
-            send_telegram_message(chat_id, message)
-        elif command == "/inventory" and chat_id:
-            inventory = get_user_inventory(user_id)
-            if not inventory:
-                send_telegram_message(chat_id, "📦 Инвентарь пуст")
-            else:
-                lines = ["📦 Ваш инвентарь:\n"]
-                for item in inventory[:10]:
-                    status = "✅" if item["is_active"] else "❌"
-                    lines.append(f"{status} {item['name']}")
-                send_telegram_message(chat_id, "\n".join(lines))
-
-        # Trivia command - use static questions with Telegram poll for Vercel
-        elif command == "/trivia" and chat_id:
-            import importlib.util
-            spec = importlib.util.spec_from_file_location(
-                "trivia_questions", os.path.join(os.path.dirname(__file__), "..", "bot", "trivia", "questions.py")
+            send_telegram_message(chat_id, "\n".join(lines))
+
+
+@webhook_command("/admin_balances")
+def _cmd_admin_balances(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    if not check_admin(user_id):
+        send_telegram_message(chat_id, "🔒 Нет прав администратора")
+    else:
+        top = get_top_balances(limit=10)
+        if not top:
+            send_telegram_message(chat_id, "Нет данных")
+        else:
+            lines = ["🏆 Топ баланс:\n"]
+            for i, u in enumerate(top, 1):
+                lines.append(f"{i}. {u['first_name']} — {u['balance']}")
+            send_telegram_message(chat_id, "\n".join(lines))
+
+
+@webhook_command("/admin_transactions")
+def _cmd_admin_transactions(ctx: WebhookContext) -> None:
+    msg_text, chat_id, user_id = ctx.msg_text, ctx.chat_id, ctx.user_id
+    if not check_admin(user_id):
+        send_telegram_message(chat_id, "🔒 Нет прав администратора")
+    else:
+        args = msg_text.split()[1:] if len(msg_text.split()) > 1 else []
+        if len(args) < 1:
+            send_telegram_message(
+                chat_id, "Формат: /admin_transactions telegram_id"
             )
-            trivia_questions = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(trivia_questions)
-            
-            question = trivia_questions.generate_trivia_question()
-            question_text = question["text"]
-            options = question["options"]
-            correct_index = question["correct_index"]
-            explanation = question["explanation"]
-            
+        else:
             try:
-                # Send native Telegram poll via API
-                bot_token = os.getenv("BOT_TOKEN", "")
-                if bot_token:
-                    response = requests.post(
-                        f"https://api.telegram.org/bot{bot_token}/sendPoll",
-                        json={
-                            "chat_id": chat_id,
-                            "question": question_text[:300],
-                            "options": [opt[:100] for opt in options],
-                            "type": "quiz",
-                            "correct_option_id": correct_index,
-                            "explanation": explanation[:200],
-                            "explanation_parse_mode": "Markdown",
-                            "is_anonymous": False,
-                        },
-                        timeout=10,
+                target_id = int(args[0])
+                history = get_user_history(target_id, limit=10)
+                if not history:
+                    send_telegram_message(
+                        chat_id, f"Нет транзакций для {target_id}"
                     )
-                    
-                    if response.status_code == 200:
-                        send_telegram_message(
-                            chat_id,
-                            "🎯 **Викторина по канону** отправлена!\nОтветьте на опрос выше. Правильный ответ даст +25 монет.",
-                            parse_mode="Markdown",
-                        )
-                        return jsonify({"ok": True})
-                    else:
-                        print(f"sendPoll error: {response.text}")
-                        raise Exception("sendPoll failed")
                 else:
-                    raise Exception("BOT_TOKEN not set")
-            except Exception as exc:
-                print(f"Error sending trivia poll: {exc}")
-            
-            # Fallback to text question with inline buttons
+                    lines = [f"💰 Транзакции {target_id}:\n"]
+                    for tx in history:
+                        amount_text = (
+                            f"+{tx['amount']}"
+                            if tx["amount"] > 0
+                            else str(tx["amount"])
+                        )
+                        lines.append(
+                            f"{amount_text} — {tx['description'][:20]}"
+                        )
+                    send_telegram_message(chat_id, "\n".join(lines))
+            except ValueError:
+                send_telegram_message(chat_id, "❌ Неверный формат ID")
+
+
+@webhook_command("/admin_stats")
+def _cmd_admin_stats(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    if not check_admin(user_id):
+        send_telegram_message(chat_id, "🔒 Нет прав администратора")
+    else:
+        users = get_all_users(limit=1000)
+        total_balance = sum(u["balance"] for u in users)
+        admin_count = sum(1 for u in users if u["is_admin"])
+        send_telegram_message(
+            chat_id,
+            f"📊 Статистика системы:\n\nПользователей: {len(users)}\nАдминов: {admin_count}\nОбщий баланс: {total_balance}",
+        )
+
+
+@webhook_command("/reload_rates")
+def _cmd_reload_rates(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    if not check_admin(user_id):
+        send_telegram_message(chat_id, "🔒 Нет прав администратора")
+        return
+    invalidate_conversion_rates()
+    rates = ", ".join(f"{bot}={get_conversion_rate(bot)}" for bot in BOT_CONVERSION_RATES)
+    send_telegram_message(chat_id, f"🔄 Коэффициенты перечитаны из БД:\n{rates}")
+
+
+@webhook_command("/broadcast")
+def _cmd_broadcast(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    if not check_admin(user_id):
+        send_telegram_message(chat_id, "🔒 Нет прав администратора")
+    else:
+        send_telegram_message(
+            chat_id, "❌ Рассылка пока не реализована в Vercel runtime"
+        )
+
+
+# AI commands
+# /ai command (parent for AI module)
+@webhook_command("/ai", "/ask", requires_chat=False)
+def _cmd_ai(ctx: WebhookContext) -> None:
+    msg_text, chat_id, user_id = ctx.msg_text, ctx.chat_id, ctx.user_id
+    if not chat_id:
+        return
+    args = msg_text.split(maxsplit=1)
+    if len(args) < 2:
+        send_telegram_message(
+            chat_id,
+            "**🤖 AI Module**\n\n"
+            "/ai <вопрос> — задать вопрос AI\n"
+            "/ask <вопрос> — алиас /ai\n"
+            "/ai_help — показать эту справку\n"
+            "/character — выбрать характер\n"
+            "/generate_prayer или /pray — сгенерировать молитву\n"
+            "/ask_canon <вопрос> — вопрос по канону\n\n"
+            "💡 Или просто ответьте на сообщение бота или упомяните @lt_lo_game_bot",
+        )
+    else:
+        question = args[1]
+        if len(question) < 3:
+            send_telegram_message(chat_id, "❌ Вопрос слишком короткий")
+        else:
+            prompt = f"Ты помощник, отвечающий кратко и по делу. Вопрос пользователя: {question}\n\nОтветь в 2-3 предложениях."
+            answer = call_ai_with_memory(user_id, prompt, max_tokens=200)
+            send_telegram_message(chat_id, answer)
+
+
+@webhook_command("/ai_help")
+def _cmd_ai_help(ctx: WebhookContext) -> None:
+    chat_id = ctx.chat_id
+    send_telegram_message(
+        chat_id,
+        "🤖 **AI Module**\n\n"
+        "/ai <вопрос> — задать вопрос AI\n"
+        "/ask <вопрос> — алиас /ai\n"
+        "/ai_help — показать эту справку\n"
+        "/character — выбрать характер\n"
+        "/generate_prayer или /pray — сгенерировать молитву\n"
+        "/ask_canon <вопрос> — вопрос по канону\n\n"
+        "💡 Или просто ответьте на сообщение бота или упомяните @lt_lo_game_bot",
+    )
+
+
+@webhook_command("/character")
+def _cmd_character(ctx: WebhookContext) -> None:
+    msg_text, chat_id, user_id = ctx.msg_text, ctx.chat_id, ctx.user_id
+    args = msg_text.split()
+    if len(args) < 2:
+        # Show current character and available options
+        current = get_user_character(user_id)
+        chars = "\n".join([f"• {k} {CHARACTER_EMOJI.get(k, '')}" for k in CHARACTER_PROMPTS])
+        send_telegram_message(
+            chat_id,
+            f"🎭 Текущий характер: **{current}** {CHARACTER_EMOJI.get(current, '')}\n\n"
+            f"Доступные характеры:\n{chars}\n\n"
+            f"Смена: /character <имя>\n"
+            f"Пример: /character чай",
+        )
+    else:
+        character = args[1].lower()
+        if set_user_character(user_id, character):
+            emoji = CHARACTER_EMOJI.get(character, "")
             send_telegram_message(
                 chat_id,
-                f"🎯 **Викторина по канону**\n\n{question_text}\n\nВыберите правильный ответ:",
-                parse_mode="Markdown",
+                f"✅ Характер изменён на: **{character}** {emoji}\n\n"
+                f"Теперь при ответе на сообщение бота или @упоминании бот будет отвечать в стиле {character}.",
             )
-            inline_keyboard = []
-            for i, opt in enumerate(options):
-                inline_keyboard.append([
-                    {"text": f"✅ {opt}", "callback_data": f"trivia_{i}_{correct_index}"}
-                ])
+        else:
+            chars = ", ".join(CHARACTER_PROMPTS.keys())
             send_telegram_message(
                 chat_id,
-                "⚠️ Для ответа нажмите на кнопку с вариантом ниже. Правильный ответ даст +25 монет.",
-                reply_markup={"inline_keyboard": inline_keyboard},
+                f"❌ Неизвестный характер: {character}\n\n"
+                f"Доступные: {chars}",
             )
-            return jsonify({"ok": True})
 
-        # /chess command
-        elif command == "/chess" and chat_id:
-            help_text = (
-                "♟ **Шахматный модуль BankBot**\n\n"
-                "**Доступные команды:**\n"
-                "`/chess_link <ник>` — привязать Lichess аккаунт\n"
-                "`/chess_rating` — показать рейтинги\n"
-                "`/chess_stats` — показать статистику\n"
-                "`/puzzle` или `/chess_puzzle` — решить шахматную задачу\n"
-                "`/chess_history` — история решённых задач\n\n"
-                "**Как решать задачи:**\n"
-                "1. Отправьте `/puzzle`\n"
-                "2. Введите ваш ход (например: `e2e4`)\n"
-                "3. За правильный ответ — +5 монет\n\n"
-                "**Пример:**\n"
-                "`/chess_link DrNykterstein`"
+
+@webhook_command("/character_all")
+def _cmd_character_all(ctx: WebhookContext) -> None:
+    msg_text, chat_id, user_id = ctx.msg_text, ctx.chat_id, ctx.user_id
+    if not check_admin(user_id):
+        send_telegram_message(chat_id, "🔒 Только для админов")
+    else:
+        args = msg_text.split()
+        if len(args) < 2:
+            current = get_global_character()
+            send_telegram_message(
+                chat_id,
+                f"🌐 Глобальный характер: **{current}** {CHARACTER_EMOJI.get(current, '')}\n\n"
+                f"Смена: /character_all <имя>",
             )
-            send_telegram_message(chat_id, help_text, parse_mode="Markdown")
-        
-        # /chess_link <username>
-        elif command == "/chess_link" and chat_id:
-            args = msg_text.split()[1:] if msg_text else []
-            
-            if len(args) < 1:
+        else:
+            character = args[1].lower()
+            if set_global_character(character):
+                emoji = CHARACTER_EMOJI.get(character, "")
                 send_telegram_message(
                     chat_id,
-                    "♟ Использование: `/chess_link <ник>`\n\nПример: `/chess_link DrNykterstein`",
-                    parse_mode="Markdown",
+                    f"✅ Глобальный характер изменён на: **{character}** {emoji}",
                 )
             else:
-                lichess_username = args[0].strip()
-                if not lichess_username:
-                    send_telegram_message(
-                        chat_id, 
-                        "❌ Укажите ник Lichess: `/chess_link <ник>`",
-                        parse_mode="Markdown"
-                    )
-                else:
-                    # Send "checking" status
-                    send_telegram_message(
-                        chat_id,
-                        f"🔍 Проверяю Lichess аккаунт **{lichess_username}**...",
-                        parse_mode="Markdown",
-                    )
-                    
-                    try:
-                        lichess_user = fetch_lichess_user(lichess_username)
-                    except Exception as exc:
-                        print(f"Lichess lookup failed: {exc}")
-                        send_telegram_message(
-                            chat_id,
-                            "❌ Сейчас не удалось проверить Lichess аккаунт. Попробуйте позже.",
-                        )
-                        lichess_user = None
-                    
-                    if lichess_user is None:
-                        send_telegram_message(
-                            chat_id,
-                            f"❌ Lichess аккаунт **{lichess_username}** не найден. Проверьте ник.",
-                            parse_mode="Markdown",
-                        )
-                    else:
-                        # Try to link account
-                        success = link_chess_account(user_id, lichess_user["username"])
-                        
-                        if not success:
-                            send_telegram_message(
-                                chat_id,
-                                "❌ Этот Lichess аккаунт уже привязан к другому пользователю.",
-                            )
-                        else:
-                            title_prefix = f"{lichess_user['title']} " if lichess_user.get("title") else ""
-                            online_text = "онлайн" if lichess_user.get("online") else "оффлайн/неизвестно"
-                            success_msg = (
-                                "♟ **Lichess аккаунт привязан!**\n\n"
-                                f"Аккаунт: **{title_prefix}{lichess_user['username']}**\n"
-                                f"Статус: {online_text}\n\n"
-                                "Теперь можно использовать шахматные команды BankBot."
-                            )
-                            send_telegram_message(chat_id, success_msg, parse_mode="Markdown")
-        
-        # /chess_rating
-        elif command == "/chess_rating" and chat_id:
-            account = get_chess_account(user_id)
-            if not account:
+                send_telegram_message(chat_id, f"❌ Неизвестный характер: {character}")
+
+
+@webhook_command("/generate_prayer", "/pray")
+def _cmd_generate_prayer(ctx: WebhookContext) -> None:
+    chat_id = ctx.chat_id
+    send_telegram_message(chat_id, "🙏 Сочиняю молитву...")
+    prompt = (
+        "Создай короткую молитву в стиле чайной религии.\n\n"
+        "СТРУКТУРА ОБЯЗАТЕЛЬНАЯ:\n"
+        "1. Начало: 5-9 повторений слова 'чай' через запятую\n"
+        "2. Основная часть: 3-5 строк, каждая заканчивается словом 'чай' или 'настой'\n"
+        "3. Завершение: 'eight-nine' (курсивом)\n\n"
+        "Используй слова: чай, настой, заварка, кружка-алтарь, eight-nine.\n"
+        "Пример:\n"
+        "Чай, чай, чай, чай, чай, чай, чай.\n"
+        "Да будет заварка моей крепкой, чай.\n"
+        "Да не остынет кружка моя, чай.\n"
+        "Да успокоит меня тёплый пар, чай.\n"
+        "*eight-nine*\n\n"
+        "Создай новую молитву в этом стиле:"
+    )
+    prayer = call_ai_api(prompt, max_tokens=150)
+    send_telegram_message(chat_id, f"🙏 Молитва:\n\n{prayer}")
+    return
+
+
+@webhook_command("/ask_canon")
+def _cmd_ask_canon(ctx: WebhookContext) -> None:
+    msg_text, chat_id = ctx.msg_text, ctx.chat_id
+    args = msg_text.split(maxsplit=1)
+    if len(args) < 2:
+        send_telegram_message(
+            chat_id,
+            "Использование: /ask_canon <вопрос>\nПример: /ask_canon Кто такой олеговирус?",
+        )
+    else:
+        question = args[1]
+        prompt = (
+            f"Ты знаток канона олеговируса и LucasTeam Lore (LTL). "
+            f"Ответь кратко на вопрос по канону: {question}"
+        )
+        answer = call_ai_api(prompt)
+        send_telegram_message(chat_id, answer)
+
+
+# Shop commands
+@webhook_command("/shop")
+def _cmd_shop(ctx: WebhookContext) -> None:
+    chat_id = ctx.chat_id
+    items = get_shop_items(limit=10)
+    if not items:
+        send_telegram_message(chat_id, "🏪 Магазин пуст")
+    else:
+        lines = ["🏪 Магазин:\n"]
+        for item in items:
+            lines.append(
+                f"{item['id']}. {item['name']} — {item['price']} очков"
+            )
+        lines.append("\nКупить: /buy <номер>")
+        send_telegram_message(chat_id, "\n".join(lines))
+
+
+@webhook_command("/buy")
+def _cmd_buy(ctx: WebhookContext) -> None:
+    msg_text, chat_id, user_id = ctx.msg_text, ctx.chat_id, ctx.user_id
+    args = msg_text.split(maxsplit=1)
+    if len(args) < 2:
+        send_telegram_message(chat_id, "Формат: /buy <номер товара>")
+    else:
+        try:
+            item_id = int(args[1])
+            success, message = purchase_item(user_id, item_id)
+            send_telegram_message(chat_id, message)
+        except ValueError:
+            send_telegram_message(chat_id, "❌ Неверный номер товара")
+
+
+@webhook_command("/buy_contact")
+def _cmd_buy_contact(ctx: WebhookContext) -> None:
+    chat_id = ctx.chat_id
+    send_telegram_message(chat_id, "Используйте /buy <номер> для покупки")
+
+
+@webhook_command("/buy_1", "/buy_2", "/buy_3", "/buy_4", "/buy_5", "/buy_6", "/buy_7", "/buy_8")
+def _cmd_buy_shortcut(ctx: WebhookContext) -> None:
+    chat_id, user_id, command = ctx.chat_id, ctx.user_id, ctx.command
+    # Quick buy shortcuts
+    item_num = int(command.replace("/buy_", ""))
+    success, message = purchase_item(user_id, item_num)
+    send_telegram_message(chat_id, message)
+
+
+@webhook_command("/inventory")
+def _cmd_inventory(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    inventory = get_user_inventory(user_id)
+    if not inventory:
+        send_telegram_message(chat_id, "📦 Инвентарь пуст")
+    else:
+        lines = ["📦 Ваш инвентарь:\n"]
+        for item in inventory[:10]:
+            status = "✅" if item["is_active"] else "❌"
+            lines.append(f"{status} {item['name']}")
+        send_telegram_message(chat_id, "\n".join(lines))
+
+
+# Trivia command - prefetched AI or static questions with Telegram poll for Vercel
+@webhook_command("/trivia")
+def _cmd_trivia(ctx: WebhookContext) -> None:
+    chat_id = ctx.chat_id
+    question = _vercel_trivia_question()
+    if question is None:
+        send_telegram_message(chat_id, "❌ Вопросы викторины недоступны. Попробуйте позже.")
+        return
+    question_text = question["text"]
+    options = question["options"]
+    correct_index = question["correct_index"]
+    explanation = question.get("explanation") or "Ответ из канона Олеговируса."
+
+    try:
+        # Send native Telegram poll via API
+        bot_token = os.getenv("BOT_TOKEN", "")
+        if bot_token:
+            response = requests.post(
+                f"https://api.telegram.org/bot{bot_token}/sendPoll",
+                json={
+                    "chat_id": chat_id,
+                    "question": question_text[:300],
+                    "options": [opt[:100] for opt in options],
+                    "type": "quiz",
+                    "correct_option_id": correct_index,
+                    "explanation": explanation[:200],
+                    "explanation_parse_mode": "Markdown",
+                    "is_anonymous": False,
+                },
+                timeout=10,
+            )
+
+            if response.status_code == 200:
                 send_telegram_message(
                     chat_id,
-                    "❌ Сначала привяжите Lichess аккаунт: `/chess_link <ник>`",
+                    "🎯 **Викторина по канону** отправлена!\nОтветьте на опрос выше. Правильный ответ даст +25 монет.",
                     parse_mode="Markdown",
                 )
+                return
             else:
+                print(f"sendPoll error: {response.text}")
+                raise Exception("sendPoll failed")
+        else:
+            raise Exception("BOT_TOKEN not set")
+    except Exception as exc:
+        print(f"Error sending trivia poll: {exc}")
+
+    # Fallback to text question with inline buttons
+    send_telegram_message(
+        chat_id,
+        f"🎯 **Викторина по канону**\n\n{question_text}\n\nВыберите правильный ответ:",
+        parse_mode="Markdown",
+    )
+    inline_keyboard = []
+    for i, opt in enumerate(options):
+        inline_keyboard.append([
+            {"text": f"✅ {opt}", "callback_data": f"trivia_{i}_{correct_index}"}
+        ])
+    send_telegram_message(
+        chat_id,
+        "⚠️ Для ответа нажмите на кнопку с вариантом ниже. Правильный ответ даст +25 монет.",
+        reply_markup={"inline_keyboard": inline_keyboard},
+    )
+    return
+
+
+# /chess command
+@webhook_command("/chess")
+def _cmd_chess(ctx: WebhookContext) -> None:
+    chat_id = ctx.chat_id
+    help_text = (
+        "♟ **Шахматный модуль BankBot**\n\n"
+        "**Доступные команды:**\n"
+        "`/chess_link <ник>` — привязать Lichess аккаунт\n"
+        "`/chess_rating` — показать рейтинги\n"
+        "`/chess_stats` — показать статистику\n"
+        "`/puzzle` или `/chess_puzzle` — решить шахматную задачу\n"
+        "`/chess_history` — история решённых задач\n\n"
+        "**Как решать задачи:**\n"
+        "1. Отправьте `/puzzle`\n"
+        "2. Введите ваш ход (например: `e2e4`)\n"
+        "3. За правильный ответ — +5 монет\n\n"
+        "**Пример:**\n"
+        "`/chess_link DrNykterstein`"
+    )
+    send_telegram_message(chat_id, help_text, parse_mode="Markdown")
+
+
+# /chess_link <username>
+@webhook_command("/chess_link")
+def _cmd_chess_link(ctx: WebhookContext) -> None:
+    msg_text, chat_id, user_id = ctx.msg_text, ctx.chat_id, ctx.user_id
+    args = msg_text.split()[1:] if msg_text else []
+
+    if len(args) < 1:
+        send_telegram_message(
+            chat_id,
+            "♟ Использование: `/chess_link <ник>`\n\nПример: `/chess_link DrNykterstein`",
+            parse_mode="Markdown",
+        )
+    else:
+        lichess_username = args[0].strip()
+        if not lichess_username:
+            send_telegram_message(
+                chat_id, 
+                "❌ Укажите ник Lichess: `/chess_link <ник>`",
+                parse_mode="Markdown"
+            )
+        else:
+            # Send "checking" status
+            send_telegram_message(
+                chat_id,
+                f"🔍 Проверяю Lichess аккаунт **{lichess_username}**...",
+                parse_mode="Markdown",
+            )
+
+            try:
+                lichess_user = fetch_lichess_user(lichess_username)
+            except Exception as exc:
+                print(f"Lichess lookup failed: {exc}")
                 send_telegram_message(
                     chat_id,
-                    "🔍 Загружаю рейтинги...",
+                    "❌ Сейчас не удалось проверить Lichess аккаунт. Попробуйте позже.",
                 )
-                
-                try:
-                    lichess_user = fetch_lichess_user(account["lichess_username"])
-                    if not lichess_user:
-                        send_telegram_message(
-                            chat_id,
-                            "❌ Не удалось загрузить данные Lichess. Попробуйте позже.",
-                        )
-                    else:
-                        title_prefix = f"{lichess_user['title']} " if lichess_user.get("title") else ""
-                        online_text = "🟢 онлайн" if lichess_user.get("online") else "⚫ оффлайн"
-                        perfs = lichess_user.get("perfs", {})
-                        
-                        rating_parts = []
-                        rating_parts.append(f"**Статус:** {online_text}\n")
-                        
-                        if "bullet" in perfs:
-                            rating_parts.append(f"🎯 **Пуля:** {perfs['bullet'].get('rating', '?')} ({perfs['bullet'].get('games', 0)} игр)")
-                        if "blitz" in perfs:
-                            rating_parts.append(f"⚡ **Блиц:** {perfs['blitz'].get('rating', '?')} ({perfs['blitz'].get('games', 0)} игр)")
-                        if "rapid" in perfs:
-                            rating_parts.append(f"⏱️ **Рапид:** {perfs['rapid'].get('rating', '?')} ({perfs['rapid'].get('games', 0)} игр)")
-                        if "classical" in perfs:
-                            rating_parts.append(f"⏳ **Классика:** {perfs['classical'].get('rating', '?')} ({perfs['classical'].get('games', 0)} игр)")
-                        
-                        rating_msg = (
-                            f"♟ **Рейтинги {title_prefix}{lichess_user['username']}**\n\n"
-                            + "\n".join(rating_parts)
-                        )
-                        send_telegram_message(chat_id, rating_msg, parse_mode="Markdown")
-                except Exception as exc:
-                    print(f"Error fetching ratings: {exc}")
-                    send_telegram_message(
-                        chat_id,
-                        "❌ Ошибка загрузки рейтингов. Попробуйте позже.",
-                    )
-        
-        # /chess_stats
-        elif command == "/chess_stats" and chat_id:
-            account = get_chess_account(user_id)
-            if not account:
+                lichess_user = None
+
+            if lichess_user is None:
                 send_telegram_message(
                     chat_id,
-                    "❌ Сначала привяжите Lichess аккаунт: `/chess_link <ник>`",
+                    f"❌ Lichess аккаунт **{lichess_username}** не найден. Проверьте ник.",
                     parse_mode="Markdown",
                 )
             else:
-                send_telegram_message(
-                    chat_id,
-                    "🔍 Загружаю статистику...",
-                )
-                
-                try:
-                    lichess_user = fetch_lichess_user(account["lichess_username"])
-                    if not lichess_user:
-                        send_telegram_message(
-                            chat_id,
-                            "❌ Не удалось загрузить данные Lichess. Попробуйте позже.",
-                        )
-                    else:
-                        title_prefix = f"{lichess_user['title']} " if lichess_user.get("title") else ""
-                        perfs = lichess_user.get("perfs", {})
-                        games = lichess_user.get("games", {})
-                        
-                        total_games = games.get("total", 0)
-                        win = games.get("win", 0)
-                        loss = games.get("loss", 0)
-                        draw = games.get("draw", 0)
-                        
-                        winrate = round((win / total_games * 100), 1) if total_games > 0 else 0
-                        
-                        stats_parts = []
-                        stats_parts.append(f"**Всего игр:** {total_games}")
-                        stats_parts.append(f"✅ **Побед:** {win} ({winrate}%)")
-                        stats_parts.append(f"❌ **Поражений:** {loss}")
-                        stats_parts.append(f"🤝 **Ничьих:** {draw}\n")
-                        
-                        if "bullet" in perfs:
-                            stats_parts.append(f"🎯 **Пуля:** {perfs['bullet'].get('rating', '?')} ({perfs['bullet'].get('games', 0)} игр)")
-                        if "blitz" in perfs:
-                            stats_parts.append(f"⚡ **Блиц:** {perfs['blitz'].get('rating', '?')} ({perfs['blitz'].get('games', 0)} игр)")
-                        if "rapid" in perfs:
-                            stats_parts.append(f"⏱️ **Рапид:** {perfs['rapid'].get('rating', '?')} ({perfs['rapid'].get('games', 0)} игр)")
-                        if "classical" in perfs:
-                            stats_parts.append(f"⏳ **Классика:** {perfs['classical'].get('rating', '?')} ({perfs['classical'].get('games', 0)} игр)")
-                        
-                        stats_msg = (
-                            f"♟ **Статистика {title_prefix}{lichess_user['username']}**\n\n"
-                            + "\n".join(stats_parts)
-                        )
-                        send_telegram_message(chat_id, stats_msg, parse_mode="Markdown")
-                except Exception as exc:
-                    print(f"Error fetching stats: {exc}")
+                # Try to link account
+                success = link_chess_account(user_id, lichess_user["username"])
+
+                if not success:
                     send_telegram_message(
                         chat_id,
-                        "❌ Ошибка загрузки статистики. Попробуйте позже.",
+                        "❌ Этот Lichess аккаунт уже привязан к другому пользователю.",
                     )
-        
-        # /puzzle and /chess_puzzle commands
-        elif command in ["/puzzle", "/chess_puzzle"] and chat_id:
-            print(f"[PUZZLE] user_id={user_id}, chat_id={chat_id}")
-            account = get_chess_account(user_id)
-            print(f"[PUZZLE] account={account}")
-            if not account:
-                print("[PUZZLE] No account, sending error")
+                else:
+                    title_prefix = f"{lichess_user['title']} " if lichess_user.get("title") else ""
+                    online_text = "онлайн" if lichess_user.get("online") else "оффлайн/неизвестно"
+                    success_msg = (
+                        "♟ **Lichess аккаунт привязан!**\n\n"
+                        f"Аккаунт: **{title_prefix}{lichess_user['username']}**\n"
+                        f"Статус: {online_text}\n\n"
+                        "Теперь можно использовать шахматные команды BankBot."
+                    )
+                    send_telegram_message(chat_id, success_msg, parse_mode="Markdown")
+
+
+# /chess_rating
+@webhook_command("/chess_rating")
+def _cmd_chess_rating(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    account = get_chess_account(user_id)
+    if not account:
+        send_telegram_message(
+            chat_id,
+            "❌ Сначала привяжите Lichess аккаунт: `/chess_link <ник>`",
+            parse_mode="Markdown",
+        )
+    else:
+        send_telegram_message(
+            chat_id,
+            "🔍 Загружаю рейтинги...",
+        )
+
+        try:
+            lichess_user = fetch_lichess_user(account["lichess_username"])
+            if not lichess_user:
                 send_telegram_message(
                     chat_id,
-                    "❌ Сначала привяжите Lichess аккаунт: `/chess_link <ник>`",
-                    parse_mode="Markdown",
+                    "❌ Не удалось загрузить данные Lichess. Попробуйте позже.",
                 )
             else:
-                # Check cooldown (max 1 puzzle per day) — REMOVED for testing
-                # TODO: re-enable after testing
-                now = datetime.utcnow()
-                coins_data = get_user_coins(user_id)
-                
-                # Cooldown disabled — allow multiple puzzles per day
-                # if coins_data and coins_data.get("last_puzzle_at"):
-                #     last_puzzle = coins_data["last_puzzle_at"]
-                #     if hasattr(last_puzzle, 'tzinfo') and last_puzzle.tzinfo is not None:
-                #         last_puzzle = last_puzzle.replace(tzinfo=None)
-                #     from datetime import timedelta
-                #     if now - last_puzzle < timedelta(hours=24):
-                #         remaining = 24 - (now - last_puzzle).total_seconds() / 3600
-                #         send_telegram_message(
-                #             chat_id,
-                #             f"⏳ Пожалуйста, подождите {remaining:.1f} часов до следующей задачи.",
-                #         )
-                #         return jsonify({"ok": True})
-                
-                send_telegram_message(
-                    chat_id,
-                    "🧩 Загружаю задачу...",
+                title_prefix = f"{lichess_user['title']} " if lichess_user.get("title") else ""
+                online_text = "🟢 онлайн" if lichess_user.get("online") else "⚫ оффлайн"
+                perfs = lichess_user.get("perfs", {})
+
+                rating_parts = []
+                rating_parts.append(f"**Статус:** {online_text}\n")
+
+                if "bullet" in perfs:
+                    rating_parts.append(f"🎯 **Пуля:** {perfs['bullet'].get('rating', '?')} ({perfs['bullet'].get('games', 0)} игр)")
+                if "blitz" in perfs:
+                    rating_parts.append(f"⚡ **Блиц:** {perfs['blitz'].get('rating', '?')} ({perfs['blitz'].get('games', 0)} игр)")
+                if "rapid" in perfs:
+                    rating_parts.append(f"⏱️ **Рапид:** {perfs['rapid'].get('rating', '?')} ({perfs['rapid'].get('games', 0)} игр)")
+                if "classical" in perfs:
+                    rating_parts.append(f"⏳ **Классика:** {perfs['classical'].get('rating', '?')} ({perfs['classical'].get('games', 0)} игр)")
+
+                rating_msg = (
+                    f"♟ **Рейтинги {title_prefix}{lichess_user['username']}**\n\n"
+                    + "\n".join(rating_parts)
                 )
-                
-                try:
-                    # Fetch random puzzle from Lichess (not daily — random each time)
-                    puzzle_url = f"{LICHESS_API_BASE_URL}/puzzle/next"
-                    headers = {"Accept": "application/json", "User-Agent": "BankBot/ChessModule"}
-                    response = requests.get(puzzle_url, headers=headers, timeout=LICHESS_TIMEOUT_SECONDS)
-                    
-                    if response.status_code != 200:
-                        send_telegram_message(
-                            chat_id,
-                            "❌ Не удалось загрузить задачу. Попробуйте позже.",
-                        )
-                        return jsonify({"ok": True})
-                    
-                    puzzle_data = response.json()
-                    puzzle = puzzle_data.get("puzzle", {})
-                    game = puzzle_data.get("game", {})
-                    
-                    puzzle_id = puzzle.get("id", "unknown")
-                    rating = puzzle.get("rating", "?")
-                    themes = ", ".join(puzzle.get("themes", [])[:3])
-                    solution = puzzle.get("solution", "")
-                    initial_ply = puzzle.get("initialPly", 0)
-                    puzzle_url_link = f"https://lichess.org/training/{puzzle_id}"
-                    
-                    # Derive FEN from game PGN + initialPly
-                    fen = ""
-                    try:
-                        import io
-                        import chess.pgn
-                        pgn_text = game.get("pgn", "")
-                        pgn_io = io.StringIO(pgn_text)
-                        pgn_game = chess.pgn.read_game(pgn_io)
-                        if pgn_game:
-                            board = pgn_game.board()
-                            moves = list(pgn_game.mainline_moves())
-                            for i, move in enumerate(moves):
-                                if i >= initial_ply:
-                                    break
-                                board.push(move)
-                            fen = board.fen()
-                            # Lichess board images show from white's perspective
-                            # If black to move, flip the board
-                            if board.turn == chess.BLACK:
-                                fen = board.mirror().fen()
-                    except Exception as fen_exc:
-                        print(f"Error deriving FEN from PGN: {fen_exc}")
-                        log_error("Chess", "fen_derivation", f"FEN parse error: {fen_exc}", f"pgn={pgn_text[:80]}... initialPly={initial_ply}")
-                    
-                    if not fen:
-                        log_error("Chess", "fen_empty", "Empty FEN after derivation", f"pgn={pgn_text[:80]}... initialPly={initial_ply}")
-                        send_telegram_message(
-                            chat_id,
-                            "❌ Не удалось отобразить доску. Попробуйте позже.",
-                        )
-                        return jsonify({"ok": True})
-                    
-                    # Store pending puzzle for this user
-                    _PENDING_PUZZLES[user_id] = {
-                        "puzzle_id": puzzle_id,
-                        "solution": solution,
-                        "rating": rating,
-                        "themes": themes,
-                        "chat_id": chat_id,
-                        "username": account["lichess_username"],
-                        "initial_ply": initial_ply,
-                    }
-                    
-                    board_image_url = f"https://lichess1.org/export/fen.gif?fen={fen.replace(' ', '_')}&theme=brown&piece=cburnett"
-                    
-                    turn = "Белых" if initial_ply % 2 == 0 else "Чёрных"
-                    puzzle_msg = (
-                        f"🧩 **Шахматная задача**\n\n"
-                        f"Рейтинг: {rating}\n"
-                        f"Темы: {themes}\n"
-                        f"Ход: {turn}\n\n"
-                        f"Введите ход в формате UCI (например: `e2e4` или `g1f3`):"
-                    )
-                    
-                    try:
-                        photo_response = requests.post(
-                            f"https://api.telegram.org/bot{BOT_TOKEN}/sendPhoto",
-                            json={
-                                "chat_id": chat_id,
-                                "photo": board_image_url,
-                                "caption": puzzle_msg,
-                                "parse_mode": "Markdown",
-                                "reply_markup": {
-                                    "inline_keyboard": [
-                                        [
-                                            {
-                                                "text": "🔗 Решить на Lichess",
-                                                "url": puzzle_url_link
-                                            }
-                                        ]
-                                    ]
-                                }
-                            },
-                            timeout=10,
-                        )
-                        if photo_response.status_code != 200:
-                            print(f"Error sending photo: status={photo_response.status_code}, response={photo_response.text}")
-                            send_telegram_message(chat_id, puzzle_msg + f"\n\n[Открыть на Lichess]({puzzle_url_link})", parse_mode="Markdown")
-                    except Exception as photo_exc:
-                        print(f"Error sending photo: {photo_exc}")
-                        send_telegram_message(chat_id, puzzle_msg + f"\n\n[Открыть на Lichess]({puzzle_url_link})", parse_mode="Markdown")
-                    
-                    log_chess_game(user_id, account["lichess_username"], puzzle_id, rating if isinstance(rating, int) else None, themes)
-                except Exception as exc:
-                    print(f"Error fetching puzzle: {exc}")
-                    send_telegram_message(
-                        chat_id,
-                        "❌ Ошибка загрузки задачи. Попробуйте позже.",
-                    )
+                send_telegram_message(chat_id, rating_msg, parse_mode="Markdown")
+        except Exception as exc:
+            print(f"Error fetching ratings: {exc}")
+            send_telegram_message(
+                chat_id,
+                "❌ Ошибка загрузки рейтингов. Попробуйте позже.",
+            )
+
+
+# /chess_stats
+@webhook_command("/chess_stats")
+def _cmd_chess_stats(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    account = get_chess_account(user_id)
+    if not account:
+        send_telegram_message(
+            chat_id,
+            "❌ Сначала привяжите Lichess аккаунт: `/chess_link <ник>`",
+            parse_mode="Markdown",
+        )
+    else:
+        send_telegram_message(
+            chat_id,
+            "🔍 Загружаю статистику...",
+        )
 
-        # /chess_history — история решённых задач
-        elif command == "/chess_history" and chat_id:
-            account = get_chess_account(user_id)
-            if not account:
+        try:
+            lichess_user = fetch_lichess_user(account["lichess_username"])
+            if not lichess_user:
                 send_telegram_message(
                     chat_id,
-                    "❌ Сначала привяжите Lichess аккаунт: `/chess_link <ник>`",
-                    parse_mode="Markdown",
+                    "❌ Не удалось загрузить данные Lichess. Попробуйте позже.",
                 )
             else:
-                try:
-                    with get_db_engine().connect() as conn:
-                        rows = conn.execute(
-                            text(
-                                "SELECT puzzle_id, puzzle_rating, puzzle_themes, solved, solved_at, created_at "
-                                "FROM chess_games WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 10"
-                            ),
-                            {"user_id": user_id},
-                        ).mappings().all()
-
-                    if not rows:
-                        send_telegram_message(
-                            chat_id,
-                            "📋 У вас пока нет истории задач. Решите первую: /puzzle",
-                        )
-                    else:
-                        coins = get_user_coins(user_id)
-                        balance = coins["balance"] if coins else 0
-                        lines = [f"📋 **История задач** ({account['lichess_username']})\n💰 Баланс: {balance} монет\n"]
-                        for r in rows:
-                            status = "✅" if r["solved"] else "⏳"
-                            rating = r["puzzle_rating"] or "?"
-                            themes = r["puzzle_themes"] or "—"
-                            link = f"https://lichess.org/training/{r['puzzle_id']}"
-                            lines.append(f"{status} [{r['puzzle_id']}]({link}) | Рейтинг: {rating} | {themes}")
-                        send_telegram_message(chat_id, "\n".join(lines), parse_mode="Markdown")
-                except Exception as exc:
-                    print(f"Error fetching chess history: {exc}")
-                    log_error("Chess", "history_query", f"chess_history user={user_id}: {exc}", f"query: chess_games WHERE user_id={user_id}")
-                    send_telegram_message(
-                        chat_id,
-                        "❌ Ошибка загрузки истории. Попробуйте позже.",
-                    )
+                title_prefix = f"{lichess_user['title']} " if lichess_user.get("title") else ""
+                perfs = lichess_user.get("perfs", {})
+                games = lichess_user.get("games", {})
+
+                total_games = games.get("total", 0)
+                win = games.get("win", 0)
+                loss = games.get("loss", 0)
+                draw = games.get("draw", 0)
+
+                winrate = round((win / total_games * 100), 1) if total_games > 0 else 0
+
+                stats_parts = []
+                stats_parts.append(f"**Всего игр:** {total_games}")
+                stats_parts.append(f"✅ **Побед:** {win} ({winrate}%)")
+                stats_parts.append(f"❌ **Поражений:** {loss}")
+                stats_parts.append(f"🤝 **Ничьих:** {draw}\n")
+
+                if "bullet" in perfs:
+                    stats_parts.append(f"🎯 **Пуля:** {perfs['bullet'].get('rating', '?')} ({perfs['bullet'].get('games', 0)} игр)")
+                if "blitz" in perfs:
+                    stats_parts.append(f"⚡ **Блиц:** {perfs['blitz'].get('rating', '?')} ({perfs['blitz'].get('games', 0)} игр)")
+                if "rapid" in perfs:
+                    stats_parts.append(f"⏱️ **Рапид:** {perfs['rapid'].get('rating', '?')} ({perfs['rapid'].get('games', 0)} игр)")
+                if "classical" in perfs:
+                    stats_parts.append(f"⏳ **Классика:** {perfs['classical'].get('rating', '?')} ({perfs['classical'].get('games', 0)} игр)")
+
+                stats_msg = (
+                    f"♟ **Статистика {title_prefix}{lichess_user['username']}**\n\n"
+                    + "\n".join(stats_parts)
+                )
+                send_telegram_message(chat_id, stats_msg, parse_mode="Markdown")
+        except Exception as exc:
+            print(f"Error fetching stats: {exc}")
+            send_telegram_message(
+                chat_id,
+                "❌ Ошибка загрузки статистики. Попробуйте позже.",
+            )
 
-        # =====================================================================
-        # Chess Module — puzzle answer handler
-        # =====================================================================
-        if chat_id and user_id in _PENDING_PUZZLES and not command.startswith("/"):
-            pending = _PENDING_PUZZLES[user_id]
-            user_move = msg_text.strip().lower()
-            # UCI move validation: 4-5 chars, letters+digits (e.g. e2e4, g1f3, e7e8q)
-            import re
-            if not re.match(r'^[a-h][1-8][a-h][1-8][qrbn]?$', user_move):
-                return jsonify({"ok": True})
-            solution = pending["solution"]
-            # Handle both string and list formats
-            if isinstance(solution, list):
-                solution_moves = solution
-            else:
-                solution_moves = solution.split()
-            
-            if solution_moves and user_move == solution_moves[0].lower():
-                # Correct move — award coins
-                del _PENDING_PUZZLES[user_id]
-                update_user_coins(user_id, 5, datetime.utcnow())
+
+# /puzzle and /chess_puzzle commands
+@webhook_command("/puzzle", "/chess_puzzle")
+def _cmd_puzzle(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    print(f"[PUZZLE] user_id={user_id}, chat_id={chat_id}")
+    account = get_chess_account(user_id)
+    print(f"[PUZZLE] account={account}")
+    if not account:
+        print("[PUZZLE] No account, sending error")
+        send_telegram_message(
+            chat_id,
+            "❌ Сначала привяжите Lichess аккаунт: `/chess_link <ник>`",
+            parse_mode="Markdown",
+        )
+    else:
+        # Check cooldown (max 1 puzzle per day) — REMOVED for testing
+        # TODO: re-enable after testing
+        now = datetime.utcnow()
+        coins_data = get_user_coins(user_id)
+
+        # Cooldown disabled — allow multiple puzzles per day
+        # if coins_data and coins_data.get("last_puzzle_at"):
+        #     last_puzzle = coins_data["last_puzzle_at"]
+        #     if hasattr(last_puzzle, 'tzinfo') and last_puzzle.tzinfo is not None:
+        #         last_puzzle = last_puzzle.replace(tzinfo=None)
+        #     from datetime import timedelta
+        #     if now - last_puzzle < timedelta(hours=24):
+        #         remaining = 24 - (now - last_puzzle).total_seconds() / 3600
+        #         send_telegram_message(
+        #             chat_id,
+        #             f"⏳ Пожалуйста, подождите {remaining:.1f} часов до следующей задачи.",
+        #         )
+        #         return
+
+        send_telegram_message(
+            chat_id,
+            "🧩 Загружаю задачу...",
+        )
+
+        try:
+            # Fetch random puzzle from Lichess (not daily — random each time)
+            puzzle_url = f"{LICHESS_API_BASE_URL}/puzzle/next"
+            headers = {"Accept": "application/json", "User-Agent": "BankBot/ChessModule"}
+            response = requests.get(puzzle_url, headers=headers, timeout=LICHESS_TIMEOUT_SECONDS)
+
+            if response.status_code != 200:
                 send_telegram_message(
                     chat_id,
-                    f"✅ **Правильно!**\n\nХод: `{solution_moves[0]}`\n💰 +5 монет",
-                    parse_mode="Markdown",
+                    "❌ Не удалось загрузить задачу. Попробуйте позже.",
                 )
-            else:
-                # Wrong move — show correct solution
-                correct = solution_moves[0] if solution_moves else "?"
-                del _PENDING_PUZZLES[user_id]
+                return
+
+            puzzle_data = response.json()
+            puzzle = puzzle_data.get("puzzle", {})
+            game = puzzle_data.get("game", {})
+
+            puzzle_id = puzzle.get("id", "unknown")
+            rating = puzzle.get("rating", "?")
+            themes = ", ".join(puzzle.get("themes", [])[:3])
+            solution = puzzle.get("solution", "")
+            initial_ply = puzzle.get("initialPly", 0)
+            puzzle_url_link = f"https://lichess.org/training/{puzzle_id}"
+
+            # Derive FEN from game PGN + initialPly
+            fen = ""
+            try:
+                import io
+                import chess.pgn
+                pgn_text = game.get("pgn", "")
+                pgn_io = io.StringIO(pgn_text)
+                pgn_game = chess.pgn.read_game(pgn_io)
+                if pgn_game:
+                    board = pgn_game.board()
+                    moves = list(pgn_game.mainline_moves())
+                    for i, move in enumerate(moves):
+                        if i >= initial_ply:
+                            break
+                        board.push(move)
+                    fen = board.fen()
+                    # Lichess board images show from white's perspective
+                    # If black to move, flip the board
+                    if board.turn == chess.BLACK:
+                        fen = board.mirror().fen()
+            except Exception as fen_exc:
+                print(f"Error deriving FEN from PGN: {fen_exc}")
+                log_error("Chess", "fen_derivation", f"FEN parse error: {fen_exc}", f"pgn={pgn_text[:80]}... initialPly={initial_ply}")
+
+            if not fen:
+                log_error("Chess", "fen_empty", "Empty FEN after derivation", f"pgn={pgn_text[:80]}... initialPly={initial_ply}")
                 send_telegram_message(
                     chat_id,
-                    f"❌ **Неверно.**\n\nПравильный ход: `{correct}`\nПопробуйте следующую задачу: /puzzle",
-                    parse_mode="Markdown",
+                    "❌ Не удалось отобразить доску. Попробуйте позже.",
                 )
-        
-        # =====================================================================
-        # GD Module — submit follow-up
-        # =====================================================================
-        if command == "" and chat_id:
-            # GD submit — check pending_media submission in DB (survives cold starts)
-            pending_sub = None
-            try:
-                with get_db_engine().connect() as conn:
-                    row = conn.execute(
-                        text("SELECT id, level_name FROM submissions WHERE user_id = :uid AND status = 'pending_media' ORDER BY submitted_at DESC LIMIT 1"),
-                        {"uid": user_id},
-                    ).mappings().first()
-                    if row:
-                        pending_sub = dict(row)
-            except Exception as exc:
-                print(f"Error fetching pending submission: {exc}")
-
-            if pending_sub:
-                sub_id = pending_sub["id"]
-                level_name = pending_sub["level_name"]
-                media_file_id = None
-                media_type = None
-                if message.get("photo"):
-                    media_file_id = message["photo"][-1].get("file_id", "")
-                    media_type = "photo"
-                elif message.get("video"):
-                    media_file_id = message["video"].get("file_id", "")
-                    media_type = "video"
-                elif message.get("document"):
-                    media_file_id = message["document"].get("file_id", "")
-                    media_type = "document"
-                else:
-                    send_telegram_message(chat_id, "❌ Пожалуйста, отправьте видео или фото с прохождением.")
-                    return jsonify({"ok": True})
-                try:
-                    with get_db_engine().connect() as conn:
-                        conn.execute(
-                            text("UPDATE submissions SET media_file_id = :mfid, media_type = :mt, status = 'pending', submitted_at = CURRENT_TIMESTAMP WHERE id = :sid"),
-                            {"mfid": media_file_id, "mt": media_type, "sid": sub_id},
-                        )
-                        conn.commit()
-                    send_telegram_message(
-                        chat_id,
-                        f"✅ **Заявка отправлена!**\n\nУровень: **{level_name}**\nСтатус: **Ожидает модерации**\n\nВаша заявка будет рассмотрена администратором.",
-                        parse_mode="Markdown",
-                    )
-                except Exception as exc:
-                    print(f"Error updating submission #{sub_id}: {exc}")
-                    send_telegram_message(chat_id, "❌ Ошибка при сохранении заявки. Убедитесь, что база данных настроена правильно, и попробуйте ещё раз.")
-                    log_error("GD", "submission_save", f"GD submit save failed user={user_id}", "INSERT INTO submissions failed")
-                return jsonify({"ok": True})
+                return
 
-            # Legacy in-memory fallback
-            submit_state = _GD_SUBMIT_STATE.get(user_id)
-            if submit_state and submit_state.get("step") == "awaiting_media":
-                level_name = submit_state.get("level_name", "")
-                media_file_id = None
-                media_type = None
-                if message.get("photo"):
-                    media_file_id = message["photo"][-1].get("file_id", "")
-                    media_type = "photo"
-                elif message.get("video"):
-                    media_file_id = message["video"].get("file_id", "")
-                    media_type = "video"
-                elif message.get("document"):
-                    media_file_id = message["document"].get("file_id", "")
-                    media_type = "document"
-                else:
-                    send_telegram_message(chat_id, "❌ Пожалуйста, отправьте видео или фото с прохождением.")
-                    return jsonify({"ok": True})
-                sub_id = create_gd_submission(user_id, name, level_name, media_file_id, media_type)
-                _GD_SUBMIT_STATE.pop(user_id, None)
-                if sub_id:
-                    send_telegram_message(
-                        chat_id,
-                        f"✅ **Заявка отправлена!**\n\nУровень: **{level_name}**\nСтатус: **Ожидает модерации**\n\nВаша заявка будет рассмотрена администратором.",
-                        parse_mode="Markdown",
-                    )
-                else:
-                    send_telegram_message(
-                        chat_id,
-                        "❌ Ошибка при сохранении заявки. Убедитесь, что база данных настроена правильно, и попробуйте ещё раз.",
-                    )
-                return jsonify({"ok": True})
+            # Store pending puzzle for this user
+            _PENDING_PUZZLES[user_id] = {
+                "puzzle_id": puzzle_id,
+                "solution": solution,
+                "rating": rating,
+                "themes": themes,
+                "chat_id": chat_id,
+                "username": account["lichess_username"],
+                "initial_ply": initial_ply,
+            }
+
+            board_image_url = f"https://lichess1.org/export/fen.gif?fen={fen.replace(' ', '_')}&theme=brown&piece=cburnett"
+
+            turn = "Белых" if initial_ply % 2 == 0 else "Чёрных"
+            puzzle_msg = (
+                f"🧩 **Шахматная задача**\n\n"
+                f"Рейтинг: {rating}\n"
+                f"Темы: {themes}\n"
+                f"Ход: {turn}\n\n"
+                f"Введите ход в формате UCI (например: `e2e4` или `g1f3`):"
+            )
+
+            try:
+                photo_response = requests.post(
+                    f"https://api.telegram.org/bot{BOT_TOKEN}/sendPhoto",
+                    json={
+                        "chat_id": chat_id,
+                        "photo": board_image_url,
+                        "caption": puzzle_msg,
+                        "parse_mode": "Markdown",
+                        "reply_markup": {
+                            "inline_keyboard": [
+                                [
+                                    {
+                                        "text": "🔗 Решить на Lichess",
+                                        "url": puzzle_url_link
+                                    }
+                                ]
+                            ]
+                        }
+                    },
+                    timeout=10,
+                )
+                if photo_response.status_code != 200:
+                    print(f"Error sending photo: status={photo_response.status_code}, response={photo_response.text}")
+                    send_telegram_message(chat_id, puzzle_msg + f"\n\n[Открыть на Lichess]({puzzle_url_link})", parse_mode="Markdown")
+            except Exception as photo_exc:
+                print(f"Error sending photo: {photo_exc}")
+                send_telegram_message(chat_id, puzzle_msg + f"\n\n[Открыть на Lichess]({puzzle_url_link})", parse_mode="Markdown")
+
+            log_chess_game(user_id, account["lichess_username"], puzzle_id, rating if isinstance(rating, int) else None, themes)
+        except Exception as exc:
+            print(f"Error fetching puzzle: {exc}")
+            send_telegram_message(
+                chat_id,
+                "❌ Ошибка загрузки задачи. Попробуйте позже.",
+            )
 
-        # =====================================================================
-        # GD Module — commands
-        # =====================================================================
 
-        # /gd — help
-        elif command == "/gd" and chat_id:
+# /chess_history — история решённых задач
+@webhook_command("/chess_history")
+def _cmd_chess_history(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    account = get_chess_account(user_id)
+    if not account:
+        send_telegram_message(
+            chat_id,
+            "❌ Сначала привяжите Lichess аккаунт: `/chess_link <ник>`",
+            parse_mode="Markdown",
+        )
+    else:
+        try:
+            with get_db_engine().connect() as conn:
+                rows = conn.execute(
+                    text(
+                        "SELECT puzzle_id, puzzle_rating, puzzle_themes, solved, solved_at, created_at "
+                        "FROM chess_games WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 10"
+                    ),
+                    {"user_id": user_id},
+                ).mappings().all()
+
+            if not rows:
+                send_telegram_message(
+                    chat_id,
+                    "📋 У вас пока нет истории задач. Решите первую: /puzzle",
+                )
+            else:
+                coins = get_user_coins(user_id)
+                balance = coins["balance"] if coins else 0
+                lines = [f"📋 **История задач** ({account['lichess_username']})\n💰 Баланс: {balance} монет\n"]
+                for r in rows:
+                    status = "✅" if r["solved"] else "⏳"
+                    rating = r["puzzle_rating"] or "?"
+                    themes = r["puzzle_themes"] or "—"
+                    link = f"https://lichess.org/training/{r['puzzle_id']}"
+                    lines.append(f"{status} [{r['puzzle_id']}]({link}) | Рейтинг: {rating} | {themes}")
+                send_telegram_message(chat_id, "\n".join(lines), parse_mode="Markdown")
+        except Exception as exc:
+            print(f"Error fetching chess history: {exc}")
+            log_error("Chess", "history_query", f"chess_history user={user_id}: {exc}", f"query: chess_games WHERE user_id={user_id}")
             send_telegram_message(
                 chat_id,
-                "🎮 **Geometry Dash Module**\n\n"
-                "**Команды:**\n"
-                "`/gd_user <ник>` — инфо об игроке в GD\n"
-                "`/gd_level <id/название>` — инфо об уровне GD\n"
-                "`/gd_leaderboard` — топ уровней\n"
-                "`/my_stats` — моя статистика\n"
-                "`/player_stats @user` — статистика игрока\n"
-                "`/submit <название>` — отправить прохождение\n"
-                "`/moderate` — модерация (админ)\n"
-                "`/add_level <название> <позиция>` — добавить уровень (админ)\n"
-                "`/set_level_position <id> <позиция>` — изменить позицию (админ)",
-                parse_mode="Markdown",
+                "❌ Ошибка загрузки истории. Попробуйте позже.",
             )
 
-        # /gd_user <username>
-        elif command == "/gd_user" and chat_id:
-            args = msg_text.split()[1:] if msg_text else []
-            if not args:
-                send_telegram_message(chat_id, "❌ Использование: `/gd_user <ник>`\nПример: `/gd_user Riot`", parse_mode="Markdown")
+
+# GD Module — commands
+# /gd — help
+@webhook_command("/gd")
+def _cmd_gd(ctx: WebhookContext) -> None:
+    chat_id = ctx.chat_id
+    send_telegram_message(
+        chat_id,
+        "🎮 **Geometry Dash Module**\n\n"
+        "**Команды:**\n"
+        "`/gd_user <ник>` — инфо об игроке в GD\n"
+        "`/gd_level <id/название>` — инфо об уровне GD\n"
+        "`/gd_leaderboard` — топ уровней\n"
+        "`/my_stats` — моя статистика\n"
+        "`/player_stats @user` — статистика игрока\n"
+        "`/submit <название>` — отправить прохождение\n"
+        "`/moderate` — модерация (админ)\n"
+        "`/add_level <название> <позиция>` — добавить уровень (админ)\n"
+        "`/set_level_position <id> <позиция>` — изменить позицию (админ)",
+        parse_mode="Markdown",
+    )
+
+
+# /gd_user <username>
+@webhook_command("/gd_user")
+def _cmd_gd_user(ctx: WebhookContext) -> None:
+    msg_text, chat_id = ctx.msg_text, ctx.chat_id
+    args = msg_text.split()[1:] if msg_text else []
+    if not args:
+        send_telegram_message(chat_id, "❌ Использование: `/gd_user <ник>`\nПример: `/gd_user Riot`", parse_mode="Markdown")
+    else:
+        username = args[0].strip()
+        send_telegram_message(chat_id, f"🔍 Ищу игрока **{username}** в Geometry Dash...", parse_mode="Markdown")
+        try:
+            data = fetch_gd_user(username)
+            if not data:
+                send_telegram_message(chat_id, f"❌ Игрок **{username}** не найден.", parse_mode="Markdown")
             else:
-                username = args[0].strip()
-                send_telegram_message(chat_id, f"🔍 Ищу игрока **{username}** в Geometry Dash...", parse_mode="Markdown")
-                try:
-                    data = fetch_gd_user(username)
-                    if not data:
-                        send_telegram_message(chat_id, f"❌ Игрок **{username}** не найден.", parse_mode="Markdown")
-                    else:
-                        send_telegram_message(chat_id, format_gd_user_stats(data), parse_mode="Markdown")
-                except Exception as exc:
-                    print(f"gd_user error: {exc}")
-                    send_telegram_message(chat_id, "❌ Ошибка получения данных GD.")
-                    log_error("GD", "gd_api", f"GD API user lookup failed: {exc}", f"username={msg_text.split()[1] if len(msg_text.split()) > 1 else '?'}")
-
-        # /gd_level <id или название>
-        elif command == "/gd_level" and chat_id:
-            args = msg_text.split()[1:] if msg_text else []
-            if not args:
-                send_telegram_message(chat_id, "❌ Использование: `/gd_level <ID или название>`\nПример: `/gd_level 10565740` или `/gd_level Bloodbath`", parse_mode="Markdown")
+                send_telegram_message(chat_id, format_gd_user_stats(data), parse_mode="Markdown")
+        except Exception as exc:
+            print(f"gd_user error: {exc}")
+            send_telegram_message(chat_id, "❌ Ошибка получения данных GD.")
+            log_error("GD", "gd_api", f"GD API user lookup failed: {exc}", f"username={msg_text.split()[1] if len(msg_text.split()) > 1 else '?'}")
+
+
+# /gd_level <id или название>
+@webhook_command("/gd_level")
+def _cmd_gd_level(ctx: WebhookContext) -> None:
+    msg_text, chat_id = ctx.msg_text, ctx.chat_id
+    args = msg_text.split()[1:] if msg_text else []
+    if not args:
+        send_telegram_message(chat_id, "❌ Использование: `/gd_level <ID или название>`\nПример: `/gd_level 10565740` или `/gd_level Bloodbath`", parse_mode="Markdown")
+    else:
+        query = " ".join(args).strip()
+        try:
+            level_id = int(query)
+            send_telegram_message(chat_id, f"🔍 Ищу уровень с ID **{level_id}**...", parse_mode="Markdown")
+            data = fetch_gd_level(level_id)
+        except ValueError:
+            send_telegram_message(chat_id, f"🔍 Ищу уровень **{query}**...", parse_mode="Markdown")
+            data = search_gd_level(query)
+        try:
+            if not data:
+                send_telegram_message(chat_id, f"❌ Уровень **{query}** не найден.", parse_mode="Markdown")
             else:
-                query = " ".join(args).strip()
-                try:
-                    level_id = int(query)
-                    send_telegram_message(chat_id, f"🔍 Ищу уровень с ID **{level_id}**...", parse_mode="Markdown")
-                    data = fetch_gd_level(level_id)
-                except ValueError:
-                    send_telegram_message(chat_id, f"🔍 Ищу уровень **{query}**...", parse_mode="Markdown")
-                    data = search_gd_level(query)
-                try:
-                    if not data:
-                        send_telegram_message(chat_id, f"❌ Уровень **{query}** не найден.", parse_mode="Markdown")
-                    else:
-                        send_telegram_message(chat_id, format_gd_level_info(data), parse_mode="Markdown")
-                except Exception as exc:
-                    print(f"gd_level error: {exc}")
-                    send_telegram_message(chat_id, "❌ Ошибка получения данных уровня.")
-                    log_error("GD", "gd_level_api", f"GD API level lookup failed: {exc}", f"query={msg_text.split()[1] if len(msg_text.split()) > 1 else '?'}")
-
-        # /leaderboard — top by balance
-        elif command == "/leaderboard" and chat_id:
-            try:
-                top = get_top_balances(10)
-                if not top:
-                    send_telegram_message(chat_id, "📊 Таблица лидеров пока пуста.")
-                else:
-                    lines = ["🏆 **Таблица лидеров по монетам**\n"]
-                    for i, u in enumerate(top, 1):
-                        name = u["first_name"] if u["first_name"] != "—" else u["username"]
-                        lines.append(f"{i}. **{name}** — 💰 {u['balance']:,} монет")
-                    send_telegram_message(chat_id, "\n".join(lines), parse_mode="Markdown")
-            except Exception as exc:
-                print(f"leaderboard error: {exc}")
-                send_telegram_message(chat_id, "❌ Ошибка при загрузке лидеров.")
-                log_error("GD", "leaderboard", f"Leaderboard load failed: {exc}", "get_top_balances or get_gd_leaderboard query failed")
-
-        # /gd_leaderboard — GD уровень топ
-        elif command == "/gd_leaderboard" and chat_id:
-            levels = get_gd_leaderboard(20)
-            if not levels:
-                send_telegram_message(chat_id, "📊 Топ уровней пуст. Администратор ещё не добавил уровни.")
+                send_telegram_message(chat_id, format_gd_level_info(data), parse_mode="Markdown")
+        except Exception as exc:
+            print(f"gd_level error: {exc}")
+            send_telegram_message(chat_id, "❌ Ошибка получения данных уровня.")
+            log_error("GD", "gd_level_api", f"GD API level lookup failed: {exc}", f"query={msg_text.split()[1] if len(msg_text.split()) > 1 else '?'}")
+
+
+# /leaderboard — top by balance
+@webhook_command("/leaderboard")
+def _cmd_leaderboard(ctx: WebhookContext) -> None:
+    chat_id = ctx.chat_id
+    try:
+        top = get_top_balances(10)
+        if not top:
+            send_telegram_message(chat_id, "📊 Таблица лидеров пока пуста.")
+        else:
+            lines = ["🏆 **Таблица лидеров по монетам**\n"]
+            for i, u in enumerate(top, 1):
+                name = u["first_name"] if u["first_name"] != "—" else u["username"]
+                lines.append(f"{i}. **{name}** — 💰 {u['balance']:,} монет")
+            send_telegram_message(chat_id, "\n".join(lines), parse_mode="Markdown")
+    except Exception as exc:
+        print(f"leaderboard error: {exc}")
+        send_telegram_message(chat_id, "❌ Ошибка при загрузке лидеров.")
+        log_error("GD", "leaderboard", f"Leaderboard load failed: {exc}", "get_top_balances or get_gd_leaderboard query failed")
+
+
+# /gd_leaderboard — GD уровень топ
+@webhook_command("/gd_leaderboard")
+def _cmd_gd_leaderboard(ctx: WebhookContext) -> None:
+    chat_id = ctx.chat_id
+    levels = get_gd_leaderboard(20)
+    if not levels:
+        send_telegram_message(chat_id, "📊 Топ уровней пуст. Администратор ещё не добавил уровни.")
+    else:
+        lines = ["🏆 Geometry Dash — Топ-20 уровней\n"]
+        for lv in levels:
+            diff = lv.get("difficulty", "Unknown")
+            completers_str = lv.get("completers") or "—"
+            lines.append(f"#{lv['position']} {lv['name']}\n   💀 {diff}\n   ✅ Прохождений: {lv['completions']}\n   👤 {completers_str}")
+        lines.append("\nИспользуйте /my_stats для просмотра своей статистики")
+        send_telegram_message(chat_id, "\n".join(lines))
+
+
+# /my_stats
+@webhook_command("/my_stats")
+def _cmd_my_stats(ctx: WebhookContext) -> None:
+    chat_id, user_id, name = ctx.chat_id, ctx.user_id, ctx.name
+    try:
+        stats = get_gd_player_stats(user_id)
+        if not stats:
+            send_telegram_message(chat_id, "📊 У вас пока нет статистики.\n\nОтправьте своё первое прохождение через /submit!")
+        else:
+            sc = get_gd_submission_counts(user_id)
+            hardest = get_gd_hardest_level_name(user_id)
+            completed = get_gd_user_completions_count(user_id)
+            lines = [
+                f"📊 **Статистика {name}**\n",
+                f"🏆 **Хардест:** {hardest}",
+                f"✅ **Подтверждённых прохождений:** {stats.get('total_approved', 0)}",
+                f"📝 **Всего заявок:** {sc['total']}",
+                f"⏳ **На модерации:** {sc['pending']}",
+                f"❌ **Отклонено:** {sc['rejected']}",
+                f"🎮 **Пройдено уровней:** {completed}",
+            ]
+            if sc["total"] > 0:
+                rate = (sc["approved"] / sc["total"]) * 100
+                lines.append(f"📈 **Процент одобрения:** {rate:.1f}%")
+            send_telegram_message(chat_id, "\n".join(lines), parse_mode="Markdown")
+    except Exception as exc:
+        print(f"my_stats error: {exc}")
+        send_telegram_message(chat_id, "❌ Ошибка при загрузке статистики.")
+        log_error("GD", "my_stats", f"my_stats load failed user={user_id}: {exc}", "get_gd_player_stats or get_gd_submission_counts failed")
+
+
+# /player_stats @username
+@webhook_command("/player_stats")
+def _cmd_player_stats(ctx: WebhookContext) -> None:
+    msg_text, chat_id = ctx.msg_text, ctx.chat_id
+    args = msg_text.split()[1:] if msg_text else []
+    if not args:
+        send_telegram_message(chat_id, "❌ Укажите пользователя: `/player_stats @username`", parse_mode="Markdown")
+    else:
+        target = args[0].lstrip("@")
+        try:
+            with get_db_engine().connect() as conn:
+                target_user = conn.execute(
+                    text("SELECT telegram_id FROM users WHERE username ILIKE :un LIMIT 1"),
+                    {"un": target},
+                ).mappings().first()
+            if not target_user:
+                send_telegram_message(chat_id, f"📊 Пользователь **{target}** не найден.", parse_mode="Markdown")
             else:
-                lines = ["🏆 Geometry Dash — Топ-20 уровней\n"]
-                for lv in levels:
-                    diff = lv.get("difficulty", "Unknown")
-                    completers_str = lv.get("completers") or "—"
-                    lines.append(f"#{lv['position']} {lv['name']}\n   💀 {diff}\n   ✅ Прохождений: {lv['completions']}\n   👤 {completers_str}")
-                lines.append("\nИспользуйте /my_stats для просмотра своей статистики")
-                send_telegram_message(chat_id, "\n".join(lines))
-
-        # /my_stats
-        elif command == "/my_stats" and chat_id:
-            try:
-                stats = get_gd_player_stats(user_id)
+                target_id = target_user["telegram_id"]
+                stats = get_gd_player_stats(target_id)
                 if not stats:
-                    send_telegram_message(chat_id, "📊 У вас пока нет статистики.\n\nОтправьте своё первое прохождение через /submit!")
+                    send_telegram_message(chat_id, f"📊 У пользователя **{target}** пока нет статистики GD.", parse_mode="Markdown")
                 else:
-                    sc = get_gd_submission_counts(user_id)
-                    hardest = get_gd_hardest_level_name(user_id)
-                    completed = get_gd_user_completions_count(user_id)
+                    hardest = get_gd_hardest_level_name(target_id)
+                    completed = get_gd_user_completions_count(target_id)
                     lines = [
-                        f"📊 **Статистика {name}**\n",
+                        "📊 **Статистика игрока**\n",
                         f"🏆 **Хардест:** {hardest}",
                         f"✅ **Подтверждённых прохождений:** {stats.get('total_approved', 0)}",
-                        f"📝 **Всего заявок:** {sc['total']}",
-                        f"⏳ **На модерации:** {sc['pending']}",
-                        f"❌ **Отклонено:** {sc['rejected']}",
                         f"🎮 **Пройдено уровней:** {completed}",
                     ]
-                    if sc["total"] > 0:
-                        rate = (sc["approved"] / sc["total"]) * 100
-                        lines.append(f"📈 **Процент одобрения:** {rate:.1f}%")
                     send_telegram_message(chat_id, "\n".join(lines), parse_mode="Markdown")
-            except Exception as exc:
-                print(f"my_stats error: {exc}")
-                send_telegram_message(chat_id, "❌ Ошибка при загрузке статистики.")
-                log_error("GD", "my_stats", f"my_stats load failed user={user_id}: {exc}", "get_gd_player_stats or get_gd_submission_counts failed")
-
-        # /player_stats @username
-        elif command == "/player_stats" and chat_id:
-            args = msg_text.split()[1:] if msg_text else []
-            if not args:
-                send_telegram_message(chat_id, "❌ Укажите пользователя: `/player_stats @username`", parse_mode="Markdown")
-            else:
-                target = args[0].lstrip("@")
-                try:
-                    with get_db_engine().connect() as conn:
-                        target_user = conn.execute(
-                            text("SELECT telegram_id FROM users WHERE username ILIKE :un LIMIT 1"),
-                            {"un": target},
-                        ).mappings().first()
-                    if not target_user:
-                        send_telegram_message(chat_id, f"📊 Пользователь **{target}** не найден.", parse_mode="Markdown")
-                    else:
-                        target_id = target_user["telegram_id"]
-                        stats = get_gd_player_stats(target_id)
-                        if not stats:
-                            send_telegram_message(chat_id, f"📊 У пользователя **{target}** пока нет статистики GD.", parse_mode="Markdown")
-                        else:
-                            hardest = get_gd_hardest_level_name(target_id)
-                            completed = get_gd_user_completions_count(target_id)
-                            lines = [
-                                "📊 **Статистика игрока**\n",
-                                f"🏆 **Хардест:** {hardest}",
-                                f"✅ **Подтверждённых прохождений:** {stats.get('total_approved', 0)}",
-                                f"🎮 **Пройдено уровней:** {completed}",
-                            ]
-                            send_telegram_message(chat_id, "\n".join(lines), parse_mode="Markdown")
-                except Exception as exc:
-                    print(f"player_stats error: {exc}")
-                    send_telegram_message(chat_id, "❌ Ошибка при загрузке статистики игрока.")
-                    log_error("GD", "player_stats", f"player_stats load failed: {exc}", f"query player_stats for user in chat {chat_id}")
-
-        # /submit <level_name>
-        elif command == "/submit" and chat_id:
-            args = msg_text.split(maxsplit=1)
-            if len(args) < 2:
-                send_telegram_message(chat_id, "❌ Использование: `/submit <название уровня>`\nПример: `/submit Tartarus`", parse_mode="Markdown")
-            else:
-                level_name = args[1].strip()
-                # Create placeholder submission (no media yet)
-                sub_id = create_gd_submission(user_id, name, level_name, "", "")
-                if not sub_id:
-                    send_telegram_message(
-                        chat_id,
-                        "❌ Ошибка при создании заявки. Попробуйте позже.",
-                    )
-                    return jsonify({"ok": True})
-                _GD_SUBMIT_STATE[user_id] = {"step": "awaiting_media", "level_name": level_name}
-                send_telegram_message(
-                    chat_id,
-                    f"🎮 **Geometry Dash — Отправка прохождения**\n\nУровень: **{level_name}**\n\nОтправьте видео или фото с прохождением уровня:",
-                )
-                return jsonify({"ok": True})
+        except Exception as exc:
+            print(f"player_stats error: {exc}")
+            send_telegram_message(chat_id, "❌ Ошибка при загрузке статистики игрока.")
+            log_error("GD", "player_stats", f"player_stats load failed: {exc}", f"query player_stats for user in chat {chat_id}")
+
+
+# /submit <level_name>
+@webhook_command("/submit")
+def _cmd_submit(ctx: WebhookContext) -> None:
+    msg_text, chat_id, user_id, name = ctx.msg_text, ctx.chat_id, ctx.user_id, ctx.name
+    args = msg_text.split(maxsplit=1)
+    if len(args) < 2:
+        send_telegram_message(chat_id, "❌ Использование: `/submit <название уровня>`\nПример: `/submit Tartarus`", parse_mode="Markdown")
+    else:
+        level_name = args[1].strip()
+        # Create placeholder submission (no media yet)
+        sub_id = create_gd_submission(user_id, name, level_name, "", "")
+        if not sub_id:
+            send_telegram_message(
+                chat_id,
+                "❌ Ошибка при создании заявки. Попробуйте позже.",
+            )
+            return
+        _GD_SUBMIT_STATE[user_id] = {"step": "awaiting_media", "level_name": level_name}
+        send_telegram_message(
+            chat_id,
+            f"🎮 **Geometry Dash — Отправка прохождения**\n\nУровень: **{level_name}**\n\nОтправьте видео или фото с прохождением уровня:",
+        )
+        return
 
-        # /moderate (admin only)
-        elif command == "/moderate" and chat_id:
-            if not check_admin(user_id):
-                send_telegram_message(chat_id, "🔒 Нет прав администратора")
-            else:
-                try:
-                    submissions, total = get_gd_pending_submissions(0, 5)
-                    if not submissions:
-                        send_telegram_message(chat_id, "✅ Все заявки обработаны! Новых заявок нет.")
-                    else:
-                        total_pages = (total + 4) // 5
-                        lines = ["🎮 **Geometry Dash — Модерация заявок**"]
-                        lines.append(f"Страница 1/{total_pages} ({total} заявок)\n")
-                        for s in submissions:
-                            ts_str = str(s.get("submitted_at", ""))[:19] if s.get("submitted_at") else ""
-                            lines.append(
-                                f"📝 Заявка #{s['id']}\n"
-                                f"👤 Пользователь: {s.get('username', s['user_id'])}\n"
-                                f"🏆 Уровень: **{s['level_name']}**\n"
-                                f"📅 Отправлено: {ts_str}\n"
-                                f"📄 Тип: {s.get('media_type', 'media')}\n"
-                            )
-                        inline_kb = []
-                        if total_pages > 1:
-                            inline_kb.append([{"text": "➡️ Вперёд", "callback_data": "gd_moderate_page_1"}])
-                        inline_kb.append([
-                            {"text": "✅ Подтвердить", "callback_data": f"gd_moderate_approve_{submissions[0]['id']}"},
-                            {"text": "❌ Отклонить", "callback_data": f"gd_moderate_reject_{submissions[0]['id']}"},
-                        ])
-                        _GD_MODERATE_STATE[chat_id] = 0
-                        send_telegram_message(chat_id, "\n".join(lines), parse_mode="Markdown", reply_markup={"inline_keyboard": inline_kb})
-                except Exception as exc:
-                    print(f"moderate error: {exc}")
-                    send_telegram_message(chat_id, "❌ Ошибка при загрузке заявок. Попробуйте позже.")
-
-        # /add_level <name> <position> (admin only)
-        elif command == "/add_level" and chat_id:
-            if not check_admin(user_id):
-                send_telegram_message(chat_id, "🔒 Нет прав администратора")
-            else:
-                args = msg_text.split()
-                if len(args) < 3:
-                    send_telegram_message(chat_id, "❌ Использование: `/add_level <название> <позиция>`\nПример: `/add_level Tartarus 1`", parse_mode="Markdown")
-                else:
-                    try:
-                        pos = int(args[-1])
-                        name = " ".join(args[1:-1])
-                        difficulty = get_gd_difficulty_name(name)
-                        if add_gd_level(name, pos, difficulty):
-                            send_telegram_message(chat_id, f"✅ Уровень **{name}** добавлен на позицию {pos}.", parse_mode="Markdown")
-                        else:
-                            send_telegram_message(chat_id, "❌ Ошибка при добавлении уровня.")
-                    except ValueError:
-                        send_telegram_message(chat_id, "❌ Позиция должна быть числом.")
-
-        # /set_level_position <id> <pos> (admin only)
-        elif command == "/set_level_position" and chat_id:
-            if not check_admin(user_id):
-                send_telegram_message(chat_id, "🔒 Нет прав администратора")
+
+# /moderate (admin only)
+@webhook_command("/moderate")
+def _cmd_moderate(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    if not check_admin(user_id):
+        send_telegram_message(chat_id, "🔒 Нет прав администратора")
+    else:
+        try:
+            submissions, total = get_gd_pending_submissions(0, 5)
+            if not submissions:
+                send_telegram_message(chat_id, "✅ Все заявки обработаны! Новых заявок нет.")
             else:
-                args = msg_text.split()
-                if len(args) < 3:
-                    send_telegram_message(chat_id, "❌ Использование: `/set_level_position <id> <позиция>`\nПример: `/set_level_position 1 5`", parse_mode="Markdown")
-                else:
-                    try:
-                        lid = int(args[1])
-                        pos = int(args[2])
-                        if set_gd_level_position(lid, pos):
-                            send_telegram_message(chat_id, f"✅ Позиция уровня #{lid} изменена на {pos}.")
-                        else:
-                            send_telegram_message(chat_id, "❌ Ошибка при изменении позиции уровня.")
-                    except ValueError:
-                        send_telegram_message(chat_id, "❌ ID и позиция должны быть числами.")
-
-        # ========== Universe Module ==========
-        elif command == "/infect" and chat_id:
-            try:
-                with get_db_engine().connect() as conn:
-                    existing = conn.execute(
-                        text("SELECT virus_type, infected_at FROM infection_status WHERE user_id = :uid"),
-                        {"uid": user_id},
-                    ).mappings().first()
-                    if existing and existing["infected_at"]:
-                        infected_at = existing["infected_at"]
-                        if hasattr(infected_at, "tzinfo") and infected_at.tzinfo is None:
-                            from datetime import timezone
-                            infected_at = infected_at.replace(tzinfo=timezone.utc)
-                        if (datetime.now(timezone.utc) - infected_at) < timedelta(hours=24):
-                            send_telegram_message(
-                                chat_id,
-                                f"🦠 Вы уже заражены «{existing['virus_type']}»!\n"
-                                f"Попробуйте `/tea` для облегчения.",
-                                parse_mode="Markdown",
-                            )
-                            return jsonify({"ok": True})
-                    virus = random.choice(["олеговирус", "LTL-паразит"])
-                    symptoms_oleg = [
-                        "кхм-кхм в каждом предложении",
-                        "непреодолимое желание писать манифесты",
-                        "постоянная потребность поправлять других",
-                    ]
-                    symptoms_ltl = [
-                        "непонятные вспышки смеха",
-                        "желание пить чай 24/7",
-                        "странные байты в голове",
-                    ]
-                    symptoms = random.choice(symptoms_oleg if virus == "олеговирус" else symptoms_ltl)
-                    conn.execute(
-                        text("""
-                            INSERT INTO infection_status (user_id, virus_type, infected_at)
-                            VALUES (:uid, :vt, NOW())
-                            ON CONFLICT (user_id) DO UPDATE SET virus_type = :vt, infected_at = NOW()
-                        """),
-                        {"uid": user_id, "vt": virus},
+                total_pages = (total + 4) // 5
+                lines = ["🎮 **Geometry Dash — Модерация заявок**"]
+                lines.append(f"Страница 1/{total_pages} ({total} заявок)\n")
+                for s in submissions:
+                    ts_str = str(s.get("submitted_at", ""))[:19] if s.get("submitted_at") else ""
+                    lines.append(
+                        f"📝 Заявка #{s['id']}\n"
+                        f"👤 Пользователь: {s.get('username', s['user_id'])}\n"
+                        f"🏆 Уровень: **{s['level_name']}**\n"
+                        f"📅 Отправлено: {ts_str}\n"
+                        f"📄 Тип: {s.get('media_type', 'media')}\n"
                     )
-                    conn.commit()
-                emoji = "🦠" if virus == "олеговирус" else "🧬"
-                send_telegram_message(
-                    chat_id,
-                    f"{emoji} Вы заражены «{virus}»!\n"
-                    f"Симптомы: {symptoms}\n\n"
-                    f"Используйте `/tea` для облегчения.",
-                    parse_mode="Markdown",
-                )
-            except Exception as exc:
-                print(f"[UNIVERSE] /infect error: {exc}")
-                send_telegram_message(chat_id, "❌ Ошибка при заражении.")
+                inline_kb = []
+                if total_pages > 1:
+                    inline_kb.append([{"text": "➡️ Вперёд", "callback_data": "gd_moderate_page_1"}])
+                inline_kb.append([
+                    {"text": "✅ Подтвердить", "callback_data": f"gd_moderate_approve_{submissions[0]['id']}"},
+                    {"text": "❌ Отклонить", "callback_data": f"gd_moderate_reject_{submissions[0]['id']}"},
+                ])
+                _GD_MODERATE_STATE[chat_id] = 0
+                send_telegram_message(chat_id, "\n".join(lines), parse_mode="Markdown", reply_markup={"inline_keyboard": inline_kb})
+        except Exception as exc:
+            print(f"moderate error: {exc}")
+            send_telegram_message(chat_id, "❌ Ошибка при загрузке заявок. Попробуйте позже.")
+
+
+# /add_level <name> <position> (admin only)
+@webhook_command("/add_level")
+def _cmd_add_level(ctx: WebhookContext) -> None:
+    msg_text, chat_id, user_id = ctx.msg_text, ctx.chat_id, ctx.user_id
+    if not check_admin(user_id):
+        send_telegram_message(chat_id, "🔒 Нет прав администратора")
+    else:
+        args = msg_text.split()
+        if len(args) < 3:
+            send_telegram_message(chat_id, "❌ Использование: `/add_level <название> <позиция>`\nПример: `/add_level Tartarus 1`", parse_mode="Markdown")
+        else:
+            try:
+                pos = int(args[-1])
+                name = " ".join(args[1:-1])
+                difficulty = get_gd_difficulty_name(name)
+                if add_gd_level(name, pos, difficulty):
+                    send_telegram_message(chat_id, f"✅ Уровень **{name}** добавлен на позицию {pos}.", parse_mode="Markdown")
+                else:
+                    send_telegram_message(chat_id, "❌ Ошибка при добавлении уровня.")
+            except ValueError:
+                send_telegram_message(chat_id, "❌ Позиция должна быть числом.")
+
 
-        elif command == "/tea" and chat_id:
+# /set_level_position <id> <pos> (admin only)
+@webhook_command("/set_level_position")
+def _cmd_set_level_position(ctx: WebhookContext) -> None:
+    msg_text, chat_id, user_id = ctx.msg_text, ctx.chat_id, ctx.user_id
+    if not check_admin(user_id):
+        send_telegram_message(chat_id, "🔒 Нет прав администратора")
+    else:
+        args = msg_text.split()
+        if len(args) < 3:
+            send_telegram_message(chat_id, "❌ Использование: `/set_level_position <id> <позиция>`\nПример: `/set_level_position 1 5`", parse_mode="Markdown")
+        else:
             try:
-                with get_db_engine().connect() as conn:
-                    row = conn.execute(
-                        text("SELECT virus_type, tea_cooldown_until FROM infection_status WHERE user_id = :uid"),
-                        {"uid": user_id},
-                    ).mappings().first()
-                    if not row or not row["virus_type"]:
-                        send_telegram_message(chat_id, "☕ Вы не заражены. Чай и так поможет!")
-                        return jsonify({"ok": True})
-                    if row["tea_cooldown_until"]:
-                        cooldown = row["tea_cooldown_until"]
-                        if hasattr(cooldown, "tzinfo") and cooldown.tzinfo is None:
-                            from datetime import timezone
-                            cooldown = cooldown.replace(tzinfo=timezone.utc)
-                        if datetime.now(timezone.utc) < cooldown:
-                            remaining = (cooldown - datetime.now(timezone.utc)).seconds // 60
-                            send_telegram_message(
-                                chat_id,
-                                f"☕ Подождите ещё {remaining} мин. до следующего чаепития.",
-                            )
-                            return jsonify({"ok": True})
-                    conn.execute(
-                        text("""
-                            UPDATE infection_status
-                            SET tea_cooldown_until = NOW() + INTERVAL '1 hour'
-                            WHERE user_id = :uid
-                        """),
-                        {"uid": user_id},
+                lid = int(args[1])
+                pos = int(args[2])
+                if set_gd_level_position(lid, pos):
+                    send_telegram_message(chat_id, f"✅ Позиция уровня #{lid} изменена на {pos}.")
+                else:
+                    send_telegram_message(chat_id, "❌ Ошибка при изменении позиции уровня.")
+            except ValueError:
+                send_telegram_message(chat_id, "❌ ID и позиция должны быть числами.")
+
+
+# ========== Universe Module ==========
+@webhook_command("/infect")
+def _cmd_infect(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    try:
+        with get_db_engine().connect() as conn:
+            existing = conn.execute(
+                text("SELECT virus_type, infected_at FROM infection_status WHERE user_id = :uid"),
+                {"uid": user_id},
+            ).mappings().first()
+            if existing and existing["infected_at"]:
+                infected_at = existing["infected_at"]
+                if hasattr(infected_at, "tzinfo") and infected_at.tzinfo is None:
+                    from datetime import timezone
+                    infected_at = infected_at.replace(tzinfo=timezone.utc)
+                if (datetime.now(timezone.utc) - infected_at) < timedelta(hours=24):
+                    send_telegram_message(
+                        chat_id,
+                        f"🦠 Вы уже заражены «{existing['virus_type']}»!\n"
+                        f"Попробуйте `/tea` для облегчения.",
+                        parse_mode="Markdown",
                     )
-                    conn.commit()
-                phrases = [
-                    "Чай помогает! Временное облегчение на 1 час.",
-                    "Ароматный настой снимает симптомы... пока.",
-                    "eight-nine! Чай спасёт вас от вируса.",
-                    "Горячий чай — лучшее лекарство. Эффект: 1 час.",
-                ]
-                send_telegram_message(chat_id, f"☕ {random.choice(phrases)}", parse_mode="Markdown")
-            except Exception as exc:
-                print(f"[UNIVERSE] /tea error: {exc}")
-                send_telegram_message(chat_id, "❌ Ошибка при чаепитии.")
+                    return
+            virus = random.choice(["олеговирус", "LTL-паразит"])
+            symptoms_oleg = [
+                "кхм-кхм в каждом предложении",
+                "непреодолимое желание писать манифесты",
+                "постоянная потребность поправлять других",
+            ]
+            symptoms_ltl = [
+                "непонятные вспышки смеха",
+                "желание пить чай 24/7",
+                "странные байты в голове",
+            ]
+            symptoms = random.choice(symptoms_oleg if virus == "олеговирус" else symptoms_ltl)
+            conn.execute(
+                text("""
+                    INSERT INTO infection_status (user_id, virus_type, infected_at)
+                    VALUES (:uid, :vt, NOW())
+                    ON CONFLICT (user_id) DO UPDATE SET virus_type = :vt, infected_at = NOW()
+                """),
+                {"uid": user_id, "vt": virus},
+            )
+            conn.commit()
+        emoji = "🦠" if virus == "олеговирус" else "🧬"
+        send_telegram_message(
+            chat_id,
+            f"{emoji} Вы заражены «{virus}»!\n"
+            f"Симптомы: {symptoms}\n\n"
+            f"Используйте `/tea` для облегчения.",
+            parse_mode="Markdown",
+        )
+    except Exception as exc:
+        print(f"[UNIVERSE] /infect error: {exc}")
+        send_telegram_message(chat_id, "❌ Ошибка при заражении.")
 
-        elif command == "/daily_prayer" and chat_id:
-            try:
-                today = date.today().isoformat()
-                with get_db_engine().connect() as conn:
-                    existing = conn.execute(
-                        text("SELECT 1 FROM daily_prayer_log WHERE user_id = :uid AND prayer_date = :d"),
-                        {"uid": user_id, "d": today},
-                    ).first()
-                    if existing:
-                        send_telegram_message(
-                            chat_id,
-                            "🙏 Вы уже получали сегодняшнюю молитву!\nВозвращайтесь завтра.",
-                        )
-                        return jsonify({"ok": True})
-                    prayers = [
-                        "Да будет настрой стабилен, а пинг — нулевым.",
-                        "О Чай, дай нам мудрости в коде и терпения в дебаге.",
-                        "Да будет каждый день наполнен ароматом чая.",
-                        "Да будет моя душа чиста, как первозданный настой.",
-                        "Да будет кружка-алтарь моей рукой всегда наполнена.",
-                        "О Великий Баг, прости нам наши deprecated зависимости.",
-                        "Да будет деплой быстрым, а баги — редкими.",
-                        "Чай, чай, чай — да будет eight-nine с нами!",
-                    ]
-                    prayer = random.choice(prayers)
-                    conn.execute(
-                        text("""
-                            INSERT INTO daily_prayer_log (user_id, prayer_date)
-                            VALUES (:uid, :d)
-                            ON CONFLICT DO NOTHING
-                        """),
-                        {"uid": user_id, "d": today},
+
+@webhook_command("/tea")
+def _cmd_tea(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    try:
+        with get_db_engine().connect() as conn:
+            row = conn.execute(
+                text("SELECT virus_type, tea_cooldown_until FROM infection_status WHERE user_id = :uid"),
+                {"uid": user_id},
+            ).mappings().first()
+            if not row or not row["virus_type"]:
+                send_telegram_message(chat_id, "☕ Вы не заражены. Чай и так поможет!")
+                return
+            if row["tea_cooldown_until"]:
+                cooldown = row["tea_cooldown_until"]
+                if hasattr(cooldown, "tzinfo") and cooldown.tzinfo is None:
+                    from datetime import timezone
+                    cooldown = cooldown.replace(tzinfo=timezone.utc)
+                if datetime.now(timezone.utc) < cooldown:
+                    remaining = (cooldown - datetime.now(timezone.utc)).seconds // 60
+                    send_telegram_message(
+                        chat_id,
+                        f"☕ Подождите ещё {remaining} мин. до следующего чаепития.",
                     )
-                    conn.commit()
+                    return
+            conn.execute(
+                text("""
+                    UPDATE infection_status
+                    SET tea_cooldown_until = NOW() + INTERVAL '1 hour'
+                    WHERE user_id = :uid
+                """),
+                {"uid": user_id},
+            )
+            conn.commit()
+        phrases = [
+            "Чай помогает! Временное облегчение на 1 час.",
+            "Ароматный настой снимает симптомы... пока.",
+            "eight-nine! Чай спасёт вас от вируса.",
+            "Горячий чай — лучшее лекарство. Эффект: 1 час.",
+        ]
+        send_telegram_message(chat_id, f"☕ {random.choice(phrases)}", parse_mode="Markdown")
+    except Exception as exc:
+        print(f"[UNIVERSE] /tea error: {exc}")
+        send_telegram_message(chat_id, "❌ Ошибка при чаепитии.")
+
+
+@webhook_command("/daily_prayer")
+def _cmd_daily_prayer(ctx: WebhookContext) -> None:
+    chat_id, user_id = ctx.chat_id, ctx.user_id
+    try:
+        today = date.today().isoformat()
+        with get_db_engine().connect() as conn:
+            existing = conn.execute(
+                text("SELECT 1 FROM daily_prayer_log WHERE user_id = :uid AND prayer_date = :d"),
+                {"uid": user_id, "d": today},
+            ).first()
+            if existing:
                 send_telegram_message(
                     chat_id,
-                    f"🙏 Молитва на сегодня:\n\n_{prayer}_\n\neight-nine!",
-                    parse_mode="Markdown",
+                    "🙏 Вы уже получали сегодняшнюю молитву!\nВозвращайтесь завтра.",
                 )
-            except Exception as exc:
-                print(f"[UNIVERSE] /daily_prayer error: {exc}")
-                send_telegram_message(chat_id, "❌ Ошибка при получении молитвы.")
+                return
+            prayers = [
+                "Да будет настрой стабилен, а пинг — нулевым.",
+                "О Чай, дай нам мудрости в коде и терпения в дебаге.",
+                "Да будет каждый день наполнен ароматом чая.",
+                "Да будет моя душа чиста, как первозданный настой.",
+                "Да будет кружка-алтарь моей рукой всегда наполнена.",
+                "О Великий Баг, прости нам наши deprecated зависимости.",
+                "Да будет деплой быстрым, а баги — редкими.",
+                "Чай, чай, чай — да будет eight-nine с нами!",
+            ]
+            prayer = random.choice(prayers)
+            conn.execute(
+                text("""
+                    INSERT INTO daily_prayer_log (user_id, prayer_date)
+                    VALUES (:uid, :d)
+                    ON CONFLICT DO NOTHING
+                """),
+                {"uid": user_id, "d": today},
+            )
+            conn.commit()
+        send_telegram_message(
+            chat_id,
+            f"🙏 Молитва на сегодня:\n\n_{prayer}_\n\neight-nine!",
+            parse_mode="Markdown",
+        )
+    except Exception as exc:
+        print(f"[UNIVERSE] /daily_prayer error: {exc}")
+        send_telegram_message(chat_id, "❌ Ошибка при получении молитвы.")
+
+
+# Stages that may consume any update before command lookup (order matters)
+_PRE_COMMAND_STAGES = (_handle_infected_message, _handle_parsing_trigger, _handle_gd_approve_input, _handle_ai_reply)
+# Stages for updates that did not match a registered command
+_PLAIN_MESSAGE_STAGES = (_handle_puzzle_answer, _handle_gd_submission_media)
+
+
+@app.route("/telegram/webhook/<secret>", methods=["POST"])
+def telegram_webhook(secret: str):
+    """Receive Telegram webhook and dispatch it through the route tables."""
+
+    # Verify secret
+    if not hmac.compare_digest(secret, WEBHOOK_SECRET):
+        return jsonify({"error": "invalid_secret"}), 404
+
+    # Get update
+    update = request.get_json()
+    if not update:
+        return jsonify({"ok": True})
+
+    # Handle callback_query
+    callback_query = update.get("callback_query", {})
+    callback_data = callback_query.get("data", "")
+    if callback_data:
+        for prefix, callback_handler in _CALLBACK_ROUTES.items():
+            if callback_data.startswith(prefix):
+                _timed_call(prefix, callback_handler, callback_query, callback_data)
+                return jsonify({"ok": True})
+
+    # Process Telegram commands supported by the Vercel webhook runtime.
+    try:
+        message = update.get("message", {})
+        msg_text = message.get("text", "")
+        chat_id = message.get("chat", {}).get("id")
+        user = message.get("from", {})
+        user_id = user.get("id", chat_id)
+        name = user.get("first_name") or user.get("username") or "LucasTeam"
+        command = normalize_command(msg_text)
+        ctx = WebhookContext(
+            update=update,
+            message=message,
+            msg_text=msg_text,
+            chat_id=chat_id,
+            user=user,
+            user_id=user_id,
+            name=name,
+            command=command,
+            reply_to=message.get("reply_to_message"),
+        )
+
+        print(f"[WEBHOOK] command='{command}' text='{msg_text[:50]}' user_id={user_id} chat_id={chat_id}")
+
+        if _run_stages(_PRE_COMMAND_STAGES, ctx):
+            return jsonify({"ok": True})
+
+        route = _COMMAND_ROUTES.get(command)
+        if route is None:
+            _run_stages(_PLAIN_MESSAGE_STAGES, ctx)
+        else:
+            handler, requires_chat = route
+            if chat_id or not requires_chat:
+                _timed_call(command, handler, ctx)
 
     except Exception as e:
         print(f"Error processing update: {e}")
@@ -4583,10 +5300,32 @@ def telegram_webhook(secret: str):
     return jsonify({"ok": True})
 
 
+@app.route("/api/debug_routes", methods=["GET"])
+def debug_routes():
+    """Per-command latency stats collected by the webhook router."""
+    routes = []
+    for route, stats in _ROUTE_STATS.items():
+        routes.append({
+            "route": route,
+            "calls": stats["calls"],
+            "errors": stats["errors"],
+            "avg_ms": round(stats["total_ms"] / stats["calls"], 2),
+            "max_ms": round(stats["max_ms"], 2),
+            "last_ms": round(stats["last_ms"], 2),
+        })
+    routes.sort(key=lambda item: item["avg_ms"], reverse=True)
+    return jsonify({
+        "commands": len(_COMMAND_ROUTES),
+        "callback_prefixes": list(_CALLBACK_ROUTES),
+        "routes": routes,
+    })
+
+
 # ============================================================================
 # GD Module — moderation callback handler
 # ============================================================================
 
+@webhook_callback("gd_moderate_")
 def gd_moderate_callback(callback_query: dict, callback_data: str) -> None:
     """Handle GD moderation inline button callbacks."""
     user = callback_query.get("from", {})
@@ -4722,6 +5461,7 @@ def _gd_moderate_show_page(callback_query: dict, chat_id: int, page: int) -> Non
         print(f"_gd_moderate_show_page error: {exc}")
 
 
+@webhook_callback("trivia_")
 def trivia_answer_callback(callback_query: dict, callback_data: str) -> None:
     """Handle trivia answer selection."""
     message = callback_query.get("message", {})
@@ -4796,6 +5536,9 @@ def trivia_answer_callback(callback_query: dict, callback_data: str) -> None:
                             },
                         )
                         conn.commit()
+                        _USER_DIRECTORY.upsert(
+                            user_id, user.get("username"), user.get("first_name"), user.get("last_name")
+                        )
                         
                         send_telegram_message(chat_id, "🎉 Правильно! +10 монет")
             except Exception as db_err:
@@ -4820,45 +5563,20 @@ def trivia_answer_callback(callback_query: dict, callback_data: str) -> None:
 
 
 def generate_trivia_from_canon(chat_id: int) -> str | None:
-    """Generate trivia question from canon knowledge using AI.
-    
-    Returns question string if successful, None if AI unavailable.
+    """Return a prefetched canon trivia question formatted as text.
+
+    Returns question string if one is ready, None otherwise (the pool is
+    refilled by cron and in the background, so the caller never waits for the AI).
     """
-    try:
-        canon_path = os.path.join(os.path.dirname(__file__), "..", "data", "canon_knowledge.txt")
-        canon_content = ""
-        
-        if os.path.exists(canon_path):
-            with open(canon_path, "r", encoding="utf-8") as f:
-                canon_content = f.read()[:5000]
-        
-        prompt = (
-            "Ты — создатель викторины по вселенной Олеговируса и LTL-паразита.\n\n"
-            "Вот контекст из канона (ограниченный фрагмент):\n"
-            f"{canon_content[:1500]}\n\n"
-            "Создай вопрос-викторину (на русском) с 4 вариантами ответа (A, B, C, D) по этому контексту.\n"
-            "Формат ответа ТОЧНО:\n"
-            "Вопрос: [вопрос]\n"
-            "A) [вариант A]\n"
-            "B) [вариант B]\n"
-            "C) [вариант C]\n"
-            "D) [вариант D]\n"
-            "Правильный: [буква правильного ответа]\n"
-            "Объяснение: [краткое объяснение]\n\n"
-            "Вопрос должен быть сложным, но справедливым, с однозначным правильным ответом."
-        )
-        
-        question = call_ai_api(prompt, max_tokens=300)
-        
-        # Validate AI response contains required format
-        if "Вопрос:" in question and "A)" in question and "Правильный:" in question:
-            return question
-        else:
-            print(f"AI trivia response invalid format: {question[:100]}")
-            return None
-    except Exception as exc:
-        print(f"Error generating trivia from canon: {exc}")
+    question = _TRIVIA_POOL.take()
+    if question is None:
         return None
+    letters = "ABCD"
+    lines = [f"Вопрос: {question['text']}"]
+    lines += [f"{letters[i]}) {option}" for i, option in enumerate(question["options"])]
+    lines.append(f"Правильный: {letters[question['correct_index']]}")
+    lines.append(f"Объяснение: {question['explanation']}")
+    return "\n".join(lines)
 
 
 @app.route("/api/test_ai", methods=["GET"])
@@ -4978,14 +5696,9 @@ def debug_hf():
     return jsonify(debug_info)
 
 
-@app.route("/api/reading_generate", methods=["POST", "GET"])
-def reading_generate():
-    """Generate reading msg_text and questions using AI API."""
+def _generate_reading_set() -> dict | None:
+    """Generate reading msg_text and questions using AI API (None if all providers fail)."""
     try:
-        import requests
-        import json
-        import random
-
         # Try Groq first, then HF as fallback
         groq_key = os.getenv("GROQ_API_KEY")
         hf_token = os.getenv("HF_INFERENCE_TOKEN") or os.getenv("HF_TOKEN")
@@ -4994,9 +5707,8 @@ def reading_generate():
         print(f"HF Token available: {bool(hf_token)}")
 
         if not groq_key and not hf_token:
-            print("No API keys, using fallback")
-            fallback_sets = get_fallback_sets()
-            return jsonify(random.choice(fallback_sets))
+            print("No API keys, reading pool not refilled")
+            return None
 
         # Simplified prompt for better results
         prompt = """Напиши короткую историю для ребёнка 7 лет.
@@ -5085,8 +5797,8 @@ def reading_generate():
                 print(f"HF error: {e}")
 
         if not generated_text:
-            print("All AI providers failed, using fallback")
-            raise Exception("All AI providers failed")
+            print("All AI providers failed")
+            return None
 
         print(f"Generated text length: {len(generated_text)}")
 
@@ -5156,20 +5868,53 @@ def reading_generate():
             "questions": questions[:3],
         }
 
-        print(f"Returning story: {story_data['title']}")
-        return jsonify(story_data)
+        print(f"Generated story: {story_data['title']}")
+        return story_data
 
     except Exception as e:
         print(f"Error generating reading text: {e}")
         import traceback
 
         traceback.print_exc()
+        return None
+
+
+# Stories are generated ahead of time into reading_sets; page loads never wait for AI
+_READING_POOL = ReadingSetPool(SqlReadingSetStore(lambda: get_db_engine()), _generate_reading_set)
+_READING_VIEWER_COOKIE = "reading_viewer"
+
 
-        # Return fallback set on error
-        import random
+@app.route("/api/reading_generate", methods=["POST", "GET"])
+def reading_generate():
+    """Serve a reading set from the pre-generated pool.
 
-        fallback_sets = get_fallback_sets()
-        return jsonify(random.choice(fallback_sets))
+    ``?refill=1`` (Vercel cron or a manual call with the admin secret) tops
+    the pool up and returns its state instead of a story. Stories already shown to the viewer (cookie or
+    ``user_id``) are skipped while unseen ones remain; when the pool is empty
+    a static set is served and a background refill is started.
+    """
+    if request.args.get("refill") == "1":
+        # Each refill spends provider quota: only cron jobs and admins may trigger it
+        if not _has_admin_secret():
+            return jsonify({"error": "unauthorized"}), 403
+        added = _READING_POOL.refill()
+        return jsonify({"refilled": added, "pool_size": _READING_POOL.size(), "stats": _READING_POOL.stats})
+
+    payload = request.get_json(silent=True) or {}
+    user_id = payload.get("user_id") or request.args.get("user_id")
+    viewer = f"tg:{user_id}"[:64] if user_id else request.cookies.get(_READING_VIEWER_COOKIE, "")[:64]
+    new_viewer = not viewer
+    if new_viewer:
+        viewer = uuid.uuid4().hex
+
+    story = _READING_POOL.take(viewer)
+    if story is None:
+        story = random.choice(get_fallback_sets())
+
+    response = jsonify(story)
+    if new_viewer:
+        response.set_cookie(_READING_VIEWER_COOKIE, viewer, max_age=365 * 24 * 3600, samesite="Lax")
+    return response
 
 
 def get_fallback_sets():
@@ -5249,13 +5994,12 @@ def debug_webhook():
     except Exception as e:
         return jsonify({"error": str(e)})
 
-# Initialize database tables on cold start
+# Initialize database tables on cold start (no-op once schema_version is current)
 try:
-    engine = get_db_engine()
-    _ensure_gd_tables(engine)
-    print("[INIT] GD tables initialized successfully")
+    get_db_engine()
+    print(f"[INIT] Schema bootstrap done: ready={_SCHEMA_READY}, ddl={_DDL_STATS['total']}")
 except Exception as init_exc:
-    print(f"[INIT] GD table init failed: {init_exc}")
+    print(f"[INIT] Schema bootstrap failed: {init_exc}")
 
 # Load bot ID at startup for reply/mention detection
 try:
@@ -5263,18 +6007,6 @@ try:
 except Exception as bot_id_exc:
     print(f"[INIT] BOT_ID load failed (will retry on first request): {bot_id_exc}")
 
-# Ensure user_preferences table exists
-try:
-    _ensure_user_preferences_table(get_db_engine())
-except Exception as pref_exc:
-    print(f"[INIT] user_preferences table init failed: {pref_exc}")
-
-# Ensure chess_games table exists
-try:
-    _ensure_chess_games_table(get_db_engine())
-except Exception as chess_exc:
-    print(f"[INIT] chess_games table init failed: {chess_exc}")
-
 # Debug endpoint to test submissions table
 @app.route("/api/debug_db", methods=["GET"])
 def debug_db():
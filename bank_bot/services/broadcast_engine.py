@@ -0,0 +1,332 @@
+"""
+Broadcast engine shared by BroadcastSystem and BroadcastService
+
+Recipients are streamed from the users table in keyset-paginated pages,
+sends are paced by a token bucket sized to Telegram's limits (about 30
+messages per second overall, one per second per chat), 429 responses
+pause the whole broadcast for their retry_after and progress is stored in
+broadcast_jobs after every page, so an interrupted broadcast of the same
+message by the same sender resumes after the last completed page.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+from core.models.advanced_models import BroadcastResult
+from database.database import BroadcastJob, User
+
+logger = logging.getLogger(__name__)
+
+# Telegram allows about 30 messages per second to different chats
+GLOBAL_MESSAGES_PER_SECOND = 30.0
+
+# ...and about one message per second to the same chat
+PER_CHAT_INTERVAL_SECONDS = 1.0
+
+# Recipient IDs loaded per query; progress is saved after each page
+RECIPIENT_PAGE_SIZE = 500
+
+# Sends in flight at once; the bucket, not this, sets the rate
+SEND_CONCURRENCY = 10
+
+# 429 responses tolerated per recipient before giving up on them
+MAX_FLOOD_WAITS = 5
+
+# Unfinished jobs older than this are not resumed
+RESUME_WINDOW = timedelta(hours=24)
+
+# Error strings kept in the result
+MAX_REPORTED_ERRORS = 10
+
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_ABANDONED = "abandoned"
+
+
+class TokenBucket:
+    """
+    Async token bucket that can be paused for a flood-wait
+
+    Holds up to `capacity` tokens refilled at `rate` tokens per second;
+    acquire() waits until a token is available and the bucket is not paused.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait for and take one token."""
+        async with self._lock:
+            while True:
+                now = self.clock()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Hand out no tokens for the next `seconds` and drop the accumulated burst."""
+        self._paused_until = max(self._paused_until, self.clock() + seconds)
+        self._tokens = 0.0
+        self._updated = self._paused_until
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    """Return a 429's retry_after in seconds (int or timedelta depending on PTB version)."""
+    retry_after = error.retry_after
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+def message_fingerprint(text: str, parse_mode: Optional[str]) -> str:
+    """Identify a broadcast message for resuming without storing its text."""
+    return hashlib.sha256(f"{parse_mode}\n{text}".encode("utf-8")).hexdigest()
+
+
+class BroadcastEngine:
+    """
+    Sends one message to every registered user at Telegram's rate limits
+
+    Memory use is bounded by the page size rather than the number of users.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        bot: Bot,
+        page_size: int = RECIPIENT_PAGE_SIZE,
+        max_retries: int = 3,
+        bucket: Optional[TokenBucket] = None,
+        per_chat_interval: float = PER_CHAT_INTERVAL_SECONDS,
+        concurrency: int = SEND_CONCURRENCY,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.db = db
+        self.bot = bot
+        self.page_size = page_size
+        self.max_retries = max_retries
+        self.bucket = bucket or TokenBucket(GLOBAL_MESSAGES_PER_SECOND, clock=clock)
+        self.per_chat_interval = per_chat_interval
+        self.concurrency = concurrency
+        self.clock = clock
+        self._chat_ready_at: Dict[int, float] = {}
+
+    def count_recipients(self) -> int:
+        """Number of users with a Telegram ID."""
+        return self.db.query(func.count(User.id)).filter(User.telegram_id.isnot(None)).scalar() or 0
+
+    def iter_recipient_pages(self, after: Optional[int] = None) -> Iterator[List[int]]:
+        """
+        Yield recipient Telegram IDs in ascending pages
+
+        Each page is one indexed range query on users.telegram_id, so no
+        ORM objects are loaded and deep pages cost the same as the first.
+
+        Args:
+            after: Start after this Telegram ID (None to start from the beginning)
+        """
+        while True:
+            query = self.db.query(User.telegram_id).filter(User.telegram_id.isnot(None))
+            if after is not None:
+                query = query.filter(User.telegram_id > after)
+            page = [row[0] for row in query.order_by(User.telegram_id).limit(self.page_size).all()]
+            if not page:
+                return
+            yield page
+            if len(page) < self.page_size:
+                return
+            after = page[-1]
+
+    async def run(self, text: str, sender_id: int, parse_mode: Optional[str] = "HTML") -> BroadcastResult:
+        """
+        Send `text` to all recipients, resuming an interrupted identical broadcast
+
+        Args:
+            text: Formatted message text
+            sender_id: Telegram ID of the user who started the broadcast
+            parse_mode: Telegram parse mode for the message
+
+        Returns:
+            BroadcastResult: Totals include sends made before a resume
+        """
+        start_time = time.time()
+        job = self._start_job(text, sender_id, parse_mode)
+        successful_sends = job.successful_sends
+        failed_sends = job.failed_sends
+        sent_this_run = 0
+        errors: List[str] = []
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(chat_id: int) -> Optional[str]:
+            async with semaphore:
+                return await self._deliver(chat_id, text, parse_mode)
+
+        for page in self.iter_recipient_pages(after=job.last_telegram_id):
+            results = await asyncio.gather(*(deliver(chat_id) for chat_id in page), return_exceptions=True)
+            for chat_id, error in zip(page, results):
+                if error is None:
+                    successful_sends += 1
+                    continue
+                failed_sends += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append(f"{chat_id}: {error}")
+            sent_this_run += len(page)
+            self._forget_idle_chats()
+            self._save_progress(job, page[-1], successful_sends, failed_sends)
+
+        self._finish_job(job)
+        execution_time = time.time() - start_time
+        rate = sent_this_run / execution_time if execution_time > 0 else 0.0
+        logger.info(
+            f"Broadcast job {job.id} finished: {successful_sends} sent, {failed_sends} failed, "
+            f"{rate:.1f} msg/s"
+        )
+        return BroadcastResult(
+            total_users=max(job.total_users, successful_sends + failed_sends),
+            successful_sends=successful_sends,
+            failed_sends=failed_sends,
+            errors=errors,
+            completion_message=(
+                f"Broadcast completed: {successful_sends} successful, {failed_sends} failed "
+                f"({rate:.1f} msg/s)"
+            ),
+            execution_time=execution_time,
+            messages_per_second=rate,
+        )
+
+    async def send(self, chat_id: int, text: str, parse_mode: Optional[str] = "HTML") -> bool:
+        """Send one message with pacing and retries; True if it was delivered."""
+        return await self._deliver(chat_id, text, parse_mode) is None
+
+    async def _deliver(self, chat_id: int, text: str, parse_mode: Optional[str]) -> Optional[str]:
+        """Send one message; returns None on success or the reason it failed."""
+        attempt = 0
+        flood_waits = 0
+        while True:
+            await self._wait_for_chat(chat_id)
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+                return None
+
+            except RetryAfter as e:
+                # Flood control applies to the whole bot: pause every send,
+                # then retry this chat without spending an attempt
+                wait = retry_after_seconds(e)
+                flood_waits += 1
+                if flood_waits > MAX_FLOOD_WAITS:
+                    logger.error(f"Giving up on user {chat_id} after {MAX_FLOOD_WAITS} flood waits")
+                    return f"flood control: {e}"
+                logger.warning(f"Flood control hit, pausing broadcast for {wait:.1f}s")
+                self.bucket.pause(wait)
+                continue
+
+            except Forbidden:
+                logger.debug(f"User {chat_id} has blocked the bot")
+                return "bot blocked by user"
+
+            except BadRequest as e:
+                logger.warning(f"Bad request for user {chat_id}: {e}")
+                return str(e)
+
+            except Exception as e:
+                attempt += 1
+                if attempt >= self.max_retries:
+                    logger.error(f"Failed to send message to user {chat_id} after {self.max_retries} attempts: {e}")
+                    return str(e)
+                wait_time = attempt * 2
+                logger.warning(f"Error sending to user {chat_id}, retrying in {wait_time}s: {e}")
+                await asyncio.sleep(wait_time)
+
+    async def _wait_for_chat(self, chat_id: int) -> None:
+        now = self.clock()
+        ready_at = self._chat_ready_at.get(chat_id, now)
+        self._chat_ready_at[chat_id] = max(ready_at, now) + self.per_chat_interval
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+
+    def _forget_idle_chats(self) -> None:
+        now = self.clock()
+        self._chat_ready_at = {
+            chat_id: ready_at for chat_id, ready_at in self._chat_ready_at.items() if ready_at > now
+        }
+
+    def _start_job(self, text: str, sender_id: int, parse_mode: Optional[str]) -> BroadcastJob:
+        fingerprint = message_fingerprint(text, parse_mode)
+        job = (
+            self.db.query(BroadcastJob)
+            .filter(
+                BroadcastJob.sender_id == sender_id,
+                BroadcastJob.message_hash == fingerprint,
+                BroadcastJob.status == JOB_RUNNING,
+            )
+            .order_by(BroadcastJob.id.desc())
+            .first()
+        )
+        if job is not None and job.updated_at >= datetime.utcnow() - RESUME_WINDOW:
+            logger.info(
+                f"Resuming broadcast job {job.id} after user {job.last_telegram_id} "
+                f"({job.successful_sends + job.failed_sends}/{job.total_users} done)"
+            )
+            return job
+        if job is not None:
+            job.status = JOB_ABANDONED
+
+        job = BroadcastJob(
+            sender_id=sender_id,
+            message_hash=fingerprint,
+            status=JOB_RUNNING,
+            total_users=self.count_recipients(),
+            successful_sends=0,
+            failed_sends=0,
+        )
+        self.db.add(job)
+        self._commit()
+        return job
+
+    def _save_progress(self, job: BroadcastJob, last_telegram_id: int, successful: int, failed: int) -> None:
+        job.last_telegram_id = last_telegram_id
+        job.successful_sends = successful
+        job.failed_sends = failed
+        job.updated_at = datetime.utcnow()
+        self._commit()
+
+    def _finish_job(self, job: BroadcastJob) -> None:
+        job.status = JOB_COMPLETED
+        job.updated_at = datetime.utcnow()
+        self._commit()
+
+    def _commit(self) -> None:
+        # Losing a checkpoint only means re-sending one page on resume,
+        # so a failed write must not stop the broadcast
+        try:
+            self.db.commit()
+        except Exception as e:
+            logger.warning(f"Failed to save broadcast progress: {e}")
+            self.db.rollback()
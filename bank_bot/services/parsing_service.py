@@ -22,6 +22,8 @@ from sqlalchemy.orm import Session
 
 from bank_bot.repositories.balance_repository import BalanceRepository
 from bank_bot.repositories.transaction_repository import TransactionRepository
+from common.conversion_rates import ConversionRateCache, conversion_rate_cache
+from core.parsers.markers import MarkerMatcher
 from database.database import UserResource, ConversionRate
 
 logger = structlog.get_logger()
@@ -67,6 +69,21 @@ PARSING_PATTERNS = {
     },
 }
 
+# Markers for detect_bot. "hint" rules are the priority heuristics; the
+# plain bot rules list literals every accrual pattern of that bot needs, so
+# a bot whose literals are absent is skipped without running its regexes.
+_DETECT_PRIORITY = ("gdcards", "gusya_cards", "shmalala", "shmalala_karma")
+_DETECT_MATCHER = MarkerMatcher([
+    (("hint", "gdcards"), [("(?i)орбы",), ("🤩",)]),
+    (("hint", "gusya_cards"), [("(?i)монеты", "💰"), ("(?i)монеты", "(?i)гус")]),
+    (("hint", "shmalala"), [("(?i)монеты:", "💰")]),
+    (("hint", "shmalala_karma"), [("❤️",), ("(?i)рейтинг",)]),
+    ("gusya_cards", [("Монеты", "•")]),
+    ("gdcards", [("Орбы:",)]),
+    ("shmalala", [("Монеты:",)]),
+    ("shmalala_karma", [("❤️", "(?i)рейтинг:")]),
+])
+
 BOT_DISPLAY_NAMES = {
     "gusya_cards": "Гуся Cards",
     "gdcards": "GDcards",
@@ -88,13 +105,17 @@ class ParsingService:
     Priority: GDcards (orbs)
     """
 
-    def __init__(self, session: Session) -> None:
+    def __init__(
+        self, session: Session, rate_cache: Optional[ConversionRateCache] = None
+    ) -> None:
         """Initialize with SQLAlchemy session.
 
         Args:
             session: Active SQLAlchemy session.
+            rate_cache: Conversion rate cache (process-wide cache by default).
         """
         self._session = session
+        self._rate_cache = rate_cache or conversion_rate_cache
         self._balance_repo = BalanceRepository(session)
         self._tx_repo = TransactionRepository(session)
 
@@ -107,34 +128,19 @@ class ParsingService:
         Returns:
             Bot identifier (gusya_cards, gdcards, shmalala) or None.
         """
-        text_lower = text.lower()
-
-        # GDcards priority detection (accrual patterns)
-        if "орбы" in text_lower or "🤩" in text:
-            for pattern in PARSING_PATTERNS["gdcards"]["patterns"]:
-                if pattern.search(text):
-                    return "gdcards"
-
-        # Gusya Cards
-        if "монеты" in text_lower and ("💰" in text or "гус" in text_lower):
-            for pattern in PARSING_PATTERNS["gusya_cards"]["patterns"]:
-                if pattern.search(text):
-                    return "gusya_cards"
-
-        # Shmalala money
-        if "монеты:" in text_lower and "💰" in text:
-            for pattern in PARSING_PATTERNS["shmalala"]["patterns"]:
-                if pattern.search(text):
-                    return "shmalala"
+        matched = set(_DETECT_MATCHER.candidates(text))
 
-        # Shmalala karma
-        if "❤️" in text or "рейтинг" in text_lower:
-            for pattern in PARSING_PATTERNS["shmalala_karma"]["patterns"]:
-                if pattern.search(text):
-                    return "shmalala_karma"
+        # Heuristic priority order (gdcards accrual first), then fallback
+        # over all patterns. Regexes run only when their literals are present.
+        for bot_name in _DETECT_PRIORITY:
+            if ("hint", bot_name) in matched and bot_name in matched:
+                for pattern in PARSING_PATTERNS[bot_name]["patterns"]:
+                    if pattern.search(text):
+                        return bot_name
 
-        # Fallback: try all accrual patterns
         for bot_name, config in PARSING_PATTERNS.items():
+            if bot_name not in matched:
+                continue
             for pattern in config["patterns"]:
                 if pattern.search(text):
                     return bot_name
@@ -268,7 +274,10 @@ class ParsingService:
         return resource
 
     def get_conversion_rate(self, bot_name: str, resource_type: str) -> Decimal:
-        """Get conversion coefficient k from DB.
+        """Get conversion coefficient k from the shared rate cache.
+
+        The cache reloads all active rates from the DB once per TTL or after
+        ``invalidate_conversion_rates()``.
 
         Args:
             bot_name: Bot name.
@@ -277,17 +286,9 @@ class ParsingService:
         Returns:
             Conversion coefficient k (default 1.0 if not found).
         """
-        rate = (
-            self._session.query(ConversionRate)
-            .filter(
-                ConversionRate.bot_name == bot_name,
-                ConversionRate.resource_type == resource_type,
-                ConversionRate.is_active == True,  # noqa: E712
-            )
-            .first()
-        )
+        k = self._rate_cache.get(bot_name, resource_type, loader=self._load_conversion_rates)
 
-        if rate is None:
+        if k is None:
             logger.warning(
                 "Conversion rate not found, using default 1.0",
                 bot_name=bot_name,
@@ -295,7 +296,19 @@ class ParsingService:
             )
             return Decimal("1.0")
 
-        return Decimal(str(rate.k))
+        return k
+
+    def _load_conversion_rates(self) -> list:
+        """Load all active conversion rates for the shared rate cache."""
+        rows = (
+            self._session.query(
+                ConversionRate.bot_name, ConversionRate.resource_type, ConversionRate.k
+            )
+            .filter(ConversionRate.is_active == True)  # noqa: E712
+            .order_by(ConversionRate.id)
+            .all()
+        )
+        return [tuple(row) for row in rows]
 
     def parse_profile_and_accrue(
         self, user_id: int, text: str
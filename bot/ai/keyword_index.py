@@ -0,0 +1,103 @@
+"""Keyword index for AI-lite matching.
+
+AI-lite matches a keyword when it occurs anywhere in the normalized question
+(``keyword in question``), so "олег" also matches "олеговирус". The index keeps
+exactly that behaviour: one Aho–Corasick automaton over all distinct keywords
+finds every occurring keyword in a single pass over the question, and an
+inverted keyword → items map limits scoring to candidate items.
+"""
+
+from __future__ import annotations
+
+from collections import Counter, deque
+from typing import Callable, Generic, Iterable, TypeVar
+
+
+T = TypeVar("T")
+
+
+class KeywordIndex(Generic[T]):
+    """Immutable substring index from keywords to the items that declare them."""
+
+    def __init__(self, items: Iterable[T], keywords: Callable[[T], Iterable[str]]) -> None:
+        self.items: tuple[T, ...] = tuple(items)
+        keyword_ids: dict[str, int] = {}
+        # keyword id -> [(item position, how many times the item lists the keyword)]
+        self._postings: list[list[tuple[int, int]]] = []
+        self._always: list[int] = []
+        for position, item in enumerate(self.items):
+            for keyword, count in Counter(keywords(item)).items():
+                keyword_id = keyword_ids.get(keyword)
+                if keyword_id is None:
+                    keyword_id = keyword_ids[keyword] = len(self._postings)
+                    self._postings.append([])
+                self._postings[keyword_id].append((position, count))
+        self._keywords: tuple[str, ...] = tuple(keyword_ids)
+        self._build_automaton()
+
+    def _build_automaton(self) -> None:
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[tuple[int, ...]] = [()]
+        outputs: list[list[int]] = [[]]
+        for keyword_id, keyword in enumerate(self._keywords):
+            if not keyword:
+                # "" in question is always true
+                self._always.append(keyword_id)
+                continue
+            node = 0
+            for char in keyword:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    outputs.append([])
+                node = next_node
+            outputs[node].append(keyword_id)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                outputs[child].extend(outputs[self._fail[child]])
+        self._out = [tuple(ids) for ids in outputs]
+
+    def matched_keywords(self, text: str) -> list[str]:
+        """Return distinct keywords that occur in text."""
+        return [self._keywords[keyword_id] for keyword_id in sorted(self._matched_ids(text))]
+
+    def _matched_ids(self, text: str) -> set[int]:
+        found = set(self._always)
+        node = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+    def score(self, text: str, weight: Callable[[str], int]) -> list[tuple[int, T]]:
+        """Score candidate items by the keywords found in text.
+
+        Args:
+            text: Normalized question.
+            weight: Score of one keyword occurrence in an item's keyword list.
+
+        Returns:
+            (score, item) for items with a positive score, in index order.
+        """
+        scores: dict[int, int] = {}
+        for keyword_id in self._matched_ids(text):
+            keyword_weight = weight(self._keywords[keyword_id])
+            for position, count in self._postings[keyword_id]:
+                scores[position] = scores.get(position, 0) + keyword_weight * count
+        return [(scores[position], self.items[position]) for position in sorted(scores) if scores[position]]
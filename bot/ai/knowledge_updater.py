@@ -7,13 +7,17 @@ deterministic AI-lite service.
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import html
 import json
+import os
 import re
+import tempfile
 from dataclasses import asdict, dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Iterable
+from typing import Callable, Iterable
 
 import aiohttp
 
@@ -28,6 +32,7 @@ LOCAL_CANON_PATH = Path("data/canon_knowledge.txt")
 MAX_DYNAMIC_ENTRIES = 40
 MAX_ENTRY_TEXT_LENGTH = 1200
 MIN_KEYWORD_LENGTH = 4
+FETCH_CONCURRENCY = 8
 
 
 @dataclass(frozen=True)
@@ -50,78 +55,166 @@ class KnowledgeUpdateResult:
     failed_urls: tuple[str, ...]
     entries_count: int
     cache_path: str
+    unchanged_urls: tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class _Fetched:
+    """Outcome of one conditional fetch."""
+
+    status: str  # "changed", "unchanged" or "failed"
+    text: str = ""
+    etag: str | None = None
+    last_modified: str | None = None
 
 
 async def update_ai_knowledge_cache(
     *,
     cache_path: Path = DEFAULT_CACHE_PATH,
     channel_url: str = DEFAULT_CHANNEL_URL,
+    concurrency: int = FETCH_CONCURRENCY,
 ) -> KnowledgeUpdateResult:
-    """Fetch public canon/channel data and write a compact local AI cache."""
+    """Fetch public canon/channel data and write a compact local AI cache.
+
+    Sources are fetched concurrently (at most `concurrency` at a time) with
+    ETag/Last-Modified validators from the previous run. A source whose
+    server answers 304, or whose extracted text has the same hash as last
+    time, keeps its stored entry without re-extraction; a source that fails
+    keeps its last good entry. The cache file is replaced atomically and only
+    when something changed.
+    """
 
+    previous_payload = _read_cache(cache_path)
+    previous_sources: dict[str, dict] = previous_payload.get("sources", {})
+    sources: dict[str, dict] = {}
     fetched: list[str] = []
     failed: list[str] = []
-    entries: list[DynamicKnowledgeEntry] = []
-
-    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60)) as session:
-        canon_text = await _fetch_text(session, CANON_DOC_EXPORT_URL, fetched, failed)
-        channel_text = await _fetch_telegram_text(session, channel_url, fetched, failed)
-
-        if canon_text:
-            entries.append(
-                _entry_from_text(
-                    title="runtime_canon_doc",
-                    text=canon_text,
-                    source=CANON_DOC_URL,
-                    canon_level="main",
-                    prefix="📖 Обновлённый канон из Google Doc:",
-                )
+    unchanged: list[str] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def refresh(url: str, *, telegram: bool, build: Callable[[str], dict]) -> None:
+        previous = previous_sources.get(url, {})
+        result = await _fetch_conditional(session, semaphore, url, previous)
+        if result.status == "failed":
+            failed.append(url)
+            if previous:
+                sources[url] = previous
+            return
+        fetched.append(url)
+        text = _telegram_html_to_text(result.text) if telegram else result.text
+        # Hash the extracted text: Telegram pages change markup (view counters) on every load
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest() if result.status == "changed" else None
+        if result.status == "unchanged" or content_hash == previous.get("content_hash"):
+            unchanged.append(url)
+            state = dict(previous)
+        else:
+            state = {"content_hash": content_hash, **build(text)}
+        state["etag"] = result.etag or previous.get("etag")
+        state["last_modified"] = result.last_modified or previous.get("last_modified")
+        sources[url] = state
+
+    def build_canon(text: str) -> dict:
+        return {
+            "entry": _entry_dict(
+                text,
+                title="runtime_canon_doc",
+                source=CANON_DOC_URL,
+                canon_level="main",
+                prefix="📖 Обновлённый канон из Google Doc:",
+            ),
+            "source_urls": [list(item) for item in _extract_ranked_source_urls(text)],
+        }
+
+    def build_channel(text: str) -> dict:
+        return {
+            "entry": _entry_dict(
+                text,
+                title="runtime_channel_lucasteamgd",
+                source=channel_url.replace("/s/", "/"),
+                canon_level="channel",
+                prefix="📣 Новые данные из канала LucasTeam GD:",
             )
-
-        if channel_text:
-            entries.append(
-                _entry_from_text(
-                    title="runtime_channel_lucasteamgd",
-                    text=channel_text,
-                    source=channel_url.replace("/s/", "/"),
-                    canon_level="channel",
-                    prefix="📣 Новые данные из канала LucasTeam GD:",
-                )
+        }
+
+    def build_source(source_url: str, level: str) -> Callable[[str], dict]:
+        return lambda text: {
+            "entry": _entry_dict(
+                text,
+                title=_title_from_url(source_url),
+                source=source_url,
+                canon_level=level,
+                prefix=f"{_level_emoji(level)} Источник канона ({level}):",
             )
+        }
 
-        source_urls = _extract_ranked_source_urls(canon_text or "")
-        for source_url, level in source_urls[:MAX_DYNAMIC_ENTRIES]:
-            text = await _fetch_telegram_text(session, _telegram_web_url(source_url), fetched, failed)
-            if not text:
-                continue
-            entries.append(
-                _entry_from_text(
-                    title=_title_from_url(source_url),
-                    text=text,
-                    source=source_url,
-                    canon_level=level,
-                    prefix=f"{_level_emoji(level)} Источник канона ({level}):",
-                )
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60)) as session:
+        await asyncio.gather(
+            refresh(CANON_DOC_EXPORT_URL, telegram=False, build=build_canon),
+            refresh(channel_url, telegram=True, build=build_channel),
+        )
+        source_urls = [
+            (str(url), str(level))
+            for url, level in sources.get(CANON_DOC_EXPORT_URL, {}).get("source_urls", [])
+        ][:MAX_DYNAMIC_ENTRIES]
+        await asyncio.gather(
+            *(
+                refresh(_telegram_web_url(url), telegram=True, build=build_source(url, level))
+                for url, level in source_urls
             )
+        )
 
-    payload = {
-        "updated_at": datetime.now(timezone.utc).isoformat(),
-        "entries": [asdict(entry) for entry in entries if entry.answer.strip()],
-        "fetched_urls": fetched,
-        "failed_urls": failed,
-    }
-    cache_path.parent.mkdir(parents=True, exist_ok=True)
-    cache_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    ordered_urls = [CANON_DOC_EXPORT_URL, channel_url] + [_telegram_web_url(url) for url, _level in source_urls]
+    entries = [
+        sources[url]["entry"]
+        for url in ordered_urls
+        if url in sources and sources[url].get("entry") and sources[url]["entry"]["answer"].strip()
+    ]
+    ordered_sources = {url: sources[url] for url in ordered_urls if url in sources}
+
+    updated_at = previous_payload.get("updated_at", "")
+    if ordered_sources != previous_sources or entries != previous_payload.get("entries") or not updated_at:
+        updated_at = datetime.now(timezone.utc).isoformat()
+        payload = {
+            "updated_at": updated_at,
+            "entries": entries,
+            "fetched_urls": fetched,
+            "failed_urls": failed,
+            "sources": ordered_sources,
+        }
+        _write_cache_atomic(cache_path, payload)
 
     return KnowledgeUpdateResult(
-        updated_at=payload["updated_at"],
+        updated_at=updated_at,
         fetched_urls=tuple(fetched),
         failed_urls=tuple(failed),
-        entries_count=len(payload["entries"]),
+        entries_count=len(entries),
         cache_path=str(cache_path),
+        unchanged_urls=tuple(unchanged),
     )
 
 
+def _read_cache(cache_path: Path) -> dict:
+    try:
+        payload = json.loads(cache_path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return payload if isinstance(payload, dict) else {}
+
+
+def _write_cache_atomic(cache_path: Path, payload: dict) -> None:
+    """Write the cache to a temp file in the same directory and rename it over the old one."""
+
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=cache_path.parent, prefix=f".{cache_path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(payload, file, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_name, cache_path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
 def load_local_canon_knowledge(path: Path = LOCAL_CANON_PATH) -> tuple[DynamicKnowledgeEntry, ...]:
     """Parse data/canon_knowledge.txt into structured entries with good keywords.
 
@@ -222,32 +315,32 @@ def load_dynamic_knowledge(cache_path: Path = DEFAULT_CACHE_PATH) -> tuple[Dynam
     return tuple(entries)
 
 
-async def _fetch_text(
+async def _fetch_conditional(
     session: aiohttp.ClientSession,
+    semaphore: asyncio.Semaphore,
     url: str,
-    fetched: list[str],
-    failed: list[str],
-) -> str:
-    try:
-        async with session.get(url) as response:
-            if response.status >= 400:
-                failed.append(url)
-                return ""
-            fetched.append(url)
-            return await response.text()
-    except Exception:
-        failed.append(url)
-        return ""
-
-
-async def _fetch_telegram_text(
-    session: aiohttp.ClientSession,
-    url: str,
-    fetched: list[str],
-    failed: list[str],
-) -> str:
-    raw_html = await _fetch_text(session, url, fetched, failed)
-    return _telegram_html_to_text(raw_html)
+    previous: dict,
+) -> _Fetched:
+    headers = {}
+    if previous.get("etag"):
+        headers["If-None-Match"] = previous["etag"]
+    if previous.get("last_modified"):
+        headers["If-Modified-Since"] = previous["last_modified"]
+    async with semaphore:
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304:
+                    return _Fetched("unchanged")
+                if response.status >= 400:
+                    return _Fetched("failed")
+                return _Fetched(
+                    "changed",
+                    text=await response.text(),
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified"),
+                )
+        except Exception:
+            return _Fetched("failed")
 
 
 def _telegram_html_to_text(raw_html: str) -> str:
@@ -309,6 +402,14 @@ def _level_emoji(level: str) -> str:
     return "🔵" if level.lower().startswith("выс") else "🟡"
 
 
+def _entry_dict(text: str, **kwargs: str) -> dict | None:
+    if not text:
+        return None
+    entry = asdict(_entry_from_text(text=text, **kwargs))
+    entry["keywords"] = list(entry["keywords"])
+    return entry
+
+
 def _entry_from_text(
     *,
     title: str,
@@ -6,19 +6,49 @@ fallback when one provider fails. Designed for Phase 2 modules (Mom, Universe, A
 
 from __future__ import annotations
 
+import asyncio
+import concurrent.futures
+import importlib.util
 import json
 import logging
 import os
 import time
-from dataclasses import dataclass
+import weakref
+from collections import deque
+from dataclasses import dataclass, replace
 from enum import Enum
 from typing import Optional, Dict, Any
 
 import httpx
 
+from bot.ai.response_cache import ResponseCache, make_cache_key, persistent_tier_from_settings
+
 
 logger = logging.getLogger(__name__)
 
+# HTTP/2 needs the optional "h2" package; without it clients speak HTTP/1.1
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Keep-alive pool of each provider client
+MAX_CONNECTIONS_PER_PROVIDER = 10
+MAX_KEEPALIVE_PER_PROVIDER = 5
+KEEPALIVE_EXPIRY_SECONDS = 60.0
+
+# Provider health: EWMA smoothing and latency samples kept for p90
+HEALTH_EWMA_ALPHA = 0.2
+HEALTH_LATENCY_SAMPLES = 50
+
+# Hedge only after this many successful calls give a meaningful p90
+HEDGE_MIN_SAMPLES = 5
+MAX_PARALLEL_PROVIDERS = 2
+
+# Circuit breaker: open after N consecutive failures, probe again after the cooldown
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_OPEN_SECONDS = 60.0
+
+# Managers alive in the process, closed together on shutdown
+_managers: "weakref.WeakSet[AIModelManager]" = weakref.WeakSet()
+
 
 class ProviderType(Enum):
     """Supported AI provider types."""
@@ -40,6 +70,130 @@ class ProviderConfig:
     max_tokens: int = 150
 
 
+@dataclass
+class ProviderTimings:
+    """Accumulated request timings of one provider (seconds)."""
+    requests: int = 0
+    new_connections: int = 0
+    connect: float = 0.0
+    ttfb: float = 0.0
+    total: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return counters and per-request averages."""
+        n = self.requests or 1
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "avg_connect": self.connect / n,
+            "avg_ttfb": self.ttfb / n,
+            "avg_total": self.total / n,
+        }
+
+
+class _RequestTrace:
+    """httpcore trace callback splitting a request into connect / TTFB / total."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.connect = 0.0
+        self.connected = False
+        self.first_byte: Optional[float] = None
+        self._connect_started: Optional[float] = None
+
+    async def __call__(self, event_name: str, info: Dict[str, Any]) -> None:
+        now = time.perf_counter()
+        if event_name == "connection.connect_tcp.started":
+            self._connect_started = now
+            self.connected = True
+        elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            if self._connect_started is not None:
+                self.connect = now - self._connect_started
+        elif event_name.endswith("receive_response_headers.complete") and self.first_byte is None:
+            self.first_byte = now - self.started
+
+
+class ProviderHealth:
+    """Latency/error tracker and circuit breaker of one provider.
+
+    Latency and error rate are exponentially weighted moving averages.
+    After CIRCUIT_FAILURE_THRESHOLD consecutive failures the circuit opens
+    for CIRCUIT_OPEN_SECONDS; then it is half-open: one probe request is
+    let through and the circuit stays open for everyone else until the
+    probe's outcome closes or reopens it.
+    """
+
+    def __init__(self, prior_latency: float) -> None:
+        self.prior_latency = prior_latency
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.samples: deque[float] = deque(maxlen=HEALTH_LATENCY_SAMPLES)
+
+    def allows_request(self, now: float) -> bool:
+        """Check whether the circuit is closed or due for a probe."""
+        return now >= self.open_until and not self.probing
+
+    def start_request(self, now: float) -> bool:
+        """Take the half-open probe slot if the circuit is due for a probe.
+
+        Returns:
+            True if this request is the probe; its outcome must be recorded
+            with record_success/record_failure or released with end_probe.
+        """
+        if self.open_until and now >= self.open_until and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def end_probe(self) -> None:
+        """Release the probe slot without an outcome (e.g. a cancelled hedge)."""
+        self.probing = False
+
+    def record_success(self, latency: float) -> None:
+        """Record a successful call and close the circuit."""
+        self.samples.append(latency)
+        self.latency = latency if self.latency is None else (
+            HEALTH_EWMA_ALPHA * latency + (1 - HEALTH_EWMA_ALPHA) * self.latency
+        )
+        self.error_rate *= 1 - HEALTH_EWMA_ALPHA
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probing = False
+
+    def record_failure(self, now: float, fatal: bool = False, probe: bool = False) -> None:
+        """Record a failed call; `fatal` or a failed `probe` opens the circuit immediately."""
+        self.error_rate = HEALTH_EWMA_ALPHA + (1 - HEALTH_EWMA_ALPHA) * self.error_rate
+        self.consecutive_failures += 1
+        if fatal or probe or self.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+            self.open_until = now + CIRCUIT_OPEN_SECONDS
+        if probe:
+            self.probing = False
+
+    def score(self) -> float:
+        """Expected cost of a call: latency inflated by the error rate (lower is better)."""
+        latency = self.latency if self.latency is not None else self.prior_latency
+        return latency * (1 + 4 * self.error_rate)
+
+    def hedge_delay(self) -> Optional[float]:
+        """p90 latency after which a hedge request is worth it, if known."""
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+
+    def as_dict(self, now: float) -> Dict[str, Any]:
+        """Return the health snapshot for stats."""
+        return {
+            "latency": self.latency,
+            "error_rate": self.error_rate,
+            "p90": self.hedge_delay(),
+            "circuit_open": not self.allows_request(now),
+        }
+
+
 @dataclass
 class AIResponse:
     """Response from AI model."""
@@ -56,7 +210,10 @@ class AIModelManager:
     Features:
     - Multiple provider support (HF, OpenRouter, Ollama)
     - Automatic switching on errors (429, 403, 500)
-    - Response caching (5 minutes)
+    - Bounded LRU response cache (5 minutes) with optional Redis tier
+    - One pooled keep-alive (HTTP/2 if available) client per provider
+    - Connect / time-to-first-byte / total timings per provider
+    - Health-ordered providers with circuit breaker and hedged requests
     - Configurable via environment variables
     
     Usage:
@@ -67,9 +224,30 @@ class AIModelManager:
     
     def __init__(self):
         self.providers: list[ProviderConfig] = []
-        self.cache: Dict[str, tuple[str, float]] = {}  # prompt -> (response, timestamp)
-        self.cache_ttl = 300  # 5 minutes
+        self.cache = ResponseCache(
+            max_entries=int(os.getenv("AI_CACHE_MAX_ENTRIES", "1000")),
+            max_bytes=int(os.getenv("AI_CACHE_MAX_BYTES", str(2 * 1024 * 1024))),
+            ttl=300,  # 5 minutes
+            persistent=persistent_tier_from_settings(),
+        )
+        self._clients: Dict[str, tuple[httpx.AsyncClient, asyncio.AbstractEventLoop]] = {}
+        self.timings: Dict[str, ProviderTimings] = {}
+        self.health: Dict[str, ProviderHealth] = {}
+        self.hedging = os.getenv("AI_HEDGING", "true").lower() == "true"
+        self.hedges = 0
         self._load_providers()
+        # Answers depend on the configured models, so they are part of cache keys
+        self._models_key = ",".join(f"{p.name}/{p.model}" for p in self.providers)
+        _managers.add(self)
+
+    @property
+    def cache_ttl(self) -> float:
+        """Seconds a cached response stays fresh."""
+        return self.cache.ttl
+
+    @cache_ttl.setter
+    def cache_ttl(self, value: float) -> None:
+        self.cache.ttl = value
         
     def _load_providers(self) -> None:
         """Load provider configurations from environment."""
@@ -166,36 +344,108 @@ class AIModelManager:
         if not self.providers:
             logger.warning("No AI providers configured. AI features will be limited.")
     
-    def _get_cache_key(self, prompt: str, user_id: Optional[int] = None) -> str:
-        """Generate cache key for prompt."""
-        return f"{user_id or 'global'}:{prompt[:100]}"
+    def _get_cache_key(
+        self,
+        prompt: str,
+        user_id: Optional[int] = None,
+        preferred_provider: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        """Generate cache key from the full prompt, models and max_tokens."""
+        return make_cache_key(
+            prompt,
+            user_id=user_id,
+            model=f"{preferred_provider or ''}|{self._models_key}",
+            max_tokens=max_tokens,
+        )
     
-    def _get_cached_response(self, prompt: str, user_id: Optional[int] = None) -> Optional[str]:
-        """Get cached response if available and not expired."""
-        cache_key = self._get_cache_key(prompt, user_id)
-        
-        if cache_key in self.cache:
-            response, timestamp = self.cache[cache_key]
-            if time.time() - timestamp < self.cache_ttl:
-                logger.debug(f"Cache hit for prompt: {prompt[:50]}...")
-                return response
-            else:
-                # Expired, remove from cache
-                del self.cache[cache_key]
-        
-        return None
+    def _get_cached_response(self, prompt: str, user_id: Optional[int] = None, **key_args: Any) -> Optional[str]:
+        """Get cached response from memory if available and not expired."""
+        return self.cache.get(self._get_cache_key(prompt, user_id, **key_args))
     
-    def _cache_response(self, prompt: str, response: str, user_id: Optional[int] = None) -> None:
-        """Cache response with timestamp."""
-        cache_key = self._get_cache_key(prompt, user_id)
-        self.cache[cache_key] = (response, time.time())
-        
-        # Limit cache size to 100 entries
-        if len(self.cache) > 100:
-            # Remove oldest entry
-            oldest_key = min(self.cache.keys(), key=lambda k: self.cache[k][1])
-            del self.cache[oldest_key]
+    def _cache_response(self, prompt: str, response: str, user_id: Optional[int] = None, **key_args: Any) -> None:
+        """Cache response in memory."""
+        self.cache.set(self._get_cache_key(prompt, user_id, **key_args), response)
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get response cache hit rate and size."""
+        return self.cache.get_stats()
     
+    def _client(self, provider: ProviderConfig) -> httpx.AsyncClient:
+        """Return the pooled client of a provider, creating it on first use.
+
+        A client is bound to the event loop it was created in, so it is
+        recreated if the bot runs on a new loop; the replaced client is
+        closed on its own loop (see _retire_client).
+        """
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(provider.name)
+        if entry is not None and entry[1] is loop:
+            return entry[0]
+        if entry is not None:
+            self._retire_client(provider.name, *entry)
+        client = httpx.AsyncClient(
+            timeout=provider.timeout,
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS_PER_PROVIDER,
+                max_keepalive_connections=MAX_KEEPALIVE_PER_PROVIDER,
+                keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS,
+            ),
+        )
+        self._clients[provider.name] = (client, loop)
+        logger.info(f"Created HTTP client for provider {provider.name} (http2={HTTP2_AVAILABLE})")
+        return client
+
+    @staticmethod
+    def _retire_client(name: str, client: httpx.AsyncClient, loop: asyncio.AbstractEventLoop) -> None:
+        """Close a client replaced after an event loop change.
+
+        Its connections belong to the old loop, so aclose() is scheduled
+        there while that loop still runs. A closed loop has already dropped
+        its transports; the client is then only logged and released.
+        """
+        if loop.is_closed() or not loop.is_running():
+            logger.info(f"Dropped HTTP client for provider {name}: its event loop is gone")
+            return
+        def log_error(future: concurrent.futures.Future) -> None:
+            if not future.cancelled() and future.exception() is not None:
+                logger.warning(f"Failed to close HTTP client for {name}: {future.exception()}")
+
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop).add_done_callback(log_error)
+
+    async def _post(self, provider: ProviderConfig, url: str, **kwargs: Any) -> httpx.Response:
+        """POST through the provider's pooled client and record its timings."""
+        trace = _RequestTrace()
+        extensions = {"trace": trace}
+        try:
+            return await self._client(provider).post(
+                url, timeout=provider.timeout, extensions=extensions, **kwargs
+            )
+        finally:
+            total = time.perf_counter() - trace.started
+            stats = self.timings.setdefault(provider.name, ProviderTimings())
+            stats.requests += 1
+            stats.new_connections += int(trace.connected)
+            stats.connect += trace.connect
+            stats.ttfb += trace.first_byte if trace.first_byte is not None else total
+            stats.total += total
+
+    def get_timing_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get connect / TTFB / total averages per provider."""
+        return {name: stats.as_dict() for name, stats in self.timings.items()}
+
+    async def aclose(self) -> None:
+        """Close pooled provider clients."""
+        clients, self._clients = self._clients, {}
+        for name, (client, _loop) in clients.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Failed to close HTTP client for {name}: {e}")
+        if self.timings:
+            logger.info(f"AI provider timings: {self.get_timing_stats()}")
+
     async def _call_huggingface(self, provider: ProviderConfig, prompt: str) -> str:
         """Call Hugging Face Inference API."""
         url = f"{provider.endpoint}/{provider.model}"
@@ -209,19 +459,18 @@ class AIModelManager:
             }
         }
         
-        async with httpx.AsyncClient(timeout=provider.timeout) as client:
-            response = await client.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # Handle different response formats
-            if isinstance(data, list) and len(data) > 0:
-                return data[0].get("generated_text", "").strip()
-            elif isinstance(data, dict):
-                return data.get("generated_text", "").strip()
-            else:
-                raise ValueError(f"Unexpected HF response format: {data}")
+        response = await self._post(provider, url, headers=headers, json=payload)
+        response.raise_for_status()
+        
+        data = response.json()
+        
+        # Handle different response formats
+        if isinstance(data, list) and len(data) > 0:
+            return data[0].get("generated_text", "").strip()
+        elif isinstance(data, dict):
+            return data.get("generated_text", "").strip()
+        else:
+            raise ValueError(f"Unexpected HF response format: {data}")
     
     async def _call_openrouter(self, provider: ProviderConfig, prompt: str) -> str:
         """Call OpenRouter API."""
@@ -236,12 +485,11 @@ class AIModelManager:
             "temperature": 0.7,
         }
         
-        async with httpx.AsyncClient(timeout=provider.timeout) as client:
-            response = await client.post(provider.endpoint, headers=headers, json=payload)
-            response.raise_for_status()
-            
-            data = response.json()
-            return data["choices"][0]["message"]["content"].strip()
+        response = await self._post(provider, provider.endpoint, headers=headers, json=payload)
+        response.raise_for_status()
+        
+        data = response.json()
+        return data["choices"][0]["message"]["content"].strip()
     
     async def _call_ollama(self, provider: ProviderConfig, prompt: str) -> str:
         """Call local Ollama API."""
@@ -256,12 +504,11 @@ class AIModelManager:
             }
         }
         
-        async with httpx.AsyncClient(timeout=provider.timeout) as client:
-            response = await client.post(url, json=payload)
-            response.raise_for_status()
-            
-            data = response.json()
-            return data.get("response", "").strip()
+        response = await self._post(provider, url, json=payload)
+        response.raise_for_status()
+        
+        data = response.json()
+        return data.get("response", "").strip()
     
     async def _call_groq(self, provider: ProviderConfig, prompt: str) -> str:
         """Call Groq API (OpenAI-compatible)."""
@@ -276,13 +523,87 @@ class AIModelManager:
             "temperature": 0.7,
         }
         
-        async with httpx.AsyncClient(timeout=provider.timeout) as client:
-            response = await client.post(provider.endpoint, headers=headers, json=payload)
-            response.raise_for_status()
-            
-            data = response.json()
-            return data["choices"][0]["message"]["content"].strip()
+        response = await self._post(provider, provider.endpoint, headers=headers, json=payload)
+        response.raise_for_status()
+        
+        data = response.json()
+        return data["choices"][0]["message"]["content"].strip()
     
+    def _health(self, provider: ProviderConfig) -> ProviderHealth:
+        """Get or create the health tracker of a provider."""
+        health = self.health.get(provider.name)
+        if health is None:
+            health = self.health[provider.name] = ProviderHealth(prior_latency=provider.timeout / 2)
+        return health
+
+    def _order_providers(
+        self,
+        preferred_provider: Optional[str],
+        providers: Optional[list[ProviderConfig]] = None,
+    ) -> list[ProviderConfig]:
+        """Order providers by health: closed circuits first, then by score.
+
+        The preferred provider goes first unless its circuit is open. Open
+        circuits are kept at the end so a total outage still gets a try.
+        """
+        now = time.monotonic()
+
+        def key(provider: ProviderConfig) -> tuple:
+            health = self._health(provider)
+            return (
+                not health.allows_request(now),
+                provider.name != preferred_provider,
+                health.score(),
+            )
+
+        return sorted(self.providers if providers is None else providers, key=key)
+
+    async def _call_provider(self, provider: ProviderConfig, prompt: str, probe: bool = False) -> str:
+        """Call a provider and record the outcome in its health tracker.
+
+        `probe` marks the half-open probe taken with ProviderHealth.start_request.
+        """
+        health = self._health(provider)
+        started = time.monotonic()
+        try:
+            if provider.provider_type == ProviderType.HUGGINGFACE:
+                text = await self._call_huggingface(provider, prompt)
+            elif provider.provider_type == ProviderType.OPENROUTER:
+                text = await self._call_openrouter(provider, prompt)
+            elif provider.provider_type == ProviderType.OLLAMA:
+                text = await self._call_ollama(provider, prompt)
+            elif provider.provider_type == ProviderType.GROQ:
+                text = await self._call_groq(provider, prompt)
+            else:
+                raise ValueError(f"Unknown provider type: {provider.provider_type}")
+            if not text:
+                raise ValueError(f"Empty response from {provider.name}")
+        except asyncio.CancelledError:
+            raise
+        except httpx.HTTPStatusError as e:
+            # Bad credentials will not fix themselves: open the circuit at once
+            health.record_failure(time.monotonic(), fatal=e.response.status_code in (401, 403), probe=probe)
+            raise
+        except Exception:
+            health.record_failure(time.monotonic(), probe=probe)
+            raise
+        health.record_success(time.monotonic() - started)
+        return text
+
+    def _log_failure(self, provider: ProviderConfig, error: BaseException) -> None:
+        """Log a provider failure by error kind."""
+        if isinstance(error, httpx.HTTPStatusError):
+            status_code = error.response.status_code
+            logger.warning(f"Provider {provider.name} failed with HTTP {status_code}: {error}")
+            if status_code in (401, 403):
+                logger.error(f"Authentication error for {provider.name}, skipping")
+        elif isinstance(error, (httpx.TimeoutException, httpx.ConnectError)):
+            logger.warning(f"Provider {provider.name} timeout/connection error: {error}")
+        elif isinstance(error, ValueError):
+            logger.warning(f"Provider {provider.name} failed: {error}")
+        else:
+            logger.error(f"Unexpected error with provider {provider.name}: {error}")
+
     async def get_response(
         self,
         prompt: str,
@@ -293,6 +614,11 @@ class AIModelManager:
         """
         Get AI response with automatic provider switching.
         
+        Providers are tried in order of health (see ProviderHealth). With
+        hedging enabled, if the provider in flight has not answered by its
+        p90 latency the next provider is started as well and the first
+        answer wins.
+        
         Args:
             prompt: User prompt/question
             user_id: Optional user ID for caching
@@ -304,9 +630,11 @@ class AIModelManager:
         Raises:
             RuntimeError: If all providers fail
         """
-        # Check cache first
-        cached = self._get_cached_response(prompt, user_id)
+        # Check cache first (memory, then the persistent tier)
+        cache_key = self._get_cache_key(prompt, user_id, preferred_provider, max_tokens)
+        cached = await self.cache.aget(cache_key)
         if cached:
+            logger.debug(f"Cache hit for prompt: {prompt[:50]}...")
             return AIResponse(
                 text=cached,
                 provider="cache",
@@ -318,85 +646,78 @@ class AIModelManager:
         if not self.providers:
             raise RuntimeError("No AI providers configured")
         
-        # Try preferred provider first
-        providers_to_try = list(self.providers)
-        if preferred_provider:
-            providers_to_try.sort(
-                key=lambda p: 0 if p.name == preferred_provider else 1
-            )
-        
-        last_error = None
-        
-        for provider in providers_to_try:
-            try:
-                logger.info(f"Trying provider: {provider.name} ({provider.model})")
-
-                if max_tokens is not None:
-                    provider = ProviderConfig(
-                        name=provider.name,
-                        provider_type=provider.provider_type,
-                        api_key=provider.api_key,
-                        endpoint=provider.endpoint,
-                        model=provider.model,
-                        timeout=provider.timeout,
-                        max_tokens=max_tokens,
-                    )
-
-                # Call appropriate provider
-                if provider.provider_type == ProviderType.HUGGINGFACE:
-                    text = await self._call_huggingface(provider, prompt)
-                elif provider.provider_type == ProviderType.OPENROUTER:
-                    text = await self._call_openrouter(provider, prompt)
-                elif provider.provider_type == ProviderType.OLLAMA:
-                    text = await self._call_ollama(provider, prompt)
-                elif provider.provider_type == ProviderType.GROQ:
-                    text = await self._call_groq(provider, prompt)
-                else:
-                    logger.warning(f"Unknown provider type: {provider.provider_type}")
-                    continue
-                
-                # Success! Cache and return
-                if text:
-                    self._cache_response(prompt, text, user_id)
-                    logger.info(f"✅ Success with provider: {provider.name}")
-                    
-                    return AIResponse(
-                        text=text,
-                        provider=provider.name,
-                        model=provider.model,
-                        cached=False,
-                    )
-                else:
-                    logger.warning(f"Empty response from {provider.name}")
-                    continue
-                    
-            except httpx.HTTPStatusError as e:
-                status_code = e.response.status_code
-                logger.warning(
-                    f"Provider {provider.name} failed with HTTP {status_code}: {e}"
+        remaining = list(self.providers)
+        in_flight: Dict[asyncio.Task, ProviderConfig] = {}
+        last_error: Optional[BaseException] = None
+
+        def launch() -> bool:
+            if not remaining:
+                return False
+            # Re-ordered on every launch: a circuit may have opened, or its
+            # half-open probe may have been taken by another request meanwhile
+            provider = self._order_providers(preferred_provider, remaining)[0]
+            remaining.remove(provider)
+            health = self._health(provider)
+            probe = health.start_request(time.monotonic())
+            if max_tokens is not None:
+                provider = replace(provider, max_tokens=max_tokens)
+            logger.info(f"Trying provider: {provider.name} ({provider.model})")
+            task = asyncio.create_task(self._call_provider(provider, prompt, probe))
+            if probe:
+                # A cancelled hedge (even one that never started) records no outcome
+                task.add_done_callback(lambda t: t.cancelled() and health.end_probe())
+            in_flight[task] = provider
+            return True
+
+        launch()
+        try:
+            while in_flight:
+                hedge_delay = None
+                if self.hedging and len(in_flight) < MAX_PARALLEL_PROVIDERS:
+                    newest = list(in_flight.values())[-1]
+                    hedge_delay = self._health(newest).hedge_delay()
+
+                done, _ = await asyncio.wait(
+                    in_flight, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED
                 )
-                
-                # Don't retry on certain errors
-                if status_code in (401, 403):
-                    logger.error(f"Authentication error for {provider.name}, skipping")
-                
-                last_error = e
-                continue
-                
-            except (httpx.TimeoutException, httpx.ConnectError) as e:
-                logger.warning(f"Provider {provider.name} timeout/connection error: {e}")
-                last_error = e
-                continue
-                
-            except Exception as e:
-                logger.error(f"Unexpected error with provider {provider.name}: {e}")
-                last_error = e
-                continue
+                if not done:
+                    # Slower than p90 of the provider in flight: hedge with the next one
+                    if launch():
+                        self.hedges += 1
+                        logger.info(f"Hedging after {hedge_delay:.2f}s")
+                    continue
+
+                for task in done:
+                    provider = in_flight.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        text = task.result()
+                        await self.cache.aset(cache_key, text)
+                        logger.info(f"✅ Success with provider: {provider.name}")
+                        return AIResponse(
+                            text=text,
+                            provider=provider.name,
+                            model=provider.model,
+                            cached=False,
+                        )
+                    self._log_failure(provider, error)
+                    last_error = error
+
+                if not in_flight:
+                    launch()
+        finally:
+            for task in in_flight:
+                task.cancel()
         
         # All providers failed
         error_msg = f"All AI providers failed. Last error: {last_error}"
         logger.error(error_msg)
         raise RuntimeError(error_msg)
+
+    def get_health_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get latency/error EWMAs and circuit state per provider."""
+        now = time.monotonic()
+        return {name: health.as_dict(now) for name, health in self.health.items()}
     
     async def generate_sentence(self, theme: Optional[str] = None) -> str:
         """
@@ -426,3 +747,9 @@ class AIModelManager:
     def is_available(self) -> bool:
         """Check if any providers are configured."""
         return len(self.providers) > 0
+
+
+async def close_ai_clients() -> None:
+    """Close the pooled HTTP clients of every AIModelManager in the process."""
+    for manager in list(_managers):
+        await manager.aclose()
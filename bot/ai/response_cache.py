@@ -0,0 +1,219 @@
+"""Bounded LRU cache of AI responses with an optional persistent tier.
+
+Keys hash the whole normalized prompt together with everything that changes
+the answer (user scope, provider/model, max_tokens). The in-memory tier is an
+O(1) LRU limited by entry count and total bytes; a persistent tier (anything
+with RedisCache's get/set interface) keeps answers across restarts.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Protocol
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 300
+
+PERSISTENT_KEY_PREFIX = "ai_response:"
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class PersistentTier(Protocol):
+    """Second-level store, e.g. utils.redis_cache.RedisCache."""
+
+    def get(self, key: str) -> Optional[Any]: ...
+
+    def set(self, key: str, value: Any, ttl: int = 0) -> None: ...
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so formatting-only differences share an entry."""
+    return _WHITESPACE_RE.sub(" ", prompt).strip()
+
+
+def make_cache_key(
+    prompt: str,
+    user_id: Optional[int] = None,
+    model: str = "",
+    max_tokens: Optional[int] = None,
+) -> str:
+    """Build a cache key from the full prompt and answer-shaping parameters.
+
+    Args:
+        prompt: Prompt text (normalized before hashing).
+        user_id: User scope, or None for answers shared by everyone.
+        model: Provider/model fingerprint the answer comes from.
+        max_tokens: Token limit of the answer.
+
+    Returns:
+        "<scope>:<sha256>" key.
+    """
+    digest = hashlib.sha256()
+    for part in (model, str(max_tokens or ""), normalize_prompt(prompt)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return f"{user_id or 'global'}:{digest.hexdigest()}"
+
+
+class ResponseCache:
+    """O(1) LRU+TTL cache of response texts bounded by entries and bytes.
+
+    get()/set() touch only memory. aget()/aset() also use the persistent
+    tier, in a worker thread since Redis calls are blocking; a persistent
+    hit is promoted into memory.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl: float = DEFAULT_TTL_SECONDS,
+        persistent: Optional[PersistentTier] = None,
+        clock: Optional[Callable[[], float]] = None,
+    ) -> None:
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of cached responses.
+            max_bytes: Maximum total UTF-8 size of cached responses.
+            ttl: Seconds a response stays fresh.
+            persistent: Optional persistent tier.
+            clock: Time source (time.time by default).
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.persistent = persistent
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple[str, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self.stats: Dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "persistent_hits": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _now(self) -> float:
+        return self._clock() if self._clock is not None else time.time()
+
+    def _lookup(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        text, expires_at, size = entry
+        if self._now() >= expires_at:
+            del self._entries[key]
+            self._bytes -= size
+            self.stats["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return text
+
+    def get(self, key: str) -> Optional[str]:
+        """Return a fresh in-memory response, or None."""
+        text = self._lookup(key)
+        self.stats["hits" if text is not None else "misses"] += 1
+        return text
+
+    def set(self, key: str, text: str, ttl: Optional[float] = None) -> None:
+        """Store a response in memory, evicting least recently used ones.
+
+        Args:
+            key: Cache key (see make_cache_key).
+            text: Response text.
+            ttl: Seconds to keep it (the cache TTL by default).
+        """
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[2]
+        self._entries[key] = (text, self._now() + (self.ttl if ttl is None else ttl), size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.stats["evictions"] += 1
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Return a response from memory or, failing that, the persistent tier."""
+        text = self._lookup(key)
+        if text is None and self.persistent is not None:
+            try:
+                stored = await asyncio.to_thread(self.persistent.get, PERSISTENT_KEY_PREFIX + key)
+            except Exception as e:
+                logger.warning(f"Persistent AI cache read failed: {e}")
+                stored = None
+            if isinstance(stored, str):
+                self.stats["persistent_hits"] += 1
+                self.set(key, stored)
+                text = stored
+        self.stats["hits" if text is not None else "misses"] += 1
+        return text
+
+    async def aset(self, key: str, text: str) -> None:
+        """Store a response in memory and in the persistent tier."""
+        self.set(key, text)
+        if self.persistent is not None:
+            try:
+                await asyncio.to_thread(
+                    self.persistent.set, PERSISTENT_KEY_PREFIX + key, text, int(self.ttl)
+                )
+            except Exception as e:
+                logger.warning(f"Persistent AI cache write failed: {e}")
+
+    def clear(self) -> None:
+        """Drop all in-memory entries."""
+        self._entries.clear()
+        self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters, hit rate and current size."""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "persistent": self.persistent is not None,
+        }
+
+
+def persistent_tier_from_settings(settings: Any = None) -> Optional[PersistentTier]:
+    """Build the Redis tier when settings.CACHE_BACKEND is "redis", else None.
+
+    Reads CACHE_BACKEND and REDIS_URL from src.config like the sticker rate
+    limiter, so both share one Redis server.
+    """
+    if settings is None:
+        from src.config import settings
+    try:
+        if getattr(settings, "CACHE_BACKEND", "memory") != "redis":
+            return None
+    except Exception as e:
+        # Settings are not configured (e.g. scripts without BOT_TOKEN)
+        logger.debug(f"Settings unavailable, AI cache stays in memory: {e}")
+        return None
+    try:
+        from utils.redis_cache import RedisCache
+
+        return RedisCache.from_url(settings.REDIS_URL, default_ttl=DEFAULT_TTL_SECONDS)
+    except Exception as e:
+        logger.warning(f"Persistent AI cache unavailable: {e}")
+        return None
@@ -10,6 +10,7 @@ from __future__ import annotations
 import re
 from dataclasses import dataclass
 
+from bot.ai.keyword_index import KeywordIndex
 from bot.ai.knowledge import CANON_DOC_URL, CANON_KNOWLEDGE, PROHIBITED_CANON_KEYWORDS, KnowledgeEntry
 from bot.ai.knowledge_updater import load_dynamic_knowledge, load_local_canon_knowledge
 
@@ -33,6 +34,7 @@ class AiLiteService:
     def __init__(self) -> None:
         self.dynamic_knowledge = load_dynamic_knowledge()
         self.local_knowledge = load_local_canon_knowledge()
+        self._knowledge_index = self._build_knowledge_index(self.dynamic_knowledge, self.local_knowledge)
         self.topics = (
             AiTopic(
                 title="about",
@@ -182,6 +184,7 @@ class AiLiteService:
                 ),
             ),
         )
+        self._topic_index = KeywordIndex(self.topics, lambda topic: topic.keywords)
 
     def help_text(self) -> str:
         """Return assistant usage help."""
@@ -228,31 +231,44 @@ class AiLiteService:
     def reload_dynamic_knowledge(self) -> int:
         """Reload runtime AI knowledge cache and return loaded entries count."""
 
-        self.dynamic_knowledge = load_dynamic_knowledge()
-        self.local_knowledge = load_local_canon_knowledge()
-        return len(self.dynamic_knowledge) + len(self.local_knowledge)
+        dynamic_knowledge = load_dynamic_knowledge()
+        local_knowledge = load_local_canon_knowledge()
+        index = self._build_knowledge_index(dynamic_knowledge, local_knowledge)
+        # Swap the index in one assignment so concurrent questions never see a half-built one
+        self._knowledge_index = index
+        self.dynamic_knowledge = dynamic_knowledge
+        self.local_knowledge = local_knowledge
+        return len(dynamic_knowledge) + len(local_knowledge)
+
+    @staticmethod
+    def _build_knowledge_index(
+        dynamic_knowledge: tuple, local_knowledge: tuple
+    ) -> KeywordIndex[KnowledgeEntry]:
+        """Index built-in, runtime and local canon entries by keyword."""
+        return KeywordIndex(
+            (*CANON_KNOWLEDGE, *dynamic_knowledge, *local_knowledge),
+            lambda entry: entry.keywords,
+        )
 
     def _match_topics(self, normalized_question: str) -> list[AiTopic]:
         """Return topics ordered by simple keyword score."""
-        scored_topics = []
-        for topic in self.topics:
-            score = sum(1 for keyword in topic.keywords if keyword in normalized_question)
-            if score:
-                scored_topics.append((score, topic.title, topic))
+        scored_topics = [
+            (score, topic.title, topic)
+            for score, topic in self._topic_index.score(normalized_question, lambda _keyword: 1)
+        ]
 
         scored_topics.sort(key=lambda item: (-item[0], item[1]))
         return [topic for _score, _title, topic in scored_topics]
 
     def _match_knowledge(self, normalized_question: str) -> list[KnowledgeEntry]:
         """Return canon knowledge entries ordered by simple keyword score."""
-        scored_entries = []
-        for entry in (*CANON_KNOWLEDGE, *self.dynamic_knowledge, *self.local_knowledge):
-            # Longer/specific keywords should beat generic words. Example:
-            # "кто такой олеговирус" must prefer the Olegovirus entry over
-            # generic canon rules that contain the shorter word "олег".
-            score = sum(len(keyword) for keyword in entry.keywords if keyword in normalized_question)
-            if score:
-                scored_entries.append((score, entry.title, entry))
+        # Longer/specific keywords should beat generic words. Example:
+        # "кто такой олеговирус" must prefer the Olegovirus entry over
+        # generic canon rules that contain the shorter word "олег".
+        scored_entries = [
+            (score, entry.title, entry)
+            for score, entry in self._knowledge_index.score(normalized_question, len)
+        ]
 
         if not scored_entries:
             return []
@@ -93,9 +93,11 @@ from bot.commands.admin_commands_ptb import (
 )
 from bot.template_coder import TemplateCoderDialog
 from bot.trivia.commands import trivia_command, trivia_poll_answer_handler
+from bot.trivia.questions import get_question_pool
 from bot.short_mode import long_all_command, long_command, short_all_command, short_command
 from core.managers.background_task_manager import BackgroundTaskManager
 from core.managers.sticker_manager import StickerManager
+from core.managers.sticker_rate_limiter import StickerRateLimiter
 from bot.handlers import ParsingHandler  # NEW: Unified parsing handler
 import structlog
 
@@ -217,6 +219,9 @@ class TelegramBot:
         self.background_task_manager = None
         self.sticker_manager = None
         self._last_sticker_warning_sent = {}
+        self.sticker_rate_limiter = StickerRateLimiter.from_settings(
+            engine, STICKER_LIMIT_PER_HOUR, STICKER_LIMIT_WINDOW_SECONDS, settings
+        )
 
         # NEW: Инициализация обработчика парсинга
         # Vercel serverless has a read-only filesystem; parsing's legacy
@@ -629,8 +634,6 @@ class TelegramBot:
         self, update: Update, context: ContextTypes.DEFAULT_TYPE
     ):
         """Удалять стикеры сверх лимита 5 стикеров в час на пользователя в чате."""
-        from sqlalchemy import text
-
         message = update.effective_message
         user = update.effective_user
         chat = update.effective_chat
@@ -638,106 +641,21 @@ class TelegramBot:
         if not message or not user or not chat or not message.sticker:
             return
 
-        now = datetime.utcnow()
-        window_start = now - timedelta(seconds=STICKER_LIMIT_WINDOW_SECONDS)
-
         try:
-            with engine.begin() as conn:
-                unlimited_until = conn.execute(
-                    text(
-                        """
-                        SELECT sticker_unlimited_until
-                        FROM users
-                        WHERE telegram_id = :telegram_id
-                          AND sticker_unlimited = TRUE
-                          AND sticker_unlimited_until > :now
-                        """
-                    ),
-                    {"telegram_id": user.id, "now": now},
-                ).scalar_one_or_none()
-                if unlimited_until is not None:
-                    logger.debug(
-                        "Sticker moderation skipped: unlimited access active",
-                        chat_id=chat.id,
-                        user_id=user.id,
-                        expires_at=str(unlimited_until),
-                    )
-                    return
-
-                conn.execute(
-                    text(
-                        """
-                        CREATE TABLE IF NOT EXISTS sticker_usage_events (
-                            id SERIAL PRIMARY KEY,
-                            chat_id BIGINT NOT NULL,
-                            user_id BIGINT NOT NULL,
-                            message_id BIGINT NOT NULL,
-                            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-                        )
-                        """
-                    )
-                )
-                conn.execute(
-                    text(
-                        """
-                        CREATE INDEX IF NOT EXISTS idx_sticker_usage_chat_user_created
-                        ON sticker_usage_events (chat_id, user_id, created_at)
-                        """
-                    )
-                )
-                conn.execute(
-                    text(
-                        """
-                        DELETE FROM sticker_usage_events
-                        WHERE created_at < :cleanup_before
-                        """
-                    ),
-                    {"cleanup_before": now - timedelta(hours=2)},
-                )
-                recent_count = conn.execute(
-                    text(
-                        """
-                        SELECT COUNT(*)
-                        FROM sticker_usage_events
-                        WHERE chat_id = :chat_id
-                          AND user_id = :user_id
-                          AND created_at >= :window_start
-                        """
-                    ),
-                    {
-                        "chat_id": chat.id,
-                        "user_id": user.id,
-                        "window_start": window_start,
-                    },
-                ).scalar_one()
-
-                if recent_count < STICKER_LIMIT_PER_HOUR:
-                    conn.execute(
-                        text(
-                            """
-                            INSERT INTO sticker_usage_events
-                                (chat_id, user_id, message_id, created_at)
-                            VALUES
-                                (:chat_id, :user_id, :message_id, :created_at)
-                            """
-                        ),
-                        {
-                            "chat_id": chat.id,
-                            "user_id": user.id,
-                            "message_id": message.message_id,
-                            "created_at": now,
-                        },
-                    )
-                    return
+            allowed = await self.sticker_rate_limiter.allow(
+                chat.id, user.id, message.message_id
+            )
         except Exception as e:
             logger.warning(
-                "Sticker rate-limit DB check failed",
+                "Sticker rate-limit check failed",
                 chat_id=chat.id,
                 user_id=user.id,
                 message_id=message.message_id,
                 error=str(e),
             )
             return
+        if allowed:
+            return
 
         try:
             await context.bot.delete_message(
@@ -778,33 +696,6 @@ class TelegramBot:
                 error=str(e),
             )
 
-        try:
-            with engine.begin() as conn:
-                conn.execute(
-                    text(
-                        """
-                        INSERT INTO sticker_usage_events
-                            (chat_id, user_id, message_id, created_at)
-                        VALUES
-                            (:chat_id, :user_id, :message_id, :created_at)
-                        """
-                    ),
-                    {
-                        "chat_id": chat.id,
-                        "user_id": user.id,
-                        "message_id": message.message_id,
-                        "created_at": now,
-                    },
-                )
-        except Exception as e:
-            logger.warning(
-                "Failed to record deleted sticker usage",
-                chat_id=chat.id,
-                user_id=user.id,
-                message_id=message.message_id,
-                error=str(e),
-            )
-
     def setup_error_handler(self):
         """Настройка обработчика ошибок через PTB add_error_handler."""
         from bot.middleware.error_handler import setup_error_handler as _setup
@@ -852,6 +743,18 @@ class TelegramBot:
         Graceful shutdown фоновых задач (Task 11.3)
         Validates: Requirements 12.1, 12.2
         """
+        try:
+            from core.middleware import flush_user_activity
+
+            await flush_user_activity()
+        except Exception as e:
+            logger.error(f"Error flushing user activity: {e}")
+
+        try:
+            await self.sticker_rate_limiter.close()
+        except Exception as e:
+            logger.error(f"Error flushing sticker usage events: {e}")
+
         try:
             if self.background_task_manager:
                 logger.info("Stopping background task manager...")
@@ -911,6 +814,9 @@ class TelegramBot:
                     "Background task system initialization completed successfully"
                 )
 
+                # Прогреваем пул ИИ-вопросов викторины, чтобы /trivia отвечал сразу
+                get_question_pool().maybe_refill()
+
             finally:
                 db.close()
 
@@ -1552,6 +1458,11 @@ class TelegramBot:
             # Проверяем и инициализируем правила парсинга (Task 11.2)
             self._ensure_parsing_rules_initialized(db)
 
+            # Кэш режимов ответа (short/long/watch) одним запросом
+            from bot.response_modes import preload_response_modes
+
+            logger.info("Response modes preloaded", users=preload_response_modes())
+
         except Exception as e:
             logger.error("Failed to initialize systems", error=str(e))
         finally:
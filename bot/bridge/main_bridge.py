@@ -58,6 +58,7 @@ async def main() -> None:
             tg_chat_id=BRIDGE_TG_CHAT_ID,
             bot=bot,
             loop=loop,
+            vk_peer_id=VK_PEER_ID,
         )
         vk_thread.start()
         logger.info("Bridge module started", tg_chat_id=BRIDGE_TG_CHAT_ID, vk_peer_id=VK_PEER_ID)
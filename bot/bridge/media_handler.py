@@ -1,10 +1,21 @@
 """Shim: re-export из bridge_bot/media.py."""
 
 from bridge_bot.media import (
+    MediaItem,
     upload_photo_to_vk,
     upload_video_to_vk,
     upload_doc_to_vk,
     download_tg_file,
+    relay_album_to_vk,
+    relay_tg_file_to_vk,
 )
 
-__all__ = ["upload_photo_to_vk", "upload_video_to_vk", "upload_doc_to_vk", "download_tg_file"]
+__all__ = [
+    "MediaItem",
+    "upload_photo_to_vk",
+    "upload_video_to_vk",
+    "upload_doc_to_vk",
+    "download_tg_file",
+    "relay_album_to_vk",
+    "relay_tg_file_to_vk",
+]
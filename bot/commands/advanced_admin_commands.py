@@ -126,7 +126,8 @@ class AdvancedAdminCommands:
                         f"   • Успешно: {result.successful_sends}\n"
                         f"   • Ошибок: {result.failed_sends}\n"
                         f"   • Успех: {success_rate:.1f}%\n"
-                        f"⏱️ Время: {result.execution_time:.2f} сек"
+                        f"⏱️ Время: {result.execution_time:.2f} сек\n"
+                        f"⚡ Скорость: {result.messages_per_second:.1f} сообщ./сек"
                     )
                     await update.message.reply_text(text, parse_mode="HTML")
                 else:
@@ -308,6 +308,7 @@ async def ai_update_knowledge_command(
         f"• Новых runtime-записей: {result.entries_count}\n"
         f"• Загружено в AI-lite: {loaded_count}\n"
         f"• Успешных источников: {len(result.fetched_urls)}\n"
+        f"• Без изменений: {len(result.unchanged_urls)}\n"
         f"• Кэш: {result.cache_path}"
         f"{failed_part}\n\n"
         "Теперь /ai будет учитывать свежий кэш вместе с встроенным каноном.",
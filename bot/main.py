@@ -37,7 +37,8 @@ class BotApplication:
         1. Database connections (engine.dispose)
         2. Background tasks
         3. Bot application
-        4. PID file
+        4. Trivia question prefetching and AI provider HTTP clients
+        5. PID file
 
         Each step is isolated - errors in one step don't stop others.
         PID file is always removed, even if other steps fail.
@@ -89,7 +90,20 @@ class BotApplication:
                 errors.append(f"bot_application: {e}")
                 logger.error("Bot application shutdown failed", error=str(e))
 
-        # Step 4: Always remove PID file (even on errors)
+        # Step 4: Stop trivia prefetching and close pooled AI provider clients
+        try:
+            from bot.ai.model_manager import close_ai_clients
+            from bot.trivia.questions import close_question_pool
+
+            await close_question_pool()
+
+            logger.info("Closing AI provider clients")
+            await close_ai_clients()
+        except Exception as e:
+            errors.append(f"ai_clients: {e}")
+            logger.error("AI client shutdown failed", error=str(e))
+
+        # Step 5: Always remove PID file (even on errors)
         try:
             logger.info("Removing PID file")
             ProcessManager.remove_pid()
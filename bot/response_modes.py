@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import os
 import re
+import time
 from datetime import datetime
 from typing import Any
 
@@ -21,8 +22,13 @@ WATCH_MODE_MAX_LINES = 4
 SUPPORTED_RESPONSE_MODES = {"short", "long", "watch"}
 WATCH_TEMPLATES_HINT = "Часы: ОК, Да, Спасибо, Спасибо нет, Великолепно, Спасибо еще раз, Скоро увидимся, Скоро буду, Я занят(а), Нет."
 
+# How long the cached snapshot of response_mode_settings is trusted. Within it
+# a user missing from _user_modes has no persisted mode (negative entry).
+RESPONSE_MODE_CACHE_TTL_SECONDS = 300.0
+
 _user_modes: dict[int, str] = {}
 _global_mode: str | None = None
+_modes_expire_at = 0.0
 _reply_text_patch_installed = False
 _original_reply_text: Any = None
 
@@ -38,7 +44,7 @@ def set_user_mode(user_id: int | None, mode: str) -> None:
 
 
 def set_all_user_modes(mode: str) -> None:
-    """Set the default response mode for everyone and update known users."""
+    """Set the default response mode for everyone and update all users with a saved mode."""
     global _global_mode
     if mode not in SUPPORTED_RESPONSE_MODES:
         raise ValueError(f"Unsupported response mode: {mode}")
@@ -52,68 +58,74 @@ def get_user_mode(user_id: int | None) -> str | None:
     """Return explicitly selected response mode for a Telegram user."""
     if user_id is None:
         return None
-    if user_id not in _user_modes:
-        persisted_mode = _load_user_mode(user_id)
-        if persisted_mode:
-            _user_modes[user_id] = persisted_mode
+    _ensure_modes_loaded()
     return _user_modes.get(user_id)
 
 
 def get_default_user_mode(user_id: int | None) -> str:
     """Return selected mode or environment-specific default mode."""
-    global _global_mode
-    if _global_mode is None:
-        _global_mode = _load_global_mode()
+    _ensure_modes_loaded()
     return get_user_mode(user_id) or _global_mode or ("short" if os.environ.get("SPACE_ID") else "long")
 
 
-def _load_user_mode(user_id: int) -> str | None:
-    """Load a user's persisted response mode, if DB is available."""
-    try:
-        db = SessionLocal()
-        try:
-            result = db.execute(
-                text(
-                    """
-                    SELECT mode
-                    FROM response_mode_settings
-                    WHERE telegram_id = :telegram_id AND is_global = false
-                    """
-                ),
-                {"telegram_id": user_id},
-            ).mappings().first()
-        finally:
-            db.close()
-    except Exception:
-        return None
+def preload_response_modes() -> int:
+    """Load every persisted response mode into the cache with one query.
+
+    The loaded snapshot replaces the cache, so modes deleted or reset in the
+    DB are dropped. Returns the number of user modes loaded. When the DB is
+    unavailable the cached modes are kept and the next load waits for the
+    TTL as well.
+    """
+    global _user_modes, _global_mode, _modes_expire_at
+    _modes_expire_at = time.monotonic() + RESPONSE_MODE_CACHE_TTL_SECONDS
+    loaded = _load_all_modes()
+    if loaded is None:
+        return 0
+    _user_modes, _global_mode = loaded
+    return len(_user_modes)
+
+
+def invalidate_response_modes() -> None:
+    """Reload persisted response modes on the next lookup."""
+    global _modes_expire_at
+    _modes_expire_at = 0.0
+
 
-    mode = result["mode"] if result else None
-    return mode if mode in SUPPORTED_RESPONSE_MODES else None
+def _ensure_modes_loaded() -> None:
+    """Refresh the cached modes when the snapshot TTL has passed."""
+    if time.monotonic() >= _modes_expire_at:
+        preload_response_modes()
 
 
-def _load_global_mode() -> str | None:
-    """Load persisted global response mode, if DB is available."""
+def _load_all_modes() -> tuple[dict[int, str], str | None] | None:
+    """Load all persisted user modes and the global mode, if DB is available."""
     try:
         db = SessionLocal()
         try:
-            result = db.execute(
+            rows = db.execute(
                 text(
                     """
-                    SELECT mode
+                    SELECT telegram_id, mode, is_global
                     FROM response_mode_settings
-                    WHERE is_global = true
-                    ORDER BY updated_at DESC, id DESC
-                    LIMIT 1
+                    ORDER BY updated_at, id
                     """
                 )
-            ).mappings().first()
+            ).mappings().all()
         finally:
             db.close()
     except Exception:
         return None
 
-    mode = result["mode"] if result else None
-    return mode if mode in SUPPORTED_RESPONSE_MODES else None
+    user_modes: dict[int, str] = {}
+    global_mode = None
+    for row in rows:
+        if row["mode"] not in SUPPORTED_RESPONSE_MODES:
+            continue
+        if row["is_global"]:
+            global_mode = row["mode"]
+        elif row["telegram_id"] is not None:
+            user_modes[row["telegram_id"]] = row["mode"]
+    return user_modes, global_mode
 
 
 def _save_user_mode(user_id: int, mode: str) -> None:
@@ -173,6 +185,17 @@ def _save_global_mode(mode: str) -> None:
         db = SessionLocal()
         try:
             db.execute(text("DELETE FROM response_mode_settings WHERE is_global = true"))
+            # Persisted user modes are cached too, so they follow the global switch
+            db.execute(
+                text(
+                    """
+                    UPDATE response_mode_settings
+                    SET mode = :mode, updated_at = :updated_at
+                    WHERE is_global = false
+                    """
+                ),
+                {"mode": mode, "updated_at": datetime.utcnow()},
+            )
             db.add(
                 ResponseModeSetting(
                     telegram_id=None,
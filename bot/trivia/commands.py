@@ -38,8 +38,8 @@ async def trivia_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             )
             return
 
-    # Pick a random question and generate distractors dynamically
-    question = await generate_trivia_question()
+    # Prefetched AI question, or a random hardcoded one with dynamic distractors
+    question = generate_trivia_question()
     question_text = question["text"]
     options = question["options"]
     correct_shuffled_index = question["correct_index"]
@@ -6,10 +6,12 @@ import re
 from pathlib import Path
 
 from bot.ai.model_manager import AIModelManager
+from common.trivia_pool import TriviaQuestionPool
 
 
 _CANON_PATH = Path("data/canon_knowledge.txt")
 _ai_manager: AIModelManager | None = None
+_question_pool: TriviaQuestionPool | None = None
 
 
 def _get_ai_manager() -> AIModelManager:
@@ -138,6 +140,27 @@ async def generate_trivia_question_ai() -> dict | None:
     return None
 
 
+async def _generate_pool_question() -> dict | None:
+    # Late lookup so the pool always uses the current generator
+    return await generate_trivia_question_ai()
+
+
+def get_question_pool() -> TriviaQuestionPool:
+    """Return the process-wide pool of prefetched AI questions."""
+    global _question_pool
+    if _question_pool is None:
+        _question_pool = TriviaQuestionPool(_generate_pool_question)
+    return _question_pool
+
+
+async def close_question_pool() -> None:
+    """Stop background question prefetching."""
+    global _question_pool
+    if _question_pool is not None:
+        await _question_pool.aclose()
+        _question_pool = None
+
+
 TRIVIA_QUESTIONS = [
     # ── БЛОК 1 (ПРАВИЛА) — 3 вопроса ──────────────────────────────────────
     {
@@ -298,19 +321,26 @@ TRIVIA_QUESTIONS = [
 ]
 
 
-async def generate_trivia_question() -> dict:
-    """Generate a trivia question — tries AI API first, falls back to hardcoded pool.
+def generate_trivia_question() -> dict:
+    """Return a trivia question without waiting for the AI provider.
+
+    Serves a prefetched AI question when one is ready (and schedules a background
+    refill when the pool runs low), otherwise falls back to the hardcoded pool,
+    preferring questions that were not asked recently.
 
     Returns:
         dict: A dict containing question text, shuffled options, correct option index,
               correct option text, and explanation.
     """
-    ai_question = await generate_trivia_question_ai()
+    pool = get_question_pool()
+    ai_question = pool.take()
     if ai_question:
         return ai_question
 
     # Fallback: hardcoded pool, distractors from same group
-    question = random.choice(TRIVIA_QUESTIONS)
+    candidates = [q for q in TRIVIA_QUESTIONS if not pool.is_recent(q["text"])] or TRIVIA_QUESTIONS
+    question = random.choice(candidates)
+    pool.mark_asked(question)
     correct_text = question["correct_text"]
     q_group = question.get("group", "")
 
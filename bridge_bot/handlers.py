@@ -29,7 +29,7 @@ def get_message_queue() -> MessageQueue:
         def _send(msg: OutboundMessage) -> None:
             send_text(
                 text=msg.text,
-                peer_id=VK_PEER_ID,
+                peer_id=msg.peer_id or VK_PEER_ID,
                 sender_name=msg.sender_name,
                 vk_token=VK_TOKEN,
             )
@@ -74,6 +74,7 @@ async def forward_to_vk(message: Message) -> None:
         text=text,
         platform="vk",
         sender_name=sender_name,
+        peer_id=VK_PEER_ID,
     )
     get_message_queue().put(outbound)
     logger.info(
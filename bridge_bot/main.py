@@ -53,6 +53,7 @@ async def main() -> None:
             tg_chat_id=BRIDGE_TG_CHAT_ID,
             bot=bot,
             loop=loop,
+            vk_peer_id=VK_PEER_ID,
         )
         vk_thread.start()
         logger.info("Bridge started", tg_chat_id=BRIDGE_TG_CHAT_ID, vk_peer_id=VK_PEER_ID)
@@ -91,6 +92,9 @@ async def main() -> None:
             vk_thread.stop()
             vk_thread.join(timeout=5)
             closed.append("VKListenerThread")
+        from bridge_bot.vk_client import close_vk_session_pool
+        logger.info("VK session pool closed", **close_vk_session_pool())
+        closed.append("VkSessionPool")
         try:
             from database.connection import close_pool
             await close_pool()
@@ -1,9 +1,17 @@
-"""Работа с медиафайлами: скачивание из Telegram, загрузка в VK."""
+"""Работа с медиафайлами: скачивание из Telegram, загрузка в VK.
 
-import tempfile
+Файлы не пишутся на диск: байты отправляются в VK напрямую, а
+relay_tg_file_to_vk передаёт поток скачивания из Telegram в multipart-загрузку
+VK через ограниченный буфер (ChunkPipe), не держа файл в памяти целиком.
+"""
+
+import asyncio
+import threading
 import time
-from pathlib import Path
-from typing import Optional
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, List, Optional, Union
 
 import requests
 import structlog
@@ -13,6 +21,39 @@ logger = structlog.get_logger()
 
 MAX_RETRIES = 3
 
+# Chunk size of the Telegram download stream
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Bytes buffered between the Telegram download and the VK upload
+STREAM_BUFFER_BYTES = 1024 * 1024
+
+# Album items relayed at once
+ALBUM_UPLOAD_CONCURRENCY = 3
+
+# Upload request timeouts per media kind, seconds
+UPLOAD_TIMEOUTS = {"photo": 30, "video": 120, "doc": 60}
+
+DEFAULT_FILENAMES = {"photo": "photo.jpg", "video": "video.mp4", "doc": "file.bin"}
+
+# Multipart field names expected by VK upload servers
+FIELD_NAMES = {"photo": "photo", "video": "video_file", "doc": "file"}
+
+
+def _http(vk_session: vk_api.VkApi):
+    """Return the HTTP client for upload requests.
+
+    Uses the session's keep-alive requests.Session (shared by pooled
+    sessions from bridge_bot.vk_client) so uploads reuse its connections.
+
+    Args:
+        vk_session: Authenticated VkApi session.
+
+    Returns:
+        requests.Session of the VK session, or the requests module.
+    """
+    http = getattr(vk_session, "http", None)
+    return http if isinstance(http, requests.Session) else requests
+
 
 def _retry(func, *args, **kwargs):
     """Execute func with exponential backoff retries (1s → 2s → 4s).
@@ -44,6 +85,237 @@ def _retry(func, *args, **kwargs):
             time.sleep(delay)
 
 
+class PipeAborted(Exception):
+    """Raised to the producer when the consumer of a ChunkPipe has stopped."""
+
+
+class ChunkPipe:
+    """Bounded thread-safe byte buffer between a producer and a blocking reader.
+
+    The producer (the asyncio download) adds chunks with offer() or put(),
+    the reader (the upload thread) consumes them with read(). At most
+    max_bytes are held, so memory use does not depend on the file size.
+    """
+
+    def __init__(self, max_bytes: int = STREAM_BUFFER_BYTES) -> None:
+        """Initialize the pipe.
+
+        Args:
+            max_bytes: Bytes buffered before put() blocks.
+        """
+        self.max_bytes = max_bytes
+        self._chunks: Deque[bytes] = deque()
+        self._size = 0
+        self._closed = False
+        self._aborted = False
+        self._error: Optional[BaseException] = None
+        self._cond = threading.Condition()
+
+    def _has_room(self, chunk: bytes) -> bool:
+        return not self._chunks or self._size + len(chunk) <= self.max_bytes
+
+    def _append(self, chunk: bytes) -> None:
+        self._chunks.append(chunk)
+        self._size += len(chunk)
+        self._cond.notify_all()
+
+    def offer(self, chunk: bytes) -> bool:
+        """Add a chunk if there is room, without blocking.
+
+        Returns:
+            True if the chunk was added, False if the buffer is full.
+
+        Raises:
+            PipeAborted: If the reader has stopped.
+        """
+        with self._cond:
+            if self._aborted:
+                raise PipeAborted()
+            if not self._has_room(chunk):
+                return False
+            self._append(chunk)
+            return True
+
+    def put(self, chunk: bytes) -> None:
+        """Add a chunk, blocking while the buffer is full.
+
+        Raises:
+            PipeAborted: If the reader has stopped.
+        """
+        with self._cond:
+            while not self._aborted and not self._has_room(chunk):
+                self._cond.wait()
+            if self._aborted:
+                raise PipeAborted()
+            self._append(chunk)
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        """Mark the end of data, or a failed download if error is given."""
+        with self._cond:
+            self._closed = True
+            self._error = error
+            self._cond.notify_all()
+
+    def abort(self) -> None:
+        """Stop the producer: the reader will not consume more data."""
+        with self._cond:
+            self._aborted = True
+            self._chunks.clear()
+            self._size = 0
+            self._cond.notify_all()
+
+    def read(self, size: int = -1) -> bytes:
+        """Return up to size bytes, blocking until data arrives.
+
+        Returns:
+            Data, or b"" once the producer closed the pipe.
+
+        Raises:
+            IOError: If the producer closed the pipe with an error.
+        """
+        with self._cond:
+            while not self._chunks and not self._closed:
+                self._cond.wait()
+            if self._error is not None:
+                raise IOError(f"Source stream failed: {self._error}") from self._error
+            if not self._chunks:
+                return b""
+            chunk = self._chunks.popleft()
+            if 0 <= size < len(chunk):
+                self._chunks.appendleft(chunk[size:])
+                chunk = chunk[:size]
+            self._size -= len(chunk)
+            self._cond.notify_all()
+            return chunk
+
+
+class MultipartStream:
+    """File-like multipart/form-data body with one file read from a ChunkPipe.
+
+    Its length is known in advance, so requests sends it with
+    Content-Length and streams it with read() instead of building the body
+    in memory.
+    """
+
+    def __init__(self, field: str, filename: str, size: int, pipe: ChunkPipe) -> None:
+        """Initialize the body.
+
+        Args:
+            field: Form field name expected by the upload server.
+            filename: File name sent to the upload server.
+            size: Exact file size in bytes.
+            pipe: Source of the file bytes.
+        """
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self._head = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode("utf-8")
+        self._tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+        self._size = size
+        self._pipe = pipe
+        self._file_read = 0
+
+    def __len__(self) -> int:
+        return len(self._head) + self._size + len(self._tail)
+
+    def read(self, size: int = -1) -> bytes:
+        """Return the next part of the body (b"" at the end)."""
+        if self._head:
+            head, self._head = self._head, b""
+            return head
+        if self._file_read < self._size:
+            chunk = self._pipe.read(size if size > 0 else -1)
+            if not chunk:
+                raise IOError(f"Source ended after {self._file_read} of {self._size} bytes")
+            self._file_read += len(chunk)
+            if self._file_read > self._size:
+                raise IOError(f"Source is larger than {self._size} bytes")
+            return chunk
+        tail, self._tail = self._tail, b""
+        return tail
+
+
+FileBody = Union[bytes, MultipartStream]
+
+
+def _post_file(http, upload_url: str, field: str, filename: str, body: FileBody, timeout: int):
+    """POST a file to a VK upload server.
+
+    Args:
+        http: requests.Session or the requests module.
+        upload_url: Upload server URL.
+        field: Form field name.
+        filename: File name.
+        body: File bytes or a streaming multipart body.
+        timeout: Request timeout in seconds.
+
+    Returns:
+        requests.Response.
+    """
+    if isinstance(body, MultipartStream):
+        return http.post(
+            upload_url,
+            data=body,
+            headers={"Content-Type": body.content_type},
+            timeout=timeout,
+        )
+    return http.post(upload_url, files={field: (filename, body)}, timeout=timeout)
+
+
+def _upload_photo(vk_session: vk_api.VkApi, peer_id: int, body: FileBody, filename: str) -> str:
+    vk = vk_session.get_api()
+    upload_server = vk.photos.getMessagesUploadServer(peer_id=peer_id)
+    response = _post_file(
+        _http(vk_session), upload_server["upload_url"], "photo", filename, body, UPLOAD_TIMEOUTS["photo"]
+    ).json()
+    saved = vk.photos.saveMessagesPhoto(
+        photo=response["photo"],
+        server=response["server"],
+        hash=response["hash"],
+    )
+    photo = saved[0]
+    attachment = f"photo{photo['owner_id']}_{photo['id']}"
+    logger.info("Photo uploaded to VK", attachment=attachment)
+    return attachment
+
+
+def _upload_video(vk_session: vk_api.VkApi, body: FileBody, filename: str) -> str:
+    vk = vk_session.get_api()
+    upload_info = vk.video.save(name=filename, is_private=1)
+    _post_file(
+        _http(vk_session), upload_info["upload_url"], "video_file", filename, body, UPLOAD_TIMEOUTS["video"]
+    )
+    attachment = f"video{upload_info['owner_id']}_{upload_info['video_id']}"
+    logger.info("Video uploaded to VK", attachment=attachment)
+    return attachment
+
+
+def _upload_doc(vk_session: vk_api.VkApi, peer_id: int, body: FileBody, filename: str) -> str:
+    vk = vk_session.get_api()
+    upload_server = vk.docs.getMessagesUploadServer(peer_id=peer_id, type="doc")
+    response = _post_file(
+        _http(vk_session), upload_server["upload_url"], "file", filename, body, UPLOAD_TIMEOUTS["doc"]
+    ).json()
+    saved = vk.docs.save(file=response["file"], title=filename)
+    doc = saved["doc"]
+    attachment = f"doc{doc['owner_id']}_{doc['id']}"
+    logger.info("Document uploaded to VK", attachment=attachment, filename=filename)
+    return attachment
+
+
+def _upload(kind: str, vk_session: vk_api.VkApi, peer_id: int, body: FileBody, filename: str) -> str:
+    if kind == "photo":
+        return _upload_photo(vk_session, peer_id, body, filename)
+    if kind == "video":
+        return _upload_video(vk_session, body, filename)
+    if kind == "doc":
+        return _upload_doc(vk_session, peer_id, body, filename)
+    raise ValueError(f"Unsupported media kind: {kind}")
+
+
 def upload_photo_to_vk(
     file_bytes: bytes,
     vk_session: vk_api.VkApi,
@@ -59,32 +331,7 @@ def upload_photo_to_vk(
     Returns:
         VK attachment string like 'photo{owner_id}_{photo_id}'.
     """
-    vk = vk_session.get_api()
-
-    def _upload() -> str:
-        upload_server = vk.photos.getMessagesUploadServer(peer_id=peer_id)
-        upload_url = upload_server["upload_url"]
-
-        with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp:
-            tmp.write(file_bytes)
-            tmp_path = tmp.name
-
-        try:
-            with open(tmp_path, "rb") as f:
-                response = requests.post(upload_url, files={"photo": f}, timeout=30).json()
-            saved = vk.photos.saveMessagesPhoto(
-                photo=response["photo"],
-                server=response["server"],
-                hash=response["hash"],
-            )
-            photo = saved[0]
-            attachment = f"photo{photo['owner_id']}_{photo['id']}"
-            logger.info("Photo uploaded to VK", attachment=attachment)
-            return attachment
-        finally:
-            Path(tmp_path).unlink(missing_ok=True)
-
-    return _retry(_upload)
+    return _retry(lambda: _upload_photo(vk_session, peer_id, file_bytes, DEFAULT_FILENAMES["photo"]))
 
 
 def upload_video_to_vk(
@@ -102,29 +349,7 @@ def upload_video_to_vk(
     Returns:
         VK attachment string like 'video{owner_id}_{video_id}'.
     """
-    vk = vk_session.get_api()
-
-    def _upload() -> str:
-        upload_info = vk.video.save(name=filename, is_private=1)
-        upload_url = upload_info["upload_url"]
-        owner_id = upload_info["owner_id"]
-        video_id = upload_info["video_id"]
-
-        suffix = Path(filename).suffix or ".mp4"
-        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
-            tmp.write(file_bytes)
-            tmp_path = tmp.name
-
-        try:
-            with open(tmp_path, "rb") as f:
-                requests.post(upload_url, files={"video_file": (filename, f)}, timeout=120)
-            attachment = f"video{owner_id}_{video_id}"
-            logger.info("Video uploaded to VK", attachment=attachment)
-            return attachment
-        finally:
-            Path(tmp_path).unlink(missing_ok=True)
-
-    return _retry(_upload)
+    return _retry(lambda: _upload_video(vk_session, file_bytes, filename))
 
 
 def upload_doc_to_vk(
@@ -144,33 +369,132 @@ def upload_doc_to_vk(
     Returns:
         VK attachment string like 'doc{owner_id}_{doc_id}'.
     """
-    vk = vk_session.get_api()
+    return _retry(lambda: _upload_doc(vk_session, peer_id, file_bytes, filename))
+
+
+@dataclass
+class MediaItem:
+    """Telegram file to relay to VK.
+
+    Attributes:
+        file_id: Telegram file identifier.
+        kind: "photo", "video" or "doc".
+        filename: File name for VK (a default per kind if None).
+    """
 
-    def _upload() -> str:
-        upload_server = vk.docs.getMessagesUploadServer(peer_id=peer_id, type="doc")
-        upload_url = upload_server["upload_url"]
+    file_id: str
+    kind: str
+    filename: Optional[str] = None
 
-        suffix = Path(filename).suffix or ".bin"
-        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
-            tmp.write(file_bytes)
-            tmp_path = tmp.name
 
+async def _relay_once(bot, item: MediaItem, vk_session: vk_api.VkApi, peer_id: int) -> str:
+    filename = item.filename or DEFAULT_FILENAMES.get(item.kind, "file.bin")
+    tg_file = await bot.get_file(item.file_id)
+
+    if tg_file.file_size is None or bot.session.api.is_local:
+        # Without a known size (or with a local Bot API server) the file is
+        # read into memory and uploaded in one piece
+        buffer = await bot.download_file(tg_file.file_path)
+        return await asyncio.to_thread(_upload, item.kind, vk_session, peer_id, buffer.read(), filename)
+
+    pipe = ChunkPipe()
+    body = MultipartStream(FIELD_NAMES[item.kind], filename, tg_file.file_size, pipe)
+
+    def upload() -> str:
         try:
-            with open(tmp_path, "rb") as f:
-                response = requests.post(
-                    upload_url,
-                    files={"file": (filename, f)},
-                    timeout=60,
-                ).json()
-            saved = vk.docs.save(file=response["file"], title=filename)
-            doc = saved["doc"]
-            attachment = f"doc{doc['owner_id']}_{doc['id']}"
-            logger.info("Document uploaded to VK", attachment=attachment, filename=filename)
-            return attachment
+            return _upload(item.kind, vk_session, peer_id, body, filename)
         finally:
-            Path(tmp_path).unlink(missing_ok=True)
+            pipe.abort()
+
+    upload_task = asyncio.ensure_future(asyncio.to_thread(upload))
+    stream = bot.session.stream_content(
+        url=bot.session.api.file_url(bot.token, tg_file.file_path),
+        timeout=UPLOAD_TIMEOUTS.get(item.kind, 60),
+        chunk_size=STREAM_CHUNK_SIZE,
+        raise_for_status=True,
+    )
+    try:
+        async for chunk in stream:
+            if not pipe.offer(chunk):
+                await asyncio.to_thread(pipe.put, chunk)
+        pipe.close()
+    except PipeAborted:
+        # The upload ended early; its own error is raised below
+        pass
+    except BaseException as e:
+        pipe.close(error=e)
+        await asyncio.gather(upload_task, return_exceptions=True)
+        raise
+    finally:
+        await stream.aclose()
+    return await upload_task
+
+
+async def relay_tg_file_to_vk(bot, item: MediaItem, vk_session: vk_api.VkApi, peer_id: int) -> str:
+    """Stream a Telegram file into a VK upload without temporary files.
+
+    The download is piped into the multipart upload through a bounded
+    buffer, so at most STREAM_BUFFER_BYTES of the file are in memory. A
+    failed attempt restarts the download (a stream cannot be replayed),
+    with the same 1s → 2s → 4s backoff as _retry.
+
+    Args:
+        bot: aiogram Bot instance.
+        item: Telegram file to relay.
+        vk_session: Authenticated VkApi session.
+        peer_id: VK peer_id for the target chat.
+
+    Returns:
+        VK attachment string.
+    """
+    for attempt in range(MAX_RETRIES):
+        try:
+            return await _relay_once(bot, item, vk_session, peer_id)
+        except Exception as e:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            delay = 2**attempt
+            logger.warning(
+                "Retrying media relay after error",
+                attempt=attempt + 1,
+                delay=delay,
+                kind=item.kind,
+                error=str(e),
+            )
+            await asyncio.sleep(delay)
 
-    return _retry(_upload)
+
+async def relay_album_to_vk(
+    bot,
+    items: List[MediaItem],
+    vk_session: vk_api.VkApi,
+    peer_id: int,
+    concurrency: int = ALBUM_UPLOAD_CONCURRENCY,
+) -> List[str]:
+    """Relay album items to VK concurrently.
+
+    Args:
+        bot: aiogram Bot instance.
+        items: Album files in display order.
+        vk_session: Authenticated VkApi session.
+        peer_id: VK peer_id for the target chat.
+        concurrency: Items relayed at once.
+
+    Returns:
+        Attachment strings in album order; failed items are left out.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def relay(item: MediaItem) -> Optional[str]:
+        async with semaphore:
+            try:
+                return await relay_tg_file_to_vk(bot, item, vk_session, peer_id)
+            except Exception as e:
+                logger.error("Failed to relay album item", kind=item.kind, error=str(e))
+                return None
+
+    attachments = await asyncio.gather(*(relay(item) for item in items))
+    return [attachment for attachment in attachments if attachment]
 
 
 async def download_tg_file(bot, file_id: str) -> Optional[bytes]:
@@ -1,16 +1,24 @@
-"""Очередь исходящих сообщений с rate limiting для Bridge-бота."""
+"""Очередь исходящих сообщений с rate limiting для Bridge-бота.
+
+Сообщения раскладываются по полосам (lane) — по платформе и peer_id. У каждой
+полосы свой token bucket под лимиты чата, и, кроме того, все полосы платформы
+берут токены из общего bucket платформы: лимит VK считается на токен доступа,
+а не на чат. Порядок внутри полосы сохраняется, а полосы обслуживаются пулом
+воркеров параллельно.
+"""
 
-import queue
-import random
 import threading
 import time
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Callable, Optional
+from typing import Callable, Deque, Dict, List, Optional, Tuple
 
 import structlog
 
 logger = structlog.get_logger()
 
+LaneKey = Tuple[str, Optional[int]]
+
 
 @dataclass
 class OutboundMessage:
@@ -21,12 +29,16 @@ class OutboundMessage:
         platform: Target platform, either "vk" or "tg".
         sender_name: Display name of the original sender.
         retry_count: Number of delivery attempts made so far.
+        peer_id: Target chat on the platform (None for the default chat).
+        enqueued_at: Monotonic time the message was queued.
     """
 
     text: str
     platform: str  # "vk" or "tg"
     sender_name: str = ""
     retry_count: int = field(default=0)
+    peer_id: Optional[int] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
 
 
 class RateLimitError(Exception):
@@ -46,87 +58,353 @@ class RateLimitError(Exception):
         super().__init__(f"Rate limited, retry after {retry_after}s")
 
 
+@dataclass(frozen=True)
+class LaneLimit:
+    """Token bucket parameters of a lane.
+
+    Attributes:
+        rate: Sends per second in the long run.
+        burst: Sends allowed back to back after an idle period.
+    """
+
+    rate: float
+    burst: float
+
+
+# Per-lane limits. Telegram allows 20 messages per minute to one group chat
+PLATFORM_LIMITS: Dict[str, LaneLimit] = {
+    "vk": LaneLimit(rate=3.0, burst=3.0),
+    "tg": LaneLimit(rate=20 / 60, burst=5.0),
+}
+DEFAULT_LIMIT = LaneLimit(rate=1.0, burst=1.0)
+
+# Limits shared by all lanes of a platform. VK allows about 3 requests per
+# second per token (vk_api enforces the same), however many peers it sends to;
+# Telegram allows about 30 messages per second per bot overall
+PLATFORM_SHARED_LIMITS: Dict[str, LaneLimit] = {
+    "vk": LaneLimit(rate=3.0, burst=3.0),
+    "tg": LaneLimit(rate=30.0, burst=30.0),
+}
+
+
+class TokenBucket:
+    """Thread-unsafe token bucket; MessageQueue guards it with its lock.
+
+    Supports pausing until a point in time for Retry-After handling.
+    """
+
+    def __init__(self, limit: LaneLimit, now: float) -> None:
+        """Initialize a full bucket.
+
+        Args:
+            limit: Rate and burst size.
+            now: Current monotonic time.
+        """
+        self.limit = limit
+        self._tokens = limit.burst
+        self._updated = now
+        self._paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        if now > self._updated:
+            self._tokens = min(self.limit.burst, self._tokens + (now - self._updated) * self.limit.rate)
+            self._updated = now
+
+    def ready_at(self, now: float) -> float:
+        """Return the earliest time a token is available."""
+        if now < self._paused_until:
+            return self._paused_until
+        self._refill(now)
+        if self._tokens >= 1:
+            return now
+        return now + (1 - self._tokens) / self.limit.rate
+
+    def take(self, now: float) -> None:
+        """Consume one token (call only when ready_at(now) <= now)."""
+        self._refill(now)
+        self._tokens -= 1
+
+    def pause(self, until: float) -> None:
+        """Hand out no tokens before `until`, then start from an empty bucket."""
+        self._paused_until = max(self._paused_until, until)
+        self._tokens = 0.0
+        self._updated = self._paused_until
+
+
+class _Lane:
+    """Messages for one (platform, peer_id) with their rate limit and backoff."""
+
+    def __init__(self, limit: LaneLimit, now: float, shared: Optional[TokenBucket] = None) -> None:
+        self.messages: Deque[OutboundMessage] = deque()
+        self.bucket = TokenBucket(limit, now)
+        self.shared = shared
+        self.busy = False
+        self.backoff = 1.0
+
+    def ready_at(self, now: float) -> float:
+        """Return the earliest time both the lane and its platform have a token."""
+        ready_at = self.bucket.ready_at(now)
+        if self.shared is not None:
+            ready_at = max(ready_at, self.shared.ready_at(now))
+        return ready_at
+
+    def take(self, now: float) -> None:
+        """Consume a token from the lane and from its platform bucket."""
+        self.bucket.take(now)
+        if self.shared is not None:
+            self.shared.take(now)
+
+
 class MessageQueue:
-    """Thread-safe FIFO queue with rate limiting for outbound messages.
+    """Thread-safe outbound scheduler with per-platform/peer lanes.
 
-    Processes messages with 0.5–1s delay between sends.
-    Handles VK API rate limiting (429) with Retry-After support.
-    Uses exponential backoff when Retry-After is not provided.
+    Each (platform, peer_id) lane keeps FIFO order and is paced by its own
+    token bucket (PLATFORM_LIMITS) and by the bucket shared by all lanes of
+    its platform (PLATFORM_SHARED_LIMITS); at most one worker sends from a lane at
+    a time, while different lanes are served in parallel. Short consecutive
+    messages from the same sender that are waiting in a lane are coalesced
+    into one send. On 429 the message stays at the head of its lane and only
+    that lane waits for Retry-After (or exponential backoff); other errors
+    are retried the same way up to MAX_RETRIES. metrics() reports queue
+    depth, send counters and latency from put() to delivery.
     """
 
     MAX_RETRIES = 5
-    BASE_DELAY = 0.5
-    MAX_DELAY = 1.0
+    MAX_BACKOFF = 60.0
+
+    # Coalescing: only messages up to this length, at most this many,
+    # joined into a text no longer than COALESCE_MAX_TOTAL
+    COALESCE_MAX_CHARS = 200
+    COALESCE_MAX_MESSAGES = 5
+    COALESCE_MAX_TOTAL = 1000
 
-    def __init__(self, send_func: Callable[[OutboundMessage], None]) -> None:
-        """Initialize queue with a send function and start the worker thread.
+    # Latency samples kept for metrics()
+    LATENCY_SAMPLES = 1000
+
+    def __init__(
+        self,
+        send_func: Callable[[OutboundMessage], None],
+        workers: int = 4,
+        limits: Optional[Dict[str, LaneLimit]] = None,
+        shared_limits: Optional[Dict[str, LaneLimit]] = None,
+    ) -> None:
+        """Initialize queue with a send function and start the worker threads.
 
         Args:
             send_func: Callable that sends a message. Should raise
                        RateLimitError on 429 or Exception on other errors.
+            workers: Number of worker threads (lanes served in parallel).
+            limits: Lane limits per platform (PLATFORM_LIMITS by default).
+            shared_limits: Limits shared by all lanes of a platform
+                (PLATFORM_SHARED_LIMITS by default); platforms missing
+                here are paced by their lanes only.
         """
-        self._queue: queue.Queue[OutboundMessage] = queue.Queue()
         self._send_func = send_func
+        self._limits = limits or PLATFORM_LIMITS
+        self._shared_limits = PLATFORM_SHARED_LIMITS if shared_limits is None else shared_limits
+        self._platform_buckets: Dict[str, TokenBucket] = {}
         self._stop_event = threading.Event()
-        self._worker = threading.Thread(
-            target=self._run,
-            daemon=True,
-            name="bridge-queue-worker",
-        )
-        self._worker.start()
+        self._cond = threading.Condition()
+        self._lanes: Dict[LaneKey, _Lane] = {}
+        self._latencies: Deque[float] = deque(maxlen=self.LATENCY_SAMPLES)
+        self._counters = {
+            "enqueued": 0,
+            "sent": 0,
+            "coalesced": 0,
+            "rate_limited": 0,
+            "failed_attempts": 0,
+            "dropped": 0,
+        }
+        self._workers = [
+            threading.Thread(target=self._run, daemon=True, name=f"bridge-queue-worker-{i}")
+            for i in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
 
     def put(self, message: OutboundMessage) -> None:
-        """Add message to the queue.
+        """Add message to the end of its lane.
 
         Args:
             message: Message to enqueue.
         """
-        self._queue.put(message)
+        key = (message.platform, message.peer_id)
+        with self._cond:
+            lane = self._lanes.get(key)
+            if lane is None:
+                now = time.monotonic()
+                limit = self._limits.get(message.platform, DEFAULT_LIMIT)
+                shared = self._platform_buckets.get(message.platform)
+                shared_limit = self._shared_limits.get(message.platform)
+                if shared is None and shared_limit is not None:
+                    shared = self._platform_buckets[message.platform] = TokenBucket(shared_limit, now)
+                lane = self._lanes[key] = _Lane(limit, now, shared)
+            lane.messages.append(message)
+            self._counters["enqueued"] += 1
+            self._cond.notify()
 
     def stop(self, timeout: float = 5.0) -> None:
-        """Stop the worker thread gracefully.
+        """Stop the worker threads after sending messages that are ready now.
 
         Args:
-            timeout: Maximum seconds to wait for worker to finish.
+            timeout: Maximum seconds to wait for the workers to finish.
         """
         self._stop_event.set()
-        self._worker.join(timeout=timeout)
+        with self._cond:
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(timeout=max(0.0, deadline - time.monotonic()))
 
-    def _run(self) -> None:
-        """Worker loop: dequeue and send messages with rate limiting."""
-        backoff = 1.0
-        while not self._stop_event.is_set():
-            try:
-                msg = self._queue.get(timeout=1.0)
-            except queue.Empty:
-                continue
+    def depth(self) -> int:
+        """Return the number of messages waiting in all lanes."""
+        with self._cond:
+            return sum(len(lane.messages) for lane in self._lanes.values())
+
+    def metrics(self) -> dict:
+        """Return queue depth, counters and delivery latency.
 
+        Returns:
+            Dict with "queued", "lanes" ("platform:peer" → depth), the
+            counters (enqueued, sent, coalesced, rate_limited,
+            failed_attempts, dropped) and latency_avg/p95/max in seconds
+            over the last LATENCY_SAMPLES delivered messages.
+        """
+        with self._cond:
+            lanes = {
+                f"{platform}:{peer_id}": len(lane.messages)
+                for (platform, peer_id), lane in self._lanes.items()
+            }
+            latencies = sorted(self._latencies)
+            result: dict = dict(self._counters)
+        result["queued"] = sum(lanes.values())
+        result["lanes"] = lanes
+        if latencies:
+            result["latency_avg"] = sum(latencies) / len(latencies)
+            result["latency_p95"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            result["latency_max"] = latencies[-1]
+        else:
+            result["latency_avg"] = result["latency_p95"] = result["latency_max"] = 0.0
+        return result
+
+    def _next_batch(self) -> Optional[Tuple[_Lane, List[OutboundMessage]]]:
+        """Wait for a lane with a token and take its head messages.
+
+        After stop() only lanes that are ready right away are drained.
+
+        Returns:
+            (lane, messages) with the lane marked busy, or None on stop.
+        """
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                chosen: Optional[_Lane] = None
+                wake_at: Optional[float] = None
+                for lane in self._lanes.values():
+                    if lane.busy or not lane.messages:
+                        continue
+                    ready_at = lane.ready_at(now)
+                    if ready_at <= now:
+                        if chosen is None or lane.messages[0].enqueued_at < chosen.messages[0].enqueued_at:
+                            chosen = lane
+                    elif wake_at is None or ready_at < wake_at:
+                        wake_at = ready_at
+                if chosen is not None:
+                    chosen.take(now)
+                    chosen.busy = True
+                    return chosen, self._take_coalesced(chosen)
+                if self._stop_event.is_set():
+                    return None
+                self._cond.wait(timeout=None if wake_at is None else wake_at - now)
+
+    def _take_coalesced(self, lane: _Lane) -> List[OutboundMessage]:
+        """Pop the head message and the short messages from the same sender right after it."""
+        batch = [lane.messages.popleft()]
+        head = batch[0]
+        if not head.sender_name or len(head.text) > self.COALESCE_MAX_CHARS:
+            return batch
+        total = len(head.text)
+        while lane.messages and len(batch) < self.COALESCE_MAX_MESSAGES:
+            following = lane.messages[0]
+            if (
+                following.sender_name != head.sender_name
+                or len(following.text) > self.COALESCE_MAX_CHARS
+                or total + 1 + len(following.text) > self.COALESCE_MAX_TOTAL
+            ):
+                break
+            batch.append(lane.messages.popleft())
+            total += 1 + len(following.text)
+        return batch
+
+    @staticmethod
+    def _merge(batch: List[OutboundMessage]) -> OutboundMessage:
+        if len(batch) == 1:
+            return batch[0]
+        head = batch[0]
+        return OutboundMessage(
+            text="\n".join(message.text for message in batch),
+            platform=head.platform,
+            sender_name=head.sender_name,
+            retry_count=max(message.retry_count for message in batch),
+            peer_id=head.peer_id,
+            enqueued_at=head.enqueued_at,
+        )
+
+    def _run(self) -> None:
+        """Worker loop: take a ready lane, send its head and settle the result."""
+        while True:
+            taken = self._next_batch()
+            if taken is None:
+                return
+            lane, batch = taken
+            msg = self._merge(batch)
             try:
                 self._send_func(msg)
-                backoff = 1.0
-                delay = random.uniform(self.BASE_DELAY, self.MAX_DELAY)
-                time.sleep(delay)
             except RateLimitError as e:
-                retry_after = e.retry_after if e.retry_after is not None else backoff
-                logger.warning(
-                    "Rate limited, requeueing",
-                    retry_after=retry_after,
-                    text=msg.text[:50],
-                )
-                self._queue.put(msg)
-                time.sleep(retry_after)
-                backoff = min(backoff * 2, 60.0)
+                self._requeue(lane, batch, e.retry_after, rate_limited=True)
+                logger.warning("Rate limited, lane paused", retry_after=e.retry_after, text=msg.text[:50])
             except Exception as e:
                 if msg.retry_count < self.MAX_RETRIES:
-                    msg.retry_count += 1
-                    self._queue.put(msg)
-                    time.sleep(backoff)
-                    backoff = min(backoff * 2, 60.0)
+                    for message in batch:
+                        message.retry_count = msg.retry_count + 1
+                    self._requeue(lane, batch, None, rate_limited=False)
                 else:
                     logger.error(
                         "Message dropped after max retries",
                         error=str(e),
                         text=msg.text[:50],
                     )
-            finally:
-                self._queue.task_done()
+                    self._settle(lane, batch, delivered=False)
+            else:
+                self._settle(lane, batch, delivered=True)
+
+    def _requeue(
+        self,
+        lane: _Lane,
+        batch: List[OutboundMessage],
+        retry_after: Optional[float],
+        rate_limited: bool,
+    ) -> None:
+        """Put a batch back at the head of its lane and pause the lane."""
+        with self._cond:
+            lane.messages.extendleft(reversed(batch))
+            delay = retry_after if retry_after is not None else lane.backoff
+            lane.bucket.pause(time.monotonic() + delay)
+            lane.backoff = min(lane.backoff * 2, self.MAX_BACKOFF)
+            self._counters["rate_limited" if rate_limited else "failed_attempts"] += 1
+            lane.busy = False
+            self._cond.notify_all()
+
+    def _settle(self, lane: _Lane, batch: List[OutboundMessage], delivered: bool) -> None:
+        """Record a finished batch and release its lane."""
+        now = time.monotonic()
+        with self._cond:
+            lane.busy = False
+            if delivered:
+                lane.backoff = 1.0
+                self._counters["sent"] += 1
+                self._counters["coalesced"] += len(batch) - 1
+                self._latencies.extend(now - message.enqueued_at for message in batch)
+            else:
+                self._counters["dropped"] += len(batch)
+            self._cond.notify_all()
@@ -0,0 +1,165 @@
+"""Пул долгоживущих VK API сессий с keep-alive соединениями."""
+
+import threading
+from typing import Dict, Optional
+
+import requests
+import structlog
+import vk_api
+from requests.adapters import HTTPAdapter
+from vk_api.vk_api import DEFAULT_USERAGENT
+
+logger = structlog.get_logger()
+
+# Distinct hosts kept in the pool (api.vk.com plus upload servers)
+POOL_HOSTS = 10
+
+# Keep-alive connections kept per host; enough for the relay and upload threads
+POOL_CONNECTIONS_PER_HOST = 8
+
+
+class VkSessionPool:
+    """Long-lived VkApi clients sharing one keep-alive HTTP session.
+
+    One VkApi is created per token and reused for every call, and all of
+    them share a requests.Session whose connection pool keeps TLS
+    connections to api.vk.com and the upload servers open between calls.
+    Safe to use from several threads.
+    """
+
+    def __init__(
+        self,
+        pool_hosts: int = POOL_HOSTS,
+        pool_connections_per_host: int = POOL_CONNECTIONS_PER_HOST,
+    ) -> None:
+        """Initialize the pool.
+
+        Args:
+            pool_hosts: Number of hosts whose connections are kept.
+            pool_connections_per_host: Keep-alive connections kept per host.
+        """
+        self.pool_hosts = pool_hosts
+        self.pool_connections_per_host = pool_connections_per_host
+        self._lock = threading.Lock()
+        self._clients: Dict[str, vk_api.VkApi] = {}
+        self._http: Optional[requests.Session] = None
+
+    @property
+    def http(self) -> requests.Session:
+        """Shared keep-alive HTTP session, created on first use."""
+        with self._lock:
+            if self._http is None:
+                self._http = self._create_http()
+            return self._http
+
+    def _create_http(self) -> requests.Session:
+        http = requests.Session()
+        http.headers["User-agent"] = DEFAULT_USERAGENT
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_hosts,
+            pool_maxsize=self.pool_connections_per_host,
+        )
+        http.mount("https://", adapter)
+        http.mount("http://", adapter)
+        return http
+
+    def get(self, token: str) -> vk_api.VkApi:
+        """Return the pooled VkApi session for a token.
+
+        Args:
+            token: VK API token.
+
+        Returns:
+            Authenticated VkApi session bound to the shared HTTP session.
+        """
+        http = self.http
+        with self._lock:
+            client = self._clients.get(token)
+            if client is None:
+                client = vk_api.VkApi(token=token, session=http)
+                self._clients[token] = client
+                logger.info("VK API session created", clients=len(self._clients))
+            return client
+
+    def api(self, token: str):
+        """Return the VK API method proxy of the pooled session for a token.
+
+        Args:
+            token: VK API token.
+
+        Returns:
+            vk_api.VkApiMethod for calls like api.messages.send(...).
+        """
+        return self.get(token).get_api()
+
+    def stats(self) -> Dict[str, float]:
+        """Return connection reuse statistics.
+
+        Counts come from the live urllib3 host pools, so connections of a
+        host evicted from the pool are no longer included.
+
+        Returns:
+            Dict with clients, requests, connections_opened,
+            connections_reused and reuse_ratio.
+        """
+        with self._lock:
+            http = self._http
+            clients = len(self._clients)
+        requests_sent = 0
+        connections_opened = 0
+        if http is not None:
+            for adapter in set(http.adapters.values()):
+                pool_manager = getattr(adapter, "poolmanager", None)
+                if pool_manager is None:
+                    continue
+                for key in list(pool_manager.pools.keys()):
+                    host_pool = pool_manager.pools.get(key)
+                    if host_pool is None:
+                        continue
+                    requests_sent += host_pool.num_requests
+                    connections_opened += host_pool.num_connections
+        reused = max(requests_sent - connections_opened, 0)
+        return {
+            "clients": clients,
+            "requests": requests_sent,
+            "connections_opened": connections_opened,
+            "connections_reused": reused,
+            "reuse_ratio": reused / requests_sent if requests_sent else 0.0,
+        }
+
+    def close(self) -> None:
+        """Close pooled connections and forget all sessions."""
+        with self._lock:
+            http, self._http = self._http, None
+            self._clients.clear()
+        if http is not None:
+            http.close()
+
+
+_vk_session_pool: Optional[VkSessionPool] = None
+_vk_session_pool_lock = threading.Lock()
+
+
+def get_vk_session_pool() -> VkSessionPool:
+    """Get or create the process-wide VK session pool."""
+    global _vk_session_pool
+    with _vk_session_pool_lock:
+        if _vk_session_pool is None:
+            _vk_session_pool = VkSessionPool()
+        return _vk_session_pool
+
+
+def close_vk_session_pool() -> Dict[str, float]:
+    """Close the process-wide VK session pool.
+
+    Returns:
+        Final connection reuse statistics.
+    """
+    global _vk_session_pool
+    with _vk_session_pool_lock:
+        pool, _vk_session_pool = _vk_session_pool, None
+    if pool is None:
+        return {}
+    stats = pool.stats()
+    pool.close()
+    return stats
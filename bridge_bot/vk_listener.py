@@ -1,6 +1,7 @@
 """VK listener — polls VK Long Poll and forwards to Telegram."""
 
 import asyncio
+import queue
 import threading
 from typing import Optional
 
@@ -8,6 +9,8 @@ import structlog
 import vk_api
 from vk_api.longpoll import VkEventType, VkLongPoll
 
+from bridge_bot.vk_profiles import USERS_GET_BATCH, VkProfileCache
+
 from bridge_bot.loop_guard import has_bot_mark
 
 logger = structlog.get_logger()
@@ -19,11 +22,18 @@ class VKListenerThread(threading.Thread):
     Runs as a daemon thread. Forwards messages from VK to TG via
     asyncio.run_coroutine_threadsafe to safely interact with the aiogram event loop.
 
+    The Long Poll thread only queues events. A forwarder thread drains the
+    queue, resolves unknown sender names for the whole backlog with one
+    users.get call and forwards the events in order. Sender names come from
+    a VkProfileCache warmed with the chat's member list on startup.
+
     Args:
         vk_token: VK API token for authentication.
         tg_chat_id: Telegram chat ID to forward messages to.
         bot: aiogram Bot instance.
         loop: asyncio event loop running in the main thread.
+        vk_peer_id: VK chat whose members are preloaded into the name cache.
+        profile_cache: Sender name cache (a new one by default).
     """
 
     def __init__(
@@ -32,6 +42,8 @@ class VKListenerThread(threading.Thread):
         tg_chat_id: int,
         bot,  # aiogram.Bot
         loop: asyncio.AbstractEventLoop,
+        vk_peer_id: Optional[int] = None,
+        profile_cache: Optional[VkProfileCache] = None,
     ) -> None:
         """Initialize VKListenerThread.
 
@@ -40,6 +52,8 @@ class VKListenerThread(threading.Thread):
             tg_chat_id: Telegram chat ID to forward messages to.
             bot: aiogram Bot instance.
             loop: asyncio event loop running in the main thread.
+            vk_peer_id: VK chat whose members are preloaded into the name cache.
+            profile_cache: Sender name cache (a new one by default).
         """
         super().__init__(name="vk-listener", daemon=True)
         self._vk_token = vk_token
@@ -47,6 +61,9 @@ class VKListenerThread(threading.Thread):
         self._bot = bot
         self._loop = loop
         self._stop_event = threading.Event()
+        self._vk_peer_id = vk_peer_id
+        self._profiles = profile_cache or VkProfileCache()
+        self._events: "queue.Queue" = queue.Queue()
 
     def stop(self) -> None:
         """Signal the thread to stop on next Long Poll iteration."""
@@ -54,9 +71,17 @@ class VKListenerThread(threading.Thread):
 
     def run(self) -> None:
         """Main loop: poll VK Long Poll and forward messages to Telegram."""
+        forwarder: Optional[threading.Thread] = None
         try:
             session = vk_api.VkApi(token=self._vk_token)
             longpoll = VkLongPoll(session)
+            forwarder = threading.Thread(
+                target=self._forward_loop,
+                args=(session,),
+                name="vk-forwarder",
+                daemon=True,
+            )
+            forwarder.start()
             logger.info("VK Long Poll listener started")
 
             for event in longpoll.listen():
@@ -64,13 +89,61 @@ class VKListenerThread(threading.Thread):
                     break
 
                 if event.type == VkEventType.MESSAGE_NEW and event.to_me:
-                    self._handle_event(event, session)
+                    self._events.put(event)
         except Exception as e:
             if not self._stop_event.is_set():
                 logger.error("VK listener error", error=str(e))
         finally:
+            if forwarder is not None:
+                self._events.put(None)
+                forwarder.join(timeout=5)
             logger.info("VK Long Poll listener stopped")
 
+    def _forward_loop(self, session: vk_api.VkApi) -> None:
+        """Forward queued events, resolving sender names in bulk.
+
+        Warms the name cache from the chat member list first, then takes
+        every queued event at once (up to USERS_GET_BATCH), loads the
+        missing names with one users.get call and forwards the events.
+        A None in the queue stops the loop after earlier events are sent.
+
+        Args:
+            session: Authenticated VkApi session.
+        """
+        vk = session.get_api()
+        if self._vk_peer_id:
+            self._profiles.warm(vk, self._vk_peer_id)
+
+        stopping = False
+        while not stopping:
+            event = self._events.get()
+            if event is None:
+                return
+            batch = [event]
+            while len(batch) < USERS_GET_BATCH:
+                try:
+                    event = self._events.get_nowait()
+                except queue.Empty:
+                    break
+                if event is None:
+                    stopping = True
+                    break
+                batch.append(event)
+
+            self._profiles.fetch(
+                vk,
+                [
+                    event.user_id
+                    for event in batch
+                    if not has_bot_mark(getattr(event, "text", "") or "")
+                ],
+            )
+            for event in batch:
+                try:
+                    self._handle_event(event, session)
+                except Exception as e:
+                    logger.error("Failed to forward VK message", error=str(e))
+
     def _handle_event(self, event, session: vk_api.VkApi) -> None:
         """Process a VK message event and forward to Telegram.
 
@@ -187,6 +260,8 @@ class VKListenerThread(threading.Thread):
     def _get_sender_name(self, event, session: vk_api.VkApi) -> str:
         """Extract sender display name from VK event.
 
+        Names come from the profile cache; a miss costs one users.get call.
+
         Args:
             event: VK Long Poll event.
             session: Authenticated VkApi session.
@@ -195,13 +270,6 @@ class VKListenerThread(threading.Thread):
             Sender display name or 'VK User' as fallback.
         """
         try:
-            vk = session.get_api()
-            user_id = event.user_id
-            users = vk.users.get(user_ids=user_id, fields="first_name,last_name")
-            if users:
-                u = users[0]
-                name = f"{u.get('first_name', '')} {u.get('last_name', '')}".strip()
-                return name or "VK User"
+            return self._profiles.resolve(session.get_api(), event.user_id)
         except Exception:
-            pass
-        return "VK User"
+            return "VK User"
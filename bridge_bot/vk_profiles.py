@@ -0,0 +1,197 @@
+"""VK sender name cache — LRU+TTL profiles with bulk loading."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import structlog
+
+logger = structlog.get_logger()
+
+# Profiles kept in memory
+PROFILE_CACHE_SIZE = 10_000
+
+# Names change rarely; refresh them a few times a day
+PROFILE_TTL_SECONDS = 6 * 60 * 60
+
+# users.get accepts at most 1000 IDs per call
+USERS_GET_BATCH = 1000
+
+# messages.getConversationMembers returns at most 200 members per page
+MEMBERS_PAGE_SIZE = 200
+
+FALLBACK_NAME = "VK User"
+
+
+def format_profile_name(profile: dict) -> str:
+    """Build a display name from a users.get / getConversationMembers profile.
+
+    Args:
+        profile: VK user or group object.
+
+    Returns:
+        "First Last" for users, the group name for groups, or FALLBACK_NAME.
+    """
+    name = profile.get("name") or (
+        f"{profile.get('first_name', '')} {profile.get('last_name', '')}"
+    )
+    return name.strip() or FALLBACK_NAME
+
+
+class VkProfileCache:
+    """LRU cache of VK display names by user ID with per-entry TTL.
+
+    Names are loaded in bulk: warm() reads the whole member list of a chat
+    and fetch() resolves any number of IDs with one users.get call per
+    1000 IDs. Safe to use from several threads.
+    """
+
+    def __init__(
+        self,
+        max_size: int = PROFILE_CACHE_SIZE,
+        ttl: float = PROFILE_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize the cache.
+
+        Args:
+            max_size: Maximum number of names kept.
+            ttl: Seconds a name is trusted before it is loaded again.
+            clock: Monotonic time source.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._names: "OrderedDict[int, Tuple[str, float]]" = OrderedDict()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "api_calls": 0}
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def get(self, user_id: int) -> Optional[str]:
+        """Return a cached name, or None if it is missing or expired.
+
+        Args:
+            user_id: VK user ID (negative for groups).
+        """
+        with self._lock:
+            entry = self._names.get(user_id)
+            if entry is None or self.clock() >= entry[1]:
+                self.stats["misses"] += 1
+                return None
+            self._names.move_to_end(user_id)
+            self.stats["hits"] += 1
+            return entry[0]
+
+    def put_many(self, names: Dict[int, str]) -> None:
+        """Store names, evicting the least recently used ones over max_size.
+
+        Args:
+            names: VK user ID → display name.
+        """
+        expires_at = self.clock() + self.ttl
+        with self._lock:
+            for user_id, name in names.items():
+                self._names[user_id] = (name, expires_at)
+                self._names.move_to_end(user_id)
+            while len(self._names) > self.max_size:
+                self._names.popitem(last=False)
+
+    def missing(self, user_ids: Iterable[int]) -> List[int]:
+        """Return the distinct IDs that have no fresh cached name.
+
+        Args:
+            user_ids: VK user IDs to check.
+        """
+        now = self.clock()
+        with self._lock:
+            result = []
+            for user_id in dict.fromkeys(user_ids):
+                entry = self._names.get(user_id)
+                if entry is None or now >= entry[1]:
+                    result.append(user_id)
+            return result
+
+    def fetch(self, vk, user_ids: Iterable[int]) -> Dict[int, str]:
+        """Load names for IDs that are not cached, 1000 IDs per users.get call.
+
+        Group IDs (negative) are skipped: users.get cannot resolve them and
+        they are cached by warm().
+
+        Args:
+            vk: VK API method proxy (VkApi.get_api()).
+            user_ids: VK user IDs to resolve.
+
+        Returns:
+            Names loaded by this call.
+        """
+        ids = [user_id for user_id in self.missing(user_ids) if user_id > 0]
+        loaded: Dict[int, str] = {}
+        for start in range(0, len(ids), USERS_GET_BATCH):
+            chunk = ids[start:start + USERS_GET_BATCH]
+            try:
+                self.stats["api_calls"] += 1
+                users = vk.users.get(
+                    user_ids=",".join(str(user_id) for user_id in chunk),
+                    fields="first_name,last_name",
+                )
+            except Exception as e:
+                logger.warning("VK users.get failed", count=len(chunk), error=str(e))
+                continue
+            for user in users or []:
+                loaded[user["id"]] = format_profile_name(user)
+        if loaded:
+            self.put_many(loaded)
+        return loaded
+
+    def warm(self, vk, peer_id: int) -> int:
+        """Load the names of every member of a VK chat.
+
+        Args:
+            vk: VK API method proxy (VkApi.get_api()).
+            peer_id: VK peer_id of the chat.
+
+        Returns:
+            Number of names cached.
+        """
+        loaded: Dict[int, str] = {}
+        offset = 0
+        try:
+            while True:
+                self.stats["api_calls"] += 1
+                response = vk.messages.getConversationMembers(
+                    peer_id=peer_id,
+                    offset=offset,
+                    count=MEMBERS_PAGE_SIZE,
+                    fields="first_name,last_name",
+                )
+                for profile in response.get("profiles", []):
+                    loaded[profile["id"]] = format_profile_name(profile)
+                for group in response.get("groups", []):
+                    loaded[-group["id"]] = format_profile_name(group)
+                offset += MEMBERS_PAGE_SIZE
+                if offset >= response.get("count", 0):
+                    break
+        except Exception as e:
+            logger.warning("VK member list prefetch failed", peer_id=peer_id, error=str(e))
+        if loaded:
+            self.put_many(loaded)
+        logger.info("VK profile cache warmed", peer_id=peer_id, profiles=len(loaded))
+        return len(loaded)
+
+    def resolve(self, vk, user_id: int) -> str:
+        """Return a name from the cache, loading it on a miss.
+
+        Args:
+            vk: VK API method proxy (VkApi.get_api()).
+            user_id: VK user ID.
+
+        Returns:
+            Display name or FALLBACK_NAME.
+        """
+        name = self.get(user_id)
+        if name is None:
+            name = self.fetch(vk, [user_id]).get(user_id)
+        return name or FALLBACK_NAME
@@ -9,12 +9,16 @@ import vk_api
 
 from bridge_bot.loop_guard import add_bot_mark
 from bridge_bot.queue import RateLimitError
+from bridge_bot.vk_client import get_vk_session_pool
 
 logger = structlog.get_logger()
 
 
 def _create_vk_session(token: str) -> vk_api.VkApi:
-    """Create authenticated VK API session.
+    """Get the authenticated VK API session for a token.
+
+    Sessions come from the shared pool, so consecutive messages reuse the
+    same keep-alive connection instead of opening a new one.
 
     Args:
         token: VK API token.
@@ -22,7 +26,7 @@ def _create_vk_session(token: str) -> vk_api.VkApi:
     Returns:
         Authenticated VkApi session.
     """
-    return vk_api.VkApi(token=token)
+    return get_vk_session_pool().get(token)
 
 
 def send_text(
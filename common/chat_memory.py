@@ -0,0 +1,237 @@
+"""Память диалогов для ИИ вебхука (``call_ai_with_memory`` в api/index.py).
+
+Личная история каждого пользователя и общий канал хранятся в кольцевых
+буферах фиксированной длины. В запрос к модели попадает только та часть
+истории, что укладывается в бюджет токенов: сначала свежие личные
+сообщения, затем — на оставшуюся долю бюджета — свежие реплики других
+пользователей из общего канала. При наличии хранилища сообщения
+дублируются в таблицу ``ai_chat_memory`` и поднимаются из неё после
+холодного старта.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from typing import Any
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+PERSONAL_LIMIT = 10
+GLOBAL_LIMIT = 50
+
+# Бюджет истории в токенах на один запрос и доля общего канала в нём
+HISTORY_TOKEN_BUDGET = 1200
+GLOBAL_BUDGET_SHARE = 0.3
+
+# Грубая оценка для кириллицы/латиницы у Llama-токенизаторов + служебные токены роли
+CHARS_PER_TOKEN = 3
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Строки старше этого срока удаляются из таблицы при периодической чистке
+RETENTION_SECONDS = 7 * 24 * 3600
+# Чистка не чаще раза за столько секунд; первая — при первой записи процесса,
+# иначе короткоживущие serverless-инстансы до неё не доживают
+PRUNE_INTERVAL_SECONDS = 3600.0
+
+CHAT_MEMORY_DDL = """
+    CREATE TABLE IF NOT EXISTS ai_chat_memory (
+        seq BIGINT NOT NULL,
+        user_id BIGINT NOT NULL,
+        role VARCHAR(16) NOT NULL,
+        content TEXT NOT NULL,
+        PRIMARY KEY (user_id, seq)
+    )
+"""
+CHAT_MEMORY_INDEX_DDL = "CREATE INDEX IF NOT EXISTS idx_ai_chat_memory_seq ON ai_chat_memory (seq)"
+
+
+def estimate_tokens(content: str) -> int:
+    """Оценивает число токенов сообщения без загрузки токенизатора."""
+    return MESSAGE_OVERHEAD_TOKENS + math.ceil(len(content) / CHARS_PER_TOKEN)
+
+
+class SqlChatMemoryStore:
+    """Хранилище сообщений в таблице ``ai_chat_memory`` (PostgreSQL или SQLite).
+
+    Порядок задаёт ``seq`` — время записи в наносекундах, поэтому схема не
+    зависит от автоинкремента конкретной СУБД. Таблицу создаёт вызывающий
+    код (``CHAT_MEMORY_DDL``) вместе с остальной схемой.
+    """
+
+    def __init__(
+        self,
+        engine_getter: Callable[[], Any],
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._engine_getter = engine_getter
+        self._clock = clock
+        self._pruned_at: float | None = None
+
+    def load_global(self, limit: int) -> list[tuple[int, str, str]]:
+        """Возвращает последние ``limit`` сообщений всех пользователей по порядку."""
+        return self._select("", {"limit": limit})
+
+    def load_user(self, user_id: int, limit: int) -> list[tuple[int, str, str]]:
+        """Возвращает последние ``limit`` сообщений пользователя по порядку."""
+        return self._select("WHERE user_id = :user_id", {"user_id": user_id, "limit": limit})
+
+    def _select(self, where: str, params: dict) -> list[tuple[int, str, str]]:
+        with self._engine_getter().connect() as conn:
+            rows = conn.execute(
+                text(f"SELECT user_id, role, content FROM ai_chat_memory {where} ORDER BY seq DESC LIMIT :limit"),
+                params,
+            ).all()
+        return [(int(row[0]), row[1], row[2]) for row in reversed(rows)]
+
+    def append(self, messages: list[tuple[int, str, str]]) -> None:
+        """Записывает сообщения (user_id, role, content) одной транзакцией."""
+        seq = time.time_ns()
+        params = [
+            {"seq": seq + offset, "user_id": user_id, "role": role, "content": content}
+            for offset, (user_id, role, content) in enumerate(messages)
+        ]
+        with self._engine_getter().begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO ai_chat_memory (seq, user_id, role, content) "
+                    "VALUES (:seq, :user_id, :role, :content)"
+                ),
+                params,
+            )
+            now = self._clock()
+            if self._pruned_at is None or now - self._pruned_at >= PRUNE_INTERVAL_SECONDS:
+                self._pruned_at = now
+                cutoff = time.time_ns() - RETENTION_SECONDS * 1_000_000_000
+                conn.execute(text("DELETE FROM ai_chat_memory WHERE seq < :cutoff"), {"cutoff": cutoff})
+
+
+class ChatMemory:
+    """Кольцевые буферы истории ИИ-диалогов с отбором по бюджету токенов.
+
+    Без хранилища работает только в памяти процесса. С хранилищем общий
+    канал поднимается из БД при первом обращении, личная история — при
+    первом обращении к пользователю; ошибки БД не мешают ответу модели.
+    Чтение из БД идёт вне блокировки, чтобы медленный запрос не задерживал
+    остальных пользователей.
+    """
+
+    def __init__(
+        self,
+        store: SqlChatMemoryStore | None = None,
+        personal_limit: int = PERSONAL_LIMIT,
+        global_limit: int = GLOBAL_LIMIT,
+    ) -> None:
+        self.store = store
+        self.personal_limit = personal_limit
+        self.global_limit = global_limit
+        self._personal: dict[int, deque[dict]] = {}
+        self._global: deque[dict] = deque(maxlen=global_limit)
+        self._global_loaded = store is None
+        self._lock = threading.Lock()
+
+    def _load_global(self) -> None:
+        if self._global_loaded:
+            return
+        try:
+            rows = self.store.load_global(self.global_limit)
+        except Exception as exc:
+            logger.warning("Chat memory global load failed: %s", exc)
+            rows = []
+        loaded = deque(
+            ({"role": role, "content": content, "user_id": user_id} for user_id, role, content in rows),
+            maxlen=self.global_limit,
+        )
+        with self._lock:
+            if self._global_loaded:
+                return
+            self._global_loaded = True
+            # Сообщения, добавленные до загрузки, новее загруженных
+            loaded.extend(self._global)
+            self._global = loaded
+
+    def _user_buffer(self, user_id: int) -> deque[dict]:
+        """Буфер пользователя; вызывается без блокировки, вставка — под ней."""
+        with self._lock:
+            buffer = self._personal.get(user_id)
+        if buffer is not None:
+            return buffer
+        buffer = deque(maxlen=self.personal_limit)
+        if self.store is not None:
+            try:
+                rows = self.store.load_user(user_id, self.personal_limit)
+                buffer.extend({"role": role, "content": content} for _uid, role, content in rows)
+            except Exception as exc:
+                logger.warning("Chat memory load failed for %s: %s", user_id, exc)
+        with self._lock:
+            return self._personal.setdefault(user_id, buffer)
+
+    def add(self, user_id: int, *messages: tuple[str, str]) -> None:
+        """Добавляет сообщения (role, content) пользователя в его историю и общий канал."""
+        self._load_global()
+        buffer = self._user_buffer(user_id)
+        with self._lock:
+            for role, content in messages:
+                buffer.append({"role": role, "content": content})
+                self._global.append({"role": role, "content": content, "user_id": user_id})
+        if self.store is not None:
+            try:
+                self.store.append([(user_id, role, content) for role, content in messages])
+            except Exception as exc:
+                logger.warning("Chat memory write failed for %s: %s", user_id, exc)
+
+    def personal(self, user_id: int) -> list[dict]:
+        """Личная история пользователя (не длиннее ``personal_limit``)."""
+        buffer = self._user_buffer(user_id)
+        with self._lock:
+            return list(buffer)
+
+    def global_history(self) -> list[dict]:
+        """Общий канал без поля user_id (не длиннее ``global_limit``)."""
+        self._load_global()
+        with self._lock:
+            return [{"role": m["role"], "content": m["content"]} for m in self._global]
+
+    def context(self, user_id: int, token_budget: int = HISTORY_TOKEN_BUDGET) -> list[dict]:
+        """Собирает историю для запроса, укладываясь в ``token_budget``.
+
+        Берутся самые свежие личные сообщения, затем на оставшуюся часть
+        бюджета (не больше ``GLOBAL_BUDGET_SHARE``) — свежие реплики других
+        пользователей. Собственные сообщения пользователя из общего канала
+        не дублируются.
+
+        Returns:
+            Сообщения {"role", "content"}: сначала общий канал, затем личная
+            история, каждая часть в хронологическом порядке.
+        """
+        self._load_global()
+        buffer = self._user_buffer(user_id)
+        with self._lock:
+            personal_source = list(buffer)
+            global_source = [m for m in self._global if m["user_id"] != user_id]
+
+        remaining = token_budget
+        personal: list[dict] = []
+        for message in reversed(personal_source):
+            cost = estimate_tokens(message["content"])
+            if cost > remaining:
+                break
+            personal.append(message)
+            remaining -= cost
+
+        shared: list[dict] = []
+        global_budget = min(remaining, int(token_budget * GLOBAL_BUDGET_SHARE))
+        for message in reversed(global_source):
+            cost = estimate_tokens(message["content"])
+            if cost > global_budget:
+                break
+            shared.append({"role": message["role"], "content": message["content"]})
+            global_budget -= cost
+
+        return shared[::-1] + personal[::-1]
@@ -0,0 +1,100 @@
+"""Общий кэш коэффициентов конвертации (таблица ``conversion_rates``).
+
+Используется парсерами вебхука (api/index.py) и ``bank_bot`` ParsingService:
+все активные коэффициенты читаются одним запросом и живут в памяти процесса
+до истечения TTL или явного сброса через :func:`invalidate_conversion_rates`
+(например, после изменения коэффициента администратором).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections.abc import Callable, Iterable
+from decimal import Decimal
+from typing import Any
+
+# Запрос для загрузчиков: строки (bot_name, resource_type, k) в порядке id
+CONVERSION_RATES_QUERY = (
+    "SELECT bot_name, resource_type, k FROM conversion_rates "
+    "WHERE is_active = TRUE ORDER BY id"
+)
+
+RateLoader = Callable[[], Iterable[Any]]
+
+
+class ConversionRateCache:
+    """Кэш коэффициентов ``k`` с TTL и явной инвалидацией.
+
+    Загрузчик (``loader``) передаётся при обращении и вызывается только
+    при промахе по сроку жизни, поэтому вызывающий код открывает
+    соединение с БД лишь при перезагрузке таблицы.
+    """
+
+    def __init__(self, ttl: float = 300.0) -> None:
+        self.ttl = ttl
+        self._rates: dict[tuple[str, str], Decimal] = {}
+        self._by_bot: dict[str, Decimal] = {}
+        self._loaded_at: float | None = None
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "loads": 0, "invalidations": 0}
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def load(self, loader: RateLoader) -> None:
+        """Перечитывает все активные коэффициенты через ``loader``.
+
+        Args:
+            loader: Функция, возвращающая строки (bot_name, resource_type, k).
+        """
+        rates: dict[tuple[str, str], Decimal] = {}
+        by_bot: dict[str, Decimal] = {}
+        for bot_name, resource_type, k in loader():
+            value = Decimal(str(k))
+            rates.setdefault((bot_name, resource_type), value)
+            by_bot.setdefault(bot_name, value)
+        with self._lock:
+            self._rates = rates
+            self._by_bot = by_bot
+            self._loaded_at = time.monotonic()
+            self.stats["loads"] += 1
+
+    def get(
+        self,
+        bot_name: str,
+        resource_type: str | None = None,
+        *,
+        loader: RateLoader,
+    ) -> Decimal | None:
+        """Возвращает коэффициент ``k`` или None, если он не задан в БД.
+
+        Args:
+            bot_name: Имя бота (gdcards, shmalala, ...).
+            resource_type: Тип ресурса; без него берётся первый коэффициент бота.
+            loader: Загрузчик таблицы, вызывается только если кэш устарел.
+
+        Returns:
+            Коэффициент как Decimal или None.
+        """
+        if self._is_fresh():
+            self.stats["hits"] += 1
+        else:
+            self.load(loader)
+        if resource_type is None:
+            return self._by_bot.get(bot_name)
+        return self._rates.get((bot_name, resource_type))
+
+    def invalidate(self) -> None:
+        """Сбрасывает кэш; следующее обращение перечитает таблицу."""
+        with self._lock:
+            self._loaded_at = None
+            self.stats["invalidations"] += 1
+
+
+conversion_rate_cache = ConversionRateCache()
+
+
+def invalidate_conversion_rates() -> None:
+    """Сбрасывает общий кэш после изменения коэффициентов."""
+    conversion_rate_cache.invalidate()
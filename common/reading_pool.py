@@ -0,0 +1,301 @@
+"""Пул заранее сгенерированных историй для тренажёра чтения (/api/reading_generate).
+
+Генерация истории моделью занимает до десятков секунд, поэтому страница
+тренажёра получает готовый набор (история + вопросы) из таблицы
+``reading_sets``. Наборы старше ``max_age`` выходят из ротации и удаляются
+при дозаполнении; дозаполнение запускает фоновый поток, когда свежих
+наборов меньше ``low_watermark``, или явный вызов ``refill()``
+(``/api/reading_generate?refill=1``, в том числе по cron). Просмотренные
+пользователем наборы запоминаются в ``reading_seen``, чтобы не
+показывать их повторно, пока есть непросмотренные.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+READING_POOL_TARGET_SIZE = 30
+READING_POOL_LOW_WATERMARK = 10
+READING_SET_MAX_AGE = 7 * 24 * 3600
+
+# Не больше стольких генераций за один вызов refill(): запрос с ?refill=1
+# должен уложиться в лимит времени serverless-функции
+REFILL_BATCH = 5
+# Как часто снимок пула перечитывается из БД (наборы от других инстансов)
+RELOAD_SECONDS = 60.0
+# Случайные попытки найти непросмотренный набор до полного перебора
+PICK_ATTEMPTS = 8
+# Сколько пользователей держать в памяти с их просмотренными наборами
+SEEN_CACHE_VIEWERS = 1000
+
+READING_SETS_DDL = """
+    CREATE TABLE IF NOT EXISTS reading_sets (
+        id BIGINT PRIMARY KEY,
+        payload TEXT NOT NULL,
+        created_at BIGINT NOT NULL
+    )
+"""
+READING_SEEN_DDL = """
+    CREATE TABLE IF NOT EXISTS reading_seen (
+        viewer VARCHAR(64) NOT NULL,
+        set_id BIGINT NOT NULL,
+        seen_at BIGINT NOT NULL,
+        PRIMARY KEY (viewer, set_id)
+    )
+"""
+READING_SETS_INDEX_DDL = "CREATE INDEX IF NOT EXISTS idx_reading_sets_created_at ON reading_sets (created_at)"
+
+
+def validate_reading_set(story: Any) -> bool:
+    """Проверяет, что набор можно показать на странице тренажёра."""
+    if not isinstance(story, dict):
+        return False
+    if not all(isinstance(story.get(key), str) and story[key].strip() for key in ("title", "image", "text")):
+        return False
+    questions = story.get("questions")
+    return (
+        isinstance(questions, list)
+        and len(questions) > 0
+        and all(isinstance(q, dict) and q.get("question") and "answer" in q for q in questions)
+    )
+
+
+class SqlReadingSetStore:
+    """Хранилище наборов в таблицах ``reading_sets`` и ``reading_seen``.
+
+    ``id`` набора — время записи в наносекундах, как ``seq`` в
+    ``ai_chat_memory``, чтобы не зависеть от автоинкремента СУБД. Таблицы
+    создаёт вызывающий код вместе с остальной схемой.
+    """
+
+    def __init__(self, engine_getter: Callable[[], Any]) -> None:
+        self._engine_getter = engine_getter
+
+    def load(self, min_created_at: int) -> list[tuple[int, dict, int]]:
+        """Возвращает свежие наборы (id, набор, created_at), новые первыми."""
+        with self._engine_getter().connect() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT id, payload, created_at FROM reading_sets "
+                    "WHERE created_at >= :min_created_at ORDER BY created_at DESC"
+                ),
+                {"min_created_at": min_created_at},
+            ).all()
+        return [(int(row[0]), json.loads(row[1]), int(row[2])) for row in rows]
+
+    def add(self, stories: list[dict], created_at: int) -> list[int]:
+        """Записывает наборы одной транзакцией и возвращает их id."""
+        base = time.time_ns()
+        params = [
+            {"id": base + offset, "payload": json.dumps(story, ensure_ascii=False), "created_at": created_at}
+            for offset, story in enumerate(stories)
+        ]
+        if params:
+            with self._engine_getter().begin() as conn:
+                conn.execute(
+                    text("INSERT INTO reading_sets (id, payload, created_at) VALUES (:id, :payload, :created_at)"),
+                    params,
+                )
+        return [p["id"] for p in params]
+
+    def prune(self, min_created_at: int) -> int:
+        """Удаляет устаревшие наборы вместе с отметками о просмотре."""
+        with self._engine_getter().begin() as conn:
+            conn.execute(
+                text(
+                    "DELETE FROM reading_seen WHERE set_id IN "
+                    "(SELECT id FROM reading_sets WHERE created_at < :min_created_at)"
+                ),
+                {"min_created_at": min_created_at},
+            )
+            result = conn.execute(
+                text("DELETE FROM reading_sets WHERE created_at < :min_created_at"),
+                {"min_created_at": min_created_at},
+            )
+        return result.rowcount or 0
+
+    def seen(self, viewer: str) -> set[int]:
+        with self._engine_getter().connect() as conn:
+            rows = conn.execute(text("SELECT set_id FROM reading_seen WHERE viewer = :viewer"), {"viewer": viewer}).all()
+        return {int(row[0]) for row in rows}
+
+    def mark_seen(self, viewer: str, set_id: int, seen_at: int) -> None:
+        with self._engine_getter().begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO reading_seen (viewer, set_id, seen_at) VALUES (:viewer, :set_id, :seen_at) "
+                    "ON CONFLICT (viewer, set_id) DO NOTHING"
+                ),
+                {"viewer": viewer, "set_id": set_id, "seen_at": seen_at},
+            )
+
+
+class ReadingSetPool:
+    """Снимок свежих наборов в памяти с выдачей без обращения к провайдерам.
+
+    ``take()`` читает БД не чаще раза в ``RELOAD_SECONDS`` (плюс одно чтение
+    просмотренных наборов при первом обращении пользователя), поэтому
+    страница грузится за миллисекунды. Ошибки БД и провайдеров не мешают
+    выдаче: вызывающий код при None отдаёт статический набор.
+    """
+
+    def __init__(
+        self,
+        store: SqlReadingSetStore,
+        generate: Callable[[], dict | None],
+        target_size: int = READING_POOL_TARGET_SIZE,
+        low_watermark: int = READING_POOL_LOW_WATERMARK,
+        max_age: int = READING_SET_MAX_AGE,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.store = store
+        self.generate = generate
+        self.target_size = target_size
+        self.low_watermark = low_watermark
+        self.max_age = max_age
+        self._clock = clock
+        self._sets: list[tuple[int, dict, int]] = []
+        self._loaded_at: float | None = None
+        self._seen: OrderedDict[str, set[int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._refill_lock = threading.Lock()
+        self.stats = {"served": 0, "misses": 0, "generated": 0, "failed": 0, "pruned": 0}
+
+    def _min_created_at(self) -> int:
+        return int(self._clock() - self.max_age)
+
+    def _fresh_sets(self) -> list[tuple[int, dict, int]]:
+        now = self._clock()
+        if self._loaded_at is None or now - self._loaded_at >= RELOAD_SECONDS:
+            self.reload()
+        min_created_at = self._min_created_at()
+        with self._lock:
+            # Снимок отсортирован от новых к старым: отрезаем устаревший хвост
+            while self._sets and self._sets[-1][2] < min_created_at:
+                self._sets.pop()
+            return self._sets
+
+    def reload(self) -> None:
+        """Перечитывает свежие наборы из БД (при ошибке остаётся прежний снимок)."""
+        try:
+            sets = self.store.load(self._min_created_at())
+        except Exception as exc:
+            logger.warning("Reading pool load failed: %s", exc)
+            sets = None
+        with self._lock:
+            if sets is not None:
+                self._sets = sets
+            self._loaded_at = self._clock()
+
+    def _viewer_seen(self, viewer: str) -> set[int]:
+        with self._lock:
+            seen = self._seen.get(viewer)
+            if seen is not None:
+                self._seen.move_to_end(viewer)
+                return seen
+        try:
+            seen = self.store.seen(viewer)
+        except Exception as exc:
+            logger.warning("Reading pool seen load failed for %s: %s", viewer, exc)
+            seen = set()
+        with self._lock:
+            seen = self._seen.setdefault(viewer, seen)
+            while len(self._seen) > SEEN_CACHE_VIEWERS:
+                self._seen.popitem(last=False)
+        return seen
+
+    def take(self, viewer: str | None = None) -> dict | None:
+        """Выдаёт готовый набор, по возможности ещё не показанный пользователю."""
+        sets = self._fresh_sets()
+        if len(sets) < self.low_watermark:
+            self.refill_in_background()
+        if not sets:
+            self.stats["misses"] += 1
+            return None
+
+        seen = self._viewer_seen(viewer) if viewer else set()
+        picked = None
+        for _ in range(PICK_ATTEMPTS):
+            candidate = random.choice(sets)
+            if candidate[0] not in seen:
+                picked = candidate
+                break
+        if picked is None:
+            unseen = [entry for entry in sets if entry[0] not in seen]
+            # Пользователь видел всё: показываем любой и просим новые наборы
+            picked = random.choice(unseen) if unseen else random.choice(sets)
+            if not unseen:
+                self.refill_in_background()
+
+        set_id, story, _created_at = picked
+        if viewer:
+            seen.add(set_id)
+            try:
+                self.store.mark_seen(viewer, set_id, int(self._clock()))
+            except Exception as exc:
+                logger.warning("Reading pool seen write failed for %s: %s", viewer, exc)
+        self.stats["served"] += 1
+        return story
+
+    def refill(self, limit: int = REFILL_BATCH) -> int:
+        """Удаляет устаревшие наборы и генерирует недостающие (не больше ``limit``).
+
+        Returns:
+            Сколько новых наборов записано; 0, если дозаполнение уже идёт.
+        """
+        if not self._refill_lock.acquire(blocking=False):
+            return 0
+        try:
+            try:
+                self.stats["pruned"] += self.store.prune(self._min_created_at())
+            except Exception as exc:
+                logger.warning("Reading pool prune failed: %s", exc)
+            self.reload()
+            missing = min(limit, self.target_size - len(self._sets))
+            stories = []
+            for _ in range(max(missing, 0)):
+                try:
+                    story = self.generate()
+                except Exception as exc:
+                    logger.warning("Reading set generation failed: %s", exc)
+                    story = None
+                if validate_reading_set(story):
+                    stories.append(story)
+                else:
+                    self.stats["failed"] += 1
+                    # Провайдеры недоступны: не тратим время на остальные попытки
+                    break
+            if not stories:
+                return 0
+            try:
+                self.store.add(stories, int(self._clock()))
+            except Exception as exc:
+                logger.warning("Reading pool write failed: %s", exc)
+                return 0
+            self.stats["generated"] += len(stories)
+            self.reload()
+            return len(stories)
+        finally:
+            self._refill_lock.release()
+
+    def refill_in_background(self) -> bool:
+        """Запускает ``refill()`` в фоновом потоке, если он ещё не идёт."""
+        if self._refill_lock.locked():
+            return False
+        threading.Thread(target=self.refill, name="reading-pool-refill", daemon=True).start()
+        return True
+
+    def size(self) -> int:
+        """Число свежих наборов в текущем снимке."""
+        return len(self._fresh_sets())
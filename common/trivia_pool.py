@@ -0,0 +1,473 @@
+"""Пул заранее сгенерированных ИИ-вопросов викторины (/trivia).
+
+Генерация вопроса моделью занимает несколько секунд, поэтому команда не
+ждёт провайдера: она забирает готовый вопрос из пула, а пул сам
+дозаполняется в фоне, когда в нём остаётся меньше ``low_watermark``
+вопросов. В пул попадают только вопросы, прошедшие проверку формата и
+лимитов Telegram-опроса, и не повторяющие недавно заданные.
+
+Генератор может быть корутиной (бот: фоновая asyncio-задача в текущем
+цикле событий) или обычной функцией (фоновый поток).
+
+Вебхук на Vercel не может держать пул в памяти: инстанс замораживается
+после ответа и теряет память при холодном старте. Для него вопросы
+хранятся в таблице ``trivia_questions`` (SqlTriviaQuestionPool), а
+дозаполняет её cron через ``/api/trivia_pool?refill=1``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import json
+import logging
+import re
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+POOL_TARGET_SIZE = 8
+POOL_LOW_WATERMARK = 3
+RECENT_LIMIT = 100
+
+# Подряд идущие неудачи (ошибка, брак, дубль), после которых дозаполнение
+# откладывается на REFILL_RETRY_SECONDS
+MAX_GENERATION_FAILURES = 3
+REFILL_RETRY_SECONDS = 30.0
+
+# Лимиты Telegram sendPoll: обрезанный вариант ответа мог бы совпасть с другим
+QUESTION_MAX_CHARS = 300
+OPTION_MAX_CHARS = 100
+
+# Не больше стольких генераций за один вызов SqlTriviaQuestionPool.refill():
+# запрос с ?refill=1 должен уложиться в лимит времени serverless-функции
+REFILL_BATCH = 5
+# Сколько хранить заданные вопросы в trivia_questions для проверки повторов
+ASKED_MAX_AGE = 7 * 24 * 3600
+# Как часто перечитывать ключи недавних вопросов из БД
+RECENT_RELOAD_SECONDS = 60.0
+
+TRIVIA_QUESTIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS trivia_questions (
+        id BIGINT PRIMARY KEY,
+        question_key VARCHAR(300) NOT NULL,
+        payload TEXT NOT NULL,
+        created_at BIGINT NOT NULL,
+        asked_at BIGINT
+    )
+"""
+TRIVIA_QUESTIONS_INDEX_DDL = "CREATE INDEX IF NOT EXISTS idx_trivia_questions_asked_at ON trivia_questions (asked_at)"
+
+QuestionGenerator = Callable[[], "Awaitable[dict | None] | dict | None"]
+
+
+def question_key(text: str) -> str:
+    """Ключ дедупликации: текст вопроса без регистра, пунктуации и лишних пробелов."""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def validate_question(question: Any) -> bool:
+    """Проверяет, что вопрос можно отправить опросом без правок."""
+    if not isinstance(question, dict):
+        return False
+    text = question.get("text")
+    options = question.get("options")
+    correct_index = question.get("correct_index")
+    if not isinstance(text, str) or not text.strip() or len(text) > QUESTION_MAX_CHARS:
+        return False
+    if not isinstance(options, list) or len(options) != 4:
+        return False
+    if not all(isinstance(option, str) and option.strip() and len(option) <= OPTION_MAX_CHARS for option in options):
+        return False
+    if len({question_key(option) for option in options}) != len(options):
+        return False
+    if not isinstance(correct_index, int) or not 0 <= correct_index < len(options):
+        return False
+    return question.get("correct_text", options[correct_index]) == options[correct_index]
+
+
+class TriviaQuestionPool:
+    """Потокобезопасный пул готовых вопросов с фоновым дозаполнением.
+
+    ``take()`` никогда не ждёт генератор: при пустом пуле он возвращает
+    None, и вызывающий код берёт вопрос из статического набора (отметив
+    его через ``mark_asked``, чтобы ИИ-вопросы его не повторяли).
+    """
+
+    def __init__(
+        self,
+        generate: QuestionGenerator,
+        target_size: int = POOL_TARGET_SIZE,
+        low_watermark: int = POOL_LOW_WATERMARK,
+        recent_limit: int = RECENT_LIMIT,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.generate = generate
+        self.target_size = target_size
+        self.low_watermark = low_watermark
+        self._clock = clock
+        self._ready: deque[dict] = deque()
+        self._recent: deque[str] = deque(maxlen=recent_limit)
+        self._lock = threading.Lock()
+        self._refilling = False
+        self._retry_at = 0.0
+        self._closed = False
+        self._task: asyncio.Task | None = None
+        self.stats = {"served": 0, "misses": 0, "generated": 0, "rejected": 0, "duplicates": 0, "errors": 0}
+
+    def __len__(self) -> int:
+        return len(self._ready)
+
+    def take(self) -> dict | None:
+        """Забирает готовый вопрос и при необходимости запускает дозаполнение."""
+        with self._lock:
+            question = self._ready.popleft() if self._ready else None
+            if question is not None:
+                self._recent.append(question_key(question["text"]))
+                self.stats["served"] += 1
+            else:
+                self.stats["misses"] += 1
+        self.maybe_refill()
+        return question
+
+    def mark_asked(self, question: dict) -> None:
+        """Запоминает вопрос, заданный в обход пула (например, из статического набора)."""
+        with self._lock:
+            self._recent.append(question_key(question["text"]))
+
+    def is_recent(self, text: str) -> bool:
+        with self._lock:
+            return question_key(text) in self._recent
+
+    def offer(self, question: Any) -> bool:
+        """Кладёт вопрос в пул, если он корректен, не дубль и пул не полон."""
+        if not validate_question(question):
+            with self._lock:
+                self.stats["rejected"] += 1
+            return False
+        key = question_key(question["text"])
+        with self._lock:
+            if key in self._recent or any(question_key(ready["text"]) == key for ready in self._ready):
+                self.stats["duplicates"] += 1
+                return False
+            if len(self._ready) >= self.target_size:
+                return False
+            self._ready.append(question)
+            self.stats["generated"] += 1
+            return True
+
+    def maybe_refill(self) -> bool:
+        """Запускает фоновое дозаполнение, если пул ниже порога.
+
+        Returns:
+            True, если дозаполнение запущено этим вызовом.
+        """
+        with self._lock:
+            if (
+                self._closed
+                or self._refilling
+                or len(self._ready) >= self.low_watermark
+                or self._clock() < self._retry_at
+            ):
+                return False
+            self._refilling = True
+        try:
+            if inspect.iscoroutinefunction(self.generate):
+                # Без работающего цикла событий (синхронный вызов) дозаполнять некому
+                loop = asyncio.get_running_loop()
+                self._task = loop.create_task(self._refill_async())
+            else:
+                threading.Thread(target=self._refill_sync, name="trivia-pool-refill", daemon=True).start()
+        except RuntimeError:
+            with self._lock:
+                self._refilling = False
+            return False
+        return True
+
+    def _needs_more(self, failures: int) -> bool:
+        with self._lock:
+            return not self._closed and len(self._ready) < self.target_size and failures < MAX_GENERATION_FAILURES
+
+    def _record(self, question: Any, failures: int) -> int:
+        return 0 if self.offer(question) else failures + 1
+
+    def _finish(self, failures: int) -> None:
+        with self._lock:
+            self._refilling = False
+            if failures >= MAX_GENERATION_FAILURES:
+                self._retry_at = self._clock() + REFILL_RETRY_SECONDS
+        logger.info("Trivia pool refill finished: size=%s failures=%s", len(self._ready), failures)
+
+    async def _refill_async(self) -> None:
+        failures = 0
+        try:
+            while self._needs_more(failures):
+                try:
+                    question = await self.generate()
+                except Exception as exc:
+                    logger.warning("Trivia question generation failed: %s", exc)
+                    self.stats["errors"] += 1
+                    question = None
+                failures = self._record(question, failures)
+        finally:
+            self._finish(failures)
+
+    def _refill_sync(self) -> None:
+        failures = 0
+        try:
+            while self._needs_more(failures):
+                try:
+                    question = self.generate()
+                except Exception as exc:
+                    logger.warning("Trivia question generation failed: %s", exc)
+                    self.stats["errors"] += 1
+                    question = None
+                failures = self._record(question, failures)
+        finally:
+            self._finish(failures)
+
+    async def aclose(self) -> None:
+        """Останавливает фоновое дозаполнение (поток завершится после текущего вызова)."""
+        with self._lock:
+            self._closed = True
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+class SqlTriviaQuestionStore:
+    """Хранилище вопросов в таблице ``trivia_questions``.
+
+    Готовый вопрос — строка с пустым ``asked_at``; выдача проставляет его,
+    так что один вопрос достаётся одному инстансу. Заданные вопросы (в том
+    числе статические, см. ``SqlTriviaQuestionPool.mark_asked``) хранятся
+    ``ASKED_MAX_AGE`` для проверки повторов. ``id`` — время записи в
+    наносекундах, как в ``reading_sets``. Таблицу создаёт вызывающий код
+    вместе с остальной схемой.
+    """
+
+    def __init__(self, engine_getter: Callable[[], Any]) -> None:
+        self._engine_getter = engine_getter
+
+    def add(self, questions: list[dict], created_at: int, asked_at: int | None = None) -> list[int]:
+        """Записывает вопросы одной транзакцией и возвращает их id."""
+        base = time.time_ns()
+        params = [
+            {
+                "id": base + offset,
+                "question_key": question_key(question["text"])[:300],
+                "payload": json.dumps(question, ensure_ascii=False),
+                "created_at": created_at,
+                "asked_at": asked_at,
+            }
+            for offset, question in enumerate(questions)
+        ]
+        if params:
+            with self._engine_getter().begin() as conn:
+                conn.execute(
+                    text(
+                        "INSERT INTO trivia_questions (id, question_key, payload, created_at, asked_at) "
+                        "VALUES (:id, :question_key, :payload, :created_at, :asked_at)"
+                    ),
+                    params,
+                )
+        return [p["id"] for p in params]
+
+    def claim(self, asked_at: int, attempts: int = 3) -> dict | None:
+        """Забирает самый старый готовый вопрос, помечая его заданным."""
+        with self._engine_getter().begin() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT id, payload FROM trivia_questions WHERE asked_at IS NULL "
+                    "ORDER BY created_at, id LIMIT :limit"
+                ),
+                {"limit": attempts},
+            ).all()
+            for row in rows:
+                # Вопрос мог забрать другой инстанс между SELECT и UPDATE
+                claimed = conn.execute(
+                    text("UPDATE trivia_questions SET asked_at = :asked_at WHERE id = :id AND asked_at IS NULL"),
+                    {"asked_at": asked_at, "id": row[0]},
+                )
+                if claimed.rowcount == 1:
+                    return json.loads(row[1])
+        return None
+
+    def ready_count(self) -> int:
+        with self._engine_getter().connect() as conn:
+            return int(conn.execute(text("SELECT COUNT(*) FROM trivia_questions WHERE asked_at IS NULL")).scalar() or 0)
+
+    def recent_keys(self, limit: int) -> list[str]:
+        """Ключи готовых и последних заданных вопросов."""
+        with self._engine_getter().connect() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT question_key FROM trivia_questions "
+                    "ORDER BY COALESCE(asked_at, created_at) DESC LIMIT :limit"
+                ),
+                {"limit": limit},
+            ).all()
+        return [row[0] for row in rows]
+
+    def prune(self, min_asked_at: int) -> int:
+        """Удаляет вопросы, заданные раньше ``min_asked_at``."""
+        with self._engine_getter().begin() as conn:
+            result = conn.execute(
+                text("DELETE FROM trivia_questions WHERE asked_at IS NOT NULL AND asked_at < :min_asked_at"),
+                {"min_asked_at": min_asked_at},
+            )
+        return result.rowcount or 0
+
+
+class SqlTriviaQuestionPool:
+    """Пул вопросов в БД для serverless-вебхука.
+
+    Интерфейс выдачи тот же, что у TriviaQuestionPool: ``take()`` не ждёт
+    генератор и при пустом пуле возвращает None. Пул переживает холодный
+    старт и общий для всех инстансов; дозаполняет его ``refill()`` (cron)
+    и, пока инстанс жив, фоновый поток при нехватке вопросов. Ошибки БД не
+    мешают выдаче: вызывающий код берёт статический вопрос.
+    """
+
+    def __init__(
+        self,
+        store: SqlTriviaQuestionStore,
+        generate: Callable[[], dict | None],
+        target_size: int = POOL_TARGET_SIZE,
+        low_watermark: int = POOL_LOW_WATERMARK,
+        recent_limit: int = RECENT_LIMIT,
+        max_asked_age: int = ASKED_MAX_AGE,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.store = store
+        self.generate = generate
+        self.target_size = target_size
+        self.low_watermark = low_watermark
+        self.recent_limit = recent_limit
+        self.max_asked_age = max_asked_age
+        self._clock = clock
+        self._recent: set[str] = set()
+        self._recent_loaded_at: float | None = None
+        self._lock = threading.Lock()
+        self._refill_lock = threading.Lock()
+        self.stats = {"served": 0, "misses": 0, "generated": 0, "rejected": 0, "duplicates": 0, "errors": 0}
+
+    def take(self) -> dict | None:
+        """Забирает готовый вопрос и при нехватке запускает дозаполнение."""
+        try:
+            question = self.store.claim(int(self._clock()))
+        except Exception as exc:
+            logger.warning("Trivia pool claim failed: %s", exc)
+            return None
+        if question is None:
+            self.stats["misses"] += 1
+            self.refill_in_background()
+            return None
+        self.stats["served"] += 1
+        with self._lock:
+            self._recent.add(question_key(question["text"]))
+        if self.size() < self.low_watermark:
+            self.refill_in_background()
+        return question
+
+    def mark_asked(self, question: dict) -> None:
+        """Запоминает вопрос, заданный в обход пула (например, из статического набора)."""
+        with self._lock:
+            self._recent.add(question_key(question["text"]))
+        now = int(self._clock())
+        try:
+            self.store.add([question], now, asked_at=now)
+        except Exception as exc:
+            logger.warning("Trivia pool asked write failed: %s", exc)
+
+    def is_recent(self, text: str) -> bool:
+        now = self._clock()
+        if self._recent_loaded_at is None or now - self._recent_loaded_at >= RECENT_RELOAD_SECONDS:
+            self._reload_recent()
+        with self._lock:
+            return question_key(text) in self._recent
+
+    def _reload_recent(self) -> None:
+        try:
+            keys = set(self.store.recent_keys(self.recent_limit))
+        except Exception as exc:
+            logger.warning("Trivia pool recent load failed: %s", exc)
+            keys = None
+        with self._lock:
+            if keys is not None:
+                self._recent = keys
+            self._recent_loaded_at = self._clock()
+
+    def refill(self, limit: int = REFILL_BATCH) -> int:
+        """Удаляет давно заданные вопросы и генерирует недостающие (не больше ``limit``).
+
+        Returns:
+            Сколько новых вопросов записано; 0, если дозаполнение уже идёт.
+        """
+        if not self._refill_lock.acquire(blocking=False):
+            return 0
+        try:
+            try:
+                self.store.prune(int(self._clock() - self.max_asked_age))
+                missing = min(limit, self.target_size - self.store.ready_count())
+                known = set(self.store.recent_keys(self.recent_limit))
+            except Exception as exc:
+                logger.warning("Trivia pool refill failed: %s", exc)
+                return 0
+            questions: list[dict] = []
+            failures = 0
+            while len(questions) < missing and failures < MAX_GENERATION_FAILURES:
+                try:
+                    question = self.generate()
+                except Exception as exc:
+                    logger.warning("Trivia question generation failed: %s", exc)
+                    self.stats["errors"] += 1
+                    question = None
+                if not validate_question(question):
+                    self.stats["rejected"] += 1
+                    failures += 1
+                    continue
+                key = question_key(question["text"])
+                if key in known:
+                    self.stats["duplicates"] += 1
+                    failures += 1
+                    continue
+                known.add(key)
+                questions.append(question)
+                failures = 0
+            if not questions:
+                return 0
+            try:
+                self.store.add(questions, int(self._clock()))
+            except Exception as exc:
+                logger.warning("Trivia pool write failed: %s", exc)
+                return 0
+            self.stats["generated"] += len(questions)
+            return len(questions)
+        finally:
+            self._refill_lock.release()
+
+    def refill_in_background(self) -> bool:
+        """Запускает ``refill()`` в фоновом потоке, если он ещё не идёт."""
+        if self._refill_lock.locked():
+            return False
+        threading.Thread(target=self.refill, name="trivia-pool-refill", daemon=True).start()
+        return True
+
+    def size(self) -> int:
+        """Число готовых вопросов в БД (0 при ошибке БД)."""
+        try:
+            return self.store.ready_count()
+        except Exception as exc:
+            logger.warning("Trivia pool size failed: %s", exc)
+            return 0
@@ -10,6 +10,7 @@ from sqlalchemy.orm import Session
 
 from database.database import User, ShopItem, UserPurchase
 from core.models.advanced_models import PurchaseResult
+from core.managers.sticker_rate_limiter import invalidate_sticker_unlimited
 import structlog
 
 logger = structlog.get_logger()
@@ -274,6 +275,7 @@ class ShopManager:
             user.sticker_unlimited_until = datetime.utcnow() + timedelta(hours=24)
 
             self.db.commit()
+            invalidate_sticker_unlimited(user.telegram_id)
 
             logger.info(
                 "Sticker access activated",
@@ -9,6 +9,7 @@ from sqlalchemy.orm import Session
 
 from database.database import User, ScheduledTask
 from core.models.advanced_models import StickerAccessError
+from core.managers.sticker_rate_limiter import invalidate_sticker_unlimited
 import structlog
 
 logger = structlog.get_logger()
@@ -59,6 +60,7 @@ class StickerManager:
 
             # Commit the changes
             self.db.commit()
+            invalidate_sticker_unlimited(user_id)
 
             logger.info(
                 "Unlimited sticker access granted successfully",
@@ -305,6 +307,7 @@ class StickerManager:
             user.sticker_unlimited_until = None
 
             self.db.commit()
+            invalidate_sticker_unlimited(user_id)
 
             logger.info("Sticker access revoked successfully", user_id=user_id, username=user.username)
             return True
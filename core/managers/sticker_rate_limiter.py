@@ -0,0 +1,365 @@
+"""
+Sticker rate limiting for chat moderation
+Counts stickers per (chat, user) in a sliding window without database round-trips
+"""
+
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import structlog
+from sqlalchemy import DateTime, text
+
+logger = structlog.get_logger()
+
+# How long a cached sticker_unlimited_until value is trusted
+UNLIMITED_CACHE_TTL_SECONDS = 60.0
+
+# Audit events are written in batches at this interval
+EVENT_FLUSH_INTERVAL_SECONDS = 5.0
+
+# Audit rows older than this are deleted, at most once per cleanup interval
+EVENT_RETENTION = timedelta(hours=2)
+EVENT_CLEANUP_INTERVAL_SECONDS = 10 * 60
+
+StickerEvent = Tuple[int, int, int, datetime]
+
+
+class SlidingWindowCounter:
+    """
+    In-process sliding-window counter keyed by (chat_id, user_id)
+
+    Every hit is counted, including rejected ones, so a user who keeps
+    sending stickers stays limited until they pause for a full window.
+    """
+
+    def __init__(self, limit: int, window_seconds: float):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self._events: Dict[Tuple[int, int], Deque[float]] = {}
+        self._last_sweep = 0.0
+
+    def hit(self, chat_id: int, user_id: int, message_id: int, now: float) -> bool:
+        """
+        Record a sticker and report whether it is within the limit
+
+        Args:
+            chat_id: Telegram chat ID
+            user_id: Telegram user ID
+            message_id: Telegram message ID (unused, kept for backend parity)
+            now: Event time as a UNIX timestamp
+
+        Returns:
+            True if fewer than `limit` stickers preceded it in the window
+        """
+        window_start = now - self.window_seconds
+        events = self._events.setdefault((chat_id, user_id), deque())
+        while events and events[0] < window_start:
+            events.popleft()
+        allowed = len(events) < self.limit
+        events.append(now)
+        self._sweep(window_start, now)
+        return allowed
+
+    def _sweep(self, window_start: float, now: float) -> None:
+        # Drop keys whose events all left the window, once per window
+        if now - self._last_sweep < self.window_seconds:
+            return
+        self._last_sweep = now
+        stale = [key for key, events in self._events.items() if events[-1] < window_start]
+        for key in stale:
+            del self._events[key]
+
+
+class RedisSlidingWindowCounter:
+    """
+    Sliding-window counter shared by all bot instances through Redis
+
+    Falls back to an in-process counter while Redis is unavailable.
+    """
+
+    def __init__(self, cache, limit: int, window_seconds: float):
+        """
+        Args:
+            cache: utils.redis_cache.RedisCache instance
+            limit: Stickers allowed per window
+            window_seconds: Window length in seconds
+        """
+        self.cache = cache
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.fallback = SlidingWindowCounter(limit, window_seconds)
+
+    def hit(self, chat_id: int, user_id: int, message_id: int, now: float) -> bool:
+        """Record a sticker and report whether it is within the limit."""
+        count = self.cache.sliding_window_hit(
+            f"sticker_window:{chat_id}:{user_id}",
+            str(message_id),
+            now,
+            self.window_seconds,
+        )
+        if count is None:
+            return self.fallback.hit(chat_id, user_id, message_id, now)
+        return count < self.limit
+
+
+class UnlimitedAccessCache:
+    """
+    Cache of users' sticker_unlimited_until values, including users without access
+
+    Entries expire after a TTL; grants and revocations invalidate them
+    through invalidate_sticker_unlimited().
+    """
+
+    def __init__(self, ttl: float = UNLIMITED_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._entries: Dict[int, Tuple[Optional[datetime], float]] = {}
+
+    def get(self, user_id: int) -> Tuple[bool, Optional[datetime]]:
+        """
+        Returns:
+            (found, unlimited_until); found is False when the value must be loaded
+        """
+        entry = self._entries.get(user_id)
+        if entry is None or time.monotonic() >= entry[1]:
+            return False, None
+        return True, entry[0]
+
+    def set(self, user_id: int, unlimited_until: Optional[datetime]) -> None:
+        """Cache a user's unlimited_until value (None for no access)."""
+        self._entries[user_id] = (unlimited_until, time.monotonic() + self.ttl)
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        """Forget one user's cached value, or every value when user_id is None."""
+        if user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(user_id, None)
+
+
+sticker_unlimited_cache = UnlimitedAccessCache()
+
+
+def invalidate_sticker_unlimited(user_id: Optional[int] = None) -> None:
+    """Drop cached unlimited sticker access after it was granted or revoked."""
+    sticker_unlimited_cache.invalidate(user_id)
+
+
+class StickerEventRecorder:
+    """
+    Writes sticker_usage_events audit rows in the background
+
+    Rows are buffered and inserted in one batch per flush from a worker
+    thread; the table is created once per process.
+    """
+
+    def __init__(self, engine, flush_interval: float = EVENT_FLUSH_INTERVAL_SECONDS):
+        self.engine = engine
+        self.flush_interval = flush_interval
+        self._pending: List[StickerEvent] = []
+        self._task: Optional[asyncio.Task] = None
+        self._schema_ready = False
+        self._last_cleanup = 0.0
+
+    def record(self, chat_id: int, user_id: int, message_id: int, created_at: datetime) -> None:
+        """Queue an audit row and make sure the background writer runs."""
+        self._pending.append((chat_id, user_id, message_id, created_at))
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Insert queued audit rows
+
+        Returns:
+            Number of rows written
+        """
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, []
+        try:
+            await asyncio.to_thread(self._write, batch)
+        except Exception as e:
+            logger.warning("Failed to record sticker usage events", count=len(batch), error=str(e))
+            return 0
+        return len(batch)
+
+    async def close(self) -> None:
+        """Stop the background writer and write what is left."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def _write(self, batch: List[StickerEvent]) -> None:
+        with self.engine.begin() as conn:
+            if not self._schema_ready:
+                self._ensure_schema(conn)
+            conn.execute(
+                text(
+                    """
+                    INSERT INTO sticker_usage_events
+                        (chat_id, user_id, message_id, created_at)
+                    VALUES
+                        (:chat_id, :user_id, :message_id, :created_at)
+                    """
+                ),
+                [
+                    {
+                        "chat_id": chat_id,
+                        "user_id": user_id,
+                        "message_id": message_id,
+                        "created_at": created_at,
+                    }
+                    for chat_id, user_id, message_id, created_at in batch
+                ],
+            )
+            now = time.monotonic()
+            if now - self._last_cleanup >= EVENT_CLEANUP_INTERVAL_SECONDS:
+                self._last_cleanup = now
+                conn.execute(
+                    text("DELETE FROM sticker_usage_events WHERE created_at < :cleanup_before"),
+                    {"cleanup_before": datetime.utcnow() - EVENT_RETENTION},
+                )
+
+    def _ensure_schema(self, conn) -> None:
+        id_column = (
+            "id SERIAL PRIMARY KEY"
+            if conn.dialect.name == "postgresql"
+            else "id INTEGER PRIMARY KEY AUTOINCREMENT"
+        )
+        conn.execute(
+            text(
+                f"""
+                CREATE TABLE IF NOT EXISTS sticker_usage_events (
+                    {id_column},
+                    chat_id BIGINT NOT NULL,
+                    user_id BIGINT NOT NULL,
+                    message_id BIGINT NOT NULL,
+                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+        )
+        conn.execute(
+            text(
+                """
+                CREATE INDEX IF NOT EXISTS idx_sticker_usage_chat_user_created
+                ON sticker_usage_events (chat_id, user_id, created_at)
+                """
+            )
+        )
+        self._schema_ready = True
+
+
+class StickerRateLimiter:
+    """
+    Decides whether a sticker is within the per-user hourly limit
+
+    The window counter lives in memory (or Redis), the unlimited-access
+    flag is cached and audit rows are written in the background, so the
+    common path does not touch the database.
+    """
+
+    def __init__(
+        self,
+        engine,
+        limit: int,
+        window_seconds: float,
+        counter=None,
+        unlimited_cache: UnlimitedAccessCache = sticker_unlimited_cache,
+        recorder: Optional[StickerEventRecorder] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.engine = engine
+        self.limit = limit
+        self.counter = counter or SlidingWindowCounter(limit, window_seconds)
+        self.unlimited_cache = unlimited_cache
+        self.recorder = recorder or StickerEventRecorder(engine)
+        self.clock = clock
+
+    @classmethod
+    def from_settings(cls, engine, limit: int, window_seconds: float, settings) -> "StickerRateLimiter":
+        """
+        Build a limiter, sharing windows through Redis when CACHE_BACKEND is "redis"
+        """
+        counter = None
+        if getattr(settings, "CACHE_BACKEND", "memory") == "redis":
+            from utils.redis_cache import RedisCache
+
+            cache = RedisCache.from_url(settings.REDIS_URL)
+            counter = RedisSlidingWindowCounter(cache, limit, window_seconds)
+            logger.info("Sticker rate limiter uses Redis windows")
+        return cls(engine, limit, window_seconds, counter=counter)
+
+    async def allow(self, chat_id: int, user_id: int, message_id: int) -> bool:
+        """
+        Record a sticker and report whether it may stay in the chat
+
+        Users with active unlimited access are neither counted nor audited.
+
+        Args:
+            chat_id: Telegram chat ID
+            user_id: Telegram user ID
+            message_id: Telegram message ID
+
+        Returns:
+            True if the sticker is allowed, False if it is over the limit
+        """
+        now = datetime.utcnow()
+        unlimited_until = await self.get_unlimited_until(user_id)
+        if unlimited_until is not None and unlimited_until > now:
+            logger.debug(
+                "Sticker moderation skipped: unlimited access active",
+                chat_id=chat_id,
+                user_id=user_id,
+                expires_at=str(unlimited_until),
+            )
+            return True
+
+        if isinstance(self.counter, RedisSlidingWindowCounter):
+            allowed = await asyncio.to_thread(
+                self.counter.hit, chat_id, user_id, message_id, self.clock()
+            )
+        else:
+            allowed = self.counter.hit(chat_id, user_id, message_id, self.clock())
+        self.recorder.record(chat_id, user_id, message_id, now)
+        return allowed
+
+    async def get_unlimited_until(self, user_id: int) -> Optional[datetime]:
+        """Return the user's sticker_unlimited_until, loading it on a cache miss."""
+        found, unlimited_until = self.unlimited_cache.get(user_id)
+        if found:
+            return unlimited_until
+        try:
+            unlimited_until = await asyncio.to_thread(self._load_unlimited_until, user_id)
+        except Exception as e:
+            logger.warning("Sticker unlimited access lookup failed", user_id=user_id, error=str(e))
+            return None
+        self.unlimited_cache.set(user_id, unlimited_until)
+        return unlimited_until
+
+    def _load_unlimited_until(self, user_id: int) -> Optional[datetime]:
+        with self.engine.connect() as conn:
+            return conn.execute(
+                text(
+                    """
+                    SELECT sticker_unlimited_until
+                    FROM users
+                    WHERE telegram_id = :telegram_id
+                      AND sticker_unlimited = TRUE
+                    """
+                ).columns(sticker_unlimited_until=DateTime),
+                {"telegram_id": user_id},
+            ).scalar_one_or_none()
+
+    async def close(self) -> None:
+        """Write pending audit rows."""
+        await self.recorder.close()
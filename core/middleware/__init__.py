@@ -3,7 +3,7 @@
 from .error_handling import ErrorHandlingMiddleware
 
 try:
-    from .activity_tracker import track_user_activity
-    __all__ = ["track_user_activity", "ErrorHandlingMiddleware"]
+    from .activity_tracker import flush_user_activity, track_user_activity
+    __all__ = ["track_user_activity", "flush_user_activity", "ErrorHandlingMiddleware"]
 except ImportError:
     __all__ = ["ErrorHandlingMiddleware"]
@@ -1,48 +1,238 @@
 """
 Activity Tracker Middleware
 Отслеживает активность пользователей и обновляет last_activity
+
+Время последней активности копится в памяти (ActivityBuffer) и
+сбрасывается в users.last_activity одним пакетным UPDATE раз в
+ACTIVITY_FLUSH_INTERVAL секунд или при накоплении ACTIVITY_FLUSH_MAX_USERS
+пользователей. Нового пользователя обработчик создаёт сразу, до остальных
+обработчиков того же апдейта: им нужна строка в users. В БД обработчик
+ходит только при первом сообщении пользователя после запуска процесса.
+При остановке бота буфер сбрасывается через flush_user_activity().
 """
-import structlog
+import asyncio
+import threading
 from datetime import datetime
+from typing import Callable, Dict, Optional, Set
+
+import structlog
+from sqlalchemy import bindparam, or_, update
+from sqlalchemy.exc import IntegrityError
 from telegram import Update
 from telegram.ext import ContextTypes
-from database.database import get_db, User
+from database.database import SessionLocal, User
 
 logger = structlog.get_logger()
 
+# Период фонового сброса буфера, секунды
+ACTIVITY_FLUSH_INTERVAL = 30.0
+
+# Сброс раньше срока, если в буфере накопилось столько пользователей
+ACTIVITY_FLUSH_MAX_USERS = 500
+
+# Сколько уже проверенных telegram_id помнить, прежде чем начать заново
+KNOWN_USERS_LIMIT = 100_000
+
+users_table = User.__table__
+
+
+class ActivityBuffer:
+    """
+    Буфер активности пользователей с отложенной пакетной записью.
+
+    Хранит для каждого telegram_id время последнего взаимодействия. Запись
+    в БД выполняется в отдельном потоке, поэтому event loop не блокируется.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable = SessionLocal,
+        flush_interval: float = ACTIVITY_FLUSH_INTERVAL,
+        max_users: int = ACTIVITY_FLUSH_MAX_USERS,
+    ):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_users = max_users
+        # telegram_id -> время активности
+        self._pending: Dict[int, datetime] = {}
+        # telegram_id, для которых строка в users уже точно есть
+        self._known: Set[int] = set()
+        self._write_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_due: Optional[asyncio.Event] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def record(self, telegram_id: int, seen_at: Optional[datetime] = None) -> None:
+        """
+        Запоминает активность пользователя без обращения к БД.
+
+        Args:
+            telegram_id: Telegram ID пользователя
+            seen_at: Время активности (по умолчанию текущее UTC)
+        """
+        self._pending[telegram_id] = seen_at or datetime.utcnow()
+        if len(self._pending) >= self.max_users and self._flush_due is not None:
+            self._flush_due.set()
+
+    async def ensure_user(self, telegram_id: int, username: str) -> None:
+        """
+        Создаёт пользователя в БД, если его там ещё нет.
+
+        Для уже проверенных в этом процессе telegram_id запроса к БД нет.
+
+        Args:
+            telegram_id: Telegram ID пользователя
+            username: Имя для создания пользователя
+        """
+        if telegram_id in self._known:
+            return
+        await asyncio.to_thread(self.create_user, telegram_id, username)
+        if len(self._known) >= KNOWN_USERS_LIMIT:
+            self._known.clear()
+        self._known.add(telegram_id)
+
+    def create_user(self, telegram_id: int, username: str) -> bool:
+        """
+        Синхронно создаёт пользователя, если его нет.
+
+        Returns:
+            bool: True, если пользователь создан этим вызовом
+        """
+        db = self.session_factory()
+        try:
+            if db.query(User.id).filter(User.telegram_id == telegram_id).first():
+                return False
+            now = datetime.utcnow()
+            db.add(User(
+                telegram_id=telegram_id,
+                username=username,
+                balance=0,
+                last_activity=now,
+                created_at=now,
+            ))
+            db.commit()
+        except IntegrityError:
+            # Пользователя успел создать другой обработчик
+            db.rollback()
+            return False
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        logger.info(f"Created new user {telegram_id} with initial last_activity")
+        return True
+
+    def start(self) -> None:
+        """Запускает фоновый сброс в текущем event loop, если он ещё не запущен."""
+        if self._task is not None and not self._task.done():
+            return
+        self._flush_due = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_due.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_due.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Записывает накопленную активность в БД.
+
+        При ошибке записи данные возвращаются в буфер и будут записаны
+        при следующем сбросе.
+
+        Returns:
+            int: Количество пользователей в сброшенной пачке
+        """
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+        try:
+            await asyncio.to_thread(self.write_batch, batch)
+        except Exception as e:
+            logger.error(f"Error flushing user activity for {len(batch)} users: {e}")
+            for telegram_id, seen_at in batch.items():
+                newer = self._pending.get(telegram_id)
+                if newer is None or newer < seen_at:
+                    self._pending[telegram_id] = seen_at
+            return 0
+        logger.debug(f"Flushed last_activity for {len(batch)} users")
+        return len(batch)
+
+    async def close(self) -> None:
+        """Останавливает фоновый сброс и записывает остаток буфера."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def write_batch(self, batch: Dict[int, datetime]) -> None:
+        """
+        Синхронно записывает пачку одним пакетным UPDATE.
+
+        last_activity только увеличивается, так что пачка, записанная позже
+        более новой, ничего не откатывает. Пользователей, которых нет в БД,
+        UPDATE пропускает: их создаёт ensure_user().
+
+        Args:
+            batch: telegram_id -> время активности
+        """
+        updates = [
+            {"b_telegram_id": telegram_id, "b_seen_at": seen_at}
+            for telegram_id, seen_at in batch.items()
+        ]
+        with self._write_lock:
+            db = self.session_factory()
+            try:
+                db.execute(
+                    update(users_table)
+                    .where(users_table.c.telegram_id == bindparam("b_telegram_id"))
+                    .where(
+                        or_(
+                            users_table.c.last_activity.is_(None),
+                            users_table.c.last_activity < bindparam("b_seen_at"),
+                        )
+                    )
+                    .values(last_activity=bindparam("b_seen_at")),
+                    updates,
+                )
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+
+
+activity_buffer = ActivityBuffer()
+
 
 async def track_user_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Middleware для отслеживания активности пользователей.
-    Обновляет поле last_activity при каждом взаимодействии с ботом.
+    Создаёт нового пользователя сразу, а время взаимодействия запоминает
+    в буфере; запись last_activity в БД выполняется пакетами.
     """
     if not update.effective_user:
         return
 
-    user_id = update.effective_user.id
-
+    user = update.effective_user
+    username = user.username or f"user_{user.id}"
     try:
-        db = next(get_db())
-        user = db.query(User).filter(User.telegram_id == user_id).first()
+        await activity_buffer.ensure_user(user.id, username)
+    except Exception as e:
+        logger.error(f"Error creating user {user.id}: {e}")
+    activity_buffer.start()
+    activity_buffer.record(user.id)
 
-        if user:
-            user.last_activity = datetime.utcnow()
-            db.commit()
-            logger.debug(f"Updated last_activity for user {user_id}")
-        else:
-            # Создаем нового пользователя, если его нет
-            new_user = User(
-                telegram_id=user_id,
-                username=update.effective_user.username or f"user_{user_id}",
-                balance=0,
-                last_activity=datetime.utcnow(),
-                created_at=datetime.utcnow()
-            )
-            db.add(new_user)
-            db.commit()
-            logger.info(f"Created new user {user_id} with initial last_activity")
 
-    except Exception as e:
-        logger.error(f"Error tracking user activity for {user_id}: {e}")
-    finally:
-        db.close()
+async def flush_user_activity():
+    """Сбрасывает буфер активности в БД; вызывается при остановке бота."""
+    await activity_buffer.close()
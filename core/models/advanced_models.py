@@ -100,6 +100,7 @@ class BroadcastResult:
     errors: List[str]
     completion_message: str
     execution_time: float = 0.0
+    messages_per_second: float = 0.0
 
 
 @dataclass
@@ -11,6 +11,8 @@ from .base import (
     ParserError,
 )
 
+from .markers import MarkerMatcher
+
 from .registry import (
     ParserRegistry,
     get_registry,
@@ -60,6 +62,7 @@ __all__ = [
     "AccrualResult",
     "GameEndResult",
     "ParserError",
+    "MarkerMatcher",
     "ParserRegistry",
     "get_registry",
     "parse_message",
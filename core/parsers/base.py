@@ -8,6 +8,8 @@ from typing import Optional, Dict, Any
 from decimal import Decimal
 import structlog
 
+from .markers import matches
+
 logger = structlog.get_logger()
 
 
@@ -73,22 +75,29 @@ class GameEndResult(ParseResult):
 class BaseParser(ABC):
     """Базовый класс для всех парсеров"""
 
+    # Маркеры сообщения в ДНФ (см. core.parsers.markers): по ним работает
+    # can_parse, а реестр отбирает парсеры-кандидаты за один проход;
+    # пустой кортеж — парсер пробуется для любого сообщения.
+    markers: tuple = ()
+
     def __init__(self, game_name: str):
         self.game_name = game_name
         self.logger = logger.bind(parser=self.__class__.__name__, game=game_name)
 
-    @abstractmethod
     def can_parse(self, text: str) -> bool:
         """
         Проверяет, может ли парсер обработать это сообщение
         
+        Условие задаётся только атрибутом ``markers``, чтобы проверка
+        парсера и отбор кандидатов в реестре не расходились.
+        
         Args:
             text: Текст сообщения
             
         Returns:
             True если парсер может обработать сообщение
         """
-        pass
+        return matches(self.markers, text)
 
     @abstractmethod
     def parse(self, text: str) -> Optional[ParseResult]:
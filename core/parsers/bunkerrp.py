@@ -12,8 +12,7 @@ class BunkerRPProfileParser(BaseParser):
     def __init__(self):
         super().__init__("Bunker RP")
 
-    def can_parse(self, text: str) -> bool:
-        return "👤" in text and "💵 Деньги:" in text and "Bunker" in text
+    markers = (("👤", "💵 Деньги:", "Bunker"),)
 
     def parse(self, text: str) -> Optional[ProfileResult]:
         lines = text.splitlines()
@@ -53,8 +52,7 @@ class BunkerRPGameEndParser(BaseParser):
     def __init__(self):
         super().__init__("Bunker RP")
 
-    def can_parse(self, text: str) -> bool:
-        return "Прошли в бункер:" in text
+    markers = (("Прошли в бункер:",),)
 
     def parse(self, text: str) -> Optional[GameEndResult]:
         lines = text.splitlines()
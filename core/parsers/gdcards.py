@@ -13,8 +13,7 @@ class GDCardsProfileParser(BaseParser):
     def __init__(self):
         super().__init__("GD Cards")
 
-    def can_parse(self, text: str) -> bool:
-        return "ПРОФИЛЬ" in text or "Профиль" in text
+    markers = (("ПРОФИЛЬ",), ("Профиль",))
 
     def parse(self, text: str) -> Optional[ProfileResult]:
         lines = text.splitlines()
@@ -62,8 +61,7 @@ class GDCardsCardParser(BaseParser):
     def __init__(self):
         super().__init__("GD Cards")
 
-    def can_parse(self, text: str) -> bool:
-        return "🃏 НОВАЯ КАРТА 🃏" in text
+    markers = (("🃏 НОВАЯ КАРТА 🃏",),)
 
     def parse(self, text: str) -> Optional[AccrualResult]:
         # Извлекаем имя игрока
@@ -101,8 +99,7 @@ class GDCardsOrbDropParser(BaseParser):
     def __init__(self):
         super().__init__("GD Cards")
 
-    def can_parse(self, text: str) -> bool:
-        return "орб" in text.lower() and ("открыл сундук" in text or "получил" in text)
+    markers = (("(?i)орб", "открыл сундук"), ("(?i)орб", "получил"))
 
     def parse(self, text: str) -> Optional[AccrualResult]:
         import re
@@ -0,0 +1,134 @@
+"""Общий сканер маркеров игровых сообщений.
+
+Классификатор (src/classifier.py), реестр парсеров и ``bank_bot``
+ParsingService определяют тип сообщения по набору подстрок-маркеров.
+:class:`MarkerMatcher` собирает маркеры всех правил в одну таблицу,
+проверяет каждый уникальный маркер ровно один раз на сообщение и по
+найденному набору вычисляет все сработавшие правила в порядке приоритета.
+
+Правило задаётся в ДНФ: список альтернатив, каждая альтернатива — набор
+маркеров, которые должны встретиться все. Маркер с префиксом ``(?i)``
+ищется без учёта регистра (в ``text.lower()``, который считается один раз).
+"""
+
+from __future__ import annotations
+
+from collections.abc import Hashable, Iterable, Sequence
+from typing import Any
+
+IGNORE_CASE = "(?i)"
+
+Alternatives = Sequence[Sequence[str]]
+
+
+class MarkerMatcher:
+    """Скомпилированная таблица маркеров для набора правил.
+
+    Правила передаются в порядке приоритета: :meth:`candidates` возвращает
+    метки сработавших правил в том же порядке. Правило без альтернатив
+    считается сработавшим всегда (например, парсер без объявленных маркеров).
+    """
+
+    def __init__(self, rules: Iterable[tuple[Hashable, Alternatives]]) -> None:
+        index: dict[tuple[str, bool], int] = {}
+        compiled: list[tuple[Hashable, list[set[int]]]] = []
+        for label, alternatives in rules:
+            alts = []
+            for alternative in alternatives:
+                ids = set()
+                for marker in alternative:
+                    key = _split_marker(marker)
+                    ids.add(index.setdefault(key, len(index)))
+                alts.append(ids)
+            compiled.append((label, alts))
+
+        # Маркер i соответствует биту 1 << i, альтернатива — маске своих
+        # битов; правило без альтернатив выполняется при любой маске.
+        self._rules = [
+            (label, tuple(sum(1 << i for i in alt) for alt in alts) or (0,))
+            for label, alts in compiled
+        ]
+        self._markers = [(needle, ignore_case) for needle, ignore_case in index]
+        # (маркер, без учёта регистра, бит) — порядок совпадает с номерами маркеров
+        self._scan_table = tuple((needle, ignore_case, 1 << i) for i, (needle, ignore_case) in enumerate(self._markers))
+        self._needs_lower = any(ignore_case for _, ignore_case in self._markers)
+        self._on_empty = [label for label, alts in self._rules if 0 in alts]
+
+    def scan(self, text: str) -> int:
+        """Возвращает битовую маску найденных маркеров.
+
+        Каждый маркер проверяется одним ``in``; регистр понижается не более
+        одного раза — только если есть маркеры ``(?i)``.
+        """
+        lowered = text.lower() if self._needs_lower else text
+        mask = 0
+        for needle, ignore_case, bit in self._scan_table:
+            if needle in (lowered if ignore_case else text):
+                mask |= bit
+        return mask
+
+    @property
+    def marker_count(self) -> int:
+        """Количество уникальных маркеров в таблице."""
+        return len(self._markers)
+
+    def candidates(self, text: str) -> list[Any]:
+        """
+        Возвращает метки сработавших правил в порядке приоритета
+
+        Args:
+            text: Текст сообщения
+
+        Returns:
+            Список меток (пустой, если ни одно правило не сработало)
+        """
+        mask = self.scan(text)
+        if not mask:
+            return list(self._on_empty)
+        found = []
+        for label, alternatives in self._rules:
+            for alt in alternatives:
+                if alt & mask == alt:
+                    found.append(label)
+                    break
+        return found
+
+    def first(self, text: str, default: Any = None) -> Any:
+        """Возвращает метку правила с наивысшим приоритетом или ``default``."""
+        mask = self.scan(text)
+        if not mask:
+            return self._on_empty[0] if self._on_empty else default
+        for label, alternatives in self._rules:
+            for alt in alternatives:
+                if alt & mask == alt:
+                    return label
+        return default
+
+
+def matches(alternatives: Alternatives, text: str) -> bool:
+    """Проверяет одно правило без таблицы: сработала ли хоть одна альтернатива.
+
+    Правило без альтернатив выполняется всегда, как в :class:`MarkerMatcher`.
+    """
+    if not alternatives:
+        return True
+    lowered = None
+    for alternative in alternatives:
+        for marker in alternative:
+            needle, ignore_case = _split_marker(marker)
+            if ignore_case:
+                if lowered is None:
+                    lowered = text.lower()
+                if needle not in lowered:
+                    break
+            elif needle not in text:
+                break
+        else:
+            return True
+    return False
+
+
+def _split_marker(marker: str) -> tuple[str, bool]:
+    if marker.startswith(IGNORE_CASE):
+        return marker[len(IGNORE_CASE):].lower(), True
+    return marker, False
@@ -6,6 +6,7 @@
 
 from typing import List, Optional
 from .base import BaseParser, ParseResult
+from .markers import MarkerMatcher
 from .gdcards import GDCardsProfileParser, GDCardsCardParser, GDCardsOrbDropParser
 from .shmalala import ShmalalaFishingParser, ShmalalaKarmaParser
 from .truemafia import TrueMafiaProfileParser, TrueMafiaGameEndParser
@@ -24,6 +25,8 @@ class ParserRegistry:
 
     def __init__(self):
         self.parsers: List[BaseParser] = []
+        self._matcher: Optional[MarkerMatcher] = None
+        self._matcher_parsers: tuple = ()
         self._register_default_parsers()
 
     def _register_default_parsers(self):
@@ -58,23 +61,47 @@ class ParserRegistry:
             parser: Экземпляр парсера
         """
         self.parsers.append(parser)
+        self._matcher = None
         logger.debug(
             "Parser registered",
             parser=parser.__class__.__name__,
             game=parser.game_name
         )
 
+    def candidates(self, text: str) -> List[BaseParser]:
+        """
+        Возвращает парсеры, чьи маркеры найдены в сообщении
+
+        Маркеры всех парсеров проверяются за один проход сканера; порядок
+        регистрации сохраняется.
+
+        Args:
+            text: Текст сообщения
+
+        Returns:
+            Список парсеров-кандидатов
+        """
+        parsers = tuple(self.parsers)
+        if self._matcher is None or self._matcher_parsers != parsers:
+            self._matcher = MarkerMatcher(
+                (parser, parser.markers) for parser in parsers
+            )
+            self._matcher_parsers = parsers
+        return self._matcher.candidates(text)
+
     def parse(self, text: str) -> Optional[ParseResult]:
         """
-        Пытается распарсить сообщение всеми зарегистрированными парсерами
-        
+        Пытается распарсить сообщение зарегистрированными парсерами
+
+        Пробуются только парсеры, чьи маркеры найдены в тексте.
+
         Args:
             text: Текст сообщения
             
         Returns:
             ParseResult или None если ни один парсер не смог обработать
         """
-        for parser in self.parsers:
+        for parser in self.candidates(text):
             try:
                 result = parser.safe_parse(text)
                 if result:
@@ -13,8 +13,7 @@ class ShmalalaFishingParser(BaseParser):
     def __init__(self):
         super().__init__("Shmalala")
 
-    def can_parse(self, text: str) -> bool:
-        return "🎣 [Рыбалка] 🎣" in text
+    markers = (("🎣 [Рыбалка] 🎣",),)
 
     def parse(self, text: str) -> Optional[AccrualResult]:
         # Извлекаем имя рыбака
@@ -46,8 +45,7 @@ class ShmalalaKarmaParser(BaseParser):
     def __init__(self):
         super().__init__("Shmalala Karma")
 
-    def can_parse(self, text: str) -> bool:
-        return "Лайк! Вы повысили рейтинг пользователя" in text
+    markers = (("Лайк! Вы повысили рейтинг пользователя",),)
 
     def parse(self, text: str) -> Optional[AccrualResult]:
         lines = text.splitlines()
@@ -12,8 +12,7 @@ class TrueMafiaProfileParser(BaseParser):
     def __init__(self):
         super().__init__("True Mafia")
 
-    def can_parse(self, text: str) -> bool:
-        return "👤" in text and "💵 Деньги:" in text
+    markers = (("👤", "💵 Деньги:"),)
 
     def parse(self, text: str) -> Optional[ProfileResult]:
         lines = text.splitlines()
@@ -53,8 +52,7 @@ class TrueMafiaGameEndParser(BaseParser):
     def __init__(self):
         super().__init__("True Mafia")
 
-    def can_parse(self, text: str) -> bool:
-        return "Победители:" in text
+    markers = (("Победители:",),)
 
     def parse(self, text: str) -> Optional[GameEndResult]:
         lines = text.splitlines()
@@ -0,0 +1,35 @@
+"""Shim: re-export из bank_bot/services/broadcast_engine.py."""
+
+from bank_bot.services.broadcast_engine import (
+    GLOBAL_MESSAGES_PER_SECOND,
+    JOB_ABANDONED,
+    JOB_COMPLETED,
+    JOB_RUNNING,
+    MAX_FLOOD_WAITS,
+    MAX_REPORTED_ERRORS,
+    PER_CHAT_INTERVAL_SECONDS,
+    RECIPIENT_PAGE_SIZE,
+    RESUME_WINDOW,
+    SEND_CONCURRENCY,
+    BroadcastEngine,
+    TokenBucket,
+    message_fingerprint,
+    retry_after_seconds,
+)
+
+__all__ = [
+    "GLOBAL_MESSAGES_PER_SECOND",
+    "JOB_ABANDONED",
+    "JOB_COMPLETED",
+    "JOB_RUNNING",
+    "MAX_FLOOD_WAITS",
+    "MAX_REPORTED_ERRORS",
+    "PER_CHAT_INTERVAL_SECONDS",
+    "RECIPIENT_PAGE_SIZE",
+    "RESUME_WINDOW",
+    "SEND_CONCURRENCY",
+    "BroadcastEngine",
+    "TokenBucket",
+    "message_fingerprint",
+    "retry_after_seconds",
+]
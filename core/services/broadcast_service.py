@@ -3,13 +3,12 @@
 import asyncio
 import html
 import logging
-from typing import List
 from sqlalchemy.orm import Session
 from telegram import Bot
-from telegram.error import TelegramError, BadRequest, Forbidden
 
 from database.database import User
 from core.models.advanced_models import BroadcastResult, NotificationResult
+from core.services.broadcast_engine import BroadcastEngine, RECIPIENT_PAGE_SIZE
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +18,9 @@ class BroadcastService:
     Сервис для рассылки сообщений пользователям.
     
     Содержит бизнес-логику связанную с массовой рассылкой сообщений.
+    Отправка выполняется через BroadcastEngine: получатели читаются из БД
+    страницами, темп подстраивается под лимиты Telegram, а прогресс
+    сохраняется, чтобы прерванная рассылка продолжилась с места остановки.
     """
 
     def __init__(self, db: Session, bot: Bot):
@@ -31,7 +33,7 @@ class BroadcastService:
         """
         self.db = db
         self.bot = bot
-        self.batch_size = 50
+        self.batch_size = RECIPIENT_PAGE_SIZE
         self.rate_limit_delay = 0.15
         self.max_retries = 3
 
@@ -52,9 +54,20 @@ class BroadcastService:
         try:
             logger.info(f"Starting broadcast to all users from sender {sender_id}")
 
-            all_users = self.db.query(User).filter(User.telegram_id.isnot(None)).all()
+            sender_user = self.db.query(User).filter(User.telegram_id == sender_id).first()
+            sender_name = sender_user.first_name if sender_user and sender_user.first_name else f"User #{sender_id}"
 
-            if not all_users:
+            formatted_message = f"📢 <b>Объявление от {html.escape(sender_name)}:</b>\n\n{html.escape(message)}"
+
+            engine = BroadcastEngine(
+                self.db,
+                self.bot,
+                page_size=self.batch_size,
+                max_retries=self.max_retries,
+            )
+            result = await engine.run(formatted_message, sender_id, parse_mode='HTML')
+
+            if result.total_users == 0:
                 return BroadcastResult(
                     total_users=0,
                     successful_sends=0,
@@ -64,20 +77,10 @@ class BroadcastService:
                     execution_time=time.time() - start_time
                 )
 
-            sender_user = self.db.query(User).filter(User.telegram_id == sender_id).first()
-            sender_name = sender_user.first_name if sender_user and sender_user.first_name else f"User #{sender_id}"
-
-            formatted_message = f"📢 <b>Объявление от {html.escape(sender_name)}:</b>\n\n{html.escape(message)}"
-
-            result = await self._process_broadcast_batches(
-                users=all_users,
-                message=formatted_message,
-                sender_id=sender_id
+            logger.info(
+                f"Broadcast completed: {result.successful_sends}/{result.total_users} successful, "
+                f"{result.messages_per_second:.1f} msg/s"
             )
-
-            result.execution_time = time.time() - start_time
-
-            logger.info(f"Broadcast completed: {result.successful_sends}/{result.total_users} successful")
             return result
 
         except Exception as e:
@@ -230,118 +233,3 @@ class BroadcastService:
         except Exception as e:
             logger.error(f"Error formatting admin notification: {e}")
             return f"🔔 <b>Уведомление для администраторов</b>\n\n{notification}"
-
-    async def _process_broadcast_batches(
-        self, 
-        users: List[User], 
-        message: str, 
-        sender_id: int
-    ) -> BroadcastResult:
-        """
-        Обработка рассылки пакетами с асинхронной доставкой.
-
-        Args:
-            users: List of users to send message to
-            message: Message to send
-            sender_id: ID of sender
-
-        Returns:
-            BroadcastResult: Results of the broadcast operation
-        """
-        total_users = len(users)
-        successful_sends = 0
-        failed_sends = 0
-        errors = []
-
-        for i in range(0, total_users, self.batch_size):
-            batch = users[i:i + self.batch_size]
-            logger.debug(f"Processing batch {i//self.batch_size + 1}: {len(batch)} users")
-
-            tasks = []
-            for user in batch:
-                if user.telegram_id:
-                    task = self._send_message_with_retry(
-                        user.telegram_id, 
-                        message
-                    )
-                    tasks.append(task)
-
-            if tasks:
-                batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-
-                for result in batch_results:
-                    if isinstance(result, Exception):
-                        failed_sends += 1
-                        errors.append(str(result))
-                    elif result:
-                        successful_sends += 1
-                    else:
-                        failed_sends += 1
-                        errors.append("Unknown error in message sending")
-
-            if i + self.batch_size < total_users:
-                await asyncio.sleep(1.0)
-
-        completion_message = f"Broadcast completed: {successful_sends} successful, {failed_sends} failed"
-
-        return BroadcastResult(
-            total_users=total_users,
-            successful_sends=successful_sends,
-            failed_sends=failed_sends,
-            errors=errors[:10],
-            completion_message=completion_message
-        )
-
-    async def _send_message_with_retry(
-        self, 
-        chat_id: int, 
-        message: str
-    ) -> bool:
-        """
-        Отправка сообщения с логикой повторных попыток.
-
-        Args:
-            chat_id: Telegram chat ID
-            message: Message to send
-
-        Returns:
-            bool: True if message sent successfully, False otherwise
-        """
-        for attempt in range(self.max_retries):
-            try:
-                await self.bot.send_message(
-                    chat_id=chat_id,
-                    text=message,
-                    parse_mode='HTML'
-                )
-
-                await asyncio.sleep(self.rate_limit_delay)
-                return True
-
-            except Forbidden:
-                logger.debug(f"User {chat_id} has blocked the bot")
-                return False
-
-            except BadRequest as e:
-                logger.warning(f"Bad request for user {chat_id}: {e}")
-                return False
-
-            except TelegramError as e:
-                if attempt < self.max_retries - 1:
-                    wait_time = (attempt + 1) * 2
-                    logger.warning(f"Telegram error for user {chat_id}, retrying in {wait_time}s: {e}")
-                    await asyncio.sleep(wait_time)
-                else:
-                    logger.error(f"Failed to send message to user {chat_id} after {self.max_retries} attempts: {e}")
-                    return False
-
-            except Exception as e:
-                if attempt < self.max_retries - 1:
-                    wait_time = (attempt + 1) * 2
-                    logger.warning(f"Unexpected error for user {chat_id}, retrying in {wait_time}s: {e}")
-                    await asyncio.sleep(wait_time)
-                else:
-                    logger.error(f"Unexpected error sending to user {chat_id} after {self.max_retries} attempts: {e}")
-                    return False
-
-        return False
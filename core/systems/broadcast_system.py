@@ -1,6 +1,10 @@
 """
 BroadcastSystem - Advanced message broadcasting for Telegram bot
 Implements async message delivery with batch processing and error handling
+
+Broadcasts run through core.services.broadcast_engine: recipients are
+streamed page by page, sends are paced to Telegram's limits and progress
+is saved so an interrupted broadcast resumes.
 """
 
 import asyncio
@@ -8,14 +12,17 @@ import logging
 from typing import List
 from sqlalchemy.orm import Session
 from telegram import Bot
-from telegram.error import TelegramError, BadRequest, Forbidden
 
 from database.database import User
 from core.models.advanced_models import BroadcastResult, NotificationResult, BroadcastError
+from core.services.broadcast_engine import BroadcastEngine, RECIPIENT_PAGE_SIZE
 from utils.admin.admin_system import AdminSystem
 
 logger = logging.getLogger(__name__)
 
+# Users mentioned by name in a mention-all message
+MENTION_LIMIT = 50
+
 
 class BroadcastSystem:
     """
@@ -35,8 +42,8 @@ class BroadcastSystem:
         self.db = db
         self.bot = bot
         self.admin_system = admin_system
-        self.batch_size = 50  # Default batch size for processing
-        self.rate_limit_delay = 0.15  # Delay between messages to respect rate limits
+        self.batch_size = RECIPIENT_PAGE_SIZE  # Recipients loaded and checkpointed per page
+        self.rate_limit_delay = 0.15  # Delay between admin notifications
         self.max_retries = 3  # Maximum retry attempts for failed sends
 
     async def broadcast_to_all(self, message: str, sender_id: int) -> BroadcastResult:
@@ -56,10 +63,16 @@ class BroadcastSystem:
         try:
             logger.info(f"Starting broadcast to all users from sender {sender_id}")
 
-            # Get all registered users
-            all_users = self.db.query(User).filter(User.telegram_id.isnot(None)).all()
+            # Prepare message with sender info
+            sender_user = self.db.query(User).filter(User.telegram_id == sender_id).first()
+            sender_name = sender_user.first_name if sender_user and sender_user.first_name else f"User #{sender_id}"
 
-            if not all_users:
+            formatted_message = f"📢 <b>Объявление от {sender_name}:</b>\n\n{message}"
+
+            # Stream recipients from the DB and send at Telegram's rate limits
+            result = await self._make_engine().run(formatted_message, sender_id, parse_mode='HTML')
+
+            if result.total_users == 0:
                 return BroadcastResult(
                     total_users=0,
                     successful_sends=0,
@@ -69,23 +82,10 @@ class BroadcastSystem:
                     execution_time=time.time() - start_time
                 )
 
-            # Prepare message with sender info
-            sender_user = self.db.query(User).filter(User.telegram_id == sender_id).first()
-            sender_name = sender_user.first_name if sender_user and sender_user.first_name else f"User #{sender_id}"
-
-            formatted_message = f"📢 <b>Объявление от {sender_name}:</b>\n\n{message}"
-
-            # Process broadcast in batches
-            result = await self._process_broadcast_batches(
-                users=all_users,
-                message=formatted_message,
-                sender_id=sender_id
+            logger.info(
+                f"Broadcast completed: {result.successful_sends}/{result.total_users} successful, "
+                f"{result.messages_per_second:.1f} msg/s"
             )
-
-            # Add execution time
-            result.execution_time = time.time() - start_time
-
-            logger.info(f"Broadcast completed: {result.successful_sends}/{result.total_users} successful")
             return result
 
         except Exception as e:
@@ -109,10 +109,16 @@ class BroadcastSystem:
         try:
             logger.info(f"Starting mention-all broadcast from sender {sender_id}")
 
-            # Get all registered users
-            all_users = self.db.query(User).filter(User.telegram_id.isnot(None)).all()
+            # Only the mentioned users are loaded; recipients are streamed by the engine
+            mentioned_users = (
+                self.db.query(User)
+                .filter(User.telegram_id.isnot(None))
+                .order_by(User.telegram_id)
+                .limit(MENTION_LIMIT)
+                .all()
+            )
 
-            if not all_users:
+            if not mentioned_users:
                 return BroadcastResult(
                     total_users=0,
                     successful_sends=0,
@@ -128,7 +134,7 @@ class BroadcastSystem:
 
             # Create mention list (limit to avoid message length issues)
             mentions = []
-            for user in all_users[:50]:  # Limit mentions to avoid telegram limits
+            for user in mentioned_users:  # Limit mentions to avoid telegram limits
                 if user.username:
                     mentions.append(f"@{user.username}")
                 elif user.first_name:
@@ -140,18 +146,12 @@ class BroadcastSystem:
             mention_text = " ".join(mentions)
             formatted_message = f"📢 <b>Сообщение от {sender_name} для всех:</b>\n\n{message}\n\n{mention_text}"
 
-            # Process broadcast in batches
-            result = await self._process_broadcast_batches(
-                users=all_users,
-                message=formatted_message,
-                sender_id=sender_id,
-                use_markdown=True
-            )
-
-            # Add execution time
-            result.execution_time = time.time() - start_time
+            result = await self._make_engine().run(formatted_message, sender_id, parse_mode='Markdown')
 
-            logger.info(f"Mention-all broadcast completed: {result.successful_sends}/{result.total_users} successful")
+            logger.info(
+                f"Mention-all broadcast completed: {result.successful_sends}/{result.total_users} successful, "
+                f"{result.messages_per_second:.1f} msg/s"
+            )
             return result
 
         except Exception as e:
@@ -318,73 +318,13 @@ class BroadcastSystem:
             # Fallback to simple format
             return f"🔔 <b>Уведомление для администраторов</b>\n\n{notification}"
 
-    async def _process_broadcast_batches(
-        self, 
-        users: List[User], 
-        message: str, 
-        sender_id: int,
-        use_markdown: bool = False
-    ) -> BroadcastResult:
-        """
-        Process broadcast in batches with async delivery (Requirement 4.4)
-        
-        Args:
-            users: List of users to send message to
-            message: Message to send
-            sender_id: ID of sender
-            use_markdown: Whether to use markdown parsing
-            
-        Returns:
-            BroadcastResult: Results of the broadcast operation
-        """
-        total_users = len(users)
-        successful_sends = 0
-        failed_sends = 0
-        errors = []
-
-        # Process users in batches
-        for i in range(0, total_users, self.batch_size):
-            batch = users[i:i + self.batch_size]
-            logger.debug(f"Processing batch {i//self.batch_size + 1}: {len(batch)} users")
-
-            # Create tasks for concurrent sending within batch
-            tasks = []
-            for user in batch:
-                if user.telegram_id:
-                    task = self._send_message_with_retry(
-                        user.telegram_id, 
-                        message, 
-                        use_markdown
-                    )
-                    tasks.append(task)
-
-            # Execute batch concurrently
-            if tasks:
-                batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-
-                # Process batch results
-                for result in batch_results:
-                    if isinstance(result, Exception):
-                        failed_sends += 1
-                        errors.append(str(result))
-                    elif result:
-                        successful_sends += 1
-                    else:
-                        failed_sends += 1
-                        errors.append("Unknown error in message sending")
-
-            # Rate limiting between batches
-            if i + self.batch_size < total_users:
-                await asyncio.sleep(1.0)  # Longer delay between batches
-
-        completion_message = f"Broadcast completed: {successful_sends} successful, {failed_sends} failed"
-
-        return BroadcastResult(
-            total_users=total_users,
-            successful_sends=successful_sends,
-            failed_sends=failed_sends,
-            errors=errors[:10],  # Limit error list to avoid memory issues
-            completion_message=completion_message
+    def _make_engine(self) -> BroadcastEngine:
+        """Create a broadcast engine with the current batch size and retry settings"""
+        return BroadcastEngine(
+            self.db,
+            self.bot,
+            page_size=self.batch_size,
+            max_retries=self.max_retries,
         )
 
     async def _send_message_with_retry(
@@ -404,60 +344,17 @@ class BroadcastSystem:
         Returns:
             bool: True if message sent successfully, False otherwise
         """
-        for attempt in range(self.max_retries):
-            try:
-                parse_mode = 'Markdown' if use_markdown else 'HTML'
-
-                await self.bot.send_message(
-                    chat_id=chat_id,
-                    text=message,
-                    parse_mode=parse_mode
-                )
-
-                # Rate limiting
-                await asyncio.sleep(self.rate_limit_delay)
-                return True
-
-            except Forbidden:
-                # User blocked the bot - don't retry
-                logger.debug(f"User {chat_id} has blocked the bot")
-                return False
-
-            except BadRequest as e:
-                # Bad request - don't retry
-                logger.warning(f"Bad request for user {chat_id}: {e}")
-                return False
-
-            except TelegramError as e:
-                # Other telegram errors - retry
-                if attempt < self.max_retries - 1:
-                    wait_time = (attempt + 1) * 2  # Exponential backoff
-                    logger.warning(f"Telegram error for user {chat_id}, retrying in {wait_time}s: {e}")
-                    await asyncio.sleep(wait_time)
-                else:
-                    logger.error(f"Failed to send message to user {chat_id} after {self.max_retries} attempts: {e}")
-                    return False
-
-            except Exception as e:
-                # Unexpected errors - retry
-                if attempt < self.max_retries - 1:
-                    wait_time = (attempt + 1) * 2
-                    logger.warning(f"Unexpected error for user {chat_id}, retrying in {wait_time}s: {e}")
-                    await asyncio.sleep(wait_time)
-                else:
-                    logger.error(f"Unexpected error sending to user {chat_id} after {self.max_retries} attempts: {e}")
-                    return False
-
-        return False
+        parse_mode = 'Markdown' if use_markdown else 'HTML'
+        return await self._make_engine().send(chat_id, message, parse_mode)
 
     def set_batch_size(self, batch_size: int):
-        """Set the batch size for processing broadcasts"""
+        """Set how many recipients are loaded and checkpointed per page"""
         if batch_size > 0:
             self.batch_size = batch_size
             logger.info(f"Broadcast batch size set to {batch_size}")
 
     def set_rate_limit_delay(self, delay: float):
-        """Set the rate limit delay between messages"""
+        """Set the rate limit delay between admin notifications"""
         if delay >= 0:
             self.rate_limit_delay = delay
             logger.info(f"Rate limit delay set to {delay}s")
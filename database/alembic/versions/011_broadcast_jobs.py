@@ -0,0 +1,39 @@
+"""Add broadcast_jobs table for resumable broadcasts.
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-16
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "011"
+down_revision: Union[str, None] = "010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "broadcast_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("sender_id", sa.BigInteger(), nullable=False),
+        sa.Column("message_hash", sa.String(length=64), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False, server_default="running"),
+        sa.Column("last_telegram_id", sa.BigInteger(), nullable=True),
+        sa.Column("total_users", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("successful_sends", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("failed_sends", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index("ix_broadcast_jobs_message_hash", "broadcast_jobs", ["message_hash"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_broadcast_jobs_message_hash", table_name="broadcast_jobs")
+    op.drop_table("broadcast_jobs")
@@ -58,6 +58,28 @@ class ResponseModeSetting(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
 
+class BroadcastJob(Base):
+    """
+    Прогресс массовой рассылки.
+
+    Получатели обходятся по возрастанию telegram_id; last_telegram_id —
+    последний получатель обработанной страницы, с него продолжается
+    прерванная рассылка того же сообщения. Текст не хранится, только хеш.
+    """
+    __tablename__ = "broadcast_jobs"
+
+    id = Column(Integer, primary_key=True)
+    sender_id = Column(BigInteger, nullable=False)
+    message_hash = Column(String(64), nullable=False, index=True)
+    status = Column(String(16), nullable=False, default="running")  # running, completed, abandoned
+    last_telegram_id = Column(BigInteger, nullable=True)
+    total_users = Column(Integer, nullable=False, default=0)
+    successful_sends = Column(Integer, nullable=False, default=0)
+    failed_sends = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class UserAlias(Base):
     __tablename__ = "user_aliases"
 
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Backfill balances from a Telegram HTML chat export (data/chat_export).
+
+Streams messages*.html files, replays game-bot messages through
+MessageProcessor in batches (one transaction per batch) and keeps a
+checkpoint so an interrupted run resumes where it stopped. Export message
+IDs are used as idempotency keys, so re-running never double-counts.
+
+Usage:
+    python scripts/backfill_chat_export.py [--export-dir DIR] [--db PATH]
+        [--checkpoint PATH] [--batch-size N] [--dry-run] [--reset]
+
+Options:
+    --dry-run    Only parse game messages with the parser registry (no DB writes)
+    --reset      Ignore and overwrite an existing checkpoint
+"""
+
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.audit_logger import AuditLogger
+from src.balance_manager import BalanceManager
+from src.chat_export import BackfillStats, ChatExportBackfill, find_export_files
+from src.classifier import MessageClassifier
+from src.coefficient_provider import CoefficientProvider
+from src.idempotency import IdempotencyChecker
+from src.message_processor import MessageProcessor
+from src.parsers import (
+    ProfileParser, AccrualParser, FishingParser, KarmaParser,
+    MafiaGameEndParser, MafiaProfileParser, BunkerGameEndParser, BunkerProfileParser,
+)
+from src.repository import SQLiteRepository
+
+
+def build_processor(db_path: str, coefficients_path: str) -> MessageProcessor:
+    """
+    Wire a MessageProcessor against a SQLite balance database.
+
+    Args:
+        db_path: Path to SQLite database
+        coefficients_path: Path to coefficients JSON file
+
+    Returns:
+        Ready MessageProcessor
+    """
+    repository = SQLiteRepository(db_path)
+    audit_logger = AuditLogger(logging.getLogger("audit"))
+    balance_manager = BalanceManager(
+        repository=repository,
+        coefficient_provider=CoefficientProvider.from_config(coefficients_path),
+        logger=audit_logger
+    )
+    return MessageProcessor(
+        classifier=MessageClassifier(),
+        profile_parser=ProfileParser(),
+        accrual_parser=AccrualParser(),
+        fishing_parser=FishingParser(),
+        karma_parser=KarmaParser(),
+        mafia_game_end_parser=MafiaGameEndParser(),
+        mafia_profile_parser=MafiaProfileParser(),
+        bunker_game_end_parser=BunkerGameEndParser(),
+        bunker_profile_parser=BunkerProfileParser(),
+        balance_manager=balance_manager,
+        # Only the backfill stores tg-export keys (the bot may share the table,
+        # but never writes them), so a Bloom filter miss proves a key is new
+        idempotency_checker=IdempotencyChecker(repository, exclusive_writer=True),
+        logger=audit_logger
+    )
+
+
+def print_progress(stats: BackfillStats) -> None:
+    """Print running throughput after each batch."""
+    print(f"  … {stats.report()}", flush=True)
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(
+        description='Backfill balances from a Telegram HTML chat export',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Measure parser throughput on the export without touching the DB
+  python scripts/backfill_chat_export.py --dry-run
+
+  # Rebuild balances, resuming from data/chat_export.checkpoint.json
+  python scripts/backfill_chat_export.py --db data/bot.db
+        """
+    )
+    parser.add_argument('--export-dir', default='data/chat_export', help='Directory with messages*.html')
+    parser.add_argument('--db', default='data/bot.db', help='SQLite balance database')
+    parser.add_argument('--coefficients', default='config/coefficients.json', help='Coefficients JSON file')
+    parser.add_argument('--checkpoint', default='data/chat_export.checkpoint.json', help='Checkpoint file')
+    parser.add_argument('--batch-size', type=int, default=500, help='Game messages per transaction')
+    parser.add_argument('--dry-run', action='store_true', help='Parse only, no DB writes or checkpoint')
+    parser.add_argument('--reset', action='store_true', help='Start over, ignoring the checkpoint')
+    args = parser.parse_args()
+
+    files = find_export_files(Path(args.export_dir))
+    if not files:
+        print(f"❌ No messages*.html files in {args.export_dir}")
+        sys.exit(1)
+
+    checkpoint_path = None if args.dry_run else Path(args.checkpoint)
+    if args.reset and checkpoint_path is not None and checkpoint_path.exists():
+        checkpoint_path.unlink()
+
+    print("📥 Chat export backfill")
+    print('=' * 60)
+    print(f"Mode: {'DRY RUN' if args.dry_run else 'APPLY CHANGES'}")
+    print(f"Files: {len(files)} in {args.export_dir}")
+    print('=' * 60)
+
+    processor = None if args.dry_run else build_processor(args.db, args.coefficients)
+    backfill = ChatExportBackfill(
+        processor,
+        checkpoint_path=checkpoint_path,
+        batch_size=args.batch_size,
+        on_batch=print_progress
+    )
+    stats = backfill.run(files)
+
+    print('=' * 60)
+    print(f"✅ {stats.report()}")
+    sys.exit(1 if stats.errors and not args.dry_run else 0)
+
+
+if __name__ == '__main__':
+    main()
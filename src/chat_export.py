@@ -0,0 +1,335 @@
+"""Streaming backfill of game messages from Telegram HTML chat exports.
+
+Telegram Desktop exports a chat as ``messages.html``, ``messages2.html``, ...
+Each file is read in chunks through ``html.parser`` so only the message being
+assembled is kept in memory. Game messages are replayed through
+MessageProcessor.process_batch with idempotency keys derived from the export
+message IDs, and progress is checkpointed after every committed batch.
+Without a processor (dry run) game messages are only parsed by the core
+ParserRegistry, which makes the importer a realistic parser load generator.
+"""
+
+import json
+import os
+import re
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Callable, Deque, Iterable, Iterator, List, Optional
+
+from core.parsers.registry import ParserRegistry, get_registry
+from src.classifier import MessageClassifier, MessageType
+from src.idempotency import EXPORT_KEY_PREFIX
+from src.message_processor import MessageProcessor
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class ExportMessage:
+    """A single message extracted from an HTML export file."""
+    file: str
+    offset: int
+    export_id: str
+    sender: Optional[str]
+    timestamp: Optional[datetime]
+    text: str
+
+    @property
+    def idempotency_key(self) -> str:
+        """Stable processed_messages key for this export message."""
+        return f"{EXPORT_KEY_PREFIX}:{self.export_id}"
+
+
+class _ExportHTMLParser(HTMLParser):
+    """Incremental parser that turns export markup into ExportMessage records."""
+
+    def __init__(self, file_name: str):
+        super().__init__(convert_charrefs=True)
+        self.file_name = file_name
+        self.ready: Deque[ExportMessage] = deque()
+        self._offset = 0
+        self._depth = 0
+        self._last_sender: Optional[str] = None
+        self._message: Optional[dict] = None
+        self._message_depth = 0
+        # Field currently being captured ("sender" or "text") and its div depth
+        self._capture: Optional[str] = None
+        self._capture_depth = 0
+        self._buffer: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "br":
+            if self._capture == "text":
+                self._buffer.append("\n")
+            return
+        if tag != "div":
+            return
+        self._depth += 1
+        attributes = dict(attrs)
+        classes = (attributes.get("class") or "").split()
+
+        if self._message is None:
+            element_id = attributes.get("id") or ""
+            if classes[:1] == ["message"] and element_id.startswith("message"):
+                self._message = {
+                    "export_id": element_id[len("message"):],
+                    "service": "service" in classes,
+                    "joined": "joined" in classes,
+                    "sender": None,
+                    "timestamp": None,
+                    "text": None,
+                }
+                self._message_depth = self._depth
+            return
+
+        if self._capture is not None:
+            return
+        if "date" in classes and "title" in attributes and self._message["timestamp"] is None:
+            self._message["timestamp"] = _parse_export_timestamp(attributes["title"])
+        elif "from_name" in classes and self._message["sender"] is None:
+            self._start_capture("sender")
+        elif "text" in classes and self._message["text"] is None:
+            self._start_capture("text")
+
+    def handle_endtag(self, tag):
+        if tag != "div":
+            return
+        if self._capture is not None and self._depth == self._capture_depth:
+            self._message[self._capture] = "".join(self._buffer).strip()
+            self._capture = None
+        if self._message is not None and self._depth == self._message_depth:
+            self._finish_message()
+        self._depth -= 1
+
+    def handle_data(self, data):
+        if self._capture is not None:
+            self._buffer.append(data)
+
+    def _start_capture(self, name: str) -> None:
+        self._capture = name
+        self._capture_depth = self._depth
+        self._buffer = []
+
+    def _finish_message(self) -> None:
+        message, self._message = self._message, None
+        if message["service"]:
+            return
+        sender = message["sender"] or (self._last_sender if message["joined"] else None)
+        self._last_sender = sender
+        self.ready.append(ExportMessage(
+            file=self.file_name,
+            offset=self._offset,
+            export_id=message["export_id"],
+            sender=sender,
+            timestamp=message["timestamp"],
+            text=message["text"] or "",
+        ))
+        self._offset += 1
+
+
+def _parse_export_timestamp(title: str) -> Optional[datetime]:
+    """Parse a date tooltip such as ``27.05.2025 10:47:39 UTC+03:00``."""
+    try:
+        return datetime.strptime(title.replace(" UTC", ""), "%d.%m.%Y %H:%M:%S%z")
+    except ValueError:
+        return None
+
+
+def iter_export_messages(
+    path: Path, chunk_size: int = READ_CHUNK_SIZE
+) -> Iterator[ExportMessage]:
+    """
+    Stream messages from one export file without building a DOM.
+
+    Args:
+        path: Path to a ``messages*.html`` file
+        chunk_size: Number of characters fed to the parser per read
+
+    Yields:
+        ExportMessage for every non-service message, in file order
+    """
+    parser = _ExportHTMLParser(path.name)
+    with open(path, encoding="utf-8") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            parser.feed(chunk)
+            while parser.ready:
+                yield parser.ready.popleft()
+    parser.close()
+    while parser.ready:
+        yield parser.ready.popleft()
+
+
+def find_export_files(export_dir: Path) -> List[Path]:
+    """Return ``messages*.html`` files in export order (messages, messages2, ...)."""
+    def page_number(path: Path) -> int:
+        match = re.fullmatch(r"messages(\d*)\.html", path.name)
+        return int(match.group(1) or 1) if match else 0
+
+    files = [p for p in Path(export_dir).glob("messages*.html") if page_number(p)]
+    return sorted(files, key=page_number)
+
+
+@dataclass
+class BackfillCheckpoint:
+    """Resume position: completed files plus messages consumed in the current one."""
+    completed_files: List[str] = field(default_factory=list)
+    current_file: Optional[str] = None
+    offset: int = 0
+
+    @classmethod
+    def load(cls, path: Optional[Path]) -> "BackfillCheckpoint":
+        """Load a checkpoint, or return an empty one if the file does not exist."""
+        if path is None or not Path(path).exists():
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+    def save(self, path: Optional[Path]) -> None:
+        """Write the checkpoint atomically (temp file + rename)."""
+        if path is None:
+            return
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+@dataclass
+class BackfillStats:
+    """Counters and throughput of a backfill run."""
+    messages: int = 0
+    game_messages: int = 0
+    processed: int = 0
+    duplicates: int = 0
+    errors: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def messages_per_sec(self) -> float:
+        """Export messages read per second."""
+        return self.messages / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def game_messages_per_sec(self) -> float:
+        """Game messages replayed per second."""
+        return self.game_messages / self.elapsed if self.elapsed else 0.0
+
+    def report(self) -> str:
+        """Human-readable one-line summary."""
+        return (
+            f"{self.messages} messages ({self.messages_per_sec:.0f} msg/s), "
+            f"{self.game_messages} game messages ({self.game_messages_per_sec:.0f} msg/s): "
+            f"{self.processed} applied, {self.duplicates} duplicates, "
+            f"{self.errors} failed in {self.elapsed:.2f}s"
+        )
+
+
+class ChatExportBackfill:
+    """Replays game messages from chat export files through MessageProcessor."""
+
+    def __init__(
+        self,
+        processor: Optional[MessageProcessor],
+        classifier: Optional[MessageClassifier] = None,
+        registry: Optional[ParserRegistry] = None,
+        checkpoint_path: Optional[Path] = None,
+        batch_size: int = 500,
+        on_batch: Optional[Callable[[BackfillStats], None]] = None
+    ):
+        """
+        Initialize the backfill engine.
+
+        Args:
+            processor: MessageProcessor that applies balance updates; None for a
+                dry run that only parses game messages with the parser registry
+            classifier: Classifier used to skip non-game messages before batching
+            registry: Parser registry used in dry runs (defaults to the global one)
+            checkpoint_path: JSON file used to resume interrupted runs
+            batch_size: Game messages per process_batch call (one transaction each)
+            on_batch: Optional progress callback invoked after every batch
+        """
+        self.processor = processor
+        self.classifier = classifier or MessageClassifier()
+        self.registry = registry
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.on_batch = on_batch
+
+    def run(self, files: Iterable[Path]) -> BackfillStats:
+        """
+        Backfill every file, skipping what the checkpoint marks as done.
+
+        Args:
+            files: Export files in chronological order
+
+        Returns:
+            BackfillStats for this run
+        """
+        checkpoint = BackfillCheckpoint.load(self.checkpoint_path)
+        stats = BackfillStats()
+        started = time.perf_counter()
+
+        for path in files:
+            if path.name in checkpoint.completed_files:
+                continue
+            skip = checkpoint.offset if checkpoint.current_file == path.name else 0
+            checkpoint.current_file, checkpoint.offset = path.name, skip
+
+            batch: List[ExportMessage] = []
+            consumed = skip
+            for message in iter_export_messages(path):
+                if message.offset < skip:
+                    continue
+                stats.messages += 1
+                consumed = message.offset + 1
+                if self.classifier.classify(message.text) == MessageType.UNKNOWN:
+                    continue
+                batch.append(message)
+                if len(batch) >= self.batch_size:
+                    self._flush(batch, consumed, checkpoint, stats, started)
+                    batch = []
+            self._flush(batch, consumed, checkpoint, stats, started)
+
+            checkpoint.completed_files.append(path.name)
+            checkpoint.current_file, checkpoint.offset = None, 0
+            checkpoint.save(self.checkpoint_path)
+
+        stats.elapsed = time.perf_counter() - started
+        return stats
+
+    def _flush(
+        self,
+        batch: List[ExportMessage],
+        consumed: int,
+        checkpoint: BackfillCheckpoint,
+        stats: BackfillStats,
+        started: float
+    ) -> None:
+        """Apply one batch and advance the checkpoint past it."""
+        if batch and self.processor is None:
+            registry = self.registry or get_registry()
+            parsed = sum(1 for message in batch if registry.parse(message.text) is not None)
+            stats.game_messages += len(batch)
+            stats.processed += parsed
+            stats.errors += len(batch) - parsed
+        elif batch:
+            result = self.processor.process_batch(
+                [(message.text, message.timestamp) for message in batch],
+                message_ids=[message.idempotency_key for message in batch],
+            )
+            stats.game_messages += len(batch)
+            stats.processed += len(result.processed)
+            stats.duplicates += len(result.duplicates)
+            stats.errors += len(result.errors)
+        checkpoint.offset = consumed
+        checkpoint.save(self.checkpoint_path)
+        stats.elapsed = time.perf_counter() - started
+        if batch and self.on_batch is not None:
+            self.on_batch(stats)
@@ -1,5 +1,7 @@
 from enum import Enum
 
+from core.parsers.markers import MarkerMatcher
+
 
 class MessageType(Enum):
     # GD Cards
@@ -46,9 +48,34 @@ class MessageClassifier:
     BUNKERRP_PROFILE_MARKER_1 = "💎 Кристаллики:"
     BUNKERRP_PROFILE_MARKER_2 = "🎯 Побед:"
 
+    @classmethod
+    def _rules(cls):
+        """Rules in priority order: (type, alternatives of required markers)."""
+        return [
+            # GD Cards
+            (MessageType.GDCARDS_PROFILE, [(cls.GDCARDS_PROFILE_MARKER, "Орбы:")]),
+            (MessageType.GDCARDS_ACCRUAL, [(cls.GDCARDS_ACCRUAL_MARKER,)]),
+            # Shmalala
+            (MessageType.SHMALALA_FISHING, [(cls.SHMALALA_FISHING_MARKER,)]),
+            (MessageType.SHMALALA_FISHING_TOP, [(cls.SHMALALA_FISHING_TOP_MARKER,)]),
+            (MessageType.SHMALALA_KARMA, [(cls.SHMALALA_KARMA_MARKER,)]),
+            (MessageType.SHMALALA_KARMA_TOP, [(cls.SHMALALA_KARMA_TOP_MARKER,)]),
+            # True Mafia
+            (MessageType.TRUEMAFIA_GAME_END, [(cls.TRUEMAFIA_GAME_END_MARKER, "Победители:")]),
+            (MessageType.TRUEMAFIA_PROFILE, [(cls.TRUEMAFIA_PROFILE_MARKER_1, cls.TRUEMAFIA_PROFILE_MARKER_2, "💵 Деньги:")]),
+            # BunkerRP
+            (MessageType.BUNKERRP_GAME_END, [(cls.BUNKERRP_GAME_END_MARKER,)]),
+            (MessageType.BUNKERRP_PROFILE, [(cls.BUNKERRP_PROFILE_MARKER_1, cls.BUNKERRP_PROFILE_MARKER_2, "💵 Деньги:")]),
+        ]
+
+    def __init__(self):
+        self._matcher = MarkerMatcher(self._rules())
+
     def classify(self, message: str) -> MessageType:
         """
         Classify message type based on content.
+
+        Every marker is checked once; the highest-priority matching rule wins.
         
         Args:
             message: Raw message text
@@ -56,33 +83,8 @@ class MessageClassifier:
         Returns:
             MessageType enum value
         """
-        # GD Cards
-        if self.GDCARDS_PROFILE_MARKER in message and "Орбы:" in message:
-            return MessageType.GDCARDS_PROFILE
-        elif self.GDCARDS_ACCRUAL_MARKER in message:
-            return MessageType.GDCARDS_ACCRUAL
-
-        # Shmalala
-        elif self.SHMALALA_FISHING_MARKER in message:
-            return MessageType.SHMALALA_FISHING
-        elif self.SHMALALA_FISHING_TOP_MARKER in message:
-            return MessageType.SHMALALA_FISHING_TOP
-        elif self.SHMALALA_KARMA_MARKER in message:
-            return MessageType.SHMALALA_KARMA
-        elif self.SHMALALA_KARMA_TOP_MARKER in message:
-            return MessageType.SHMALALA_KARMA_TOP
-
-        # True Mafia
-        elif self.TRUEMAFIA_GAME_END_MARKER in message and "Победители:" in message:
-            return MessageType.TRUEMAFIA_GAME_END
-        elif self.TRUEMAFIA_PROFILE_MARKER_1 in message and self.TRUEMAFIA_PROFILE_MARKER_2 in message and "💵 Деньги:" in message:
-            return MessageType.TRUEMAFIA_PROFILE
-
-        # BunkerRP
-        elif self.BUNKERRP_GAME_END_MARKER in message:
-            return MessageType.BUNKERRP_GAME_END
-        elif self.BUNKERRP_PROFILE_MARKER_1 in message and self.BUNKERRP_PROFILE_MARKER_2 in message and "💵 Деньги:" in message:
-            return MessageType.BUNKERRP_PROFILE
-
-        else:
-            return MessageType.UNKNOWN
+        return self._matcher.first(message, MessageType.UNKNOWN)
+
+    def candidates(self, message: str) -> list[MessageType]:
+        """Return every matching message type, highest priority first."""
+        return self._matcher.candidates(message)
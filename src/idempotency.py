@@ -1,22 +1,132 @@
-"""Idempotency checking for message processing."""
+"""Idempotency checking for message processing.
+
+Lookups go through two tiers. The hot tier lives in memory: an LRU of
+recently seen processed IDs answers repeats without touching the database;
+everything else is checked against the processed_messages table, batched
+into one query per filter_processed call.
+
+A checker created with exclusive_writer=True (the chat export backfill,
+the only writer of its tg-export keys) also loads a Bloom filter over every
+stored ID and keeps it current by mark_processed; a Bloom miss then
+proves an ID is new without a query. With other writers on the same
+table a miss would prove nothing, so no filter is built.
+
+Processed IDs older than the retention period are pruned, except the
+permanent chat export keys (EXPORT_KEY_PREFIX): re-running a backfill over
+an old export must not credit it twice.
+"""
 
 import hashlib
-from datetime import datetime
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Set, Tuple
 
 from src.repository_impl import DatabaseRepository
 
+# Duplicates older than the retention period are not detected
+DEFAULT_RETENTION = timedelta(days=30)
+
+# Idempotency keys of Telegram chat export messages; they are never pruned
+EXPORT_KEY_PREFIX = "tg-export"
+PERMANENT_KEY_PREFIXES: Tuple[str, ...] = (f"{EXPORT_KEY_PREFIX}:",)
+
+# Recently seen processed IDs kept in the in-memory LRU
+DEFAULT_HOT_CAPACITY = 10_000
+
+# Minimum time between automatic prunes of the processed_messages table
+DEFAULT_PRUNE_INTERVAL = timedelta(hours=1)
+
+# Initial Bloom filter sizing; it is rebuilt larger when it fills up
+DEFAULT_BLOOM_CAPACITY = 100_000
+DEFAULT_BLOOM_ERROR_RATE = 0.001
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over string keys."""
+
+    def __init__(self, capacity: int, error_rate: float = DEFAULT_BLOOM_ERROR_RATE):
+        """
+        Size the filter for an expected number of keys.
+        
+        Args:
+            capacity: Number of keys the filter is sized for
+            error_rate: Target false positive rate at capacity
+        """
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._count = 0
+
+    def _positions(self, key: str):
+        # Double hashing: two 64-bit halves of one digest give every position
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (first + i * second) % self.num_bits
+
+    def add(self, key: str) -> None:
+        """Add a key to the filter."""
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self._count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+    def __len__(self) -> int:
+        return self._count
+
 
 class IdempotencyChecker:
     """Prevents duplicate message processing."""
 
-    def __init__(self, repository: DatabaseRepository):
+    def __init__(
+        self,
+        repository: DatabaseRepository,
+        retention: Optional[timedelta] = DEFAULT_RETENTION,
+        hot_capacity: int = DEFAULT_HOT_CAPACITY,
+        prune_interval: timedelta = DEFAULT_PRUNE_INTERVAL,
+        bloom_capacity: int = DEFAULT_BLOOM_CAPACITY,
+        exclusive_writer: bool = False
+    ):
         """
         Initialize with database repository.
         
+        With a retention period, expired IDs are pruned on the first lookup.
+        An exclusive writer also loads the Bloom filter from the table.
+        
         Args:
             repository: DatabaseRepository instance for storing message IDs
+            retention: How long processed IDs are kept, None keeps them forever;
+                IDs with PERMANENT_KEY_PREFIXES are always kept
+            hot_capacity: Maximum number of IDs in the in-memory LRU
+            prune_interval: Minimum time between automatic prunes
+            bloom_capacity: Minimum number of keys the Bloom filter is sized for
+            exclusive_writer: True if no other process stores the IDs this
+                checker looks up, so a Bloom filter miss proves an ID is new
         """
         self.repository = repository
+        self.retention = retention
+        self.exclusive_writer = exclusive_writer
+        self.hot_capacity = hot_capacity
+        self.prune_interval = prune_interval.total_seconds()
+        self.bloom_capacity = bloom_capacity
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+        self._last_prune: Optional[float] = None
+        self.stats: Dict[str, int] = {
+            "hot_hits": 0, "bloom_rejects": 0, "db_lookups": 0, "pruned": 0
+        }
+        self._bloom: Optional[BloomFilter] = None
+        if exclusive_writer:
+            self._rebuild_bloom()
 
     def generate_message_id(self, message: str, timestamp: datetime) -> str:
         """
@@ -25,7 +135,7 @@ class IdempotencyChecker:
         Args:
             message: Message content
             timestamp: Message timestamp
-            
+        
         Returns:
             Unique message identifier as hexadecimal string
         """
@@ -38,11 +148,52 @@ class IdempotencyChecker:
         
         Args:
             message_id: Unique message identifier
-            
+        
         Returns:
             True if message was already processed, False otherwise
         """
-        return self.repository.message_id_exists(message_id)
+        self._maybe_prune()
+        if message_id in self._recent:
+            self._recent.move_to_end(message_id)
+            self.stats["hot_hits"] += 1
+            return True
+        if self._bloom is not None and message_id not in self._bloom:
+            self.stats["bloom_rejects"] += 1
+            return False
+        self.stats["db_lookups"] += 1
+        processed = self.repository.message_id_exists(message_id)
+        if processed:
+            self._remember(message_id)
+        return processed
+
+    def filter_processed(self, message_ids: Iterable[str]) -> Set[str]:
+        """
+        Return the message IDs that were already processed, in one lookup.
+        
+        Args:
+            message_ids: Candidate message identifiers
+        
+        Returns:
+            Set of identifiers that should be skipped
+        """
+        self._maybe_prune()
+        found: Set[str] = set()
+        candidates = []
+        for message_id in dict.fromkeys(message_ids):
+            if message_id in self._recent:
+                self.stats["hot_hits"] += 1
+                found.add(message_id)
+            elif self._bloom is None or message_id in self._bloom:
+                candidates.append(message_id)
+            else:
+                self.stats["bloom_rejects"] += 1
+        if candidates:
+            self.stats["db_lookups"] += 1
+            stored = self.repository.filter_processed_message_ids(candidates)
+            for message_id in stored:
+                self._remember(message_id)
+            found |= stored
+        return found
 
     def mark_processed(self, message_id: str) -> None:
         """
@@ -52,3 +203,63 @@ class IdempotencyChecker:
             message_id: Unique message identifier
         """
         self.repository.store_message_id(message_id)
+        self._remember(message_id)
+        if self._bloom is not None:
+            self._bloom.add(message_id)
+            if len(self._bloom) > self._bloom.capacity:
+                self._rebuild_bloom()
+
+    def forget(self, message_ids: Iterable[str]) -> None:
+        """
+        Drop IDs from the in-memory tier after their transaction was rolled back.
+        
+        The Bloom filter cannot remove keys; its stale entries only cost a
+        database lookup.
+        
+        Args:
+            message_ids: Identifiers whose mark_processed was not committed
+        """
+        for message_id in message_ids:
+            self._recent.pop(message_id, None)
+
+    def prune_expired(self, now: Optional[datetime] = None) -> int:
+        """
+        Delete processed IDs older than the retention period.
+        
+        IDs with PERMANENT_KEY_PREFIXES are kept.
+        
+        Args:
+            now: Current time, defaults to the current UTC time
+        
+        Returns:
+            Number of deleted IDs
+        """
+        self._last_prune = time.monotonic()
+        if self.retention is None:
+            return 0
+        now = now or datetime.now(timezone.utc)
+        deleted = self.repository.prune_processed_message_ids(
+            now - self.retention, keep_prefixes=PERMANENT_KEY_PREFIXES
+        )
+        if deleted:
+            self.stats["pruned"] += deleted
+            self._recent.clear()
+            if self._bloom is not None:
+                self._rebuild_bloom()
+        return deleted
+
+    def _maybe_prune(self) -> None:
+        if self._last_prune is None or time.monotonic() - self._last_prune >= self.prune_interval:
+            self.prune_expired()
+
+    def _remember(self, message_id: str) -> None:
+        self._recent[message_id] = None
+        self._recent.move_to_end(message_id)
+        if len(self._recent) > self.hot_capacity:
+            self._recent.popitem(last=False)
+
+    def _rebuild_bloom(self) -> None:
+        message_ids = list(self.repository.iter_processed_message_ids())
+        self._bloom = BloomFilter(max(self.bloom_capacity, 2 * len(message_ids)))
+        for message_id in message_ids:
+            self._bloom.add(message_id)
@@ -1,7 +1,9 @@
 """Message processing pipeline orchestrator."""
 
+from dataclasses import dataclass, field
 from datetime import datetime
 from decimal import Decimal
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
 
 from src.classifier import MessageClassifier, MessageType
 from src.parsers import (
@@ -14,6 +16,27 @@ from src.idempotency import IdempotencyChecker
 from src.audit_logger import AuditLogger
 
 
+# Savepoint wrapping each message of a batch transaction
+BATCH_SAVEPOINT = "batch_message"
+
+
+@dataclass
+class BatchError:
+    """A message of a batch that could not be processed."""
+    index: int
+    message_id: str
+    stage: str
+    error: Exception
+
+
+@dataclass
+class BatchResult:
+    """Outcome of MessageProcessor.process_batch()."""
+    processed: List[str] = field(default_factory=list)
+    duplicates: List[str] = field(default_factory=list)
+    errors: List[BatchError] = field(default_factory=list)
+
+
 class MessageProcessor:
     """Main orchestrator for message processing."""
 
@@ -95,47 +118,8 @@ class MessageProcessor:
                 raise ParserError("Unknown message type")
 
             # Parse and process based on message type
-            if message_type == MessageType.GDCARDS_PROFILE:
-                parsed = self.profile_parser.parse(message)
-                self.balance_manager.process_profile(parsed)
-
-            elif message_type == MessageType.GDCARDS_ACCRUAL:
-                parsed = self.accrual_parser.parse(message)
-                self.balance_manager.process_accrual(parsed)
-
-            elif message_type == MessageType.SHMALALA_FISHING:
-                parsed = self.fishing_parser.parse(message)
-                self.balance_manager.process_fishing(parsed)
-
-            elif message_type == MessageType.SHMALALA_KARMA:
-                parsed = self.karma_parser.parse(message)
-                self.balance_manager.process_karma(parsed)
-
-            elif message_type == MessageType.TRUEMAFIA_GAME_END:
-                parsed = self.mafia_game_end_parser.parse(message)
-                # True Mafia winners get 10 money each
-                self.balance_manager.process_game_winners(
-                    winners=parsed.winners,
-                    game=parsed.game,
-                    fixed_amount=Decimal("10")
-                )
-
-            elif message_type == MessageType.TRUEMAFIA_PROFILE:
-                parsed = self.mafia_profile_parser.parse(message)
-                self.balance_manager.process_mafia_profile(parsed)
-
-            elif message_type == MessageType.BUNKERRP_GAME_END:
-                parsed = self.bunker_game_end_parser.parse(message)
-                # BunkerRP winners get 30 money each
-                self.balance_manager.process_game_winners(
-                    winners=parsed.winners,
-                    game=parsed.game,
-                    fixed_amount=Decimal("30")
-                )
-
-            elif message_type == MessageType.BUNKERRP_PROFILE:
-                parsed = self.bunker_profile_parser.parse(message)
-                self.balance_manager.process_bunker_profile(parsed)
+            parsed = self._parse(message_type, message)
+            self._apply(message_type, parsed)
 
             # Mark message as processed
             self.idempotency_checker.mark_processed(message_id)
@@ -145,22 +129,185 @@ class MessageProcessor:
 
         except ParserError as e:
             # Rollback transaction
-            self.balance_manager.repository.rollback_transaction()
+            self._rollback([message_id])
             # Log error with context
             self.logger.log_error(e, "parsing")
             # Re-raise the exception
             raise
         except ValueError as e:
             # Rollback transaction
-            self.balance_manager.repository.rollback_transaction()
+            self._rollback([message_id])
             # Log error with context
             self.logger.log_error(e, "configuration")
             # Re-raise the exception
             raise
         except Exception as e:
             # Rollback transaction
-            self.balance_manager.repository.rollback_transaction()
+            self._rollback([message_id])
             # Log error with context
             self.logger.log_error(e, "processing")
             # Re-raise the exception
             raise
+
+    def process_batch(
+        self,
+        messages: Iterable[Tuple[str, datetime]],
+        message_ids: Optional[Sequence[str]] = None
+    ) -> BatchResult:
+        """
+        Process many messages with one idempotency lookup and one transaction.
+        
+        Already-processed message IDs (and repeats inside the batch) are
+        filtered with a single IN query, the rest are classified and parsed
+        up front, and all balance updates are applied in one transaction.
+        Each message is applied under its own savepoint, so a failing message
+        is rolled back alone and reported instead of aborting the batch.
+        
+        Args:
+            messages: Iterable of (message text, timestamp) pairs
+            message_ids: Optional idempotency keys, one per message, used
+                instead of IDs generated from text and timestamp
+            
+        Returns:
+            BatchResult with processed IDs, skipped duplicates and per-message errors
+            
+        Raises:
+            Exception: If the batch transaction itself cannot be committed
+        """
+        result = BatchResult()
+        messages = list(messages)
+        if message_ids is None:
+            message_ids = [
+                self.idempotency_checker.generate_message_id(message, timestamp)
+                for message, timestamp in messages
+            ]
+        elif len(message_ids) != len(messages):
+            raise ValueError("message_ids must have one entry per message")
+        entries = [
+            (index, message, message_id)
+            for index, ((message, _timestamp), message_id) in enumerate(zip(messages, message_ids))
+        ]
+        already_processed = self.idempotency_checker.filter_processed(
+            message_id for _, _, message_id in entries
+        )
+
+        prepared = []
+        seen = set()
+        for index, message, message_id in entries:
+            if message_id in already_processed or message_id in seen:
+                result.duplicates.append(message_id)
+                continue
+            seen.add(message_id)
+            try:
+                message_type = self.classifier.classify(message)
+                if message_type == MessageType.UNKNOWN:
+                    raise ParserError("Unknown message type")
+                parsed = self._parse(message_type, message)
+            except Exception as e:
+                self._report_batch_error(result, index, message_id, e)
+                continue
+            prepared.append((index, message_id, message_type, parsed))
+
+        if not prepared:
+            return result
+
+        repository = self.balance_manager.repository
+        repository.begin_transaction()
+        try:
+            for index, message_id, message_type, parsed in prepared:
+                repository.savepoint(BATCH_SAVEPOINT)
+                try:
+                    self._apply(message_type, parsed)
+                    self.idempotency_checker.mark_processed(message_id)
+                except Exception as e:
+                    repository.rollback_to_savepoint(BATCH_SAVEPOINT)
+                    self._report_batch_error(result, index, message_id, e)
+                    continue
+                repository.release_savepoint(BATCH_SAVEPOINT)
+                result.processed.append(message_id)
+
+            repository.commit_transaction()
+        except Exception as e:
+            self._rollback(result.processed)
+            self.logger.log_error(e, "processing")
+            raise
+
+        self.logger.logger.info(
+            f"Batch processed: {len(result.processed)} applied, "
+            f"{len(result.duplicates)} duplicates, {len(result.errors)} failed"
+        )
+        return result
+
+    def _rollback(self, message_ids: Iterable[str]) -> None:
+        """Roll back the transaction and drop its IDs from the idempotency cache."""
+        self.balance_manager.repository.rollback_transaction()
+        self.idempotency_checker.forget(message_ids)
+
+    def _report_batch_error(
+        self, result: BatchResult, index: int, message_id: str, error: Exception
+    ) -> None:
+        """Log a per-message failure and add it to the batch report."""
+        if isinstance(error, ParserError):
+            stage = "parsing"
+        elif isinstance(error, ValueError):
+            stage = "configuration"
+        else:
+            stage = "processing"
+        self.logger.log_error(error, stage)
+        result.errors.append(BatchError(index, message_id, stage, error))
+
+    def _parse(self, message_type: MessageType, message: str) -> Any:
+        """Parse a classified message with the matching parser."""
+        if message_type == MessageType.GDCARDS_PROFILE:
+            return self.profile_parser.parse(message)
+        elif message_type == MessageType.GDCARDS_ACCRUAL:
+            return self.accrual_parser.parse(message)
+        elif message_type == MessageType.SHMALALA_FISHING:
+            return self.fishing_parser.parse(message)
+        elif message_type == MessageType.SHMALALA_KARMA:
+            return self.karma_parser.parse(message)
+        elif message_type == MessageType.TRUEMAFIA_GAME_END:
+            return self.mafia_game_end_parser.parse(message)
+        elif message_type == MessageType.TRUEMAFIA_PROFILE:
+            return self.mafia_profile_parser.parse(message)
+        elif message_type == MessageType.BUNKERRP_GAME_END:
+            return self.bunker_game_end_parser.parse(message)
+        elif message_type == MessageType.BUNKERRP_PROFILE:
+            return self.bunker_profile_parser.parse(message)
+        return None
+
+    def _apply(self, message_type: MessageType, parsed: Any) -> None:
+        """Apply a parsed message to balances."""
+        if message_type == MessageType.GDCARDS_PROFILE:
+            self.balance_manager.process_profile(parsed)
+
+        elif message_type == MessageType.GDCARDS_ACCRUAL:
+            self.balance_manager.process_accrual(parsed)
+
+        elif message_type == MessageType.SHMALALA_FISHING:
+            self.balance_manager.process_fishing(parsed)
+
+        elif message_type == MessageType.SHMALALA_KARMA:
+            self.balance_manager.process_karma(parsed)
+
+        elif message_type == MessageType.TRUEMAFIA_GAME_END:
+            # True Mafia winners get 10 money each
+            self.balance_manager.process_game_winners(
+                winners=parsed.winners,
+                game=parsed.game,
+                fixed_amount=Decimal("10")
+            )
+
+        elif message_type == MessageType.TRUEMAFIA_PROFILE:
+            self.balance_manager.process_mafia_profile(parsed)
+
+        elif message_type == MessageType.BUNKERRP_GAME_END:
+            # BunkerRP winners get 30 money each
+            self.balance_manager.process_game_winners(
+                winners=parsed.winners,
+                game=parsed.game,
+                fixed_amount=Decimal("30")
+            )
+
+        elif message_type == MessageType.BUNKERRP_PROFILE:
+            self.balance_manager.process_bunker_profile(parsed)
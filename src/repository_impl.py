@@ -1,8 +1,9 @@
 """Abstract database repository interface for balance management."""
 
 from abc import ABC, abstractmethod
+from datetime import datetime, timezone
 from decimal import Decimal
-from typing import Optional
+from typing import Iterable, Iterator, Optional, Set
 
 from src.models import BotBalance, UserBalance
 
@@ -81,6 +82,40 @@ class DatabaseRepository(ABC):
         """Store message ID to mark it as processed."""
         pass
 
+    @abstractmethod
+    def filter_processed_message_ids(self, message_ids: Iterable[str]) -> Set[str]:
+        """Return the subset of message IDs that have already been processed."""
+        pass
+
+    @abstractmethod
+    def iter_processed_message_ids(self) -> Iterator[str]:
+        """Yield every stored processed message ID."""
+        pass
+
+    @abstractmethod
+    def prune_processed_message_ids(
+        self,
+        older_than: datetime,
+        keep_prefixes: Iterable[str] = ()
+    ) -> int:
+        """Delete processed message IDs stored before a cutoff, returning the count."""
+        pass
+
+    @abstractmethod
+    def savepoint(self, name: str) -> None:
+        """Open a named savepoint inside the current transaction."""
+        pass
+
+    @abstractmethod
+    def release_savepoint(self, name: str) -> None:
+        """Release a savepoint, keeping its changes in the transaction."""
+        pass
+
+    @abstractmethod
+    def rollback_to_savepoint(self, name: str) -> None:
+        """Undo changes made since a savepoint and release it."""
+        pass
+
 
 class SQLiteRepository(DatabaseRepository):
     """SQLite implementation of database repository."""
@@ -340,3 +375,94 @@ class SQLiteRepository(DatabaseRepository):
         )
         if not self._in_transaction:
             self.conn.commit()
+
+    # SQLite's default SQLITE_MAX_VARIABLE_NUMBER on older builds is 999
+    _IN_QUERY_CHUNK = 900
+
+    def filter_processed_message_ids(self, message_ids: Iterable[str]) -> Set[str]:
+        """
+        Return the subset of message IDs that have already been processed.
+
+        Looks the IDs up with ``IN`` queries instead of one query per ID.
+        
+        Args:
+            message_ids: Candidate message identifiers
+            
+        Returns:
+            Set of identifiers present in processed_messages
+        """
+        ids = list(dict.fromkeys(message_ids))
+        found: Set[str] = set()
+        cursor = self.conn.cursor()
+        for start in range(0, len(ids), self._IN_QUERY_CHUNK):
+            chunk = ids[start:start + self._IN_QUERY_CHUNK]
+            placeholders = ", ".join("?" * len(chunk))
+            cursor.execute(
+                f"SELECT message_id FROM processed_messages WHERE message_id IN ({placeholders})",
+                chunk
+            )
+            found.update(row[0] for row in cursor.fetchall())
+        return found
+
+    def iter_processed_message_ids(self) -> Iterator[str]:
+        """
+        Yield every stored processed message ID.
+
+        Rows are fetched in chunks so large tables are not materialized.
+        
+        Yields:
+            Message identifiers from processed_messages
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT message_id FROM processed_messages")
+        while True:
+            rows = cursor.fetchmany(self._IN_QUERY_CHUNK)
+            if not rows:
+                return
+            for row in rows:
+                yield row[0]
+
+    def prune_processed_message_ids(
+        self,
+        older_than: datetime,
+        keep_prefixes: Iterable[str] = ()
+    ) -> int:
+        """
+        Delete processed message IDs stored before a cutoff.
+
+        Uses the processed_at index, so pruning does not scan the table.
+        
+        Args:
+            older_than: Cutoff time; naive values are taken as UTC
+            keep_prefixes: IDs starting with any of these are never deleted
+            
+        Returns:
+            Number of deleted rows
+        """
+        if older_than.tzinfo is not None:
+            older_than = older_than.astimezone(timezone.utc).replace(tzinfo=None)
+        # processed_at defaults to CURRENT_TIMESTAMP, a UTC "YYYY-MM-DD HH:MM:SS" string
+        query = "DELETE FROM processed_messages WHERE processed_at < ?"
+        params = [older_than.strftime("%Y-%m-%d %H:%M:%S")]
+        for prefix in keep_prefixes:
+            query += " AND message_id NOT LIKE ? ESCAPE '\\'"
+            escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(escaped + "%")
+        cursor = self.conn.cursor()
+        cursor.execute(query, params)
+        if not self._in_transaction:
+            self.conn.commit()
+        return cursor.rowcount
+
+    def savepoint(self, name: str) -> None:
+        """Open a named savepoint inside the current transaction."""
+        self.conn.execute(f"SAVEPOINT {name}")
+
+    def release_savepoint(self, name: str) -> None:
+        """Release a savepoint, keeping its changes in the transaction."""
+        self.conn.execute(f"RELEASE SAVEPOINT {name}")
+
+    def rollback_to_savepoint(self, name: str) -> None:
+        """Undo changes made since a savepoint and release it."""
+        self.conn.execute(f"ROLLBACK TO SAVEPOINT {name}")
+        self.conn.execute(f"RELEASE SAVEPOINT {name}")
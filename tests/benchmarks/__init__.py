@@ -0,0 +1 @@
+"""Parser throughput benchmarks (opt-in, see parser_bench.py)."""
@@ -0,0 +1,295 @@
+"""Parser throughput benchmarks on real exported bot messages.
+
+The corpus is every message sent by a game bot in ``data/chat_export`` plus
+the raw messages in ``data/parsed_results.json``. Each target parser is run
+over the whole corpus several times; the report gives ns/message, p99
+latency of a single call, and peak/retained memory of one pass (tracemalloc).
+
+Baselines live in ``baseline.json`` together with a calibration timing of a
+fixed pure-Python workload; when the machine running the check is slower
+than the one that recorded the baseline, the limits are scaled up to match.
+
+Usage::
+
+    python -m tests.benchmarks.parser_bench                     # report + check
+    python -m tests.benchmarks.parser_bench --update-baseline   # re-record
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from unittest.mock import MagicMock
+
+import structlog
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+EXPORT_DIR = PROJECT_ROOT / "data" / "chat_export"
+PARSED_RESULTS_PATH = PROJECT_ROOT / "data" / "parsed_results.json"
+
+# Senders in the export whose messages are produced by game bots
+BOT_SENDERS = {"GDcards", "Гуся Cards", "🤵🏻 True Mafia", "Shmalala", "BunkerRP"}
+
+# Allowed slowdown against the scaled baseline (0.3 = 30 %)
+DEFAULT_TOLERANCE = 0.3
+P99_TOLERANCE_FACTOR = 2.0
+
+
+@dataclass
+class BenchmarkResult:
+    """Measurements for one parser over the corpus."""
+    name: str
+    messages: int
+    ns_per_msg: float
+    p99_ns: float
+    peak_kib: float
+    retained_kib: float
+
+
+def load_corpus() -> List[str]:
+    """Bot messages from the chat export followed by parsed_results.json samples."""
+    from src.chat_export import find_export_files, iter_export_messages
+
+    corpus = [
+        message.text
+        for path in find_export_files(EXPORT_DIR)
+        for message in iter_export_messages(path)
+        if message.sender in BOT_SENDERS and message.text
+    ]
+    with open(PARSED_RESULTS_PATH, encoding="utf-8") as f:
+        corpus.extend(item["metadata"]["raw_message"] for item in json.load(f))
+    return corpus
+
+
+def _api_parse_bot_message() -> Optional[Callable[[str], object]]:
+    """The Vercel webhook parser; None if api/index.py cannot be imported here.
+
+    The shared conversion-rate cache is primed with an empty table so the
+    parser uses its built-in rates instead of reaching for the database.
+    """
+    try:
+        from api.index import parse_bot_message
+    except Exception:
+        return None
+    from common.conversion_rates import conversion_rate_cache
+
+    conversion_rate_cache.load(lambda: [])
+    return parse_bot_message
+
+
+TARGET_NAMES = (
+    "registry.parse_message",
+    "UnifiedParser.parse",
+    "MessageClassifier.classify",
+    "api.parse_bot_message",
+    "ParsingService.detect_bot",
+)
+
+
+def build_targets() -> Dict[str, Optional[Callable[[str], object]]]:
+    """Parser entry points under benchmark, keyed by TARGET_NAMES."""
+    from bank_bot.services.parsing_service import ParsingService
+    from core.parsers.registry import parse_message
+    from core.parsers.unified import UnifiedParser
+    from src.classifier import MessageClassifier
+
+    return {
+        "registry.parse_message": parse_message,
+        "UnifiedParser.parse": UnifiedParser().parse,
+        "MessageClassifier.classify": MessageClassifier().classify,
+        "api.parse_bot_message": _api_parse_bot_message(),
+        "ParsingService.detect_bot": ParsingService(MagicMock()).detect_bot,
+    }
+
+
+@contextmanager
+def quiet_structlog():
+    """Drop structlog output below CRITICAL so console I/O is not measured."""
+    previous = structlog.get_config()
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.CRITICAL))
+    try:
+        yield
+    finally:
+        structlog.configure(**previous)
+
+
+def calibrate(rounds: int = 5) -> float:
+    """Best-of-N time (ns) of a fixed string workload, used to scale baselines."""
+    text = "🃏 НОВАЯ КАРТА 🃏\nИгрок: LucasTeam\nОчки: +5 " * 4
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter_ns()
+        for i in range(20000):
+            _ = ("Очки" in text, text.lower(), str(i).split())
+        best = min(best, time.perf_counter_ns() - started)
+    return float(best)
+
+
+def measure(name: str, func: Callable[[str], object], corpus: List[str], repeats: int = 5) -> BenchmarkResult:
+    """
+    Time ``func`` over the corpus and record p99 and memory of one pass.
+
+    ns/message is taken from the fastest pass to damp scheduler noise; p99
+    is computed over the individual calls of all passes.
+
+    Args:
+        name: Report name
+        func: Parser entry point taking the message text
+        corpus: Messages to feed
+        repeats: Timed passes over the corpus (after one warm-up pass)
+
+    Returns:
+        BenchmarkResult
+    """
+    # Parsers may raise on malformed messages (e.g. UnifiedParser); that path
+    # is part of the measured cost, so failures are swallowed, not skipped.
+    for message in corpus:
+        try:
+            func(message)
+        except Exception:
+            pass
+
+    clock = time.perf_counter_ns
+    samples: List[int] = []
+    pass_totals: List[int] = []
+    for _ in range(repeats):
+        pass_started = len(samples)
+        for message in corpus:
+            started = clock()
+            try:
+                func(message)
+            except Exception:
+                pass
+            samples.append(clock() - started)
+        pass_totals.append(sum(samples[pass_started:]))
+    samples.sort()
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for message in corpus:
+            try:
+                func(message)
+            except Exception:
+                pass
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchmarkResult(
+        name=name,
+        messages=len(corpus),
+        ns_per_msg=min(pass_totals) / len(corpus),
+        p99_ns=float(samples[min(len(samples) - 1, int(len(samples) * 0.99))]),
+        peak_kib=(peak - before) / 1024,
+        retained_kib=(after - before) / 1024,
+    )
+
+
+def run(repeats: int = 5) -> Dict[str, object]:
+    """Measure every available target; returns a baseline-shaped dict."""
+    corpus = load_corpus()
+    with quiet_structlog():
+        results = {
+            name: asdict(measure(name, func, corpus, repeats))
+            for name, func in build_targets().items()
+            if func is not None
+        }
+    return {"calibration_ns": calibrate(), "results": results}
+
+
+def load_baseline(path: Path = BASELINE_PATH) -> Optional[Dict[str, object]]:
+    """Stored baseline or None."""
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def find_regressions(
+    current: Dict[str, object],
+    baseline: Dict[str, object],
+    tolerance: float = DEFAULT_TOLERANCE
+) -> List[str]:
+    """
+    Compare a run with the baseline, scaled by the calibration ratio.
+
+    Args:
+        current: Output of run()
+        baseline: Stored baseline
+        tolerance: Allowed relative slowdown of ns/message (p99 gets twice as much)
+
+    Returns:
+        Human-readable regression descriptions (empty if none)
+    """
+    # Only ever relax limits: the calibration loop is itself noisy, and a
+    # spuriously fast calibration must not turn ordinary jitter into failures.
+    scale = max(1.0, current["calibration_ns"] / baseline["calibration_ns"])
+    problems = []
+    for name, result in current["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            continue
+        checks = (
+            ("ns/msg", "ns_per_msg", tolerance),
+            ("p99", "p99_ns", tolerance * P99_TOLERANCE_FACTOR),
+        )
+        for label, key, allowed in checks:
+            limit = reference[key] * scale * (1 + allowed)
+            if result[key] > limit:
+                problems.append(
+                    f"{name}: {label} {result[key]:.0f}ns > {limit:.0f}ns "
+                    f"(baseline {reference[key]:.0f}ns x{scale:.2f} +{allowed:.0%})"
+                )
+    return problems
+
+
+def format_report(current: Dict[str, object]) -> str:
+    """Table of results."""
+    lines = [f"{'parser':<28}{'msgs':>7}{'ns/msg':>11}{'p99 ns':>11}{'peak KiB':>10}{'kept KiB':>10}"]
+    for result in current["results"].values():
+        lines.append(
+            f"{result['name']:<28}{result['messages']:>7}{result['ns_per_msg']:>11.0f}"
+            f"{result['p99_ns']:>11.0f}{result['peak_kib']:>10.1f}{result['retained_kib']:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Parser throughput benchmarks")
+    parser.add_argument("--update-baseline", action="store_true", help="Record the current run as baseline")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed passes over the corpus")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed slowdown")
+    args = parser.parse_args()
+
+    current = run(args.repeats)
+    print(format_report(current))
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {BASELINE_PATH}")
+        return
+
+    baseline = load_baseline()
+    if baseline is None:
+        print("No baseline recorded; run with --update-baseline")
+        return
+    problems = find_regressions(current, baseline, args.tolerance)
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Parser throughput regression checks against tests/benchmarks/baseline.json.
+
+Timing-sensitive, so opt-in: ``BENCHMARK=1 pytest tests/benchmarks -s``.
+"""
+
+import os
+
+import pytest
+
+from tests.benchmarks import parser_bench
+
+pytestmark = pytest.mark.skipif(
+    os.environ.get("BENCHMARK") != "1",
+    reason="set BENCHMARK=1 to run parser benchmarks",
+)
+
+
+@pytest.fixture(scope="module")
+def benchmark_run():
+    """One measurement run shared by all checks."""
+    current = parser_bench.run()
+    print("\n" + parser_bench.format_report(current))
+    return current
+
+
+@pytest.fixture(scope="module")
+def baseline():
+    stored = parser_bench.load_baseline()
+    if stored is None:
+        pytest.skip("no baseline recorded; run parser_bench --update-baseline")
+    return stored
+
+
+def test_corpus_contains_bot_messages():
+    corpus = parser_bench.load_corpus()
+    assert len(corpus) > 1000
+    assert any("🃏 НОВАЯ КАРТА 🃏" in message for message in corpus)
+
+
+@pytest.mark.parametrize("name", parser_bench.TARGET_NAMES)
+def test_parser_has_no_regression(name, benchmark_run, baseline):
+    if name not in benchmark_run["results"]:
+        pytest.skip(f"{name} is not importable in this environment")
+    tolerance = float(os.environ.get("BENCHMARK_TOLERANCE", parser_bench.DEFAULT_TOLERANCE))
+    scoped = {**benchmark_run, "results": {name: benchmark_run["results"][name]}}
+
+    assert parser_bench.find_regressions(scoped, baseline, tolerance) == []
@@ -2,12 +2,20 @@
 
 from __future__ import annotations
 
-from unittest.mock import MagicMock, patch
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
 from bridge_bot.media import (
+    ChunkPipe,
+    MediaItem,
+    PipeAborted,
+    _relay_once,
     _retry,
+    relay_album_to_vk,
+    relay_tg_file_to_vk,
     upload_doc_to_vk,
     upload_photo_to_vk,
     upload_video_to_vk,
@@ -81,9 +89,8 @@ class TestUploadPhoto:
 
     @patch("bridge_bot.media._retry")
     @patch("bridge_bot.media.requests.post")
-    @patch("bridge_bot.media.Path.unlink")
-    def test_upload_photo_cleans_temp_file(self, mock_unlink, mock_post, mock_retry):
-        """Test that temp file is deleted after upload."""
+    def test_upload_photo_posts_bytes_without_temp_file(self, mock_post, mock_retry):
+        """Test that photo bytes are posted directly, without a temp file."""
 
         mock_vk_session = MagicMock()
         mock_vk = MagicMock()
@@ -100,9 +107,11 @@ class TestUploadPhoto:
         mock_retry.side_effect = lambda f: f()
 
         file_bytes = b"fake image data"
-        upload_photo_to_vk(file_bytes, mock_vk_session, -2000000000)
+        with patch("tempfile.NamedTemporaryFile") as mock_tempfile:
+            upload_photo_to_vk(file_bytes, mock_vk_session, -2000000000)
 
-        mock_unlink.assert_called_once()
+        mock_tempfile.assert_not_called()
+        assert mock_post.call_args.kwargs["files"]["photo"][1] == file_bytes
 
 
 class TestUploadVideo:
@@ -156,3 +165,124 @@ class TestUploadDoc:
         result = upload_doc_to_vk(file_bytes, "document.pdf", mock_vk_session, -2000000000)
 
         assert result == "doc-123_999"
+
+
+def _fake_bot(data: bytes, step: int = 64 * 1024):
+    """aiogram-like bot whose download stream yields data in chunks."""
+
+    class _Session:
+        api = SimpleNamespace(is_local=False, file_url=lambda token, path: f"https://tg/{path}")
+
+        async def stream_content(self, url, timeout, chunk_size, raise_for_status):
+            for start in range(0, len(data), step):
+                yield data[start:start + step]
+
+    return SimpleNamespace(
+        token="token",
+        session=_Session(),
+        get_file=AsyncMock(return_value=SimpleNamespace(file_size=len(data), file_path="docs/f.bin")),
+    )
+
+
+def _doc_vk_session():
+    mock_vk_session = MagicMock()
+    mock_vk = mock_vk_session.get_api.return_value
+    mock_vk.docs.getMessagesUploadServer.return_value = {"upload_url": "http://upload.server/upload"}
+    mock_vk.docs.save.return_value = {"doc": {"owner_id": -1, "id": 7}}
+    return mock_vk_session
+
+
+class TestChunkPipe:
+    """Tests for the bounded buffer between download and upload."""
+
+    def test_offer_respects_buffer_limit(self):
+        """Test that the pipe refuses chunks beyond max_bytes."""
+        pipe = ChunkPipe(max_bytes=8)
+
+        assert pipe.offer(b"12345") is True
+        assert pipe.offer(b"6789") is False
+        assert pipe.read(3) == b"123"
+        assert pipe.offer(b"6789") is True
+
+    def test_read_until_close(self):
+        """Test that read() returns the data and then b''."""
+        pipe = ChunkPipe()
+        pipe.offer(b"ab")
+        pipe.close()
+
+        assert pipe.read() == b"ab"
+        assert pipe.read() == b""
+
+    def test_abort_stops_producer(self):
+        """Test that a stopped reader makes the producer fail."""
+        pipe = ChunkPipe()
+        pipe.abort()
+
+        with pytest.raises(PipeAborted):
+            pipe.offer(b"x")
+
+
+class TestStreamingRelay:
+    """Tests for relay_tg_file_to_vk and relay_album_to_vk."""
+
+    @pytest.mark.asyncio
+    async def test_relay_streams_download_into_multipart_upload(self):
+        """Test that the upload body is streamed with Content-Length and no temp file."""
+        data = bytes(range(256)) * 12_000  # ~3 MB, more than the buffer
+        received = {}
+
+        def fake_post(url, data=None, headers=None, timeout=None):
+            received["length"] = len(data)
+            parts = []
+            while chunk := data.read(8192):
+                parts.append(chunk)
+            received["body"] = b"".join(parts)
+            received["content_type"] = headers["Content-Type"]
+            return MagicMock(json=lambda: {"file": "saved"})
+
+        with patch("bridge_bot.media.requests.post", side_effect=fake_post), \
+                patch("tempfile.NamedTemporaryFile") as mock_tempfile:
+            attachment = await relay_tg_file_to_vk(
+                _fake_bot(data), MediaItem("file-id", "doc", "big.bin"), _doc_vk_session(), 2000000001
+            )
+
+        assert attachment == "doc-1_7"
+        mock_tempfile.assert_not_called()
+        body = received["body"]
+        boundary = received["content_type"].split("boundary=")[1]
+        assert len(body) == received["length"]
+        assert b'name="file"; filename="big.bin"' in body
+        assert body.endswith(f"\r\n--{boundary}--\r\n".encode())
+        assert data in body
+
+    @pytest.mark.asyncio
+    async def test_failed_upload_stops_download(self):
+        """Test that an upload error is raised and the download is abandoned."""
+        data = b"x" * (4 * 1024 * 1024)
+
+        with patch("bridge_bot.media.requests.post", side_effect=RuntimeError("upload failed")):
+            with pytest.raises(RuntimeError, match="upload failed"):
+                await _relay_once(_fake_bot(data), MediaItem("file-id", "doc"), _doc_vk_session(), 1)
+
+    @pytest.mark.asyncio
+    async def test_album_relays_concurrently_in_order(self):
+        """Test that album items run concurrently and keep their order."""
+        running = 0
+        peak = 0
+
+        async def fake_relay(bot, item, vk_session, peer_id):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            if item.file_id == "bad":
+                raise RuntimeError("failed")
+            return f"photo1_{item.file_id}"
+
+        items = [MediaItem(file_id, "photo") for file_id in ("1", "bad", "3", "4")]
+        with patch("bridge_bot.media.relay_tg_file_to_vk", side_effect=fake_relay):
+            attachments = await relay_album_to_vk(MagicMock(), items, MagicMock(), 1, concurrency=3)
+
+        assert attachments == ["photo1_1", "photo1_3", "photo1_4"]
+        assert peak == 3
@@ -2,11 +2,13 @@
 
 from __future__ import annotations
 
+import threading
 import time
 from unittest.mock import MagicMock
 
 
 from bridge_bot.queue import (
+    LaneLimit,
     MessageQueue,
     OutboundMessage,
     RateLimitError,
@@ -72,7 +74,7 @@ class TestMessageQueue:
         msg = OutboundMessage(text="Test", platform="vk")
         mq.put(msg)
 
-        assert not mq._queue.empty()
+        assert mq.metrics()["enqueued"] == 1
         mq.stop()
 
     def test_queue_send_success(self):
@@ -142,3 +144,114 @@ class TestMessageQueue:
         mq.stop(timeout=5.0)
 
         assert send_func.call_count == 3
+
+
+FAST_LIMITS = {"vk": LaneLimit(rate=100.0, burst=100.0), "tg": LaneLimit(rate=100.0, burst=100.0)}
+
+
+def _wait_for(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestLaneScheduler:
+    """Tests for per-lane scheduling, coalescing and metrics."""
+
+    def test_order_kept_within_lane(self):
+        """Test that one lane is delivered in FIFO order despite several workers."""
+        sent = []
+        mq = MessageQueue(lambda msg: sent.append(msg.text), workers=4, limits=FAST_LIMITS, shared_limits=FAST_LIMITS)
+
+        for i in range(20):
+            mq.put(OutboundMessage(text=f"m{i}", platform="vk", peer_id=1))
+
+        assert _wait_for(lambda: len(sent) == 20)
+        mq.stop()
+        assert sent == [f"m{i}" for i in range(20)]
+
+    def test_coalesces_short_messages_from_same_sender(self):
+        """Test that queued short messages from one sender go out as one send."""
+        gate = threading.Event()
+        sent = []
+
+        def send(msg):
+            gate.wait(2.0)
+            sent.append((msg.sender_name, msg.text))
+
+        mq = MessageQueue(send, workers=1, limits=FAST_LIMITS, shared_limits=FAST_LIMITS)
+        mq.put(OutboundMessage(text="first", platform="vk", sender_name="Alice"))
+        assert _wait_for(lambda: mq.depth() == 0)
+        for text, sender in (("a", "Alice"), ("b", "Alice"), ("c", "Bob"), ("x" * 500, "Bob")):
+            mq.put(OutboundMessage(text=text, platform="vk", sender_name=sender))
+        gate.set()
+
+        assert _wait_for(lambda: len(sent) == 4)
+        mq.stop()
+        assert sent == [("Alice", "first"), ("Alice", "a\nb"), ("Bob", "c"), ("Bob", "x" * 500)]
+        assert mq.metrics()["coalesced"] == 1
+
+    def test_rate_limit_pauses_only_its_lane(self):
+        """Test that a 429 in one lane does not delay other lanes."""
+        sent = []
+
+        def send(msg):
+            if msg.peer_id == 1:
+                raise RateLimitError(retry_after=30)
+            sent.append(msg.peer_id)
+
+        mq = MessageQueue(send, workers=2, limits=FAST_LIMITS, shared_limits=FAST_LIMITS)
+        mq.put(OutboundMessage(text="slow", platform="vk", peer_id=1))
+        for _ in range(3):
+            mq.put(OutboundMessage(text="fast", platform="vk", peer_id=2))
+
+        assert _wait_for(lambda: len(sent) == 3)
+        metrics = mq.metrics()
+        mq.stop()
+        assert metrics["rate_limited"] == 1
+        assert metrics["lanes"] == {"vk:1": 1, "vk:2": 0}
+
+    def test_lane_token_bucket_paces_sends(self):
+        """Test that a lane sends a burst and then at its rate."""
+        times = []
+        limits = {"vk": LaneLimit(rate=10.0, burst=2.0)}
+        mq = MessageQueue(lambda msg: times.append(time.monotonic()), limits=limits)
+
+        for i in range(5):
+            mq.put(OutboundMessage(text=f"m{i}", platform="vk"))
+
+        assert _wait_for(lambda: len(times) == 5)
+        mq.stop()
+        assert times[-1] - times[0] >= 0.25
+
+    def test_platform_bucket_is_shared_by_peers(self):
+        """Test that two peers of one platform share its rate limit."""
+        times = []
+        limits = {"vk": LaneLimit(rate=100.0, burst=100.0)}
+        shared = {"vk": LaneLimit(rate=10.0, burst=2.0)}
+        mq = MessageQueue(lambda msg: times.append(time.monotonic()), workers=2, limits=limits, shared_limits=shared)
+
+        for i in range(3):
+            mq.put(OutboundMessage(text=f"a{i}", platform="vk", peer_id=1))
+            mq.put(OutboundMessage(text=f"b{i}", platform="vk", peer_id=2))
+
+        assert _wait_for(lambda: len(times) == 6)
+        mq.stop()
+        # 2 burst tokens, then 4 more at 10/s across both peers
+        assert times[-1] - times[0] >= 0.35
+
+    def test_metrics_report_latency(self):
+        """Test that delivered messages feed the latency metrics."""
+        mq = MessageQueue(MagicMock(), limits=FAST_LIMITS, shared_limits=FAST_LIMITS)
+        for i in range(3):
+            mq.put(OutboundMessage(text=f"m{i}", platform="tg", peer_id=5))
+
+        assert _wait_for(lambda: mq.metrics()["sent"] == 3)
+        metrics = mq.metrics()
+        mq.stop()
+        assert metrics["queued"] == 0
+        assert metrics["enqueued"] == 3
+        assert 0 <= metrics["latency_avg"] <= metrics["latency_p95"] <= metrics["latency_max"]
@@ -0,0 +1,118 @@
+"""Tests for bridge_bot.vk_client module."""
+
+from __future__ import annotations
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from bridge_bot.vk_client import VkSessionPool, close_vk_session_pool, get_vk_session_pool
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):  # noqa: N802
+        body = b"{}"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    """Local HTTP/1.1 server that keeps connections alive."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+class TestVkSessionPool:
+    """Tests for VkSessionPool."""
+
+    def test_same_token_returns_same_session(self):
+        """Test that sessions are created once per token."""
+        pool = VkSessionPool()
+
+        first = pool.get("token_a")
+        assert pool.get("token_a") is first
+        assert pool.get("token_b") is not first
+        assert pool.stats()["clients"] == 2
+
+    def test_sessions_share_http_client(self):
+        """Test that all sessions use the pool's keep-alive HTTP session."""
+        pool = VkSessionPool()
+
+        assert pool.get("token_a").http is pool.http
+        assert pool.get("token_b").http is pool.http
+
+    def test_stats_count_reused_connections(self, local_server):
+        """Test that sequential requests reuse one connection."""
+        pool = VkSessionPool()
+
+        for _ in range(5):
+            pool.http.get(local_server, timeout=5)
+
+        stats = pool.stats()
+        assert stats["requests"] == 5
+        assert stats["connections_opened"] == 1
+        assert stats["connections_reused"] == 4
+        assert stats["reuse_ratio"] == pytest.approx(0.8)
+
+    def test_close_forgets_sessions(self):
+        """Test that close() drops sessions and the HTTP client."""
+        pool = VkSessionPool()
+        session = pool.get("token_a")
+        http = pool.http
+
+        pool.close()
+
+        assert pool.get("token_a") is not session
+        assert pool.http is not http
+
+    def test_global_pool_lifecycle(self):
+        """Test the process-wide pool accessors."""
+        pool = get_vk_session_pool()
+        assert get_vk_session_pool() is pool
+
+        assert close_vk_session_pool()["requests"] == 0
+        assert get_vk_session_pool() is not pool
+        close_vk_session_pool()
+
+
+class TestPooledCallers:
+    """Tests for callers sharing the pool."""
+
+    def test_send_text_reuses_pooled_session(self):
+        """Test that consecutive send_text calls use one VkApi session."""
+        from bridge_bot.vk_publisher import _create_vk_session
+
+        pool = VkSessionPool()
+        with patch("bridge_bot.vk_publisher.get_vk_session_pool", return_value=pool):
+            assert _create_vk_session("token") is _create_vk_session("token")
+
+    def test_media_uploads_use_session_http(self):
+        """Test that uploads go through the VK session's keep-alive HTTP client."""
+        from bridge_bot.media import _http, upload_doc_to_vk
+
+        pool = VkSessionPool()
+        vk_session = pool.get("token")
+        assert _http(vk_session) is pool.http
+
+        vk_session.get_api = MagicMock()
+        vk = vk_session.get_api.return_value
+        vk.docs.getMessagesUploadServer.return_value = {"upload_url": "http://upload.server/upload"}
+        vk.docs.save.return_value = {"doc": {"owner_id": -1, "id": 2}}
+        with patch.object(pool.http, "post") as mock_post:
+            mock_post.return_value.json.return_value = {"file": "saved"}
+            assert upload_doc_to_vk(b"data", "a.txt", vk_session, 1) == "doc-1_2"
+        mock_post.assert_called_once()
@@ -0,0 +1,138 @@
+"""Tests for bridge_bot.vk_profiles and sender name resolution in the VK listener."""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from bridge_bot.vk_listener import VKListenerThread
+from bridge_bot.vk_profiles import VkProfileCache
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _users_get(user_ids, fields):
+    return [
+        {"id": int(user_id), "first_name": f"User{user_id}", "last_name": "Test"}
+        for user_id in user_ids.split(",")
+    ]
+
+
+class TestVkProfileCache:
+    """Tests for VkProfileCache."""
+
+    def test_fetch_batches_misses_into_one_call(self):
+        """Test that misses are resolved with one users.get per 1000 IDs."""
+        vk = MagicMock()
+        vk.users.get.side_effect = _users_get
+        cache = VkProfileCache()
+        cache.put_many({1: "Cached"})
+
+        loaded = cache.fetch(vk, list(range(1, 1502)) + [-5])
+
+        assert len(loaded) == 1500
+        assert vk.users.get.call_count == 2
+        first_batch = vk.users.get.call_args_list[0].kwargs["user_ids"].split(",")
+        assert len(first_batch) == 1000
+        assert "1" not in first_batch
+        assert cache.get(1501) == "User1501 Test"
+
+    def test_ttl_expires_entries(self):
+        """Test that names are reloaded after the TTL."""
+        clock = _Clock()
+        cache = VkProfileCache(ttl=10, clock=clock)
+        cache.put_many({1: "Alice"})
+
+        assert cache.get(1) == "Alice"
+        clock.now = 11
+        assert cache.get(1) is None
+        assert cache.missing([1, 1]) == [1]
+
+    def test_lru_eviction(self):
+        """Test that the least recently used name is evicted first."""
+        cache = VkProfileCache(max_size=2)
+        cache.put_many({1: "A", 2: "B"})
+        cache.get(1)
+        cache.put_many({3: "C"})
+
+        assert cache.get(2) is None
+        assert cache.get(1) == "A"
+        assert cache.get(3) == "C"
+
+    def test_warm_pages_through_conversation_members(self):
+        """Test warming from messages.getConversationMembers, including groups."""
+        vk = MagicMock()
+        vk.messages.getConversationMembers.side_effect = [
+            {"count": 201, "profiles": [{"id": 1, "first_name": "Alice", "last_name": "A"}],
+             "groups": [{"id": 7, "name": "Club"}]},
+            {"count": 201, "profiles": [{"id": 2, "first_name": "Bob", "last_name": ""}]},
+        ]
+        cache = VkProfileCache()
+
+        assert cache.warm(vk, 2000000001) == 3
+        assert vk.messages.getConversationMembers.call_count == 2
+        assert cache.get(1) == "Alice A"
+        assert cache.get(2) == "Bob"
+        assert cache.get(-7) == "Club"
+
+    def test_resolve_falls_back_on_api_error(self):
+        """Test the fallback name when users.get fails."""
+        vk = MagicMock()
+        vk.users.get.side_effect = Exception("API error")
+
+        assert VkProfileCache().resolve(vk, 1) == "VK User"
+
+
+class TestListenerSenderNames:
+    """Tests for the listener's queued, batched forwarding."""
+
+    def test_forward_loop_resolves_backlog_with_one_call(self):
+        """Test that queued events share one users.get call and keep their order."""
+        session = MagicMock()
+        vk = session.get_api.return_value
+        vk.users.get.side_effect = _users_get
+        listener = VKListenerThread("token", 1, MagicMock(), MagicMock())
+        forwarded = []
+        listener._handle_event = lambda event, _session: forwarded.append(
+            (event.user_id, listener._get_sender_name(event, _session))
+        )
+
+        for user_id in (1, 2, 1, 3):
+            listener._events.put(SimpleNamespace(user_id=user_id, text="hi"))
+        listener._events.put(None)
+        listener._forward_loop(session)
+
+        assert vk.users.get.call_count == 1
+        assert forwarded == [
+            (1, "User1 Test"),
+            (2, "User2 Test"),
+            (1, "User1 Test"),
+            (3, "User3 Test"),
+        ]
+
+    def test_forward_loop_warms_from_member_list(self):
+        """Test that members are loaded on startup and need no users.get."""
+        session = MagicMock()
+        vk = session.get_api.return_value
+        vk.messages.getConversationMembers.return_value = {
+            "count": 1,
+            "profiles": [{"id": 5, "first_name": "Eve", "last_name": "E"}],
+        }
+        listener = VKListenerThread("token", 1, MagicMock(), MagicMock(), vk_peer_id=2000000001)
+        names = []
+        listener._handle_event = lambda event, _session: names.append(
+            listener._get_sender_name(event, _session)
+        )
+
+        listener._events.put(SimpleNamespace(user_id=5, text="hi"))
+        listener._events.put(None)
+        listener._forward_loop(session)
+
+        assert names == ["Eve E"]
+        vk.users.get.assert_not_called()
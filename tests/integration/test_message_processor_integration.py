@@ -184,3 +184,44 @@ def test_unknown_message_type_raises_error(message_processor):
     # Should raise ParserError
     with pytest.raises(ParserError, match="Unknown message type"):
         processor.process_message(message, timestamp)
+
+
+def test_process_batch_isolates_failing_messages(message_processor):
+    """Test that a batch commits good messages and reports failing ones."""
+    processor, repository = message_processor
+
+    accrual = """(🃏 НОВАЯ КАРТА 🃏
+Игрок: TestPlayer
+Очки: +5"""
+    # Shmalala has no configured coefficient: fails while applying balances
+    fishing = """🎣 [Рыбалка] 🎣
+
+Рыбак: Fisher
+Улов: Обычная рыба
+Монеты: +12 (100)💰"""
+    timestamp = datetime(2024, 1, 1, 12, 0, 0)
+    messages = [
+        (accrual, timestamp),
+        ("Some random message without markers", timestamp),
+        (fishing, timestamp),
+        (accrual, timestamp),
+        (accrual, datetime(2024, 1, 1, 12, 5, 0)),
+    ]
+
+    result = processor.process_batch(messages)
+
+    assert len(result.processed) == 2
+    assert len(result.duplicates) == 1
+    assert [(e.index, e.stage) for e in result.errors] == [(1, "parsing"), (2, "configuration")]
+
+    user = repository.get_or_create_user("TestPlayer")
+    assert user.bank_balance == Decimal("20")
+    cursor = repository.conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM user_balances WHERE user_name = 'Fisher'")
+    assert cursor.fetchone()[0] == 0
+
+    # Replaying the batch skips everything that was committed
+    replay = processor.process_batch(messages)
+    assert replay.processed == []
+    assert len(replay.duplicates) == 3
+
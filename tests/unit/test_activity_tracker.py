@@ -0,0 +1,161 @@
+"""Unit tests for the buffered user activity tracker."""
+
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import core.middleware.activity_tracker as activity_tracker
+from core.middleware.activity_tracker import ActivityBuffer, track_user_activity
+from database.database import Base, User
+
+
+@pytest.fixture
+def session_factory():
+    """Create an in-memory SQLite session factory shared with worker threads."""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        echo=False,
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def _users(session_factory):
+    db = session_factory()
+    try:
+        return {user.telegram_id: user for user in db.query(User).all()}
+    finally:
+        db.close()
+
+
+def _add_user(session_factory, telegram_id, last_activity=datetime(2023, 1, 1), **fields):
+    db = session_factory()
+    db.add(User(telegram_id=telegram_id, username=f"user_{telegram_id}", last_activity=last_activity, **fields))
+    db.commit()
+    db.close()
+
+
+@pytest.mark.asyncio
+async def test_record_does_not_touch_database():
+    """Test that recording activity only fills the in-memory buffer."""
+    factory = Mock(side_effect=AssertionError("unexpected DB session"))
+    buffer = ActivityBuffer(session_factory=factory)
+
+    buffer.record(1)
+    buffer.record(1)
+    buffer.record(2)
+
+    assert len(buffer) == 2
+    factory.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_flush_updates_existing_users_in_one_pass(session_factory):
+    """Test that a flush updates known users and never creates rows."""
+    _add_user(session_factory, 1, datetime(2024, 1, 1), balance=10)
+    _add_user(session_factory, 2)
+
+    buffer = ActivityBuffer(session_factory=session_factory)
+    seen = datetime(2024, 2, 1)
+    buffer.record(1, seen)
+    buffer.record(2, seen)
+    buffer.record(3, seen)
+
+    assert await buffer.flush() == 3
+    assert len(buffer) == 0
+
+    users = _users(session_factory)
+    assert set(users) == {1, 2}
+    assert users[1].last_activity == seen
+    assert users[1].balance == 10
+    assert users[2].last_activity == seen
+
+
+@pytest.mark.asyncio
+async def test_flush_never_moves_last_activity_backwards(session_factory):
+    """Test that an older buffered timestamp does not overwrite a newer one."""
+    newer = datetime(2024, 3, 1)
+    _add_user(session_factory, 1, newer)
+
+    buffer = ActivityBuffer(session_factory=session_factory)
+    buffer.record(1, newer - timedelta(days=1))
+    await buffer.flush()
+
+    assert _users(session_factory)[1].last_activity == newer
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_activity_for_retry(session_factory):
+    """Test that activity stays buffered when the write fails."""
+    _add_user(session_factory, 1)
+    seen = datetime(2024, 1, 1)
+    buffer = ActivityBuffer(session_factory=Mock(side_effect=RuntimeError("db down")))
+    buffer.record(1, seen)
+
+    assert await buffer.flush() == 0
+    assert len(buffer) == 1
+
+    buffer.session_factory = session_factory
+    assert await buffer.flush() == 1
+    assert _users(session_factory)[1].last_activity == seen
+
+
+@pytest.mark.asyncio
+async def test_max_users_triggers_background_flush(session_factory):
+    """Test that reaching max_users flushes before the interval elapses."""
+    _add_user(session_factory, 1)
+    _add_user(session_factory, 2)
+    buffer = ActivityBuffer(session_factory=session_factory, flush_interval=3600, max_users=2)
+    buffer.start()
+    try:
+        buffer.record(1)
+        buffer.record(2)
+        for _ in range(100):
+            if all(user.last_activity.year > 2023 for user in _users(session_factory).values()):
+                break
+            await asyncio.sleep(0.01)
+        assert all(user.last_activity.year > 2023 for user in _users(session_factory).values())
+    finally:
+        await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_ensure_user_creates_row_once(session_factory):
+    """Test that a new user is created immediately and then served from memory."""
+    buffer = ActivityBuffer(session_factory=session_factory)
+
+    await buffer.ensure_user(7, "carol")
+    assert _users(session_factory)[7].username == "carol"
+    assert _users(session_factory)[7].balance == 0
+
+    assert buffer.create_user(7, "carol") is False
+
+    buffer.session_factory = Mock(side_effect=AssertionError("unexpected DB session"))
+    await buffer.ensure_user(7, "carol")
+
+
+@pytest.mark.asyncio
+async def test_track_user_activity_creates_user_before_flush(session_factory, monkeypatch):
+    """Test that the middleware creates new users at once and buffers updates."""
+    buffer = ActivityBuffer(session_factory=session_factory, flush_interval=3600)
+    monkeypatch.setattr(activity_tracker, "activity_buffer", buffer)
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=5, username=None))
+
+    await track_user_activity(update, None)
+    await track_user_activity(SimpleNamespace(effective_user=None), None)
+    created = _users(session_factory)[5]
+    assert created.username == "user_5"
+    assert len(buffer) == 1
+
+    await activity_tracker.flush_user_activity()
+
+    assert _users(session_factory)[5].last_activity >= created.last_activity
+    assert len(buffer) == 0
@@ -0,0 +1,72 @@
+from hypothesis import given, settings, strategies as st
+
+from bot.ai.keyword_index import KeywordIndex
+from bot.ai.service import AiLiteService
+from bot.ai.knowledge import CANON_KNOWLEDGE
+from bot.ai.knowledge_updater import DynamicKnowledgeEntry
+
+
+def _naive_scores(items, text, weight):
+    scored = []
+    for item in items:
+        score = sum(weight(keyword) for keyword in item[1] if keyword in text)
+        if score:
+            scored.append((score, item))
+    return scored
+
+
+def test_index_finds_overlapping_and_nested_keywords() -> None:
+    items = [("a", ("he", "she")), ("b", ("his", "hers")), ("c", ("олег",)), ("d", ("олеговирус", "кто такой"))]
+    index = KeywordIndex(items, lambda item: item[1])
+
+    assert index.matched_keywords("ushers") == ["he", "she", "hers"]
+    assert index.score("кто такой олеговирус", len) == [(4, items[2]), (19, items[3])]
+
+
+def test_index_counts_repeated_keywords_like_linear_scan() -> None:
+    items = [("a", ("чай", "чай", "настой"))]
+    index = KeywordIndex(items, lambda item: item[1])
+
+    assert index.score("чай", len) == _naive_scores(items, "чай", len)
+
+
+@settings(max_examples=200, deadline=None)
+@given(
+    keyword_lists=st.lists(st.lists(st.text(alphabet="абвг ", min_size=1, max_size=4), max_size=4), max_size=6),
+    text=st.text(alphabet="абвг ", max_size=30),
+)
+def test_index_matches_linear_substring_scan(keyword_lists, text) -> None:
+    items = [(str(position), tuple(keywords)) for position, keywords in enumerate(keyword_lists)]
+    index = KeywordIndex(items, lambda item: item[1])
+
+    assert index.score(text, len) == _naive_scores(items, text, len)
+
+
+def test_service_index_agrees_with_linear_scan_on_canon() -> None:
+    service = AiLiteService()
+    entries = (*CANON_KNOWLEDGE, *service.dynamic_knowledge, *service.local_knowledge)
+
+    for entry in entries:
+        question = " ".join(entry.keywords[:2])
+        expected = [
+            (sum(len(k) for k in other.keywords if k in question), other)
+            for other in entries
+            if any(k in question for k in other.keywords)
+        ]
+        assert service._knowledge_index.score(question, len) == expected
+
+
+def test_reload_rebuilds_index(monkeypatch) -> None:
+    service = AiLiteService()
+    assert service._match_knowledge("зюзябрик") == []
+
+    entry = DynamicKnowledgeEntry(
+        title="runtime_test",
+        keywords=("зюзябрик",),
+        answer="ответ",
+        source="test",
+    )
+    monkeypatch.setattr("bot.ai.service.load_dynamic_knowledge", lambda: (entry,))
+    service.reload_dynamic_knowledge()
+
+    assert service._match_knowledge("что такое зюзябрик") == [entry]
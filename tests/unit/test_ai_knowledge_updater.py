@@ -0,0 +1,107 @@
+import asyncio
+import json
+
+from bot.ai import knowledge_updater
+from bot.ai.knowledge_updater import (
+    CANON_DOC_EXPORT_URL,
+    _Fetched,
+    load_dynamic_knowledge,
+    update_ai_knowledge_cache,
+)
+
+
+CHANNEL_URL = "https://t.me/s/testchannel"
+CANON_TEXT = """
+Канон Олеговируса
+🔵 Высокий канон: https://t.me/lucasteamgd/1
+🟡 Средний канон: https://t.me/lucasteamgd/2
+"""
+
+
+def _post_html(text: str) -> str:
+    return f'<div class="tgme_widget_message_text js-message_text">{text}</div>'
+
+
+class _FakeWeb:
+    """Stand-in for _fetch_conditional that honours ETag validators."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.pages = {
+            CANON_DOC_EXPORT_URL: CANON_TEXT,
+            CHANNEL_URL: _post_html("Новости канала про чайную религию"),
+            "https://t.me/s/lucasteamgd/1": _post_html("Высокий пост про Олеговирус"),
+            "https://t.me/s/lucasteamgd/2": _post_html("Средний пост про LTL-паразита"),
+        }
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, session, semaphore, url, previous):
+        async with semaphore:
+            self.requests.append((url, previous.get("etag")))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(self.delay)
+            self.in_flight -= 1
+        if url not in self.pages:
+            return _Fetched("failed")
+        etag = f'"{hash(self.pages[url])}"'
+        if previous.get("etag") == etag:
+            return _Fetched("unchanged")
+        return _Fetched("changed", text=self.pages[url], etag=etag)
+
+
+async def test_refresh_fetches_sources_concurrently(tmp_path, monkeypatch) -> None:
+    web = _FakeWeb(delay=0.05)
+    monkeypatch.setattr(knowledge_updater, "_fetch_conditional", web)
+    cache_path = tmp_path / "cache.json"
+
+    result = await update_ai_knowledge_cache(cache_path=cache_path, channel_url=CHANNEL_URL)
+
+    assert result.entries_count == 4
+    assert result.failed_urls == ()
+    assert web.max_in_flight == 2
+    titles = [entry.title for entry in load_dynamic_knowledge(cache_path)]
+    assert titles[:2] == ["runtime_canon_doc", "runtime_channel_lucasteamgd"]
+    assert "\n" not in cache_path.read_text(encoding="utf-8")
+
+
+async def test_unchanged_sources_use_validators_and_skip_rewrite(tmp_path, monkeypatch) -> None:
+    web = _FakeWeb()
+    monkeypatch.setattr(knowledge_updater, "_fetch_conditional", web)
+    cache_path = tmp_path / "cache.json"
+    first = await update_ai_knowledge_cache(cache_path=cache_path, channel_url=CHANNEL_URL)
+    written = cache_path.read_text(encoding="utf-8")
+    web.requests.clear()
+
+    def fail_extraction(*args, **kwargs):
+        raise AssertionError("unchanged source was re-extracted")
+
+    monkeypatch.setattr(knowledge_updater, "_entry_from_text", fail_extraction)
+    second = await update_ai_knowledge_cache(cache_path=cache_path, channel_url=CHANNEL_URL)
+
+    assert all(etag is not None for _url, etag in web.requests)
+    assert len(second.unchanged_urls) == 4
+    assert second.updated_at == first.updated_at
+    assert cache_path.read_text(encoding="utf-8") == written
+
+
+async def test_changed_source_is_reextracted_and_failed_source_kept(tmp_path, monkeypatch) -> None:
+    web = _FakeWeb()
+    monkeypatch.setattr(knowledge_updater, "_fetch_conditional", web)
+    cache_path = tmp_path / "cache.json"
+    await update_ai_knowledge_cache(cache_path=cache_path, channel_url=CHANNEL_URL)
+
+    web.pages[CHANNEL_URL] = _post_html("Свежий анонс турнира")
+    del web.pages["https://t.me/s/lucasteamgd/2"]
+    result = await update_ai_knowledge_cache(cache_path=cache_path, channel_url=CHANNEL_URL)
+
+    assert result.failed_urls == ("https://t.me/s/lucasteamgd/2",)
+    assert result.entries_count == 4
+    answers = {entry.title: entry.answer for entry in load_dynamic_knowledge(cache_path)}
+    assert "Свежий анонс турнира" in answers["runtime_channel_lucasteamgd"]
+    assert "LTL-паразита" in answers["runtime_t_me_lucasteamgd_2"]
+    payload = json.loads(cache_path.read_text(encoding="utf-8"))
+    assert set(payload["sources"]) == set(web.pages) | {"https://t.me/s/lucasteamgd/2"}
+    assert list(tmp_path.iterdir()) == [cache_path]
@@ -1,5 +1,10 @@
 """Tests for AI Model Manager."""
 
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 import httpx
@@ -9,6 +14,10 @@ from bot.ai.model_manager import (
     ProviderConfig,
     ProviderType,
     AIResponse,
+    CIRCUIT_FAILURE_THRESHOLD,
+    HEDGE_MIN_SAMPLES,
+    ProviderHealth,
+    close_ai_clients,
 )
 
 
@@ -184,7 +193,7 @@ async def test_get_response_hf_success(mock_env_hf_provider):
     mock_response.raise_for_status = MagicMock()
     
     with patch("httpx.AsyncClient") as mock_client:
-        mock_client.return_value.__aenter__.return_value.post = AsyncMock(
+        mock_client.return_value.post = AsyncMock(
             return_value=mock_response
         )
         
@@ -228,7 +237,7 @@ async def test_get_response_provider_failover(mock_env_multiple_providers):
             return mock_success_response
     
     with patch("httpx.AsyncClient") as mock_client:
-        mock_client.return_value.__aenter__.return_value.post = mock_post
+        mock_client.return_value.post = mock_post
         
         response = await manager.get_response("test prompt")
         
@@ -246,7 +255,7 @@ async def test_get_response_all_providers_fail(mock_env_hf_provider):
     mock_error_response.status_code = 500
     
     with patch("httpx.AsyncClient") as mock_client:
-        mock_client.return_value.__aenter__.return_value.post = AsyncMock(
+        mock_client.return_value.post = AsyncMock(
             side_effect=httpx.HTTPStatusError(
                 "Server error",
                 request=MagicMock(),
@@ -268,7 +277,7 @@ async def test_generate_sentence(mock_env_hf_provider):
     mock_response.raise_for_status = MagicMock()
     
     with patch("httpx.AsyncClient") as mock_client:
-        mock_client.return_value.__aenter__.return_value.post = AsyncMock(
+        mock_client.return_value.post = AsyncMock(
             return_value=mock_response
         )
         
@@ -277,6 +286,267 @@ async def test_generate_sentence(mock_env_hf_provider):
         assert sentence == "Кот спит"
         
         # Check that prompt includes theme
-        call_args = mock_client.return_value.__aenter__.return_value.post.call_args
+        call_args = mock_client.return_value.post.call_args
         payload = call_args[1]["json"]
         assert "животные" in payload["inputs"]
+
+
+class _OllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):  # noqa: N802
+        self.rfile.read(int(self.headers["Content-Length"]))
+        body = json.dumps({"response": "pong"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def local_ollama(monkeypatch):
+    """Local keep-alive server answering like Ollama's /api/generate."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _OllamaHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.delenv("AI_PROVIDERS", raising=False)
+    monkeypatch.delenv("GROQ_API_KEY", raising=False)
+    monkeypatch.delenv("HF_INFERENCE_TOKEN", raising=False)
+    monkeypatch.delenv("HF_TOKEN", raising=False)
+    monkeypatch.delenv("OPENROUTER_API_KEY", raising=False)
+    monkeypatch.setenv("OLLAMA_ENABLED", "true")
+    monkeypatch.setenv("OLLAMA_ENDPOINT", f"http://127.0.0.1:{server.server_address[1]}")
+    yield
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.asyncio
+async def test_provider_client_is_pooled(local_ollama):
+    """Test that requests to one provider reuse a keep-alive connection."""
+    manager = AIModelManager()
+    try:
+        for i in range(3):
+            response = await manager.get_response(f"ping {i}")
+            assert response.text == "pong"
+
+        stats = manager.get_timing_stats()["ollama"]
+        assert stats["requests"] == 3
+        assert stats["new_connections"] == 1
+        assert 0 < stats["avg_ttfb"] <= stats["avg_total"]
+    finally:
+        await manager.aclose()
+
+
+@pytest.mark.asyncio
+async def test_close_ai_clients_closes_pooled_clients(mock_env_hf_provider):
+    """Test that shutdown closes clients and the next call opens a new one."""
+    manager = AIModelManager()
+    mock_response = MagicMock()
+    mock_response.json.return_value = [{"generated_text": "AI response"}]
+
+    with patch("httpx.AsyncClient") as mock_client:
+        mock_client.return_value.post = AsyncMock(return_value=mock_response)
+        mock_client.return_value.aclose = AsyncMock()
+
+        await manager.get_response("first")
+        await manager.get_response("second")
+        assert mock_client.call_count == 1
+
+        await close_ai_clients()
+        mock_client.return_value.aclose.assert_awaited_once()
+
+        await manager.get_response("third")
+        assert mock_client.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_client_replaced_on_new_loop_is_closed(mock_env_hf_provider):
+    """Test that a client left behind by a loop change is closed on its own loop."""
+    manager = AIModelManager()
+    provider = manager.providers[0]
+
+    old_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=old_loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        async def make_client():
+            return manager._client(provider)
+
+        old_client = asyncio.run_coroutine_threadsafe(make_client(), old_loop).result(timeout=5)
+        new_client = manager._client(provider)
+
+        assert new_client is not old_client
+        for _ in range(100):
+            if old_client.is_closed:
+                break
+            await asyncio.sleep(0.01)
+        assert old_client.is_closed
+        assert not new_client.is_closed
+    finally:
+        old_loop.call_soon_threadsafe(old_loop.stop)
+        thread.join(timeout=5)
+        old_loop.close()
+        await manager.aclose()
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_takes_first_answer(mock_env_multiple_providers):
+    """Test that a slow primary is hedged after its p90 and the fast answer wins."""
+    manager = AIModelManager()
+    for _ in range(HEDGE_MIN_SAMPLES):
+        manager._health(manager.providers[0]).record_success(0.05)
+
+    async def slow_hf(provider, prompt):
+        await asyncio.sleep(5)
+        return "slow"
+
+    async def fast_openrouter(provider, prompt):
+        return "fast"
+
+    manager._call_huggingface = slow_hf
+    manager._call_openrouter = fast_openrouter
+
+    response = await asyncio.wait_for(manager.get_response("hedge me"), timeout=1)
+
+    assert response.text == "fast"
+    assert response.provider == "openrouter"
+    assert manager.hedges == 1
+
+
+@pytest.mark.asyncio
+async def test_no_hedging_without_latency_history(mock_env_multiple_providers):
+    """Test that the primary is awaited when its p90 is unknown."""
+    manager = AIModelManager()
+    calls = []
+
+    async def hf(provider, prompt):
+        calls.append("hf")
+        await asyncio.sleep(0.05)
+        return "hf answer"
+
+    async def openrouter(provider, prompt):
+        calls.append("openrouter")
+        return "openrouter answer"
+
+    manager._call_huggingface = hf
+    manager._call_openrouter = openrouter
+
+    response = await manager.get_response("no hedge")
+
+    assert response.provider == "hf"
+    assert calls == ["hf"]
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_skips_failing_provider(mock_env_multiple_providers):
+    """Test that a provider with an open circuit is tried last."""
+    manager = AIModelManager()
+    calls = []
+
+    async def failing_hf(provider, prompt):
+        calls.append("hf")
+        raise httpx.ConnectError("down")
+
+    async def openrouter(provider, prompt):
+        calls.append("openrouter")
+        return "ok"
+
+    manager._call_huggingface = failing_hf
+    manager._call_openrouter = openrouter
+
+    for i in range(CIRCUIT_FAILURE_THRESHOLD):
+        await manager.get_response(f"prompt {i}", preferred_provider="hf")
+    assert calls.count("hf") == CIRCUIT_FAILURE_THRESHOLD
+
+    calls.clear()
+    response = await manager.get_response("after circuit opened", preferred_provider="hf")
+
+    assert response.provider == "openrouter"
+    assert calls == ["openrouter"]
+    assert manager.get_health_stats()["hf"]["circuit_open"] is True
+
+
+@pytest.mark.asyncio
+async def test_auth_error_opens_circuit_immediately(mock_env_multiple_providers):
+    """Test that 401/403 open the circuit after a single failure."""
+    manager = AIModelManager()
+    error_response = MagicMock()
+    error_response.status_code = 401
+
+    async def unauthorized(provider, prompt):
+        raise httpx.HTTPStatusError("Unauthorized", request=MagicMock(), response=error_response)
+
+    async def openrouter(provider, prompt):
+        return "ok"
+
+    manager._call_huggingface = unauthorized
+    manager._call_openrouter = openrouter
+
+    await manager.get_response("first")
+
+    assert manager.get_health_stats()["hf"]["circuit_open"] is True
+    assert [p.name for p in manager._order_providers(None)] == ["openrouter", "hf"]
+
+
+def test_half_open_circuit_lets_one_probe_through():
+    """Test that after the cooldown only one probe passes until it reports."""
+    health = ProviderHealth(prior_latency=1.0)
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        health.record_failure(0.0)
+    reopen_at = health.open_until
+
+    assert not health.allows_request(reopen_at - 1)
+    assert health.allows_request(reopen_at)
+    assert health.start_request(reopen_at) is True
+    assert not health.allows_request(reopen_at)
+    assert health.start_request(reopen_at) is False
+
+    health.record_failure(reopen_at, probe=True)
+    assert health.open_until > reopen_at
+    assert health.start_request(health.open_until) is True
+    health.end_probe()
+    assert health.start_request(health.open_until) is True
+    health.record_success(0.1)
+    assert health.allows_request(0.0)
+    assert health.start_request(0.0) is False
+
+
+@pytest.mark.asyncio
+async def test_half_open_probe_keeps_circuit_open_for_other_requests(mock_env_multiple_providers):
+    """Test that concurrent requests skip a provider while its probe is in flight."""
+    manager = AIModelManager()
+    hf_health = manager._health(manager.providers[0])
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        hf_health.record_failure(0.0)
+    hf_health.open_until = 1.0  # cooldown already over
+    release = asyncio.Event()
+    calls = []
+
+    async def hf(provider, prompt):
+        calls.append("hf")
+        await release.wait()
+        return "hf answer"
+
+    async def openrouter(provider, prompt):
+        calls.append("openrouter")
+        return "openrouter answer"
+
+    manager._call_huggingface = hf
+    manager._call_openrouter = openrouter
+
+    probe = asyncio.create_task(manager.get_response("probe", preferred_provider="hf"))
+    await asyncio.sleep(0)
+    other = await manager.get_response("other", preferred_provider="hf")
+
+    assert other.provider == "openrouter"
+    assert calls == ["hf", "openrouter"]
+    assert manager.get_health_stats()["hf"]["circuit_open"] is True
+
+    release.set()
+    assert (await probe).provider == "hf"
+    assert manager.get_health_stats()["hf"]["circuit_open"] is False
@@ -0,0 +1,148 @@
+"""Tests for the AI response cache."""
+
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from bot.ai.model_manager import AIModelManager
+from bot.ai.response_cache import (
+    PERSISTENT_KEY_PREFIX,
+    ResponseCache,
+    make_cache_key,
+    persistent_tier_from_settings,
+)
+from core.managers.sticker_rate_limiter import StickerRateLimiter
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _FakeRedis:
+    """In-memory stand-in with RedisCache's get/set interface."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ttl=0):
+        self.data[key] = value
+
+
+def test_key_covers_full_prompt_model_and_max_tokens():
+    """Test that keys differ past character 100 and by model/max_tokens."""
+    base = "x" * 150
+    assert make_cache_key(base + "a") != make_cache_key(base + "b")
+    assert make_cache_key("hi", model="m1") != make_cache_key("hi", model="m2")
+    assert make_cache_key("hi", max_tokens=50) != make_cache_key("hi", max_tokens=100)
+    assert make_cache_key("hi", user_id=1) != make_cache_key("hi", user_id=2)
+
+
+def test_key_normalizes_whitespace():
+    """Test that formatting-only differences share an entry."""
+    assert make_cache_key("  Кто  такой\nОлег? ") == make_cache_key("Кто такой Олег?")
+
+
+def test_lru_evicts_least_recently_used():
+    """Test that the entry limit evicts in LRU order."""
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    cache.get("a")
+    cache.set("c", "C")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_byte_limit_evicts_until_under_budget():
+    """Test that total size stays within max_bytes."""
+    cache = ResponseCache(max_bytes=10)
+    cache.set("a", "12345")
+    cache.set("b", "12345")
+    cache.set("c", "123")
+
+    assert cache.get("a") is None
+    assert cache.get_stats()["bytes"] == 8
+    cache.set("huge", "x" * 11)
+    assert cache.get("huge") is None
+
+
+def test_ttl_expires_entries():
+    """Test that entries expire after the TTL."""
+    clock = _Clock()
+    cache = ResponseCache(ttl=10, clock=clock)
+    cache.set("a", "A")
+    clock.now += 11
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
+    assert cache.get_stats()["expirations"] == 1
+
+
+def test_hit_rate():
+    """Test hit-rate metric."""
+    cache = ResponseCache()
+    cache.set("a", "A")
+    cache.get("a")
+    cache.get("a")
+    cache.get("missing")
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == pytest.approx(2 / 3)
+
+
+@pytest.mark.asyncio
+async def test_persistent_tier_survives_restart():
+    """Test that a new cache instance is served from the persistent tier."""
+    store = _FakeRedis()
+    await ResponseCache(persistent=store).aset("key", "answer")
+    assert store.data[PERSISTENT_KEY_PREFIX + "key"] == "answer"
+
+    restarted = ResponseCache(persistent=store)
+    assert await restarted.aget("key") == "answer"
+    assert restarted.get("key") == "answer"
+    assert restarted.get_stats()["persistent_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_manager_long_prompts_do_not_collide(monkeypatch):
+    """Test that prompts sharing the first 100 characters get their own answers."""
+    monkeypatch.setenv("AI_PROVIDERS", '[{"name": "groq", "type": "groq", "model": "m"}]')
+    manager = AIModelManager()
+    prefix = "Расскажи подробно " * 10
+    answers = iter(["first", "second"])
+
+    async def groq(provider, prompt):
+        return next(answers)
+
+    manager._call_groq = groq
+
+    assert (await manager.get_response(prefix + "про чай")).text == "first"
+    assert (await manager.get_response(prefix + "про кофе")).text == "second"
+    cached = await manager.get_response(prefix + "про чай")
+    assert cached.cached is True
+    assert cached.text == "first"
+    assert manager.get_cache_stats()["hits"] == 1
+
+
+def test_ai_cache_and_sticker_limiter_share_redis_settings():
+    """Test that both Redis users read CACHE_BACKEND/REDIS_URL from the same settings."""
+    settings = SimpleNamespace(CACHE_BACKEND="redis", REDIS_URL="redis://cache.internal:6390/3")
+    with patch("utils.redis_cache.RedisCache.from_url") as from_url:
+        assert persistent_tier_from_settings(settings) is from_url.return_value
+        StickerRateLimiter.from_settings(None, 5, 60.0, settings)
+
+    assert [c.args[0] for c in from_url.call_args_list] == [settings.REDIS_URL] * 2
+    assert persistent_tier_from_settings(SimpleNamespace(CACHE_BACKEND="memory")) is None
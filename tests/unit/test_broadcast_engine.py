@@ -0,0 +1,156 @@
+"""Unit tests for the streaming broadcast engine."""
+
+import time
+from datetime import timedelta
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from telegram.error import Forbidden, RetryAfter
+
+from core.services.broadcast_engine import (
+    BroadcastEngine,
+    TokenBucket,
+    message_fingerprint,
+    retry_after_seconds,
+)
+from database.database import Base, BroadcastJob, User
+
+
+@pytest.fixture
+def db():
+    """In-memory database session with five users."""
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([User(telegram_id=telegram_id) for telegram_id in (5, 1, 4, 2, 3)])
+    session.add(User(telegram_id=None, username="no_telegram"))
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def bot():
+    bot = Mock()
+    bot.send_message = AsyncMock()
+    return bot
+
+
+def _engine(db, bot, **kwargs):
+    kwargs.setdefault("bucket", TokenBucket(rate=10_000))
+    kwargs.setdefault("per_chat_interval", 0)
+    return BroadcastEngine(db, bot, **kwargs)
+
+
+def _sent_to(bot):
+    return [call.kwargs["chat_id"] for call in bot.send_message.call_args_list]
+
+
+def test_recipients_are_streamed_in_keyset_pages(db, bot):
+    engine = _engine(db, bot, page_size=2)
+
+    assert list(engine.iter_recipient_pages()) == [[1, 2], [3, 4], [5]]
+    assert list(engine.iter_recipient_pages(after=3)) == [[4, 5]]
+    assert engine.count_recipients() == 5
+
+
+@pytest.mark.asyncio
+async def test_run_sends_to_everyone_and_completes_job(db, bot):
+    result = await _engine(db, bot, page_size=2).run("hello", sender_id=1)
+
+    assert sorted(_sent_to(bot)) == [1, 2, 3, 4, 5]
+    assert (result.total_users, result.successful_sends, result.failed_sends) == (5, 5, 0)
+    assert result.messages_per_second > 0
+
+    job = db.query(BroadcastJob).one()
+    assert (job.status, job.last_telegram_id, job.successful_sends) == ("completed", 5, 5)
+
+
+@pytest.mark.asyncio
+async def test_interrupted_job_resumes_after_last_page(db, bot):
+    db.add(BroadcastJob(
+        sender_id=1,
+        message_hash=message_fingerprint("hello", "HTML"),
+        status="running",
+        last_telegram_id=2,
+        total_users=5,
+        successful_sends=1,
+        failed_sends=1,
+    ))
+    db.commit()
+
+    result = await _engine(db, bot, page_size=2).run("hello", sender_id=1)
+
+    assert sorted(_sent_to(bot)) == [3, 4, 5]
+    assert (result.successful_sends, result.failed_sends) == (4, 1)
+    assert db.query(BroadcastJob).one().status == "completed"
+
+
+@pytest.mark.asyncio
+async def test_different_message_starts_new_job(db, bot):
+    db.add(BroadcastJob(
+        sender_id=1, message_hash=message_fingerprint("old", "HTML"), status="running", last_telegram_id=4
+    ))
+    db.commit()
+
+    await _engine(db, bot).run("new", sender_id=1)
+
+    assert sorted(_sent_to(bot)) == [1, 2, 3, 4, 5]
+
+
+@pytest.mark.asyncio
+async def test_failures_are_counted_and_reported(db, bot):
+    async def send_message(chat_id, **kwargs):
+        if chat_id == 3:
+            raise Forbidden("blocked")
+
+    bot.send_message.side_effect = send_message
+
+    result = await _engine(db, bot).run("hello", sender_id=1)
+
+    assert (result.successful_sends, result.failed_sends) == (4, 1)
+    assert result.errors == ["3: bot blocked by user"]
+
+
+@pytest.mark.asyncio
+async def test_retry_after_pauses_and_does_not_spend_attempts(db, bot):
+    bot.send_message.side_effect = [RetryAfter(0), None]
+    engine = _engine(db, bot, max_retries=1)
+    engine.bucket.pause = Mock(wraps=engine.bucket.pause)
+
+    assert await engine.send(1, "hello") is True
+    assert bot.send_message.call_count == 2
+    engine.bucket.pause.assert_called_once_with(0.0)
+
+
+def test_retry_after_seconds_accepts_timedelta():
+    error = Mock(retry_after=timedelta(seconds=7))
+    assert retry_after_seconds(error) == 7.0
+    assert retry_after_seconds(RetryAfter(3)) == 3.0
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_rate_and_honours_pause():
+    bucket = TokenBucket(rate=100, capacity=1)
+
+    started = time.monotonic()
+    for _ in range(5):
+        await bucket.acquire()
+    assert time.monotonic() - started >= 0.035
+
+    bucket.pause(0.05)
+    started = time.monotonic()
+    await bucket.acquire()
+    assert time.monotonic() - started >= 0.045
+
+
+@pytest.mark.asyncio
+async def test_same_chat_is_spaced_by_per_chat_interval(db, bot):
+    engine = _engine(db, bot, per_chat_interval=0.05)
+
+    started = time.monotonic()
+    await engine.send(1, "a")
+    await engine.send(1, "b")
+    assert time.monotonic() - started >= 0.045
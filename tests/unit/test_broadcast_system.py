@@ -5,11 +5,12 @@ Tests for BroadcastSystem class
 import pytest
 import asyncio
 from unittest.mock import Mock, AsyncMock, patch
-from sqlalchemy.orm import Session
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
 
 from core.systems.broadcast_system import BroadcastSystem
 from core.models.advanced_models import BroadcastResult, NotificationResult
-from database.database import User
+from database.database import Base, User
 from src.config import settings
 
 
@@ -38,6 +39,15 @@ class TestBroadcastSystem:
         """BroadcastSystem instance for testing"""
         return BroadcastSystem(mock_db, mock_bot, mock_admin_system)
 
+    @pytest.fixture
+    def sqlite_db(self):
+        """In-memory database session for broadcasts, which stream recipients with real queries"""
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(bind=engine)
+        session = sessionmaker(bind=engine)()
+        yield session
+        session.close()
+
     @pytest.fixture
     def sample_users(self):
         """Sample users for testing"""
@@ -48,13 +58,12 @@ class TestBroadcastSystem:
         ]
 
     @pytest.mark.asyncio
-    async def test_broadcast_to_all_success(self, broadcast_system, mock_db, mock_bot, sample_users):
+    async def test_broadcast_to_all_success(self, sqlite_db, mock_bot, sample_users):
         """Test successful broadcast to all users"""
         # Setup
-        mock_db.query.return_value.filter.return_value.all.return_value = sample_users
-        mock_db.query.return_value.filter.return_value.first.return_value = User(
-            id=999, telegram_id=999, first_name="Sender"
-        )
+        sqlite_db.add_all(sample_users)
+        sqlite_db.commit()
+        broadcast_system = BroadcastSystem(sqlite_db, mock_bot)
 
         # Execute
         result = await broadcast_system.broadcast_to_all("Test message", 999)
@@ -67,10 +76,10 @@ class TestBroadcastSystem:
         assert mock_bot.send_message.call_count == 3
 
     @pytest.mark.asyncio
-    async def test_broadcast_to_all_no_users(self, broadcast_system, mock_db):
+    async def test_broadcast_to_all_no_users(self, sqlite_db, mock_bot):
         """Test broadcast when no users exist"""
         # Setup
-        mock_db.query.return_value.filter.return_value.all.return_value = []
+        broadcast_system = BroadcastSystem(sqlite_db, mock_bot)
 
         # Execute
         result = await broadcast_system.broadcast_to_all("Test message", 999)
@@ -83,13 +92,12 @@ class TestBroadcastSystem:
         assert "No registered users found" in result.errors
 
     @pytest.mark.asyncio
-    async def test_mention_all_users_success(self, broadcast_system, mock_db, mock_bot, sample_users):
+    async def test_mention_all_users_success(self, sqlite_db, mock_bot, sample_users):
         """Test successful mention-all broadcast"""
         # Setup
-        mock_db.query.return_value.filter.return_value.all.return_value = sample_users
-        mock_db.query.return_value.filter.return_value.first.return_value = User(
-            id=999, telegram_id=999, first_name="Sender"
-        )
+        sqlite_db.add_all(sample_users)
+        sqlite_db.commit()
+        broadcast_system = BroadcastSystem(sqlite_db, mock_bot)
 
         # Execute
         result = await broadcast_system.mention_all_users("Test mention message", 999)
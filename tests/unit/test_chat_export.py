@@ -0,0 +1,102 @@
+"""Unit tests for the streaming chat-export backfill."""
+
+from unittest.mock import Mock
+
+import pytest
+
+from src.chat_export import (
+    BackfillCheckpoint,
+    ChatExportBackfill,
+    find_export_files,
+    iter_export_messages,
+)
+from src.message_processor import BatchResult
+
+CARD = "🃏 НОВАЯ КАРТА 🃏<br>Игрок: {name}<br>Очки: +5"
+
+
+def _message(export_id: int, text: str, sender: str = None, joined: bool = False) -> str:
+    classes = "message default clearfix" + (" joined" if joined else "")
+    from_name = f'<div class="from_name">\n{sender} \n</div>' if sender else ""
+    return f"""
+     <div class="{classes}" id="message{export_id}">
+      <div class="body">
+       <div class="pull_right date details" title="27.05.2025 10:47:39 UTC+03:00">10:47</div>
+       {from_name}
+       <div class="text">
+{text}
+       </div>
+      </div>
+     </div>"""
+
+
+def _export(tmp_path, name: str, messages: list) -> None:
+    body = '<div class="message service" id="message-1"><div class="body details">27 May</div></div>'
+    body += "".join(messages)
+    (tmp_path / name).write_text(
+        f'<html><body><div class="history">{body}</div></body></html>', encoding="utf-8"
+    )
+
+
+def test_streams_messages_across_chunk_boundaries(tmp_path):
+    _export(tmp_path, "messages.html", [
+        _message(10, CARD.format(name="Luke"), sender="GDcards"),
+        _message(11, "Tom &amp; <a href=''>Jerry</a>", joined=True),
+    ])
+
+    messages = list(iter_export_messages(tmp_path / "messages.html", chunk_size=7))
+
+    assert [m.export_id for m in messages] == ["10", "11"]
+    assert messages[0].text == "🃏 НОВАЯ КАРТА 🃏\nИгрок: Luke\nОчки: +5"
+    assert messages[0].timestamp.isoformat() == "2025-05-27T10:47:39+03:00"
+    assert messages[1].sender == "GDcards"  # joined message inherits the sender
+    assert messages[1].text == "Tom & Jerry"
+    assert messages[1].idempotency_key == "tg-export:11"
+
+
+def test_find_export_files_uses_page_order(tmp_path):
+    for name in ("messages10.html", "messages2.html", "messages.html", "other.html"):
+        (tmp_path / name).write_text("", encoding="utf-8")
+
+    assert [p.name for p in find_export_files(tmp_path)] == [
+        "messages.html", "messages2.html", "messages10.html",
+    ]
+
+
+def test_backfill_batches_game_messages_and_resumes(tmp_path):
+    _export(tmp_path, "messages.html", [
+        _message(1, CARD.format(name="A"), sender="GDcards"),
+        _message(2, "hello", sender="Luke"),
+        _message(3, CARD.format(name="B"), sender="GDcards"),
+    ])
+    _export(tmp_path, "messages2.html", [_message(4, CARD.format(name="C"), sender="GDcards")])
+    checkpoint_path = tmp_path / "checkpoint.json"
+    processor = Mock()
+
+    # Simulate a crash while applying the second file
+    def crash_on_second_file(msgs, message_ids):
+        if message_ids == ["tg-export:4"]:
+            raise RuntimeError("db down")
+        return BatchResult(processed=list(message_ids))
+
+    processor.process_batch.side_effect = crash_on_second_file
+    backfill = ChatExportBackfill(processor, checkpoint_path=checkpoint_path, batch_size=1)
+    files = find_export_files(tmp_path)
+    with pytest.raises(RuntimeError):
+        backfill.run(files)
+
+    checkpoint = BackfillCheckpoint.load(checkpoint_path)
+    assert checkpoint.completed_files == ["messages.html"]
+    assert [c.kwargs["message_ids"] for c in processor.process_batch.call_args_list] == [
+        ["tg-export:1"], ["tg-export:3"], ["tg-export:4"],
+    ]
+
+    processor.process_batch.reset_mock(side_effect=True)
+    processor.process_batch.side_effect = lambda msgs, message_ids: BatchResult(processed=list(message_ids))
+    stats = backfill.run(files)
+
+    processor.process_batch.assert_called_once()
+    assert processor.process_batch.call_args.kwargs["message_ids"] == ["tg-export:4"]
+    assert stats.messages == 1
+    assert stats.processed == 1
+    assert BackfillCheckpoint.load(checkpoint_path).completed_files == ["messages.html", "messages2.html"]
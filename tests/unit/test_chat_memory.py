@@ -0,0 +1,143 @@
+"""Tests for the token-budgeted AI chat memory."""
+
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from common.chat_memory import (
+    CHAT_MEMORY_DDL,
+    CHAT_MEMORY_INDEX_DDL,
+    PRUNE_INTERVAL_SECONDS,
+    RETENTION_SECONDS,
+    ChatMemory,
+    SqlChatMemoryStore,
+    estimate_tokens,
+)
+
+
+def _engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    with engine.begin() as conn:
+        conn.execute(text(CHAT_MEMORY_DDL))
+        conn.execute(text(CHAT_MEMORY_INDEX_DDL))
+    return engine
+
+
+def test_ring_buffers_keep_latest_messages() -> None:
+    memory = ChatMemory(personal_limit=3, global_limit=4)
+    for i in range(5):
+        memory.add(1, ("user", f"u{i}"))
+    memory.add(2, ("user", "other"))
+
+    assert [m["content"] for m in memory.personal(1)] == ["u2", "u3", "u4"]
+    assert [m["content"] for m in memory.global_history()] == ["u2", "u3", "u4", "other"]
+
+
+def test_context_fits_token_budget_newest_first() -> None:
+    memory = ChatMemory()
+    for i in range(10):
+        memory.add(1, ("user", f"вопрос {i} " + "x" * 60), ("assistant", f"ответ {i} " + "y" * 60))
+
+    context = memory.context(1, token_budget=200)
+
+    assert sum(estimate_tokens(m["content"]) for m in context) <= 200
+    assert context[-1]["content"].startswith("ответ 9")
+    assert len(context) < 10
+
+
+def test_context_limits_global_share_and_skips_own_messages() -> None:
+    memory = ChatMemory()
+    memory.add(1, ("user", "мой вопрос"), ("assistant", "мой ответ"))
+    for i in range(20):
+        memory.add(2, ("user", f"чужое сообщение {i} " + "z" * 90))
+
+    context = memory.context(1, token_budget=300)
+    contents = [m["content"] for m in context]
+
+    assert contents[-2:] == ["мой вопрос", "мой ответ"]
+    assert contents.count("мой вопрос") == 1
+    shared = contents[:-2]
+    assert 0 < len(shared) < 20
+    assert sum(estimate_tokens(c) for c in shared) <= 300 * 0.3
+    assert shared[-1].startswith("чужое сообщение 19")
+
+
+def test_history_survives_restart_with_store() -> None:
+    engine = _engine()
+    memory = ChatMemory(store=SqlChatMemoryStore(lambda: engine))
+    memory.add(1, ("user", "привет"), ("assistant", "здравствуй"))
+    memory.add(2, ("user", "чай?"))
+
+    restarted = ChatMemory(store=SqlChatMemoryStore(lambda: engine))
+
+    assert restarted.personal(1) == [
+        {"role": "user", "content": "привет"},
+        {"role": "assistant", "content": "здравствуй"},
+    ]
+    assert [m["content"] for m in restarted.global_history()] == ["привет", "здравствуй", "чай?"]
+
+
+def test_store_errors_do_not_break_memory() -> None:
+    def broken_engine():
+        raise RuntimeError("db down")
+
+    memory = ChatMemory(store=SqlChatMemoryStore(broken_engine))
+    memory.add(1, ("user", "привет"))
+
+    assert memory.context(1) == [{"role": "user", "content": "привет"}]
+
+
+def test_slow_user_load_does_not_block_other_users() -> None:
+    engine = _engine()
+    store = SqlChatMemoryStore(lambda: engine)
+    memory = ChatMemory(store)
+    memory.add(2, ("user", "warm"))
+    started, release = threading.Event(), threading.Event()
+    load_user = store.load_user
+
+    def slow_load_user(user_id, limit):
+        if user_id == 1:
+            started.set()
+            release.wait(5)
+        return load_user(user_id, limit)
+
+    store.load_user = slow_load_user
+    slow = threading.Thread(target=memory.context, args=(1,))
+    slow.start()
+    try:
+        assert started.wait(5)
+        fast = threading.Thread(target=memory.add, args=(2, ("user", "fast")))
+        fast.start()
+        fast.join(1)
+        assert not fast.is_alive()
+        assert [m["content"] for m in memory.personal(2)] == ["warm", "fast"]
+    finally:
+        release.set()
+        slow.join(5)
+
+
+def test_store_prunes_on_first_write_and_then_by_interval() -> None:
+    engine = _engine()
+    expired = time.time_ns() - (RETENTION_SECONDS + 60) * 1_000_000_000
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO ai_chat_memory VALUES (:seq, 1, 'user', 'old')"), {"seq": expired})
+    now = [0.0]
+    store = SqlChatMemoryStore(lambda: engine, clock=lambda: now[0])
+
+    def count() -> int:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT COUNT(*) FROM ai_chat_memory")).scalar()
+
+    store.append([(1, "user", "new")])
+    assert count() == 1
+
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO ai_chat_memory VALUES (:seq, 1, 'user', 'old')"), {"seq": expired})
+    store.append([(1, "user", "newer")])
+    assert count() == 3
+
+    now[0] += PRUNE_INTERVAL_SECONDS
+    store.append([(1, "user", "newest")])
+    assert count() == 3
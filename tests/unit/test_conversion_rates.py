@@ -0,0 +1,52 @@
+"""Tests for the shared conversion rate cache."""
+
+from decimal import Decimal
+from unittest.mock import Mock
+
+from common.conversion_rates import ConversionRateCache
+
+ROWS = [
+    ("gdcards", "orbs", Decimal("2.5")),
+    ("shmalala", "money", 1.5),
+    ("shmalala", "karma", Decimal("0.5")),
+]
+
+
+def test_loads_all_rates_once_within_ttl() -> None:
+    cache = ConversionRateCache(ttl=60)
+    loader = Mock(return_value=ROWS)
+
+    assert cache.get("gdcards", "orbs", loader=loader) == Decimal("2.5")
+    assert cache.get("shmalala", "karma", loader=loader) == Decimal("0.5")
+    assert cache.get("unknown", loader=loader) is None
+
+    loader.assert_called_once()
+    assert cache.stats["hits"] == 2
+
+
+def test_bot_only_lookup_returns_first_rate() -> None:
+    cache = ConversionRateCache()
+
+    assert cache.get("shmalala", loader=lambda: ROWS) == Decimal("1.5")
+
+
+def test_invalidate_forces_reload() -> None:
+    cache = ConversionRateCache(ttl=60)
+    loader = Mock(return_value=ROWS)
+    cache.get("gdcards", "orbs", loader=loader)
+
+    loader.return_value = [("gdcards", "orbs", Decimal("3.0"))]
+    cache.invalidate()
+
+    assert cache.get("gdcards", "orbs", loader=loader) == Decimal("3.0")
+    assert loader.call_count == 2
+
+
+def test_expired_ttl_reloads() -> None:
+    cache = ConversionRateCache(ttl=0)
+    loader = Mock(return_value=ROWS)
+
+    cache.get("gdcards", "orbs", loader=loader)
+    cache.get("gdcards", "orbs", loader=loader)
+
+    assert loader.call_count == 2
@@ -1,10 +1,11 @@
 """Unit tests for IdempotencyChecker class."""
 
 import pytest
-from datetime import datetime
+from datetime import datetime, timedelta
+from unittest.mock import Mock
 from decimal import Decimal
 
-from src.idempotency import IdempotencyChecker
+from src.idempotency import DEFAULT_RETENTION, IdempotencyChecker
 from src.repository import SQLiteRepository
 
 
@@ -143,3 +144,122 @@ def test_multiple_messages_tracked_independently(idempotency_checker):
     # Both should now be processed
     assert idempotency_checker.is_processed(id1)
     assert idempotency_checker.is_processed(id2)
+
+
+def test_bloom_filter_answers_unseen_ids_without_database(temp_db):
+    """Test that an exclusive writer rejects never stored IDs by the Bloom filter."""
+    temp_db.store_message_id("stored")
+    checker = IdempotencyChecker(temp_db, exclusive_writer=True)
+    temp_db.message_id_exists = Mock(side_effect=AssertionError("unexpected DB lookup"))
+    temp_db.filter_processed_message_ids = Mock(side_effect=AssertionError("unexpected DB lookup"))
+
+    assert checker.is_processed("never-seen") is False
+    assert checker.filter_processed(["a", "b", "c"]) == set()
+    assert checker.stats["bloom_rejects"] == 4
+
+
+def test_shared_writer_skips_bloom_filter(temp_db):
+    """Test that a checker sharing the table neither loads nor trusts a Bloom filter."""
+    temp_db.iter_processed_message_ids = Mock(side_effect=AssertionError("unexpected table scan"))
+    checker = IdempotencyChecker(temp_db)
+    temp_db.store_message_id("other-writer")
+    temp_db.store_message_id("other-batch")
+
+    assert checker._bloom is None
+    assert checker.is_processed("other-writer") is True
+    assert checker.filter_processed(["other-batch", "new"]) == {"other-batch"}
+    assert checker.stats["bloom_rejects"] == 0
+
+
+def test_hot_tier_answers_recent_ids_without_database(idempotency_checker, temp_db):
+    """Test that recently marked IDs are answered from the in-memory LRU."""
+    idempotency_checker.mark_processed("recent")
+    temp_db.message_id_exists = Mock(side_effect=AssertionError("unexpected DB lookup"))
+
+    assert idempotency_checker.is_processed("recent") is True
+    assert idempotency_checker.filter_processed(["recent"]) == {"recent"}
+
+
+def test_existing_ids_are_loaded_at_startup(temp_db):
+    """Test that IDs stored before the checker was created are still detected."""
+    temp_db.store_message_id("before")
+
+    checker = IdempotencyChecker(temp_db)
+
+    assert checker.is_processed("before") is True
+    assert checker.filter_processed(["before", "after"]) == {"before"}
+
+
+def test_hot_tier_is_bounded(temp_db):
+    """Test that the LRU evicts the least recently used ID."""
+    checker = IdempotencyChecker(temp_db, hot_capacity=2)
+    for message_id in ("a", "b", "c"):
+        checker.mark_processed(message_id)
+
+    assert list(checker._recent) == ["b", "c"]
+    # Evicted IDs are still found in the table
+    assert checker.is_processed("a") is True
+
+
+def test_forget_drops_rolled_back_ids(temp_db):
+    """Test that rolled back IDs are no longer reported as processed."""
+    checker = IdempotencyChecker(temp_db)
+    temp_db.begin_transaction()
+    checker.mark_processed("rolled-back")
+    temp_db.rollback_transaction()
+    checker.forget(["rolled-back"])
+
+    assert checker.is_processed("rolled-back") is False
+
+
+def test_bloom_filter_grows_past_capacity(temp_db):
+    """Test that the Bloom filter is rebuilt larger when it fills up."""
+    checker = IdempotencyChecker(temp_db, bloom_capacity=10, exclusive_writer=True)
+    for i in range(25):
+        checker.mark_processed(f"msg_{i}")
+
+    assert checker._bloom.capacity >= 25
+    assert all(checker.is_processed(f"msg_{i}") for i in range(25))
+
+
+def test_prune_expired_removes_ids_older_than_retention(temp_db):
+    """Test that expired IDs are deleted from the table and the hot tier."""
+    checker = IdempotencyChecker(temp_db, retention=timedelta(days=1))
+    checker.mark_processed("old")
+    checker.mark_processed("new")
+    temp_db.conn.execute(
+        "UPDATE processed_messages SET processed_at = '2024-01-01 00:00:00' "
+        "WHERE message_id = 'old'"
+    )
+    temp_db.conn.commit()
+
+    assert checker.prune_expired(now=datetime(2024, 1, 10)) == 1
+    assert checker.is_processed("old") is False
+    assert checker.is_processed("new") is True
+
+
+def test_retention_none_keeps_ids_forever(temp_db):
+    """Test that pruning is disabled without a retention period."""
+    checker = IdempotencyChecker(temp_db, retention=None)
+    checker.mark_processed("kept")
+
+    assert checker.prune_expired(now=datetime(2100, 1, 1)) == 0
+    assert checker.is_processed("kept") is True
+
+
+def test_default_retention_prunes_live_ids_but_keeps_export_ids(temp_db):
+    """Test that live IDs expire by default while chat export keys are permanent."""
+    checker = IdempotencyChecker(temp_db)
+    for message_id in ("live-old", "tg-export:1", "live-new"):
+        checker.mark_processed(message_id)
+    temp_db.conn.execute(
+        "UPDATE processed_messages SET processed_at = '2000-01-01 00:00:00' "
+        "WHERE message_id IN ('live-old', 'tg-export:1')"
+    )
+    temp_db.conn.commit()
+
+    assert checker.retention == DEFAULT_RETENTION
+    assert checker.prune_expired() == 1
+    assert checker.is_processed("live-old") is False
+    assert checker.is_processed("tg-export:1") is True
+    assert checker.is_processed("live-new") is True
@@ -0,0 +1,124 @@
+"""Equivalence tests for the shared marker scanner and its three call sites."""
+
+import json
+import random
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from bank_bot.services.parsing_service import PARSING_PATTERNS, ParsingService
+from core.parsers.markers import MarkerMatcher, matches
+from core.parsers.registry import ParserRegistry
+from src.classifier import MessageClassifier, MessageType
+
+FRAGMENTS = [
+    "ПРОФИЛЬ", "Профиль", "Орбы:", "Орбы: +15", "🤩 Орбы: +3", "орб", "ОРБ", "открыл сундук",
+    "получил", "🃏 НОВАЯ КАРТА 🃏", "Игрок: Luke", "🎣 [Рыбалка] 🎣", "Рыбак: Luke",
+    "[Самые богатые в этом чате]", "Лайк! Вы повысили рейтинг пользователя Luke",
+    "[Самые крутые по Карме в этом чате]", "Игра окончена!", "Победители:", "💎 Камни:",
+    "🎎 Активная роль:", "💵 Деньги: 10", "👤 Luke", "Bunker", "Прошли в бункер:",
+    "💎 Кристаллики:", "🎯 Побед:", "💰 Монеты • +20 [", "Монеты • +5", "Монеты: +7 (",
+    "монеты", "гусь", "Теперь его рейтинг: 12 ❤️", "❤️ Рейтинг: +1", "рейтинг", "\n", " ", "hello",
+]
+
+
+def _corpus():
+    rng = random.Random(7)
+    messages = [
+        item["metadata"]["raw_message"]
+        for item in json.loads(Path("data/parsed_results.json").read_text(encoding="utf-8"))
+    ]
+    for _ in range(2000):
+        messages.append("\n".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 6))))
+    return messages
+
+
+def _old_classify(c: MessageClassifier, message: str) -> MessageType:
+    if c.GDCARDS_PROFILE_MARKER in message and "Орбы:" in message:
+        return MessageType.GDCARDS_PROFILE
+    elif c.GDCARDS_ACCRUAL_MARKER in message:
+        return MessageType.GDCARDS_ACCRUAL
+    elif c.SHMALALA_FISHING_MARKER in message:
+        return MessageType.SHMALALA_FISHING
+    elif c.SHMALALA_FISHING_TOP_MARKER in message:
+        return MessageType.SHMALALA_FISHING_TOP
+    elif c.SHMALALA_KARMA_MARKER in message:
+        return MessageType.SHMALALA_KARMA
+    elif c.SHMALALA_KARMA_TOP_MARKER in message:
+        return MessageType.SHMALALA_KARMA_TOP
+    elif c.TRUEMAFIA_GAME_END_MARKER in message and "Победители:" in message:
+        return MessageType.TRUEMAFIA_GAME_END
+    elif c.TRUEMAFIA_PROFILE_MARKER_1 in message and c.TRUEMAFIA_PROFILE_MARKER_2 in message and "💵 Деньги:" in message:
+        return MessageType.TRUEMAFIA_PROFILE
+    elif c.BUNKERRP_GAME_END_MARKER in message:
+        return MessageType.BUNKERRP_GAME_END
+    elif c.BUNKERRP_PROFILE_MARKER_1 in message and c.BUNKERRP_PROFILE_MARKER_2 in message and "💵 Деньги:" in message:
+        return MessageType.BUNKERRP_PROFILE
+    return MessageType.UNKNOWN
+
+
+def _old_detect_bot(text: str):
+    text_lower = text.lower()
+    hints = [
+        ("gdcards", "орбы" in text_lower or "🤩" in text),
+        ("gusya_cards", "монеты" in text_lower and ("💰" in text or "гус" in text_lower)),
+        ("shmalala", "монеты:" in text_lower and "💰" in text),
+        ("shmalala_karma", "❤️" in text or "рейтинг" in text_lower),
+    ]
+    for bot_name, hint in hints:
+        if hint and any(p.search(text) for p in PARSING_PATTERNS[bot_name]["patterns"]):
+            return bot_name
+    for bot_name, config in PARSING_PATTERNS.items():
+        if any(p.search(text) for p in config["patterns"]):
+            return bot_name
+    return None
+
+
+def test_matcher_ranks_rules_and_handles_case() -> None:
+    matcher = MarkerMatcher([
+        ("both", [("alpha", "beta")]),
+        ("either", [("alpha",), ("(?i)GAMMA",)]),
+        ("always", []),
+    ])
+
+    assert matcher.marker_count == 3
+    assert matcher.candidates("alpha beta") == ["both", "either", "always"]
+    assert matcher.candidates("Gamma") == ["either", "always"]
+    assert matcher.first("beta") == "always"
+
+
+def test_classifier_matches_elif_chain() -> None:
+    classifier = MessageClassifier()
+    for message in _corpus():
+        assert classifier.classify(message) == _old_classify(classifier, message), message
+
+
+def test_registry_candidates_cover_can_parse() -> None:
+    registry = ParserRegistry()
+    for message in _corpus():
+        expected = [p for p in registry.parsers if p.can_parse(message)]
+        assert registry.candidates(message) == expected, message
+
+
+def test_matches_agrees_with_matcher() -> None:
+    rules = [("orb", (("(?i)орб", "открыл сундук"), ("(?i)орб", "получил")))]
+    matcher = MarkerMatcher(rules)
+    for text in ("Игрок получил 5 ОРБ", "орбы: открыл сундук", "получил карту", "ОРБ"):
+        assert matches(rules[0][1], text) == (matcher.first(text) == "orb"), text
+    assert matches((), "anything") is True
+
+
+def test_registry_rebuilds_matcher_after_register() -> None:
+    registry = ParserRegistry()
+    custom = MagicMock(markers=(), game_name="custom")
+    parsed = MagicMock()
+    custom.safe_parse.return_value = parsed
+    registry.register(custom)
+
+    assert registry.candidates("plain text") == [custom]
+    assert registry.parse("plain text") is parsed
+
+
+def test_detect_bot_matches_previous_logic() -> None:
+    service = ParsingService(MagicMock())
+    for message in _corpus():
+        assert service.detect_bot(message) == _old_detect_bot(message), message
@@ -214,3 +214,26 @@ class TestProcessMessage:
         assert isinstance(args[0], Exception)
         assert args[1] == "processing"
         self.balance_manager.repository.commit_transaction.assert_not_called()
+
+    def test_process_batch_uses_one_lookup_and_one_transaction(self):
+        """Test that a batch dedupes with one lookup and commits once."""
+        # Arrange
+        timestamp = datetime(2024, 1, 1, 12, 0, 0)
+        messages = [(f"ПРОФИЛЬ P{i}\nОрбы: {i}", timestamp) for i in range(3)]
+        self.idempotency_checker.generate_message_id.side_effect = ["id0", "id1", "id2"]
+        self.idempotency_checker.filter_processed.return_value = {"id1"}
+        self.classifier.classify.return_value = MessageType.GDCARDS_PROFILE
+        self.profile_parser.parse.return_value = ParsedProfile(player_name="P", orbs=Decimal("1"))
+
+        # Act
+        result = self.processor.process_batch(messages)
+
+        # Assert
+        assert result.processed == ["id0", "id2"]
+        assert result.duplicates == ["id1"]
+        assert result.errors == []
+        self.idempotency_checker.filter_processed.assert_called_once()
+        self.idempotency_checker.is_processed.assert_not_called()
+        self.balance_manager.repository.begin_transaction.assert_called_once()
+        self.balance_manager.repository.commit_transaction.assert_called_once()
+        assert self.balance_manager.process_profile.call_count == 2
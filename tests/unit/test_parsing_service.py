@@ -10,9 +10,16 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from bank_bot.services.parsing_service import ParsingService, PARSING_PATTERNS
+from common.conversion_rates import invalidate_conversion_rates
 from database.database import Base, User, UserResource, ConversionRate
 
 
+@pytest.fixture(autouse=True)
+def fresh_rate_cache():
+    """Each test uses its own DB, so drop rates cached by earlier tests."""
+    invalidate_conversion_rates()
+
+
 @pytest.fixture
 def db_session():
     """Create in-memory SQLite session for tests."""
@@ -0,0 +1,123 @@
+"""Tests for the pre-generated reading trainer pool."""
+
+import itertools
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from common.reading_pool import (
+    READING_SEEN_DDL,
+    READING_SETS_DDL,
+    READING_SETS_INDEX_DDL,
+    ReadingSetPool,
+    SqlReadingSetStore,
+    validate_reading_set,
+)
+
+
+def _engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    with engine.begin() as conn:
+        conn.execute(text(READING_SETS_DDL))
+        conn.execute(text(READING_SETS_INDEX_DDL))
+        conn.execute(text(READING_SEEN_DDL))
+    return engine
+
+
+def _story(n: int) -> dict:
+    return {
+        "title": f"🐱 История {n}",
+        "image": "🐱",
+        "text": f"Жил кот номер {n}. Он любил молоко.",
+        "questions": [{"question": "Как звали кота?", "answer": "ответ"}],
+    }
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _pool(engine, generate=None, clock=None, **kwargs) -> ReadingSetPool:
+    counter = itertools.count()
+    return ReadingSetPool(
+        SqlReadingSetStore(lambda: engine),
+        generate or (lambda: _story(next(counter))),
+        clock=clock or _Clock(),
+        **kwargs,
+    )
+
+
+def test_refill_stores_sets_and_take_serves_without_generating() -> None:
+    engine = _engine()
+    pool = _pool(engine, target_size=4, low_watermark=2)
+
+    assert pool.refill(limit=10) == 4
+    assert pool.refill(limit=10) == 0
+
+    def fail_generate():
+        raise AssertionError("take must not call the provider")
+
+    pool.generate = fail_generate
+    assert pool.take("viewer")["title"].startswith("🐱 История")
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM reading_sets")).scalar() == 4
+
+
+def test_take_skips_sets_already_seen_by_viewer() -> None:
+    engine = _engine()
+    pool = _pool(engine, target_size=5, low_watermark=0)
+    pool.refill(limit=5)
+
+    titles = [pool.take("tg:1")["title"] for _ in range(5)]
+    assert len(set(titles)) == 5
+
+    # seen marks survive a cold start through reading_seen
+    restarted = _pool(engine, target_size=5, low_watermark=0)
+    restarted.generate = lambda: None
+    assert restarted.take("tg:1")["title"] in titles
+    assert restarted.take("tg:2") is not None
+
+
+def test_old_sets_rotate_out_and_are_pruned() -> None:
+    engine = _engine()
+    clock = _Clock()
+    pool = _pool(engine, clock=clock, target_size=3, low_watermark=0, max_age=100)
+    pool.refill()
+
+    clock.now += 101
+    pool.reload()
+    assert pool.take("viewer") is None
+
+    assert pool.refill() == 3
+    assert pool.stats["pruned"] == 3
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM reading_sets")).scalar() == 3
+        assert conn.execute(text("SELECT COUNT(*) FROM reading_seen")).scalar() == 0
+
+
+def test_provider_outage_stops_refill_and_db_outage_returns_none() -> None:
+    calls = []
+
+    def down():
+        calls.append(1)
+        return None
+
+    pool = _pool(_engine(), generate=down, low_watermark=0)
+    assert pool.refill() == 0
+    assert calls == [1]
+
+    def broken_engine():
+        raise RuntimeError("db down")
+
+    broken = ReadingSetPool(SqlReadingSetStore(broken_engine), down, low_watermark=0)
+    assert broken.take("viewer") is None
+
+
+def test_validate_reading_set() -> None:
+    assert validate_reading_set(_story(1))
+    assert not validate_reading_set({**_story(1), "questions": []})
+    assert not validate_reading_set({**_story(1), "text": " "})
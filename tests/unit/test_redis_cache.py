@@ -51,6 +51,24 @@ class TestRedisCache:
                 socket_timeout=2,
             )
 
+    def test_from_url(self):
+        """Test that a REDIS_URL is split into connection arguments."""
+        with patch("redis.Redis") as mock_redis:
+            mock_redis.return_value.ping.return_value = True
+
+            cache = RedisCache.from_url("redis://:secret@redis.example.com:6380/2", default_ttl=60)
+
+            assert cache.default_ttl == 60
+            mock_redis.assert_called_once_with(
+                host="redis.example.com",
+                port=6380,
+                db=2,
+                password="secret",
+                decode_responses=True,
+                socket_connect_timeout=2,
+                socket_timeout=2,
+            )
+
     def test_init_connection_failure(self):
         """Test graceful handling of connection failure."""
         import redis
@@ -211,6 +229,34 @@ class TestRedisCache:
             cache = RedisCache()
             cache.clear()
 
+    def test_sliding_window_hit_returns_previous_count(self):
+        """Test sliding window trims, counts and adds in one pipeline."""
+        with patch("redis.Redis") as mock_redis:
+            mock_instance = MagicMock()
+            mock_redis.return_value = mock_instance
+            mock_instance.ping.return_value = True
+            pipe = mock_instance.pipeline.return_value
+            pipe.execute.return_value = [0, 3, 1, True]
+
+            cache = RedisCache()
+            count = cache.sliding_window_hit("window:1", "42", 1000.0, 60)
+
+            assert count == 3
+            pipe.zremrangebyscore.assert_called_once_with("bankbot:window:1", "-inf", "(940.0")
+            pipe.zadd.assert_called_once_with("bankbot:window:1", {"42": 1000.0})
+            pipe.expire.assert_called_once_with("bankbot:window:1", 61)
+
+    def test_sliding_window_hit_no_client(self):
+        """Test sliding window returns None without Redis."""
+        import redis
+
+        with patch("redis.Redis") as mock_redis:
+            mock_redis.return_value.ping.side_effect = redis.ConnectionError()
+
+            cache = RedisCache()
+
+            assert cache.sliding_window_hit("window:1", "42", 1000.0, 60) is None
+
     def test_health_check_success(self):
         """Test health check returns True when Redis available."""
         with patch("redis.Redis") as mock_redis:
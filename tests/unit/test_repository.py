@@ -3,6 +3,7 @@
 import pytest
 import tempfile
 import os
+from datetime import datetime
 from decimal import Decimal
 
 from src.repository import SQLiteRepository
@@ -374,6 +375,60 @@ class TestIdempotency:
         assert result is not None
         assert result[0] is not None  # Timestamp should be set
 
+    def test_filter_processed_message_ids(self, repository):
+        """Test bulk lookup of processed message IDs across IN-query chunks."""
+        stored = [f"msg_{i}" for i in range(0, 2000, 2)]
+        for message_id in stored:
+            repository.store_message_id(message_id)
+
+        candidates = [f"msg_{i}" for i in range(2000)] + ["msg_0"]
+
+        assert repository.filter_processed_message_ids(candidates) == set(stored)
+        assert repository.filter_processed_message_ids([]) == set()
+
+    def test_rollback_to_savepoint_keeps_earlier_changes(self, repository):
+        """Test that rolling back a savepoint leaves the rest of the transaction."""
+        repository.begin_transaction()
+        repository.store_message_id("kept")
+        repository.savepoint("sp")
+        repository.store_message_id("undone")
+        repository.rollback_to_savepoint("sp")
+        repository.commit_transaction()
+
+        assert repository.message_id_exists("kept") is True
+        assert repository.message_id_exists("undone") is False
+
+    def test_prune_processed_message_ids_deletes_only_older_rows(self, repository):
+        """Test that pruning removes IDs stored before the cutoff."""
+        repository.store_message_id("old")
+        repository.store_message_id("new")
+        repository.conn.execute(
+            "UPDATE processed_messages SET processed_at = '2024-01-01 00:00:00' "
+            "WHERE message_id = 'old'"
+        )
+        repository.conn.commit()
+
+        deleted = repository.prune_processed_message_ids(datetime(2024, 6, 1))
+
+        assert deleted == 1
+        assert set(repository.iter_processed_message_ids()) == {"new"}
+
+    def test_prune_processed_message_ids_keeps_prefixed_ids(self, repository):
+        """Test that IDs with a kept prefix survive pruning."""
+        for message_id in ("old", "keep:1", "keep_1"):
+            repository.store_message_id(message_id)
+        repository.conn.execute(
+            "UPDATE processed_messages SET processed_at = '2024-01-01 00:00:00'"
+        )
+        repository.conn.commit()
+
+        deleted = repository.prune_processed_message_ids(
+            datetime(2024, 6, 1), keep_prefixes=("keep:",)
+        )
+
+        assert deleted == 2
+        assert set(repository.iter_processed_message_ids()) == {"keep:1"}
+
 
 class TestTransactionIsolation:
     """Test transaction isolation and atomicity."""
@@ -0,0 +1,116 @@
+"""Unit tests for the response mode cache."""
+
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import bot.response_modes as response_modes
+from database.database import ResponseModeSetting
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    """Point response_modes at an in-memory DB and reset its cache."""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    ResponseModeSetting.__table__.create(bind=engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(response_modes, "SessionLocal", factory)
+    monkeypatch.setattr(response_modes, "_user_modes", {})
+    monkeypatch.setattr(response_modes, "_global_mode", None)
+    monkeypatch.setattr(response_modes, "_modes_expire_at", 0.0)
+    return factory
+
+
+def _add_setting(factory, telegram_id, mode, is_global=False):
+    db = factory()
+    db.add(ResponseModeSetting(
+        telegram_id=telegram_id, mode=mode, is_global=is_global, updated_at=datetime.utcnow()
+    ))
+    db.commit()
+    db.close()
+
+
+def test_preload_loads_all_modes_in_one_query(session_factory, monkeypatch):
+    _add_setting(session_factory, 1, "short")
+    _add_setting(session_factory, 2, "watch")
+    _add_setting(session_factory, None, "long", is_global=True)
+
+    assert response_modes.preload_response_modes() == 2
+
+    counting = MagicMock(wraps=session_factory)
+    monkeypatch.setattr(response_modes, "SessionLocal", counting)
+    assert response_modes.get_user_mode(1) == "short"
+    assert response_modes.get_user_mode(2) == "watch"
+    assert response_modes.get_default_user_mode(3) == "long"
+    counting.assert_not_called()
+
+
+def test_users_without_mode_do_not_query_until_ttl(session_factory, monkeypatch):
+    counting = MagicMock(wraps=session_factory)
+    monkeypatch.setattr(response_modes, "SessionLocal", counting)
+
+    for _ in range(5):
+        assert response_modes.get_user_mode(42) is None
+    assert counting.call_count == 1
+
+    _add_setting(session_factory, 42, "watch")
+    monkeypatch.setattr(response_modes, "_modes_expire_at", 0.0)
+    assert response_modes.get_user_mode(42) == "watch"
+    assert counting.call_count == 2
+
+
+def test_set_user_mode_updates_cache_and_db(session_factory):
+    response_modes.preload_response_modes()
+    response_modes.set_user_mode(7, "short")
+
+    assert response_modes.get_user_mode(7) == "short"
+    response_modes.invalidate_response_modes()
+    response_modes._user_modes.clear()
+    assert response_modes.get_user_mode(7) == "short"
+
+
+def test_set_all_user_modes_survives_reload(session_factory):
+    _add_setting(session_factory, 1, "short")
+    response_modes.preload_response_modes()
+
+    response_modes.set_all_user_modes("watch")
+    response_modes.invalidate_response_modes()
+
+    assert response_modes.get_user_mode(1) == "watch"
+    assert response_modes.get_default_user_mode(2) == "watch"
+
+
+def test_reload_drops_modes_removed_from_db(session_factory):
+    _add_setting(session_factory, 1, "short")
+    _add_setting(session_factory, 2, "watch")
+    _add_setting(session_factory, None, "watch", is_global=True)
+    response_modes.preload_response_modes()
+
+    db = session_factory()
+    db.query(ResponseModeSetting).filter(
+        (ResponseModeSetting.telegram_id == 1) | ResponseModeSetting.is_global
+    ).delete()
+    db.commit()
+    db.close()
+    response_modes.invalidate_response_modes()
+
+    assert response_modes.get_user_mode(1) is None
+    assert response_modes.get_user_mode(2) == "watch"
+    assert response_modes.get_default_user_mode(1) in {"short", "long"}
+
+
+def test_db_errors_keep_cached_modes(monkeypatch):
+    monkeypatch.setattr(response_modes, "SessionLocal", MagicMock(side_effect=RuntimeError("down")))
+    monkeypatch.setattr(response_modes, "_user_modes", {5: "short"})
+    monkeypatch.setattr(response_modes, "_modes_expire_at", 0.0)
+
+    assert response_modes.preload_response_modes() == 0
+    assert response_modes.get_user_mode(5) == "short"
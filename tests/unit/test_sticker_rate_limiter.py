@@ -0,0 +1,123 @@
+"""Unit tests for the in-memory sticker rate limiter."""
+
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from core.managers.sticker_rate_limiter import (
+    RedisSlidingWindowCounter,
+    SlidingWindowCounter,
+    StickerRateLimiter,
+    UnlimitedAccessCache,
+)
+from database.database import Base, User
+
+
+@pytest.fixture
+def engine():
+    """Create an in-memory SQLite engine shared with worker threads."""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+class Clock:
+    """Manually advanced UNIX clock."""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestSlidingWindowCounter:
+    """Tests for SlidingWindowCounter."""
+
+    def test_allows_up_to_limit_per_chat_and_user(self):
+        counter = SlidingWindowCounter(limit=2, window_seconds=60)
+
+        assert counter.hit(1, 10, 1, 0.0) is True
+        assert counter.hit(1, 10, 2, 1.0) is True
+        assert counter.hit(1, 10, 3, 2.0) is False
+        # Other users and chats have their own windows
+        assert counter.hit(1, 11, 4, 2.0) is True
+        assert counter.hit(2, 10, 5, 2.0) is True
+
+    def test_rejected_hits_keep_window_full(self):
+        counter = SlidingWindowCounter(limit=1, window_seconds=60)
+
+        assert counter.hit(1, 10, 1, 0.0) is True
+        assert counter.hit(1, 10, 2, 50.0) is False
+        # The first sticker left the window, the rejected ones did not
+        assert counter.hit(1, 10, 3, 70.0) is False
+        assert counter.hit(1, 10, 4, 131.0) is True
+
+    def test_idle_keys_are_swept(self):
+        counter = SlidingWindowCounter(limit=1, window_seconds=60)
+        counter.hit(1, 10, 1, 0.0)
+        counter.hit(1, 11, 2, 200.0)
+
+        assert set(counter._events) == {(1, 11)}
+
+
+def test_redis_counter_falls_back_to_memory():
+    cache = MagicMock()
+    cache.sliding_window_hit.side_effect = [4, 5, None, None]
+    counter = RedisSlidingWindowCounter(cache, limit=5, window_seconds=60)
+
+    assert counter.hit(1, 10, 1, 0.0) is True
+    assert counter.hit(1, 10, 2, 1.0) is False
+    assert counter.hit(1, 10, 3, 2.0) is True
+    cache.sliding_window_hit.assert_any_call("sticker_window:1:10", "1", 0.0, 60)
+
+
+@pytest.mark.asyncio
+async def test_limiter_counts_in_memory_and_audits_in_background(engine):
+    clock = Clock()
+    limiter = StickerRateLimiter(
+        engine, limit=2, window_seconds=3600, unlimited_cache=UnlimitedAccessCache(), clock=clock
+    )
+
+    results = [await limiter.allow(1, 10, message_id) for message_id in range(3)]
+    await limiter.close()
+
+    assert results == [True, True, False]
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT message_id FROM sticker_usage_events")).fetchall()
+    assert sorted(row[0] for row in rows) == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_unlimited_flag_is_cached_including_absent_users(engine):
+    with engine.begin() as conn:
+        conn.execute(
+            User.__table__.insert(),
+            [{
+                "telegram_id": 10,
+                "username": "vip",
+                "sticker_unlimited": True,
+                "sticker_unlimited_until": datetime.utcnow() + timedelta(hours=1),
+            }],
+        )
+    cache = UnlimitedAccessCache()
+    limiter = StickerRateLimiter(engine, limit=0, window_seconds=3600, unlimited_cache=cache)
+
+    assert await limiter.allow(1, 10, 1) is True
+    assert await limiter.allow(1, 11, 2) is False
+
+    limiter._load_unlimited_until = MagicMock(side_effect=AssertionError("unexpected DB lookup"))
+    assert await limiter.allow(1, 10, 3) is True
+    assert await limiter.allow(1, 11, 4) is False
+
+    cache.invalidate(10)
+    assert cache.get(10) == (False, None)
+    assert cache.get(11)[0] is True
+    await limiter.recorder.close()
@@ -0,0 +1,204 @@
+"""Tests for the prefetched trivia question pool."""
+
+import asyncio
+import itertools
+import threading
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from bot.trivia import questions
+from common.trivia_pool import (
+    TRIVIA_QUESTIONS_DDL,
+    TRIVIA_QUESTIONS_INDEX_DDL,
+    SqlTriviaQuestionPool,
+    SqlTriviaQuestionStore,
+    TriviaQuestionPool,
+    validate_question,
+)
+
+
+def _question(n: int) -> dict:
+    options = [f"вариант {n}-{i}" for i in range(4)]
+    return {
+        "text": f"Вопрос номер {n}?",
+        "options": options,
+        "correct_index": 1,
+        "correct_text": options[1],
+        "explanation": "потому что",
+    }
+
+
+async def _wait_until(predicate, timeout: float = 1.0) -> None:
+    for _ in range(int(timeout / 0.01)):
+        if predicate():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+async def test_take_never_waits_and_refills_below_watermark() -> None:
+    counter = itertools.count()
+    calls = 0
+
+    async def generate():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return _question(next(counter))
+
+    pool = TriviaQuestionPool(generate, target_size=4, low_watermark=2)
+
+    assert pool.take() is None
+    await _wait_until(lambda: len(pool) == 4)
+    assert calls == 4
+
+    assert pool.take()["text"] == "Вопрос номер 0?"
+    assert pool.take() is not None
+    assert calls == 4
+    pool.take()  # 1 left: below the watermark
+    await _wait_until(lambda: len(pool) == 4)
+    assert pool.stats["served"] == 3
+    await pool.aclose()
+
+
+async def test_invalid_and_recent_questions_are_rejected() -> None:
+    produced = [_question(1), {"text": "битый"}, _question(2), _question(2)]
+
+    async def generate():
+        return produced.pop(0) if produced else None
+
+    pool = TriviaQuestionPool(generate, target_size=2, low_watermark=1)
+    pool.mark_asked({"text": "вопрос НОМЕР 1"})
+    pool.maybe_refill()
+    await _wait_until(lambda: not pool._refilling)
+
+    assert not produced
+    assert pool.take()["text"] == "Вопрос номер 2?"
+    assert pool.stats["duplicates"] == 2
+    # the broken question and the two empty answers that ended the refill
+    assert pool.stats["rejected"] == 3
+    await pool.aclose()
+
+
+def test_validate_question_enforces_poll_limits() -> None:
+    assert validate_question(_question(1))
+    long_option = _question(1)
+    long_option["options"][2] = "x" * 101
+    same_options = _question(1)
+    same_options["options"][3] = same_options["options"][0].upper()
+    assert not validate_question(long_option)
+    assert not validate_question(same_options)
+    assert not validate_question({**_question(1), "correct_index": 4})
+
+
+def test_sync_generator_refills_in_thread_and_backs_off_on_failures() -> None:
+    now = [0.0]
+    done = threading.Event()
+    calls = []
+
+    def generate():
+        calls.append(threading.current_thread().name)
+        if len(calls) == 3:
+            done.set()
+        raise RuntimeError("provider down")
+
+    pool = TriviaQuestionPool(generate, clock=lambda: now[0])
+
+    assert pool.take() is None
+    assert done.wait(1.0)
+    _wait_for_idle(pool)
+    assert calls == ["trivia-pool-refill"] * 3
+    assert pool.maybe_refill() is False
+
+    now[0] = 60.0
+    assert pool.maybe_refill() is True
+    _wait_for_idle(pool)
+
+
+def _wait_for_idle(pool: TriviaQuestionPool) -> None:
+    for _ in range(100):
+        if not pool._refilling:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("refill did not finish")
+
+
+def test_generate_trivia_question_falls_back_without_repeats(monkeypatch) -> None:
+    monkeypatch.setattr(questions, "_question_pool", None)
+
+    texts = [questions.generate_trivia_question()["text"] for _ in questions.TRIVIA_QUESTIONS]
+
+    assert len(set(texts)) == len(questions.TRIVIA_QUESTIONS)
+    assert questions.get_question_pool().stats["misses"] == len(texts)
+
+
+def _engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    with engine.begin() as conn:
+        conn.execute(text(TRIVIA_QUESTIONS_DDL))
+        conn.execute(text(TRIVIA_QUESTIONS_INDEX_DDL))
+    return engine
+
+
+def _sql_pool(engine, generate=None, clock=None, **kwargs) -> SqlTriviaQuestionPool:
+    counter = itertools.count()
+    return SqlTriviaQuestionPool(
+        SqlTriviaQuestionStore(lambda: engine),
+        generate or (lambda: _question(next(counter))),
+        clock=clock or (lambda: 1_000_000.0),
+        **kwargs,
+    )
+
+
+def test_sql_pool_survives_cold_start_and_serves_each_question_once() -> None:
+    engine = _engine()
+    pool = _sql_pool(engine, target_size=3, low_watermark=0)
+    assert pool.refill() == 3
+    assert pool.refill() == 0
+
+    # a new instance (cold start) sees the questions the cron stored
+    restarted = _sql_pool(engine, generate=lambda: None, low_watermark=0)
+    other = _sql_pool(engine, generate=lambda: None, low_watermark=0)
+    texts = [restarted.take()["text"], other.take()["text"], restarted.take()["text"]]
+
+    assert sorted(texts) == ["Вопрос номер 0?", "Вопрос номер 1?", "Вопрос номер 2?"]
+    assert restarted.take() is None
+    assert restarted.is_recent("вопрос номер 1")
+
+
+def test_sql_pool_refill_skips_recent_questions_and_prunes_old_ones() -> None:
+    engine = _engine()
+    now = [1_000_000.0]
+    produced = [_question(1), {"text": "битый"}, _question(2), _question(3)]
+    pool = _sql_pool(
+        engine,
+        generate=lambda: produced.pop(0) if produced else None,
+        clock=lambda: now[0],
+        target_size=2,
+        max_asked_age=100,
+    )
+    pool.mark_asked({"text": "Вопрос номер 1?"})
+
+    assert pool.refill() == 2
+    assert not produced
+    assert pool.stats["duplicates"] == 1
+    assert pool.stats["rejected"] == 1
+
+    now[0] += 101
+    pool.refill(limit=0)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM trivia_questions")).scalar() == 2
+
+
+def test_sql_pool_db_outage_falls_back_to_static_question() -> None:
+    def broken_engine():
+        raise RuntimeError("db down")
+
+    pool = _sql_pool(None, generate=lambda: None)
+    pool.store = SqlTriviaQuestionStore(broken_engine)
+
+    assert pool.take() is None
+    assert pool.refill() == 0
+    assert pool.size() == 0
+    assert pool.is_recent("что угодно") is False
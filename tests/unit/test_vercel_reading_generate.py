@@ -0,0 +1,41 @@
+"""Tests for the pooled /api/reading_generate endpoint of the Vercel webhook."""
+
+from unittest.mock import patch
+
+import api.index as index
+from api.index import app
+
+
+def test_refill_requires_cron_or_admin_secret(monkeypatch) -> None:
+    monkeypatch.setenv("CRON_SECRET", "cron-secret")
+    client = app.test_client()
+
+    with (
+        patch.object(index._READING_POOL, "refill", return_value=2) as refill,
+        patch.object(index._READING_POOL, "size", return_value=12),
+    ):
+        anonymous = client.get("/api/reading_generate?refill=1")
+        wrong = client.get("/api/reading_generate?refill=1", headers={"Authorization": "Bearer nope"})
+        cron = client.get("/api/reading_generate?refill=1", headers={"Authorization": "Bearer cron-secret"})
+
+    assert anonymous.status_code == 403
+    assert wrong.status_code == 403
+    assert cron.status_code == 200
+    assert cron.get_json()["refilled"] == 2
+    refill.assert_called_once()
+
+
+def test_page_load_serves_pool_or_fallback_without_refill() -> None:
+    client = app.test_client()
+
+    with (
+        patch.object(index._READING_POOL, "take", return_value=None) as take,
+        patch.object(index._READING_POOL, "refill") as refill,
+    ):
+        response = client.post("/api/reading_generate", json={})
+
+    assert response.status_code == 200
+    assert response.get_json()["title"] in {story["title"] for story in index.get_fallback_sets()}
+    assert "reading_viewer=" in response.headers["Set-Cookie"]
+    take.assert_called_once()
+    refill.assert_not_called()
@@ -0,0 +1,104 @@
+"""Tests for the one-time schema bootstrap in the Vercel webhook."""
+
+from unittest.mock import Mock, patch
+
+import pytest
+
+import api.index as index
+from api.index import WEBHOOK_SECRET, app, ensure_schema
+
+ENSURE_FUNCTIONS = (
+    "_ensure_gd_tables",
+    "_ensure_user_preferences_table",
+    "_ensure_chess_games_table",
+    "_ensure_budget_tables",
+    "_ensure_universe_tables",
+    "_ensure_chat_memory_table",
+    "_ensure_reading_pool_tables",
+    "_ensure_trivia_pool_table",
+)
+
+
+@pytest.fixture
+def fresh_schema_state(monkeypatch):
+    monkeypatch.setattr(index, "_SCHEMA_READY", False)
+    mocks = {}
+    for name in ENSURE_FUNCTIONS:
+        mocks[name] = Mock(return_value=True)
+        monkeypatch.setattr(index, name, mocks[name])
+    return mocks
+
+
+def test_bootstrap_runs_ddl_once_per_process(fresh_schema_state) -> None:
+    with (
+        patch("api.index._get_schema_version", return_value=0),
+        patch("api.index._record_schema_version", return_value=True) as record,
+    ):
+        assert ensure_schema(Mock()) is True
+        assert ensure_schema(Mock()) is False
+
+    for mock in fresh_schema_state.values():
+        mock.assert_called_once()
+    record.assert_called_once()
+    assert index._SCHEMA_READY is True
+
+
+def test_bootstrap_skipped_when_version_recorded(fresh_schema_state) -> None:
+    with patch("api.index._get_schema_version", return_value=index.SCHEMA_VERSION):
+        assert ensure_schema(Mock()) is False
+
+    for mock in fresh_schema_state.values():
+        mock.assert_not_called()
+    assert index._SCHEMA_READY is True
+
+
+def test_bootstrap_retried_after_failure(fresh_schema_state) -> None:
+    fresh_schema_state["_ensure_budget_tables"].return_value = False
+    with (
+        patch("api.index._get_schema_version", return_value=0),
+        patch("api.index._record_schema_version", return_value=True) as record,
+    ):
+        ensure_schema(Mock())
+
+    record.assert_not_called()
+    assert index._SCHEMA_READY is False
+
+
+def test_warm_webhook_request_issues_no_ddl(monkeypatch) -> None:
+    monkeypatch.setattr(index, "_SCHEMA_READY", True)
+    update_payload = {
+        "update_id": 1,
+        "message": {
+            "message_id": 10,
+            "text": "/start",
+            "chat": {"id": 12345, "type": "private"},
+            "from": {"id": 1, "first_name": "Tester"},
+        },
+    }
+
+    with patch("api.index.requests.post", return_value=Mock()):
+        response = app.test_client().post(
+            f"/telegram/webhook/{WEBHOOK_SECRET}",
+            json=update_payload,
+        )
+
+    assert response.status_code == 200
+    assert response.headers["X-DDL-Statements"] == "0"
+
+
+def test_forced_bootstrap_requires_admin_secret(monkeypatch) -> None:
+    monkeypatch.setattr(index, "get_db_engine", Mock())
+    monkeypatch.setattr(index, "_get_schema_version", Mock(return_value=index.SCHEMA_VERSION))
+    client = app.test_client()
+
+    with patch("api.index.ensure_schema", return_value=True) as ensure:
+        anonymous = client.get("/api/debug_schema?force=1")
+        authorized = client.get(
+            "/api/debug_schema?force=1",
+            headers={"Authorization": f"Bearer {WEBHOOK_SECRET}"},
+        )
+
+    assert anonymous.status_code == 403
+    assert authorized.status_code == 200
+    assert authorized.get_json()["forced"] is True
+    ensure.assert_called_once()
@@ -0,0 +1,37 @@
+"""Tests for the DB-backed trivia pool endpoint of the Vercel webhook."""
+
+from unittest.mock import patch
+
+import api.index as index
+from api.index import app
+
+
+def test_trivia_pool_requires_cron_or_admin_secret(monkeypatch) -> None:
+    monkeypatch.setenv("CRON_SECRET", "cron-secret")
+    client = app.test_client()
+
+    with (
+        patch.object(index._TRIVIA_POOL, "refill", return_value=3) as refill,
+        patch.object(index._TRIVIA_POOL, "size", return_value=8),
+    ):
+        anonymous = client.get("/api/trivia_pool?refill=1")
+        cron = client.get("/api/trivia_pool?refill=1", headers={"Authorization": "Bearer cron-secret"})
+        status = client.get("/api/trivia_pool", headers={"Authorization": "Bearer cron-secret"})
+
+    assert anonymous.status_code == 403
+    assert cron.status_code == 200
+    assert cron.get_json()["refilled"] == 3
+    assert status.get_json() == {"refilled": 0, "pool_size": 8, "stats": index._TRIVIA_POOL.stats}
+    refill.assert_called_once()
+
+
+def test_trivia_falls_back_to_static_question_when_pool_is_empty() -> None:
+    with (
+        patch.object(index._TRIVIA_POOL, "take", return_value=None),
+        patch.object(index._TRIVIA_POOL, "is_recent", return_value=False),
+        patch.object(index._TRIVIA_POOL, "mark_asked") as mark_asked,
+    ):
+        question = index._vercel_trivia_question()
+
+    assert question["text"] in {q["text"] for q in index._TRIVIA_QUESTIONS}
+    mark_asked.assert_called_once()
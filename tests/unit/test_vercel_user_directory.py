@@ -0,0 +1,93 @@
+"""Tests for the in-memory user-name index used by find_user_by_name."""
+
+import random
+from unittest.mock import patch
+
+import api.index as index
+from api.index import UserDirectory, _score_user_name
+
+USERS = [
+    # (row_id, telegram_id, username, first_name, last_name)
+    (1, 101, "ivan_petrov", "Ivan", "Petrov"),
+    (2, 102, "lucasteam", "LucasTeam", "Luke"),
+    (3, 103, None, "Roman", "Khrus"),
+    (4, 104, "romankhrus", "Роман", None),
+    (5, 105, "nikitos", "Nikita", "Ivanov"),
+]
+
+
+def _directory() -> UserDirectory:
+    directory = UserDirectory()
+    for row_id, telegram_id, username, first_name, last_name in USERS:
+        directory.upsert(telegram_id, username, first_name, last_name, row_id)
+    return directory
+
+
+def _scan(users, name: str):
+    """Reference implementation: the old full-table scan."""
+    name = name.strip().lower()
+    best, best_score = None, 0
+    for _row_id, telegram_id, username, first_name, last_name in users:
+        uname = (username or "").lower()
+        fname = (first_name or "").lower()
+        lname = (last_name or "").lower()
+        score = _score_user_name(name, uname, fname, lname, f"{fname} {lname}".strip())
+        if score > best_score:
+            best, best_score = telegram_id, score
+    return best
+
+
+def test_exact_and_fuzzy_tiers() -> None:
+    directory = _directory()
+    assert directory.find("@lucasteam") == 102
+    assert directory.find("LucasTeam Luke") == 102
+    assert directory.find("ivan") == 101  # exact first name beats last-name prefix
+    assert directory.find("nikit") == 105  # username prefix
+    assert directory.find("khrus") == 103  # exact last name beats username suffix
+    assert directory.find("оман") == 104  # first-name contains
+    assert directory.find("unknown") is None
+
+
+def test_rename_reindexes_user() -> None:
+    directory = _directory()
+    directory.upsert(105, "nikitos", "Nikolay", "Ivanov")
+
+    assert directory.find("nikita") is None
+    assert directory.find("nikolay") == 105
+    assert len(directory) == len(USERS)
+
+
+def test_matches_full_scan_semantics() -> None:
+    rng = random.Random(42)
+    alphabet = "abcio_"
+    users = []
+    for row_id in range(1, 80):
+        def word():
+            return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 6))) or None
+
+        users.append((row_id, 1000 + row_id, word(), word(), word()))
+    directory = UserDirectory()
+    for row_id, telegram_id, username, first_name, last_name in users:
+        directory.upsert(telegram_id, username, first_name, last_name, row_id)
+
+    for _ in range(300):
+        query = "".join(rng.choice(alphabet + " @") for _ in range(rng.randint(1, 5)))
+        if not query.strip():
+            continue
+        assert directory.find(query) == _scan(users, query), query
+
+
+def test_find_user_by_name_fetches_new_rows_on_miss(monkeypatch) -> None:
+    directory = _directory()
+    directory.loaded_at = float("inf")
+    monkeypatch.setattr(index, "_USER_DIRECTORY", directory)
+
+    def fake_refresh(full=False):
+        directory.upsert(106, "newbie", "New", "Player", 6)
+        return 1
+
+    with patch.object(directory, "refresh", side_effect=fake_refresh) as refresh:
+        assert index.find_user_by_name("lucasteam") == 102
+        refresh.assert_not_called()
+        assert index.find_user_by_name("newbie") == 106
+        refresh.assert_called_once_with()
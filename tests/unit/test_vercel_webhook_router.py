@@ -0,0 +1,123 @@
+"""Tests for the table-driven command router of the Vercel webhook."""
+
+from unittest.mock import Mock, patch
+
+import api.index as index
+from api.index import WEBHOOK_SECRET, app
+
+
+def _post(update_payload: dict):
+    return app.test_client().post(
+        f"/telegram/webhook/{WEBHOOK_SECRET}",
+        json=update_payload,
+    )
+
+
+def _message(text: str, chat_id: int = 555, user_id: int = 777) -> dict:
+    return {
+        "update_id": 1,
+        "message": {
+            "message_id": 10,
+            "text": text,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": user_id, "first_name": "Tester"},
+        },
+    }
+
+
+def test_every_known_command_is_registered() -> None:
+    for command in ("/start", "/balance", "/ai", "/ask", "/buy_3", "/gd_user", "/daily_prayer"):
+        assert command in index._COMMAND_ROUTES
+    assert set(index._CALLBACK_ROUTES) == {"trivia_", "gd_moderate_"}
+
+
+def test_command_dispatches_to_registered_handler() -> None:
+    handler = Mock()
+    with (
+        patch.dict(index._COMMAND_ROUTES, {"/ping": (handler, True)}),
+        patch("api.index._load_bot_id"),
+    ):
+        response = _post(_message("/ping extra"))
+
+    assert response.status_code == 200
+    handler.assert_called_once()
+    ctx = handler.call_args.args[0]
+    assert ctx.command == "/ping"
+    assert ctx.chat_id == 555
+    assert ctx.user_id == 777
+
+
+def test_command_requiring_chat_is_skipped_without_chat() -> None:
+    handler = Mock()
+    update_payload = {"update_id": 1, "message": {"message_id": 1, "text": "/ping"}}
+    with (
+        patch.dict(index._COMMAND_ROUTES, {"/ping": (handler, True)}),
+        patch("api.index._load_bot_id"),
+    ):
+        _post(update_payload)
+
+    handler.assert_not_called()
+
+
+def test_callback_prefix_dispatch() -> None:
+    callback_handler = Mock()
+    update_payload = {"update_id": 1, "callback_query": {"id": "1", "data": "trivia_answer_2"}}
+    with patch.dict(index._CALLBACK_ROUTES, {"trivia_": callback_handler}):
+        response = _post(update_payload)
+
+    assert response.status_code == 200
+    callback_handler.assert_called_once()
+    assert callback_handler.call_args.args[1] == "trivia_answer_2"
+
+
+def test_plain_text_skips_command_table() -> None:
+    with (
+        patch("api.index._load_bot_id"),
+        patch("api.index.requests.post") as mock_post,
+    ):
+        response = _post(_message("just chatting"))
+
+    assert response.status_code == 200
+    mock_post.assert_not_called()
+
+
+def test_route_latency_is_recorded() -> None:
+    index._ROUTE_STATS.clear()
+    with (
+        patch("api.index.requests.post", return_value=Mock()),
+        patch("api.index._load_bot_id"),
+    ):
+        _post(_message("/ping"))
+        _post(_message("/ping"))
+
+    stats = index._ROUTE_STATS["/ping"]
+    assert stats["calls"] == 2
+    assert stats["errors"] == 0
+    assert stats["max_ms"] >= stats["last_ms"] >= 0
+
+    body = app.test_client().get("/api/debug_routes").get_json()
+    assert body["routes"][0]["route"] == "/ping"
+    assert body["routes"][0]["calls"] == 2
+
+
+def test_infected_rewrite_runs_before_ai_mention_reply() -> None:
+    conn = Mock()
+    conn.execute.return_value.mappings.return_value.first.return_value = {"virus_type": "олеговирус"}
+    engine = Mock()
+    engine.connect.return_value.__enter__ = Mock(return_value=conn)
+    engine.connect.return_value.__exit__ = Mock(return_value=False)
+    update_payload = _message(f"@{index.BOT_USERNAME} привет всем", chat_id=-100500)
+
+    with (
+        patch("api.index.get_db_engine", return_value=engine),
+        patch("api.index._load_bot_id"),
+        patch("api.index.call_ai_with_memory") as ai_reply,
+        patch("api.index.requests.delete") as delete,
+        patch("api.index.send_telegram_message") as send,
+    ):
+        response = _post(update_payload)
+
+    assert response.status_code == 200
+    ai_reply.assert_not_called()
+    delete.assert_called_once()
+    assert "кхм-кхм" in send.call_args.args[1]
@@ -5,6 +5,7 @@ from __future__ import annotations
 import json
 import logging
 from typing import Any, Optional
+from urllib.parse import urlparse
 
 import redis
 
@@ -41,6 +42,26 @@ class RedisCache:
         self._client: Optional[redis.Redis] = None
         self._connect(host, port, db, password)
 
+    @classmethod
+    def from_url(cls, url: str, **kwargs: Any) -> RedisCache:
+        """Create a cache from a ``redis://[:password@]host[:port][/db]`` URL.
+
+        Args:
+            url: Redis URL, e.g. ``settings.REDIS_URL``.
+            **kwargs: Other RedisCache arguments (key_prefix, default_ttl).
+
+        Returns:
+            RedisCache connected to the URL's server and database.
+        """
+        parsed = urlparse(url)
+        return cls(
+            host=parsed.hostname or "localhost",
+            port=parsed.port or 6379,
+            db=int(parsed.path.lstrip("/") or 0),
+            password=parsed.password,
+            **kwargs,
+        )
+
     def _connect(
         self,
         host: str,
@@ -124,6 +145,43 @@ class RedisCache:
         except redis.RedisError as e:
             logger.warning("Redis delete failed: %s", e)
 
+    def sliding_window_hit(
+        self,
+        key: str,
+        member: str,
+        now: float,
+        window_seconds: float,
+    ) -> Optional[int]:
+        """Record an event in a sorted-set sliding window.
+
+        Events older than the window are dropped, the event is added and
+        the key expires once the window has passed, all in one MULTI.
+
+        Args:
+            key: Window key (prefix will be added).
+            member: Unique event identifier.
+            now: Event time as a UNIX timestamp.
+            window_seconds: Window length in seconds.
+
+        Returns:
+            Number of events in the window before this one, or None if
+            Redis is unavailable.
+        """
+        if self._client is None:
+            return None
+        try:
+            full_key = self._key(key)
+            pipe = self._client.pipeline()
+            pipe.zremrangebyscore(full_key, "-inf", f"({now - window_seconds}")
+            pipe.zcard(full_key)
+            pipe.zadd(full_key, {member: now})
+            pipe.expire(full_key, int(window_seconds) + 1)
+            _, count, _, _ = pipe.execute()
+            return count
+        except redis.RedisError as e:
+            logger.warning("Redis sliding window failed: %s", e)
+            return None
+
     def clear(self) -> None:
         """Clear all keys with prefix."""
         if self._client is None:
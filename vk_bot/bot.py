@@ -6,18 +6,22 @@ import structlog
 import vk_api
 from vk_api.longpoll import VkLongPoll
 
+from bridge_bot.vk_client import get_vk_session_pool
 from vk_bot.config import VK_TOKEN
 
 logger = structlog.get_logger()
 
 
 def create_vk_session() -> vk_api.VkApi:
-    """Создать аутентифицированную VK API сессию.
+    """Получить аутентифицированную VK API сессию из общего пула.
+
+    Сессия и её keep-alive соединения общие с bridge_bot, поэтому
+    публикация в канал не открывает новое TLS-соединение на каждый вызов.
 
     Returns:
         Аутентифицированный VkApi объект.
     """
-    return vk_api.VkApi(token=VK_TOKEN)
+    return get_vk_session_pool().get(VK_TOKEN)
 
 
 def create_longpoll(session: vk_api.VkApi) -> VkLongPoll:
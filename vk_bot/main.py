@@ -13,6 +13,7 @@ from typing import Optional
 
 import structlog
 
+from bridge_bot.vk_client import close_vk_session_pool
 from vk_bot.bot import create_vk_session, create_longpoll
 from vk_bot.config import VK_TOKEN, VK_PEER_ID
 from bridge_bot.loop_guard import has_bot_mark
@@ -31,7 +32,7 @@ def _publish_to_channel(vk, peer_id: int, message: str, attachments: Optional[li
     """Публиковать сообщение в VK-канал.
 
     Args:
-        vk: VK API объект.
+        vk: VK API объект пулированной сессии (см. create_vk_session).
         peer_id: ID канала/чата для публикации.
         message: Текст сообщения.
         attachments: Список вложений (опционально).
@@ -129,7 +130,7 @@ def run() -> None:
     except Exception as e:
         logger.error("VK Long Poll error", error=str(e))
     finally:
-        logger.info("VK Bot stopped")
+        logger.info("VK Bot stopped", vk_connections=close_vk_session_pool())
 
 
 if __name__ == "__main__":